@@ -3,6 +3,11 @@ ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Served by an ASGI server (e.g. ``uvicorn config.asgi:application``), the reminders
+channel ``/api/reminders/stream/`` keeps one Server-Sent Events connection open per
+client instead of tying up a synchronous Gunicorn worker; under WSGI that view answers
+once and tells the client when to reconnect.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 from dotenv import load_dotenv
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -33,7 +34,10 @@ ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', '').split(',') if os.getenv('ALLOWED_
 CSRF_TRUSTED_ORIGINS = os.getenv('CSRF_TRUSTED_ORIGINS', '').split(',') if os.getenv('CSRF_TRUSTED_ORIGINS') else []
 
 #ENVIO DE CORREOS
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Los correos se envían desde la bandeja de salida (python manage.py procesar_correos, ver webmaga/correo_saliente.py)
+# En desarrollo: EMAIL_BACKEND=django.core.mail.backends.console.EmailBackend (o filebased.EmailBackend con EMAIL_FILE_PATH)
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_FILE_PATH = os.environ.get('EMAIL_FILE_PATH', os.path.join(tempfile.gettempdir(), 'webmaga-correos'))
 EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.gmail.com')
 EMAIL_PORT = int(os.environ.get('EMAIL_PORT', '587'))
 EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'True').lower() in ('true', '1', 'yes')
@@ -63,6 +67,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'webmaga.middleware.UsuarioMagaMiddleware',  # request.usuario_maga (una búsqueda por petición)
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'webmaga.middleware.NoCacheMiddleware',  # Agregar headers de no-cache para páginas autenticadas
@@ -110,12 +115,14 @@ DATABASES = {
 # CONFIGURACIÓN DE CACHÉ (para mejorar rendimiento)
 # =====================================================
 # Usando caché en memoria local (no requiere Redis ni Memcached)
+# Caché compartida por todos los workers de Gunicorn (archivo SQLite en modo WAL, ver webmaga/cache_backend.py)
+# Necesaria para que las invalidaciones y los contadores de rate limiting sean los mismos en todos los procesos
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'webmaga-cache',
+        'BACKEND': 'webmaga.cache_backend.SQLiteCache',
+        'LOCATION': os.getenv('CACHE_SQLITE_PATH', os.path.join(tempfile.gettempdir(), 'webmaga-cache.sqlite3')),
         'OPTIONS': {
-            'MAX_ENTRIES': 1000,  # Máximo de entradas en caché
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '10000')),  # Máximo de entradas en caché
         }
     }
 }
@@ -123,6 +130,20 @@ CACHES = {
 # Tiempo de caché por defecto (5 minutos)
 CACHE_MIDDLEWARE_SECONDS = 300
 
+# Caché de respuestas de las APIs de inicio/dashboard (ver webmaga/response_cache.py)
+# Se invalidan al guardar actividades, beneficiarios, comunidades y demás modelos de los que dependen
+API_CACHE_ENABLED = os.getenv('API_CACHE_ENABLED', 'True') == 'True'
+API_CACHE_TTLS = {  # Segundos que una respuesta se considera vigente, por endpoint
+    'dashboard_stats': int(os.getenv('API_CACHE_TTL_DASHBOARD', '300')),
+    'ultimos_proyectos': int(os.getenv('API_CACHE_TTL_INICIO', '120')),
+    'ultimos_eventos_inicio': int(os.getenv('API_CACHE_TTL_INICIO', '120')),
+    'cambios_recientes': int(os.getenv('API_CACHE_TTL_CAMBIOS', '60')),
+    'regiones_recientes': int(os.getenv('API_CACHE_TTL_REGIONES', '300')),
+}
+API_CACHE_STALE_SECONDS = int(os.getenv('API_CACHE_STALE_SECONDS', '600'))  # Tiempo extra en que se sirve la respuesta vencida mientras se recalcula
+API_CACHE_LOCK_SECONDS = 30  # Duración máxima del candado de recálculo
+API_CACHE_WAIT_SECONDS = 5  # Espera máxima por un cálculo en curso cuando no hay respuesta guardada
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -158,7 +179,11 @@ LOGOUT_REDIRECT_URL = '/login/'
 # IMPORTANTE: Esta configuración asegura que la sesión persista en Android incluso al cerrar la app
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False  # No cerrar sesión al cerrar el navegador (crítico para Android)
 SESSION_COOKIE_AGE = 604800  # 7 días en segundos (7 * 24 * 60 * 60 = 604800)
-SESSION_SAVE_EVERY_REQUEST = True  # Renovar la sesión con cada solicitud para mantenerla activa
+# Sesiones en caché + BD con renovación diferida (ver webmaga/session_backend.py): la sesión se sigue
+# renovando mientras se usa la app, pero solo se escribe en la BD cuando le quedan menos de SESSION_RENOVAR_SI_RESTAN
+SESSION_ENGINE = 'webmaga.session_backend'
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_RENOVAR_SI_RESTAN = SESSION_COOKIE_AGE - int(os.getenv('SESSION_RENOVAR_CADA', '3600'))  # Como máximo una escritura por hora por sesión
 SESSION_COOKIE_HTTPONLY = True  # Seguridad: evitar acceso desde JavaScript
 SESSION_COOKIE_SAMESITE = 'Lax'  # Protección CSRF
 # Configuración adicional para Android: asegurar que las cookies sean persistentes
@@ -219,6 +244,13 @@ IMAGE_COMPRESSION_SETTINGS = {
         'format_output': 'JPEG',
         'min_size_kb': 500
     },
+    'medium': {
+        'max_width': 960,
+        'max_height': 960,
+        'quality': 80,
+        'format_output': 'JPEG',
+        'min_size_kb': 200
+    },
     'thumbnail': {
         'max_width': 400,
         'max_height': 400,
@@ -235,6 +267,63 @@ IMAGE_COMPRESSION_SETTINGS = {
     }
 }
 
+# =====================================================
+# ENTREGA DE ARCHIVOS MEDIA EN PRODUCCIÓN
+# =====================================================
+# Ver webmaga/servir_media.py. Con un proxy delante, el archivo lo envía el proxy y no Gunicorn
+MEDIA_SENDFILE = os.getenv('MEDIA_SENDFILE', '').lower()  # '' (Gunicorn), 'nginx' (X-Accel-Redirect) o 'apache' (X-Sendfile)
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/media-interna/')  # location `internal` de nginx con alias a MEDIA_ROOT
+MEDIA_CACHE_MAX_AGE = int(os.getenv('MEDIA_CACHE_MAX_AGE', str(365 * 24 * 3600)))  # Archivos con UUID o hash en el nombre
+
+# =====================================================
+# ALMACÉN DE ARCHIVOS POR CONTENIDO
+# =====================================================
+# Ver webmaga/almacen_archivos.py. Un blob sin referencias se elimina pasado este plazo, para no
+# borrar un archivo que una subida en curso acaba de reutilizar
+MEDIA_BLOB_GRACIA_HORAS = int(os.getenv('MEDIA_BLOB_GRACIA_HORAS', '24'))
+
+# =====================================================
+# SUBIDA POR PARTES DE ARCHIVOS GRANDES
+# =====================================================
+# Ver webmaga/subidas_por_partes.py
+SUBIDAS_TAMANO_MAXIMO_MB = int(os.getenv('SUBIDAS_TAMANO_MAXIMO_MB', '2048'))  # Tamaño máximo de un archivo subido por partes
+SUBIDAS_EXPIRACION_HORAS = int(os.getenv('SUBIDAS_EXPIRACION_HORAS', '48'))  # Subidas sin actividad se eliminan con su archivo parcial
+
+# =====================================================
+# EXPORTACIÓN DE REPORTES EN SEGUNDO PLANO
+# =====================================================
+# Los reportes exportados y la caché de reportes son solo para administradores: se guardan en
+# REPORT_STORAGE_ROOT, fuera de MEDIA_ROOT (que /media/ sirve sin autenticación), y se descargan
+# únicamente por api_descargar_exportacion. Las carpetas antiguas media/reportes_exportados y
+# media/reportes_cache ya no se usan y se pueden eliminar
+REPORT_STORAGE_ROOT = Path(os.getenv('REPORT_STORAGE_ROOT', str(BASE_DIR / 'almacen_privado')))
+
+# Los archivos generados por `manage.py procesar_exportaciones` se guardan en REPORT_STORAGE_ROOT/<REPORT_EXPORT_DIR>
+REPORT_EXPORT_DIR = 'reportes_exportados'
+REPORT_EXPORT_RETENTION_HOURS = int(os.getenv('REPORT_EXPORT_RETENTION_HOURS', '24'))  # Horas que se conservan los archivos
+REPORT_EXPORT_MAX_INTENTOS = int(os.getenv('REPORT_EXPORT_MAX_INTENTOS', '3'))
+REPORT_EXPORT_TIMEOUT_MINUTES = int(os.getenv('REPORT_EXPORT_TIMEOUT_MINUTES', '15'))  # Trabajo 'procesando' más antiguo se reintenta
+
+# Caché de archivos de reportes generados (REPORT_STORAGE_ROOT/<REPORT_CACHE_DIR>)
+# La clave incluye un sello de versión de los datos (webmaga/report_cache.SELLO_TABLAS), así que
+# un cambio en cualquier tabla que lean los reportes invalida las entradas sin necesidad de borrarlas
+REPORT_CACHE_ENABLED = os.getenv('REPORT_CACHE_ENABLED', 'True') == 'True'
+REPORT_CACHE_DIR = 'reportes_cache'
+REPORT_CACHE_MAX_BYTES = int(os.getenv('REPORT_CACHE_MAX_MB', '500')) * 1024 * 1024  # Tamaño máximo antes del desalojo LRU
+REPORT_CACHE_MAX_AGE_SECONDS = int(os.getenv('REPORT_CACHE_MAX_AGE_HOURS', '72')) * 3600  # Los reportes incluyen la fecha de generación
+
+# =====================================================
+# CONVERSIÓN WORD → PDF (POOL DE LIBREOFFICE)
+# =====================================================
+# Instancias soffice headless que se mantienen calientes por proceso (ver webmaga/pdf_converter.py)
+LIBREOFFICE_POOL_SIZE = int(os.getenv('LIBREOFFICE_POOL_SIZE', '2'))  # Conversiones simultáneas máximas por proceso
+LIBREOFFICE_CONVERSION_TIMEOUT = int(os.getenv('LIBREOFFICE_CONVERSION_TIMEOUT', '60'))  # Segundos por conversión
+LIBREOFFICE_QUEUE_TIMEOUT = int(os.getenv('LIBREOFFICE_QUEUE_TIMEOUT', '120'))  # Espera máxima por una instancia libre
+LIBREOFFICE_MAX_CONVERSIONES = int(os.getenv('LIBREOFFICE_MAX_CONVERSIONES', '200'))  # Reciclar instancia tras N conversiones
+LIBREOFFICE_HEALTHCHECK_SECONDS = int(os.getenv('LIBREOFFICE_HEALTHCHECK_SECONDS', '30'))
+LIBREOFFICE_IDLE_SECONDS = int(os.getenv('LIBREOFFICE_IDLE_SECONDS', '900'))  # Apagar instancias sin uso
+LIBREOFFICE_PROFILE_DIR = os.getenv('LIBREOFFICE_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'webmaga-libreoffice'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -18,26 +18,15 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from django.views.static import serve
-from django.http import Http404, HttpResponse
+from django.http import HttpResponse
 from django.views.decorators.http import require_http_methods
+from webmaga.servir_media import servir_archivo
 import os
 
+@require_http_methods(["GET", "HEAD"])
 def serve_media(request, path):
-    """Vista personalizada para servir archivos media en producción"""
-    media_root = str(settings.MEDIA_ROOT)
-    file_path = os.path.join(media_root, path)
-    
-    # Verificar que el archivo esté dentro de MEDIA_ROOT (seguridad)
-    file_path = os.path.normpath(file_path)
-    if not file_path.startswith(os.path.normpath(media_root)):
-        raise Http404("Archivo no encontrado")
-    
-    # Verificar que el archivo exista
-    if not os.path.exists(file_path):
-        raise Http404("Archivo no encontrado")
-    
-    return serve(request, path, document_root=media_root)
+    """Vista personalizada para servir archivos media en producción (ver webmaga/servir_media.py)"""
+    return servir_archivo(request, path)
 
 @require_http_methods(["GET"])
 def serve_service_worker(request):
@@ -2303,6 +2303,41 @@ function closeExportModal() {
     currentExportFormat = null;
 }
 
+// Encolar una exportación en segundo plano y consultar su estado hasta que el archivo esté listo
+async function solicitarExportacion(url, intervaloMs = 2000, maxEsperaMs = 600000) {
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: {
+            'X-CSRFToken': getCookie('csrftoken')
+        }
+    });
+    const data = await response.json().catch(() => ({}));
+    if (!response.ok || !data.success) {
+        throw new Error(data.error || 'Error al solicitar la exportación');
+    }
+    
+    let exportacion = data.exportacion;
+    const inicio = Date.now();
+    while (exportacion.estado === 'pendiente' || exportacion.estado === 'procesando') {
+        if (Date.now() - inicio > maxEsperaMs) {
+            throw new Error('La exportación está tardando demasiado. Intenta nuevamente más tarde.');
+        }
+        await new Promise(resolve => setTimeout(resolve, intervaloMs));
+        
+        const estadoResponse = await fetch(`/api/exportaciones/${exportacion.id}/`);
+        const estadoData = await estadoResponse.json().catch(() => ({}));
+        if (!estadoResponse.ok || !estadoData.success) {
+            throw new Error(estadoData.error || 'Error al consultar el estado de la exportación');
+        }
+        exportacion = estadoData.exportacion;
+    }
+    
+    if (exportacion.estado !== 'completado') {
+        throw new Error(exportacion.error || 'No se pudo generar el archivo del reporte');
+    }
+    return exportacion;
+}
+
 async function exportReport(format) {
     // Prevenir múltiples llamadas simultáneas
     if (isExporting) {
@@ -2358,41 +2393,17 @@ async function exportReport(format) {
         // Mostrar indicador de carga
         mostrarMensaje('info', 'Generando reporte... Por favor espere.');
         
-        // Realizar petición
-        const response = await fetch(`/api/beneficiarios/exportar-reporte/?${params.toString()}`, {
-            method: 'GET',
-        });
-        
-        if (!response.ok) {
-            const errorData = await response.json().catch(() => ({ error: 'Error al exportar el reporte' }));
-            throw new Error(errorData.error || 'Error al exportar el reporte');
-        }
-        
-        // Obtener el blob del archivo
-        const blob = await response.blob();
+        // Encolar la exportación y esperar a que el worker genere el archivo
+        const exportacion = await solicitarExportacion(`/api/exportaciones/beneficiarios/?${params.toString()}`);
         
-        // Crear URL temporal y descargar
-        const url = window.URL.createObjectURL(blob);
-        const a = document.createElement('a');
-        a.href = url;
-        
-        // Obtener nombre del archivo del header Content-Disposition o generar uno
-        const contentDisposition = response.headers.get('Content-Disposition');
+        // Descargar directamente desde el servidor (sin cargar el archivo en memoria)
         const extension = format === 'pdf' ? 'pdf' : 'docx';
-        let filename = `reporte_beneficiarios_${new Date().toISOString().split('T')[0]}.${extension}`;
-        
-        if (contentDisposition) {
-            const filenameMatch = contentDisposition.match(/filename[^;=\n]*=((['"]).*?\2|[^;\n]*)/);
-            if (filenameMatch && filenameMatch[1]) {
-                filename = filenameMatch[1].replace(/['"]/g, '');
-            }
-        }
-        
-        a.download = filename;
+        const a = document.createElement('a');
+        a.href = exportacion.download_url;
+        a.download = exportacion.archivo_nombre || `reporte_beneficiarios_${new Date().toISOString().split('T')[0]}.${extension}`;
         document.body.appendChild(a);
         a.click();
         document.body.removeChild(a);
-        window.URL.revokeObjectURL(url);
         
         mostrarMensaje('success', 'Reporte exportado exitosamente');
         
@@ -154,6 +154,7 @@ function normalizeCommunityDetailResponse(data) {
     ? data.photos.map((photo) => ({
         id: photo.id || null,
         url: photo.url,
+        url_miniatura: photo.url_miniatura || null,
         description: photo.description || 'Imagen de la comunidad',
       }))
     : [];
@@ -1459,18 +1460,43 @@ function addFileToCommunity() {
   formData.append('nombre', finalName);
   formData.append('descripcion', description);
 
-  fetch(`/api/comunidad/${currentCommunityData.id}/archivos/agregar/`, {
-    method: 'POST',
-    headers: {
-      'X-CSRFToken': getCookie('csrftoken') || '',
-    },
-    body: formData,
-  })
-    .then(async (response) => {
+  let envio;
+  if (window.SubidaPorPartes && window.SubidaPorPartes.debeUsarse(file)) {
+    // Archivos grandes: subida por partes que continúa tras un corte de conexión
+    const confirmButton = document.getElementById('confirmFileBtn');
+    envio = window.SubidaPorPartes.subir(file, {
+      destino: 'comunidad',
+      objetoId: currentCommunityData.id,
+      nombre: finalName,
+      descripcion: description,
+      onProgress: (recibido, total) => {
+        if (confirmButton) {
+          confirmButton.textContent = `Subiendo ${Math.floor((recibido * 100) / total)}%`;
+        }
+      },
+    }).finally(() => {
+      if (confirmButton) {
+        confirmButton.textContent = 'Agregar';
+      }
+    });
+  } else {
+    envio = fetch(`/api/comunidad/${currentCommunityData.id}/archivos/agregar/`, {
+      method: 'POST',
+      headers: {
+        'X-CSRFToken': getCookie('csrftoken') || '',
+      },
+      body: formData,
+    }).then(async (response) => {
       const result = await response.json();
       if (!response.ok || !result.success) {
         throw new Error(result.error || 'No se pudo agregar el archivo');
       }
+      return result;
+    });
+  }
+
+  envio
+    .then((result) => {
       clearFileForm();
       hideModal('addFileModal');
       return refreshCurrentCommunity(result.message || 'Archivo agregado exitosamente');
@@ -2179,6 +2205,8 @@ function renderCommunityGalleryPage() {
     const photoUrl = photo.url || '';
     const encodedName = encodeURIComponent(photo.nombre || photo.name || photo.archivo_nombre || '');
     const imageUrlAttr = escapeHtml(photoUrl);
+    // La cuadrícula usa la miniatura; el visor abre la imagen completa (data-image-url)
+    const thumbnailUrlAttr = escapeHtml(photo.url_miniatura || photoUrl);
     const removeButton = currentCommunityGalleryCanManage
       ? `<button class="btn-remove-item" data-imagen-id="${photo.id}" data-image-name="${encodedName}" title="Eliminar imagen">
             <svg width="18" height="18" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="3" stroke-linecap="round">
@@ -2194,7 +2222,7 @@ function renderCommunityGalleryPage() {
     return `
       <div class="gallery-item" data-image-url="${imageUrlAttr}" data-image-description="${imageDescriptionAttr}">
         ${removeButton}
-        <img src="${imageUrlAttr}" alt="${imageAltAttr}" data-image-url="${imageUrlAttr}" data-image-description="${imageDescriptionAttr}" loading="lazy" onerror="this.src='https://images.unsplash.com/photo-1523978591478-c753949ff840?ixlib=rb-4.0.3&auto=format&fit=crop&w=400&q=80'">
+        <img src="${thumbnailUrlAttr}" alt="${imageAltAttr}" data-image-url="${imageUrlAttr}" data-image-description="${imageDescriptionAttr}" loading="lazy" onerror="this.src='https://images.unsplash.com/photo-1523978591478-c753949ff840?ixlib=rb-4.0.3&auto=format&fit=crop&w=400&q=80'">
         ${descriptionHtml}
       </div>
     `;
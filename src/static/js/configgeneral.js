@@ -457,7 +457,9 @@ async function sincronizarCacheManual() {
         // Paso 2: Sincronizar eventos completos
         syncStatus.textContent = 'Sincronizando eventos...';
         try {
-            const eventosResponse = await fetch('/api/eventos/');
+            // Solo los campos que se leen aquí (id, tipo) y los que muestra la tabla de eventos sin conexión;
+            // los detalles completos se guardan desde /api/evento/<id>/
+            const eventosResponse = await fetch('/api/eventos/?fields=id,nombre,tipo,comunidad,comunidades_resumen,fecha,estado,personal_count,personal_nombres,beneficiarios_count,creado_en');
             if (eventosResponse.ok) {
                 const data = await eventosResponse.json();
                 if (data.success && data.eventos && Array.isArray(data.eventos)) {
@@ -5052,15 +5052,33 @@ document.addEventListener('DOMContentLoaded', function() {
     let eventosData = [];
     let eventosDataOriginal = []; // Guardar la lista original para el filtrado
     
+    // En línea la lista se pide por páginas con las columnas de la tabla (view=summary)
+    // y la búsqueda por nombre se hace en el servidor
+    const EVENTOS_POR_PAGINA = 50;
+    let eventosSiguienteOffset = 0;
+    let eventosHayMas = false;
+    let eventosBusqueda = '';
+    let idsEventosServidor = new Set(); // IDs recibidos en las páginas cargadas (sin búsqueda)
+    let temporizadorBusquedaEventos = null;
+    
+    function urlListadoEventos(offset) {
+        const params = new URLSearchParams({ view: 'summary', limite: EVENTOS_POR_PAGINA, offset: offset });
+        if (eventosBusqueda) {
+            params.set('buscar', eventosBusqueda);
+        }
+        return `/api/eventos/?${params.toString()}`;
+    }
+    
     // NOTA: El event listener para openManageEventBtn ya está configurado arriba (línea 356-358)
     // No es necesario duplicarlo aquí
     
-    async function cargarEventos() {
+    async function cargarEventos(agregarPagina = false) {
         try {
             const isOffline = !navigator.onLine;
             const db = window.OfflineDB;
             
             if (isOffline && db) {
+                eventosHayMas = false;
                 // Modo offline: cargar desde IndexedDB
                 try {
                     const eventosOffline = await db.getAllProyectos();
@@ -5095,8 +5113,9 @@ document.addEventListener('DOMContentLoaded', function() {
                     renderEventos();
                 }
             } else {
-                // Modo online: cargar desde el servidor
-                const response = await fetch('/api/eventos/');
+                // Modo online: cargar una página desde el servidor
+                const offset = agregarPagina ? eventosSiguienteOffset : 0;
+                const response = await fetch(urlListadoEventos(offset));
                 
                 if (!response.ok) {
                     throw new Error('Error al cargar eventos');
@@ -5119,17 +5138,27 @@ document.addEventListener('DOMContentLoaded', function() {
                                typeof evento.nombre === 'string' &&
                                evento.nombre.trim() !== '';
                     });
-                    eventosData = [...eventosValidos];
-                    eventosDataOriginal = [...eventosValidos]; // Guardar copia original
+                    eventosDataOriginal = agregarPagina ? [...eventosDataOriginal, ...eventosValidos] : [...eventosValidos];
+                    eventosData = [...eventosDataOriginal];
+                    eventosSiguienteOffset = offset + eventosCargados.length;
+                    eventosHayMas = Boolean(data.hay_mas);
+                    
+                    if (!eventosBusqueda) {
+                        if (!agregarPagina) {
+                            idsEventosServidor = new Set();
+                        }
+                        eventosCargados.forEach(e => idsEventosServidor.add(String(e.id)));
+                    }
                     
                     // Guardar eventos en IndexedDB para uso offline
                     if (db && eventosCargados.length > 0) {
-                        // Obtener IDs de eventos del servidor
-                        const idsServidor = new Set(eventosCargados.map(e => String(e.id)));
+                        // Solo con la lista completa (todas las páginas, sin búsqueda) se sabe qué eventos ya no existen
+                        const listaCompleta = !eventosBusqueda && !eventosHayMas;
+                        const idsServidor = idsEventosServidor;
                         
                         // Obtener todos los eventos del IndexedDB para comparar
                         try {
-                            const eventosIndexedDB = await db.getAllProyectos();
+                            const eventosIndexedDB = listaCompleta ? await db.getAllProyectos() : [];
                             if (eventosIndexedDB && eventosIndexedDB.length > 0) {
                                 // Eliminar del IndexedDB los eventos que ya no existen en el servidor
                                 for (const eventoDB of eventosIndexedDB) {
@@ -5148,10 +5177,12 @@ document.addEventListener('DOMContentLoaded', function() {
                             console.warn('⚠️ Error al sincronizar IndexedDB:', error);
                         }
                         
-                        // Guardar lista básica de eventos
+                        // Guardar lista básica de eventos (sin perder los detalles ya guardados)
                         eventosCargados.forEach(async (evento) => {
                             try {
+                                const eventoExistente = await db.getProyecto(evento.id);
                                 await db.saveProyecto({
+                                    ...(eventoExistente || {}),
                                     ...evento,
                                     ultimo_sync: new Date().toISOString(),
                                     is_offline: false
@@ -5163,7 +5194,7 @@ document.addEventListener('DOMContentLoaded', function() {
                         console.log('✅ Eventos guardados en IndexedDB (lista básica):', eventosCargados.length);
                         
                         // Cargar detalles completos de los primeros 5 eventos más recientes en segundo plano
-                        const eventosRecientes = eventosCargados.slice(0, 5);
+                        const eventosRecientes = (agregarPagina || eventosBusqueda) ? [] : eventosCargados.slice(0, 5);
                         eventosRecientes.forEach(async (eventoBasico) => {
                             try {
                                 const detalleResponse = await fetch(`/api/evento/${eventoBasico.id}/`, {
@@ -5362,10 +5393,35 @@ document.addEventListener('DOMContentLoaded', function() {
                 confirmarEliminarEvento(eventoId);
             });
         });
+        
+        // Botón para pedir la siguiente página de eventos al servidor
+        if (eventosHayMas && navigator.onLine) {
+            const loadMoreBtn = document.createElement('button');
+            loadMoreBtn.type = 'button';
+            loadMoreBtn.className = 'btn-load-more-events';
+            loadMoreBtn.textContent = 'Cargar más eventos';
+            loadMoreBtn.style.cssText = 'display: block; margin: 8px auto 0; background: rgba(255, 255, 255, 0.08); color: #b8c5d1; border: 1px solid rgba(255, 255, 255, 0.2); padding: 10px 20px; border-radius: 6px; cursor: pointer; font-size: 0.9rem;';
+            loadMoreBtn.addEventListener('click', function() {
+                this.disabled = true;
+                this.textContent = 'Cargando...';
+                cargarEventos(true);
+            });
+            eventsList.appendChild(loadMoreBtn);
+        }
     }
     
     // Función para filtrar eventos por nombre
     function filtrarEventosPorNombre(searchTerm) {
+        // En línea la lista está paginada: la búsqueda se hace en el servidor
+        if (navigator.onLine) {
+            clearTimeout(temporizadorBusquedaEventos);
+            temporizadorBusquedaEventos = setTimeout(() => {
+                eventosBusqueda = (searchTerm || '').trim();
+                cargarEventos();
+            }, 300);
+            return;
+        }
+        
         if (!searchTerm || searchTerm.trim() === '') {
             eventosData = [...eventosDataOriginal];
             renderEventos();
@@ -451,6 +451,7 @@
         '/api/beneficiarios/exportar-reporte/',
         '/api/beneficiarios/exportar-comparativa/',
         '/api/reportes/exportar/',
+        '/api/exportaciones/',
       ];
       
       // Si es una ruta de exportación, hacer bypass
@@ -988,7 +989,9 @@
 
       // Sincronizar eventos completos (con todos sus detalles)
       try {
-        const eventosResponse = await fetch('/api/eventos/');
+        // Solo los campos que se leen aquí (id, tipo) y los que muestra la tabla de eventos sin conexión;
+        // los detalles completos se guardan desde /api/evento/<id>/
+        const eventosResponse = await fetch('/api/eventos/?fields=id,nombre,tipo,comunidad,comunidades_resumen,fecha,estado,personal_count,personal_nombres,beneficiarios_count,creado_en');
         if (eventosResponse.ok) {
           // Verificar Content-Type antes de parsear JSON
           const contentType = eventosResponse.headers.get('content-type');
@@ -5447,6 +5447,8 @@ function renderProjectGalleryPage() {
       const mimeType = img.tipo || img.archivo_tipo || 'image/jpeg';
       imageUrlAttr = `data:${mimeType};base64,${img.base64}`;
     }
+    // La cuadrícula usa la miniatura; el visor abre la imagen completa (data-image-url)
+    const thumbnailUrlAttr = escapeHtml(img.url_miniatura || imageUrlAttr);
     imageUrlAttr = escapeHtml(imageUrlAttr);
     
     // Indicador de imagen offline
@@ -5472,7 +5474,7 @@ function renderProjectGalleryPage() {
       <div class="gallery-item" data-image-url="${imageUrlAttr}" data-image-description="${imageDescriptionAttr}" style="position: relative;">
         ${offlineBadge}
         ${removeButton}
-        <img src="${imageUrlAttr}" alt="${imageAltAttr}" data-image-url="${imageUrlAttr}" data-image-description="${imageDescriptionAttr}" loading="lazy" onerror="this.onerror=null; this.src='${placeholderSvg}'">
+        <img src="${thumbnailUrlAttr}" alt="${imageAltAttr}" data-image-url="${imageUrlAttr}" data-image-description="${imageDescriptionAttr}" loading="lazy" onerror="this.onerror=null; this.src='${placeholderSvg}'">
         ${descriptionHtml}
       </div>
     `;
@@ -11074,26 +11076,41 @@ async function addFileToProject() {
       const description = fileItem.description || '';
 
       try {
-        // Crear FormData para enviar el archivo
-        const formData = new FormData();
-        formData.append('archivo', file);
-        if (description) {
-          formData.append('descripcion', description);
-        }
+        let result;
+        if (window.SubidaPorPartes && window.SubidaPorPartes.debeUsarse(file)) {
+          // Archivos grandes: subida por partes que continúa tras un corte de conexión
+          result = await window.SubidaPorPartes.subir(file, {
+            destino: 'evento',
+            objetoId: proyecto.id,
+            descripcion: description,
+            onProgress: (recibido, total) => {
+              if (confirmButton) {
+                confirmButton.textContent = `Subiendo ${i + 1}/${selectedProjectFiles.length}: ${Math.floor((recibido * 100) / total)}%`;
+              }
+            }
+          });
+        } else {
+          // Crear FormData para enviar el archivo
+          const formData = new FormData();
+          formData.append('archivo', file);
+          if (description) {
+            formData.append('descripcion', description);
+          }
 
-        // Llamar a la API
-        const url = `/api/evento/${proyecto.id}/archivo/agregar/`;
-        
-        const response = await fetch(url, {
-          credentials: 'include',
-          method: 'POST',
-          headers: {
-            'X-CSRFToken': getCookie('csrftoken')
-          },
-          body: formData
-        });
+          // Llamar a la API
+          const url = `/api/evento/${proyecto.id}/archivo/agregar/`;
+          
+          const response = await fetch(url, {
+            credentials: 'include',
+            method: 'POST',
+            headers: {
+              'X-CSRFToken': getCookie('csrftoken')
+            },
+            body: formData
+          });
 
-        const result = await response.json();
+          result = await response.json();
+        }
 
         if (result.success) {
           successCount++;
@@ -670,6 +670,8 @@ function renderRegionGalleryPage() {
     const photoUrl = photo.url || '';
     const encodedName = encodeURIComponent(photo.nombre || photo.name || photo.archivo_nombre || '');
     const imageUrlAttr = escapeHtml(photoUrl);
+    // La cuadrícula usa la miniatura; el visor abre la imagen completa (data-image-url)
+    const thumbnailUrlAttr = escapeHtml(photo.url_miniatura || photoUrl);
     const removeButton = currentRegionGalleryCanManage
       ? `<button class="btn-remove-item" data-imagen-id="${photo.id}" data-image-name="${encodedName}" title="Eliminar imagen">
             <svg width="18" height="18" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="3" stroke-linecap="round">
@@ -685,7 +687,7 @@ function renderRegionGalleryPage() {
     return `
       <div class="gallery-item" data-image-url="${imageUrlAttr}" data-image-description="${imageDescriptionAttr}">
         ${removeButton}
-        <img src="${imageUrlAttr}" alt="${imageAltAttr}" data-image-url="${imageUrlAttr}" data-image-description="${imageDescriptionAttr}" loading="lazy" onerror="this.src='https://images.unsplash.com/photo-1506905925346-21bda4d32df4?ixlib=rb-4.0.3&auto=format&fit=crop&w=400&q=80'">
+        <img src="${thumbnailUrlAttr}" alt="${imageAltAttr}" data-image-url="${imageUrlAttr}" data-image-description="${imageDescriptionAttr}" loading="lazy" onerror="this.src='https://images.unsplash.com/photo-1506905925346-21bda4d32df4?ixlib=rb-4.0.3&auto=format&fit=crop&w=400&q=80'">
         ${descriptionHtml}
       </div>
     `;
@@ -1273,22 +1275,38 @@ async function addFileToRegion() {
     }
     
   try {
-    const response = await fetch(`/api/region/${currentRegionId}/archivo/agregar/`, {
-      method: 'POST',
-      headers: {
-        'X-CSRFToken': getCookie('csrftoken')
-      },
-      body: formData
-    });
+    let result;
+    if (window.SubidaPorPartes && window.SubidaPorPartes.debeUsarse(file)) {
+      // Archivos grandes: subida por partes que continúa tras un corte de conexión
+      result = await window.SubidaPorPartes.subir(file, {
+        destino: 'region',
+        objetoId: currentRegionId,
+        nombre: finalName,
+        descripcion: description,
+        onProgress: (recibido, total) => {
+          if (confirmButton) {
+            confirmButton.textContent = `Subiendo ${Math.floor((recibido * 100) / total)}%`;
+          }
+        }
+      });
+    } else {
+      const response = await fetch(`/api/region/${currentRegionId}/archivo/agregar/`, {
+        method: 'POST',
+        headers: {
+          'X-CSRFToken': getCookie('csrftoken')
+        },
+        body: formData
+      });
 
-    const result = await response.json().catch(() => ({}));
+      result = await response.json().catch(() => ({}));
 
-    if (!response.ok || !result.success) {
-      const errorMessage = result.error || 'No se pudo guardar el archivo.';
-      throw new Error(errorMessage);
+      if (!response.ok || !result.success) {
+        const errorMessage = result.error || 'No se pudo guardar el archivo.';
+        throw new Error(errorMessage);
+      }
     }
 
-    if (currentRegionData) {
+    if (currentRegionData && result.archivo) {
       currentRegionData.files = currentRegionData.files || [];
       currentRegionData.files.push(result.archivo);
       renderRegionFiles(currentRegionData.files);
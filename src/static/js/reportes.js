@@ -5085,6 +5085,57 @@ function setupExportButtons(reportType, enabled) {
     }
 }
 
+// Obtener cookie (token CSRF)
+function getCookie(name) {
+    let cookieValue = null;
+    if (document.cookie && document.cookie !== '') {
+        const cookies = document.cookie.split(';');
+        for (let i = 0; i < cookies.length; i++) {
+            const cookie = cookies[i].trim();
+            if (cookie.substring(0, name.length + 1) === (name + '=')) {
+                cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                break;
+            }
+        }
+    }
+    return cookieValue;
+}
+
+// Encolar una exportación en segundo plano y consultar su estado hasta que el archivo esté listo
+async function solicitarExportacion(url, intervaloMs = 2000, maxEsperaMs = 600000) {
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: {
+            'X-CSRFToken': getCookie('csrftoken')
+        }
+    });
+    const data = await response.json().catch(() => ({}));
+    if (!response.ok || !data.success) {
+        throw new Error(data.error || 'Error al solicitar la exportación');
+    }
+    
+    let exportacion = data.exportacion;
+    const inicio = Date.now();
+    while (exportacion.estado === 'pendiente' || exportacion.estado === 'procesando') {
+        if (Date.now() - inicio > maxEsperaMs) {
+            throw new Error('La exportación está tardando demasiado. Intenta nuevamente más tarde.');
+        }
+        await new Promise(resolve => setTimeout(resolve, intervaloMs));
+        
+        const estadoResponse = await fetch(`/api/exportaciones/${exportacion.id}/`);
+        const estadoData = await estadoResponse.json().catch(() => ({}));
+        if (!estadoResponse.ok || !estadoData.success) {
+            throw new Error(estadoData.error || 'Error al consultar el estado de la exportación');
+        }
+        exportacion = estadoData.exportacion;
+    }
+    
+    if (exportacion.estado !== 'completado') {
+        throw new Error(exportacion.error || 'No se pudo generar el archivo del reporte');
+    }
+    return exportacion;
+}
+
 // Exportar reporte
 async function exportReport(reportType, format) {
     try {
@@ -5171,36 +5222,16 @@ async function exportReport(reportType, format) {
             btn.style.opacity = '0.5';
         });
         
-        // Realizar petición
-        const response = await fetch(`/api/reportes/exportar/${reportType}/?${params.toString()}`);
-        
-        if (!response.ok) {
-            throw new Error('Error al exportar el reporte');
-        }
-        
-        // Obtener el blob del archivo
-        const blob = await response.blob();
+        // Encolar la exportación y esperar a que el worker genere el archivo
+        const exportacion = await solicitarExportacion(`/api/exportaciones/reporte/${reportType}/?${params.toString()}`);
         
-        // Crear URL temporal y descargar
-        const url = window.URL.createObjectURL(blob);
+        // Descargar directamente desde el servidor (sin cargar el archivo en memoria)
         const a = document.createElement('a');
-        a.href = url;
-        
-        // Obtener nombre del archivo del header Content-Disposition o generar uno
-        const contentDisposition = response.headers.get('Content-Disposition');
-        let filename = `reporte_${reportType}_${new Date().toISOString().split('T')[0]}.${format === 'pdf' ? 'pdf' : 'docx'}`;
-        if (contentDisposition) {
-            const filenameMatch = contentDisposition.match(/filename="?(.+)"?/);
-            if (filenameMatch) {
-                filename = filenameMatch[1];
-            }
-        }
-        
-        a.download = filename;
+        a.href = exportacion.download_url;
+        a.download = exportacion.archivo_nombre || `reporte_${reportType}_${new Date().toISOString().split('T')[0]}.${format === 'pdf' ? 'pdf' : 'docx'}`;
         document.body.appendChild(a);
         a.click();
         document.body.removeChild(a);
-        window.URL.revokeObjectURL(url);
         
         // Rehabilitar botones
         exportButtons.forEach(btn => {
@@ -84,8 +84,8 @@ self.addEventListener('activate', (event) => {
     ])
   );
   
-  // Iniciar verificación periódica de recordatorios
-  startPeriodicCheck();
+  // Iniciar el canal de recordatorios (verificación periódica si no está disponible)
+  iniciarCanalRecordatorios();
 });
 
 // Escuchar mensajes del cliente
@@ -172,6 +172,132 @@ function showNotification(title, body, tag, data) {
   });
 }
 
+// Mostrar las notificaciones de los recordatorios que ya vencieron (respuesta de
+// check-background o evento del canal /api/reminders/stream/)
+function procesarRecordatoriosBackground(reminders, baseUrl) {
+  if (!Array.isArray(reminders)) {
+    console.warn('[Service Worker] Respuesta no es un array:', reminders);
+    return;
+  }
+  
+  if (reminders.length === 0) {
+    console.log('[Service Worker] No hay recordatorios pendientes');
+    return;
+  }
+  
+  console.log(`[Service Worker] ${reminders.length} recordatorio(s) pendiente(s)`);
+  
+  // Procesar cada recordatorio
+  reminders.forEach(reminder => {
+    const reminderId = reminder.id;
+    const tiempoRestante = reminder.tiempo_restante_segundos || 0;
+    const recordar = reminder.recordar || false;
+    const yaEnviado = reminder.enviado || false;
+    
+    // SOLO mostrar notificaciones para recordatorios que YA PASARON
+    // NO enviar notificaciones para recordatorios futuros - esperar a que llegue la hora
+    // Solo incluir recordatorios que ya pasaron pero están dentro de los 15 minutos
+    const debeMostrar = tiempoRestante <= 0 && tiempoRestante >= -900; // Ya pasó pero dentro de 15 minutos
+    
+    if (debeMostrar) {
+      // Verificar si ya fue enviado
+      // Si ya fue enviado y NO tiene la opción "recordar", no enviar
+      if (yaEnviado && !recordar) {
+        return; // Ya enviado y sin recordar, saltar
+      }
+      
+      // IMPORTANTE: El Service Worker NO debe reenviar automáticamente
+      // Solo debe enviar la notificación principal una vez
+      // El reenvío solo ocurre cuando el usuario recarga index.html y tiene "recordar" activado
+      if (yaEnviado && recordar) {
+        // Si ya fue enviado y tiene "recordar", NO reenviar desde el Service Worker
+        // El reenvío se maneja solo en index.html cuando el usuario recarga la página
+        return;
+      }
+      
+      // Crear clave única para evitar duplicados
+      const notificationKey = `${reminderId}-principal`;
+      
+      // Verificar si ya enviamos esta notificación recientemente (últimos 5 minutos)
+      if (sentNotifications.has(notificationKey)) {
+        console.log('[Service Worker] Notificación ya enviada recientemente, saltando:', notificationKey);
+        return;
+      }
+      
+      // Construir título y cuerpo (solo notificación principal, no reenvío)
+      const title = '🔔 Recordatorio';
+      let body = reminder.descripcion || '';
+      
+      if (reminder.evento_nombre || reminder.titulo) {
+        body += (body ? '\n' : '') + `📅 Evento: ${reminder.evento_nombre || reminder.titulo}`;
+      }
+      
+      if (reminder.fecha && reminder.hora) {
+        body += (body ? '\n' : '') + `🕐 ${reminder.fecha} a las ${reminder.hora}`;
+      }
+      
+      if (reminder.owners_text) {
+        body += (body ? '\n' : '') + `👥 Personal: ${reminder.owners_text}`;
+      }
+      
+      const tag = `reminder-${reminderId}`;
+      
+      console.log('[Service Worker] Mostrando notificación push:', { reminderId, tag, title, tiempoRestante });
+      
+      // Mostrar notificación usando Promise para asegurar que se muestre
+      // Incluir vibración (se ignora en desktop, funciona en Android)
+      const notificationPromise = self.registration.showNotification(title, {
+        body: body || 'Tienes un recordatorio',
+        icon: '/static/img/logos/logo_maga.png',
+        badge: '/static/img/logos/logo_maga.png',
+        tag: tag,
+        requireInteraction: false,
+        silent: false,
+        vibrate: [200, 100, 200], // Vibración (se ignora en desktop, funciona en Android)
+        data: {
+          reminderId: reminderId,
+          isReenviar: false  // Service Worker solo envía notificaciones principales
+        },
+        timestamp: Date.now()
+      });
+      
+      notificationPromise.then(() => {
+        console.log('[Service Worker] ✅ Notificación PUSH mostrada exitosamente:', reminderId);
+        
+        // Marcar como enviado para evitar duplicados (por 5 minutos)
+        sentNotifications.add(notificationKey);
+        setTimeout(() => {
+          sentNotifications.delete(notificationKey);
+        }, 5 * 60 * 1000); // 5 minutos
+        
+        // Marcar como enviado en el backend (solo notificación principal)
+        if (!yaEnviado) {
+          fetch(`${baseUrl}/api/reminders/${reminderId}/marcar-enviado/`, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: {
+              'X-Requested-With': 'XMLHttpRequest',
+              'Content-Type': 'application/json'
+            }
+          }).catch(err => {
+            // Solo mostrar warning si no es un error de red esperado (offline)
+            if (err.name !== 'TypeError' || !err.message.includes('Failed to fetch')) {
+              console.warn('[Service Worker] Error al marcar como enviado:', err);
+            }
+            // Si es un error de red, ignorarlo silenciosamente (se marcará cuando vuelva la conexión)
+          });
+        }
+      }).catch(err => {
+        console.error('[Service Worker] ❌ Error al mostrar notificación:', err);
+        // Si falla, no agregar a sentNotifications para que pueda reintentar
+      });
+      
+      // Asegurar que la promesa se complete antes de continuar
+      return notificationPromise;
+    }
+  });
+}
+
 // Verificar recordatorios directamente desde el Service Worker (para cuando la página está cerrada)
 async function checkRemindersFromServiceWorker() {
   try {
@@ -239,129 +365,7 @@ async function checkRemindersFromServiceWorker() {
       return;
     }
     
-    const reminders = data.reminders || [];
-    
-    if (!Array.isArray(reminders)) {
-      console.warn('[Service Worker] Respuesta no es un array:', reminders);
-      return;
-    }
-    
-    if (reminders.length === 0) {
-      console.log('[Service Worker] No hay recordatorios pendientes');
-      return;
-    }
-    
-    console.log(`[Service Worker] ${reminders.length} recordatorio(s) pendiente(s)`);
-    
-    // Procesar cada recordatorio
-    reminders.forEach(reminder => {
-      const reminderId = reminder.id;
-      const tiempoRestante = reminder.tiempo_restante_segundos || 0;
-      const recordar = reminder.recordar || false;
-      const yaEnviado = reminder.enviado || false;
-      
-      // SOLO mostrar notificaciones para recordatorios que YA PASARON
-      // NO enviar notificaciones para recordatorios futuros - esperar a que llegue la hora
-      // Solo incluir recordatorios que ya pasaron pero están dentro de los 15 minutos
-      const debeMostrar = tiempoRestante <= 0 && tiempoRestante >= -900; // Ya pasó pero dentro de 15 minutos
-      
-      if (debeMostrar) {
-        // Verificar si ya fue enviado
-        // Si ya fue enviado y NO tiene la opción "recordar", no enviar
-        if (yaEnviado && !recordar) {
-          return; // Ya enviado y sin recordar, saltar
-        }
-        
-        // IMPORTANTE: El Service Worker NO debe reenviar automáticamente
-        // Solo debe enviar la notificación principal una vez
-        // El reenvío solo ocurre cuando el usuario recarga index.html y tiene "recordar" activado
-        if (yaEnviado && recordar) {
-          // Si ya fue enviado y tiene "recordar", NO reenviar desde el Service Worker
-          // El reenvío se maneja solo en index.html cuando el usuario recarga la página
-          return;
-        }
-        
-        // Crear clave única para evitar duplicados
-        const notificationKey = `${reminderId}-principal`;
-        
-        // Verificar si ya enviamos esta notificación recientemente (últimos 5 minutos)
-        if (sentNotifications.has(notificationKey)) {
-          console.log('[Service Worker] Notificación ya enviada recientemente, saltando:', notificationKey);
-          return;
-        }
-        
-        // Construir título y cuerpo (solo notificación principal, no reenvío)
-        const title = '🔔 Recordatorio';
-        let body = reminder.descripcion || '';
-        
-        if (reminder.evento_nombre || reminder.titulo) {
-          body += (body ? '\n' : '') + `📅 Evento: ${reminder.evento_nombre || reminder.titulo}`;
-        }
-        
-        if (reminder.fecha && reminder.hora) {
-          body += (body ? '\n' : '') + `🕐 ${reminder.fecha} a las ${reminder.hora}`;
-        }
-        
-        if (reminder.owners_text) {
-          body += (body ? '\n' : '') + `👥 Personal: ${reminder.owners_text}`;
-        }
-        
-        const tag = `reminder-${reminderId}`;
-        
-        console.log('[Service Worker] Mostrando notificación push:', { reminderId, tag, title, tiempoRestante });
-        
-        // Mostrar notificación usando Promise para asegurar que se muestre
-        // Incluir vibración (se ignora en desktop, funciona en Android)
-        const notificationPromise = self.registration.showNotification(title, {
-          body: body || 'Tienes un recordatorio',
-          icon: '/static/img/logos/logo_maga.png',
-          badge: '/static/img/logos/logo_maga.png',
-          tag: tag,
-          requireInteraction: false,
-          silent: false,
-          vibrate: [200, 100, 200], // Vibración (se ignora en desktop, funciona en Android)
-          data: {
-            reminderId: reminderId,
-            isReenviar: false  // Service Worker solo envía notificaciones principales
-          },
-          timestamp: Date.now()
-        });
-        
-        notificationPromise.then(() => {
-          console.log('[Service Worker] ✅ Notificación PUSH mostrada exitosamente:', reminderId);
-          
-          // Marcar como enviado para evitar duplicados (por 5 minutos)
-          sentNotifications.add(notificationKey);
-          setTimeout(() => {
-            sentNotifications.delete(notificationKey);
-          }, 5 * 60 * 1000); // 5 minutos
-          
-          // Marcar como enviado en el backend (solo notificación principal)
-          if (!yaEnviado) {
-            fetch(`${baseUrl}/api/reminders/${reminderId}/marcar-enviado/`, {
-              method: 'POST',
-              credentials: 'same-origin',
-              headers: {
-                'X-Requested-With': 'XMLHttpRequest',
-                'Content-Type': 'application/json'
-              }
-            }).catch(err => {
-              // Solo mostrar warning si no es un error de red esperado (offline)
-              if (err.name !== 'TypeError' || !err.message.includes('Failed to fetch')) {
-                console.warn('[Service Worker] Error al marcar como enviado:', err);
-              }
-              // Si es un error de red, ignorarlo silenciosamente (se marcará cuando vuelva la conexión)
-            });
-          }
-        }).catch(err => {
-          console.error('[Service Worker] ❌ Error al mostrar notificación:', err);
-          // Si falla, no agregar a sentNotifications para que pueda reintentar
-        });
-        
-        // Asegurar que la promesa se complete antes de continuar
-        return notificationPromise;
-      }
-    });
+    procesarRecordatoriosBackground(data.reminders || [], baseUrl);
     
   } catch (error) {
     // Solo mostrar error si no es un error de red esperado (offline)
@@ -373,6 +377,157 @@ async function checkRemindersFromServiceWorker() {
   }
 }
 
+// =====================================================
+// CANAL DE RECORDATORIOS (Server-Sent Events)
+// =====================================================
+// El servidor mantiene abierta /api/reminders/stream/ y envía un evento "reminders" cuando
+// vence un recordatorio, en lugar de consultar check-background cada 30 segundos.
+// Cuando la conexión se cierra se reconecta después del "retry" que indique el servidor.
+let canalRecordatoriosActivo = false;
+let canalRecordatoriosAbort = null;
+let reconexionCanalId = null;
+
+function programarReconexionCanal(ms) {
+  if (reconexionCanalId) {
+    clearTimeout(reconexionCanalId);
+  }
+  reconexionCanalId = setTimeout(() => {
+    reconexionCanalId = null;
+    escucharRecordatorios();
+  }, ms);
+}
+
+// Procesa un bloque SSE; devuelve el nuevo retry (ms) si el bloque lo trae
+function procesarEventoSSE(bloque, baseUrl) {
+  let nombre = 'message';
+  let datos = '';
+  let retry = null;
+  bloque.split('\n').forEach(linea => {
+    if (linea.startsWith(':')) {
+      return; // Comentario keep-alive
+    }
+    const separador = linea.indexOf(':');
+    const campo = separador >= 0 ? linea.slice(0, separador) : linea;
+    const valor = separador >= 0 ? linea.slice(separador + 1).replace(/^ /, '') : '';
+    if (campo === 'event') {
+      nombre = valor;
+    } else if (campo === 'data') {
+      datos += (datos ? '\n' : '') + valor;
+    } else if (campo === 'retry' && /^\d+$/.test(valor)) {
+      retry = parseInt(valor, 10);
+    }
+  });
+  
+  if (nombre === 'reminders' && datos) {
+    try {
+      const data = JSON.parse(datos);
+      if (data.session_active) {
+        procesarRecordatoriosBackground(data.reminders || [], baseUrl);
+      }
+    } catch (error) {
+      console.warn('[Service Worker] Evento de recordatorios inválido:', error);
+    }
+  }
+  return retry;
+}
+
+async function escucharRecordatorios() {
+  if (!canalRecordatoriosActivo) {
+    return;
+  }
+  const baseUrl = self.location.origin;
+  let retry = CHECK_INTERVAL;
+  
+  canalRecordatoriosAbort = new AbortController();
+  let response;
+  try {
+    response = await fetch(`${baseUrl}/api/reminders/stream/`, {
+      method: 'GET',
+      credentials: 'same-origin',
+      headers: { 'Accept': 'text/event-stream' },
+      cache: 'no-store',
+      signal: canalRecordatoriosAbort.signal
+    });
+  } catch (error) {
+    // Sin conexión (o canal detenido): volver a intentar más tarde
+    if (canalRecordatoriosActivo) {
+      programarReconexionCanal(retry);
+    }
+    return;
+  }
+  
+  const contentType = response.headers.get('content-type') || '';
+  if (response.ok && !contentType.includes('text/event-stream')) {
+    // El servidor no tiene el canal: volver a la verificación periódica
+    console.log('[Service Worker] Canal de recordatorios no disponible, usando verificación periódica');
+    canalRecordatoriosActivo = false;
+    startPeriodicCheck();
+    return;
+  }
+  if (!response.ok || !response.body) {
+    // 401/403: sesión cerrada; otros errores: reintentar con el intervalo normal
+    programarReconexionCanal(retry);
+    return;
+  }
+  
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  try {
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) {
+        break;
+      }
+      buffer += decoder.decode(value, { stream: true }).replace(/\r\n?/g, '\n');
+      let fin;
+      while ((fin = buffer.indexOf('\n\n')) >= 0) {
+        const bloque = buffer.slice(0, fin);
+        buffer = buffer.slice(fin + 2);
+        const nuevoRetry = procesarEventoSSE(bloque, baseUrl);
+        if (nuevoRetry !== null) {
+          retry = nuevoRetry;
+        }
+      }
+    }
+  } catch (error) {
+    // Conexión interrumpida: se reconecta abajo
+  }
+  
+  if (canalRecordatoriosActivo) {
+    programarReconexionCanal(retry);
+  }
+}
+
+function iniciarCanalRecordatorios() {
+  if (typeof ReadableStream === 'undefined' || typeof AbortController === 'undefined') {
+    startPeriodicCheck();
+    return;
+  }
+  if (checkIntervalId) {
+    clearInterval(checkIntervalId);
+    checkIntervalId = null;
+  }
+  if (canalRecordatoriosActivo) {
+    return;
+  }
+  canalRecordatoriosActivo = true;
+  console.log('[Service Worker] Escuchando canal de recordatorios...');
+  escucharRecordatorios();
+}
+
+function detenerCanalRecordatorios() {
+  canalRecordatoriosActivo = false;
+  if (reconexionCanalId) {
+    clearTimeout(reconexionCanalId);
+    reconexionCanalId = null;
+  }
+  if (canalRecordatoriosAbort) {
+    canalRecordatoriosAbort.abort();
+    canalRecordatoriosAbort = null;
+  }
+}
+
 // Manejar notificaciones
 self.addEventListener('notificationclick', (event) => {
   console.log('[Service Worker] Notificación clickeada:', event.notification.tag);
@@ -454,6 +609,7 @@ self.addEventListener('message', (event) => {
       clearInterval(checkIntervalId);
       checkIntervalId = null;
     }
+    detenerCanalRecordatorios();
   }
 });
 
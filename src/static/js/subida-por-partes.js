@@ -0,0 +1,182 @@
+// subida-por-partes.js - Subida reanudable de archivos grandes de eventos, regiones y comunidades
+// Sistema Web-MAGA-Purulhá
+//
+// Protocolo: ver webmaga/subidas_por_partes.py. Si la conexión se corta, la subida continúa
+// desde el último byte que recibió el servidor; al volver a elegir el mismo archivo después de
+// un error, el servidor retoma la subida anterior en lugar de empezar de cero.
+(function (window) {
+  'use strict';
+
+  const UMBRAL_BYTES = 8 * 1024 * 1024; // Los archivos menores se siguen enviando en un solo POST
+  const MAX_REINTENTOS = 6;
+
+  function getCsrfToken() {
+    const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+    return match ? decodeURIComponent(match[1]) : '';
+  }
+
+  function esperar(ms) {
+    return new Promise((resolve) => setTimeout(resolve, ms));
+  }
+
+  async function leerJson(response) {
+    try {
+      return await response.json();
+    } catch (_) {
+      return {};
+    }
+  }
+
+  async function sha256Hex(blob) {
+    // crypto.subtle solo existe en contextos seguros (HTTPS o localhost)
+    if (!window.crypto || !window.crypto.subtle) {
+      return null;
+    }
+    const hash = await window.crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+    return Array.from(new Uint8Array(hash))
+      .map((byte) => byte.toString(16).padStart(2, '0'))
+      .join('');
+  }
+
+  function esErrorTemporal(status) {
+    // offline-sync.js convierte los errores de red en respuestas 503
+    return status === 0 || status === 502 || status === 503 || status === 504;
+  }
+
+  async function iniciar(file, opciones) {
+    const response = await fetch('/api/subidas/', {
+      method: 'POST',
+      credentials: 'include',
+      headers: {
+        'Content-Type': 'application/json',
+        'X-CSRFToken': getCsrfToken(),
+      },
+      body: JSON.stringify({
+        destino: opciones.destino,
+        objeto_id: opciones.objetoId,
+        archivo_nombre: file.name,
+        archivo_tipo: file.type || '',
+        tamanio: file.size,
+        ultima_modificacion: file.lastModified || null,
+        nombre: opciones.nombre || '',
+        descripcion: opciones.descripcion || '',
+      }),
+    });
+    const result = await leerJson(response);
+    if (!response.ok || !result.success) {
+      const error = new Error(result.error || 'No se pudo iniciar la subida del archivo');
+      error.status = response.status;
+      throw error;
+    }
+    return result;
+  }
+
+  async function consultarRecibido(subidaId) {
+    try {
+      const response = await fetch(`/api/subidas/${subidaId}/`, { credentials: 'include' });
+      const result = await leerJson(response);
+      return response.ok && typeof result.recibido === 'number' ? result.recibido : null;
+    } catch (_) {
+      return null;
+    }
+  }
+
+  /**
+   * Sube `file` por partes y resuelve con la misma respuesta que la subida en un solo POST
+   * (más subida_id, recibido y completada).
+   * opciones: { destino: 'evento'|'region'|'comunidad', objetoId, nombre, descripcion, onProgress(recibido, total) }
+   */
+  async function subir(file, opciones) {
+    const onProgress = typeof opciones.onProgress === 'function' ? opciones.onProgress : () => {};
+
+    let estado = null;
+    for (let intento = 0; !estado; intento++) {
+      try {
+        estado = await iniciar(file, opciones);
+      } catch (error) {
+        const temporal = error.status === undefined || esErrorTemporal(error.status);
+        if (!temporal || intento >= MAX_REINTENTOS) {
+          throw error;
+        }
+        await esperar(1000 * 2 ** intento);
+      }
+    }
+
+    const subidaId = estado.subida_id;
+    const tamanioParte = estado.tamanio_parte;
+    let recibido = estado.recibido;
+    let reintentos = 0;
+    onProgress(recibido, file.size);
+
+    while (true) {
+      const fin = Math.min(recibido + tamanioParte, file.size);
+      const parte = file.slice(recibido, fin);
+      let response = null;
+      let result = {};
+
+      try {
+        const headers = {
+          'Content-Type': 'application/octet-stream',
+          'Content-Range': `bytes ${recibido}-${fin - 1}/${file.size}`,
+          'X-CSRFToken': getCsrfToken(),
+        };
+        const checksum = await sha256Hex(parte);
+        if (checksum) {
+          headers['X-Checksum-Sha256'] = checksum;
+        }
+        response = await fetch(`/api/subidas/${subidaId}/`, {
+          method: 'PUT',
+          credentials: 'include',
+          headers,
+          body: parte,
+        });
+        result = await leerJson(response);
+      } catch (_) {
+        response = null;
+      }
+
+      if (response && response.ok && result.success) {
+        reintentos = 0;
+        recibido = result.recibido;
+        onProgress(recibido, file.size);
+        if (result.completada) {
+          return result;
+        }
+        continue;
+      }
+
+      // 409: el servidor tiene otra posición; 422: la parte llegó dañada; el resto de errores
+      // de red o del proxy se reintentan esperando cada vez más
+      const status = response ? response.status : 0;
+      const reintentable = status === 409 || status === 422 || esErrorTemporal(status);
+      if (!reintentable || reintentos >= MAX_REINTENTOS) {
+        throw new Error(
+          result.error ||
+            (reintentable
+              ? 'Se perdió la conexión. Vuelve a agregar el archivo para continuar la subida.'
+              : 'No se pudo subir el archivo')
+        );
+      }
+      reintentos++;
+      if (esErrorTemporal(status)) {
+        await esperar(1000 * 2 ** reintentos);
+      }
+
+      if (typeof result.recibido === 'number') {
+        recibido = result.recibido;
+      } else {
+        const actual = await consultarRecibido(subidaId);
+        if (actual !== null) {
+          recibido = actual;
+        }
+      }
+      onProgress(recibido, file.size);
+    }
+  }
+
+  window.SubidaPorPartes = {
+    UMBRAL_BYTES,
+    debeUsarse: (file) => Boolean(file) && file.size > UMBRAL_BYTES,
+    subir,
+  };
+})(window);
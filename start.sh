@@ -39,6 +39,7 @@ carpetas = [
     'comunidades_archivos',
     'regiones_portada_img',
     'regiones_archivos',
+    'blobs',
 ]
 
 os.makedirs(media_root, exist_ok=True)
@@ -60,6 +61,7 @@ for carpeta in carpetas:
     mkdir -p "$MEDIA_DIR/comunidades_archivos"
     mkdir -p "$MEDIA_DIR/regiones_portada_img"
     mkdir -p "$MEDIA_DIR/regiones_archivos"
+    mkdir -p "$MEDIA_DIR/blobs"
     echo "✅ Carpetas creadas con fallback"
 }
 
@@ -159,6 +161,39 @@ PORT=${PORT:-8000}
 HOST=${HOST:-0.0.0.0}
 WORKERS=${WORKERS:-4}
 
+EXPORT_WORKERS=${EXPORT_WORKERS:-1}
+SYNC_WORKERS=${SYNC_WORKERS:-1}
+MAIL_WORKERS=${MAIL_WORKERS:-1}
+IMAGE_WORKERS=${IMAGE_WORKERS:-1}
+
+# Iniciar workers de exportación de reportes (PDF/Word) en segundo plano
+# para que la generación de archivos no ocupe los workers de Gunicorn
+echo "Iniciando $EXPORT_WORKERS worker(s) de exportación de reportes..."
+for i in $(seq 1 $EXPORT_WORKERS); do
+    python manage.py procesar_exportaciones 2>&1 &
+done
+
+# Iniciar workers que aplican la cola de sincronización offline (operaciones que no
+# se alcanzaron a aplicar durante la subida desde la PWA)
+echo "Iniciando $SYNC_WORKERS worker(s) de sincronización offline..."
+for i in $(seq 1 $SYNC_WORKERS); do
+    python manage.py procesar_sincronizacion 2>&1 &
+done
+
+# Iniciar workers que envían la bandeja de salida de correos (recuperación de contraseña,
+# asistencia técnica) para que las vistas no esperen al servidor SMTP
+echo "Iniciando $MAIL_WORKERS worker(s) de correos..."
+for i in $(seq 1 $MAIL_WORKERS); do
+    python manage.py procesar_correos 2>&1 &
+done
+
+# Iniciar workers que comprimen las imágenes subidas (cada uno con su propio pool de procesos)
+# para que las vistas de subida solo guarden el original
+echo "Iniciando $IMAGE_WORKERS worker(s) de imágenes..."
+for i in $(seq 1 $IMAGE_WORKERS); do
+    python manage.py procesar_imagenes 2>&1 &
+done
+
 echo "Iniciando Gunicorn en $HOST:$PORT con $WORKERS workers..."
 
 # Iniciar Gunicorn con configuración explícita
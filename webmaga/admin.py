@@ -4,7 +4,8 @@ from .models import (
     TipoActividad, TipoBeneficiario, Beneficiario, BeneficiarioIndividual,
     BeneficiarioFamilia, BeneficiarioInstitucion, Actividad, ActividadPersonal,
     ActividadBeneficiario, Evidencia, ActividadCambio, EventoCambioColaborador,
-    ActividadArchivo, ComunidadGaleria, RegionGaleria
+    ActividadArchivo, ComunidadGaleria, RegionGaleria, ExportacionReporte, CorreoSaliente,
+    ProcesamientoImagen, ArchivoBlob, SubidaArchivo
 )
 
 # =====================================================
@@ -296,3 +297,51 @@ class ActividadArchivoAdmin(admin.ModelAdmin):
     list_filter = ['archivo_tipo', 'creado_en']
     search_fields = ['nombre_archivo', 'actividad__nombre']
     readonly_fields = ['id', 'creado_en']
+
+
+# =====================================================
+# CONFIGURACIÓN DE ADMIN - EXPORTACIONES
+# =====================================================
+
+@admin.register(ExportacionReporte)
+class ExportacionReporteAdmin(admin.ModelAdmin):
+    list_display = ['report_type', 'tipo_exportacion', 'formato', 'estado', 'usuario', 'intentos', 'creado_en', 'completado_en']
+    list_filter = ['estado', 'formato', 'tipo_exportacion']
+    search_fields = ['report_type', 'usuario__username', 'archivo_nombre']
+    readonly_fields = ['id', 'creado_en', 'iniciado_en', 'completado_en']
+
+
+# =====================================================
+# CONFIGURACIÓN DE ADMIN - COLAS DE TRABAJO
+# =====================================================
+
+@admin.register(CorreoSaliente)
+class CorreoSalienteAdmin(admin.ModelAdmin):
+    list_display = ['asunto', 'tipo', 'estado', 'intentos', 'creado_en', 'enviado_en']
+    list_filter = ['estado', 'tipo']
+    search_fields = ['asunto', 'destinatarios']
+    readonly_fields = ['id', 'creado_en', 'enviado_en']
+
+
+@admin.register(ProcesamientoImagen)
+class ProcesamientoImagenAdmin(admin.ModelAdmin):
+    list_display = ['modelo', 'registro_id', 'tipo_compresion', 'estado', 'intentos', 'tamanio_original', 'tamanio_optimizado', 'creado_en']
+    list_filter = ['estado', 'modelo', 'tipo_compresion']
+    search_fields = ['registro_id', 'url_original']
+    readonly_fields = ['id', 'creado_en', 'iniciado_en', 'completado_en']
+
+
+@admin.register(ArchivoBlob)
+class ArchivoBlobAdmin(admin.ModelAdmin):
+    list_display = ['sha256', 'ruta', 'tamanio', 'referencias', 'optimizado', 'creado_en', 'sin_referencias_desde']
+    list_filter = ['optimizado']
+    search_fields = ['sha256', 'ruta']
+    readonly_fields = ['sha256', 'ruta', 'tamanio', 'creado_en']
+
+
+@admin.register(SubidaArchivo)
+class SubidaArchivoAdmin(admin.ModelAdmin):
+    list_display = ['archivo_nombre', 'destino', 'usuario', 'estado', 'recibido', 'tamanio_total', 'actualizado_en']
+    list_filter = ['estado', 'destino']
+    search_fields = ['archivo_nombre', 'usuario__username']
+    readonly_fields = ['id', 'creado_en', 'actualizado_en']
@@ -0,0 +1,411 @@
+"""
+Almacén de archivos por contenido (tabla archivos_blob)
+Cada vista guardaba la subida con un nombre `timestamp_id.ext` en su propia carpeta (galeria_img,
+evidencias, comunidades_galeria, ...): la misma foto usada como portada, en la galería y como
+evidencia de un cambio quedaba guardada varias veces, y al eliminar un registro se borraba el
+archivo por URL sin saber si otro registro lo seguía usando.
+
+- guardar() escribe la subida en una carpeta temporal calculando su SHA-256 y la mueve a
+  MEDIA_ROOT/blobs/<2 primeros>/<sha256>.<ext>. Si el contenido ya existía se descarta la copia
+  y se reutiliza el archivo: url_almacenamiento de todos esos registros apunta al mismo blob.
+- `referencias` cuenta los registros que apuntan a cada blob. Lo mantienen las señales
+  post_save/post_delete de los modelos de MODELOS_CON_ARCHIVO (signals.py); el código que cambia
+  url_almacenamiento con update() o SQL directo llama a sumar_referencias/restar_referencias.
+- Los archivos derivados de un blob (versión WebP, miniatura y tamaño mediano, ver
+  imagenes_diferidas) se guardan junto a él como <sha256>_<nombre>.<ext> y se eliminan con él.
+- recolectar() elimina los blobs que llevan más de MEDIA_BLOB_GRACIA_HORAS sin referencias,
+  después de comprobar en las tablas que ningún registro los usa (el contador puede desviarse
+  si alguien borra filas directamente en la base de datos). recontar() recalcula los contadores
+  desde las tablas. Los dos corren en la limpieza del worker procesar_imagenes y con
+  `python manage.py recolectar_archivos`.
+- Los archivos anteriores a este almacén se mueven con `python manage.py migrar_archivos_almacen`;
+  mientras tanto siguen funcionando como antes (se borran por URL al eliminar su registro).
+"""
+import glob
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import (
+    ActividadArchivo, ActividadPortada, ArchivoBlob, BeneficiarioFoto, CambioEvidencia, ComunidadArchivo,
+    ComunidadGaleria, EventosEvidenciasCambios, EventosGaleria, Evidencia, RegionArchivo, RegionGaleria,
+    UsuarioFotoPerfil,
+)
+
+logger = logging.getLogger(__name__)
+
+CARPETA_BLOBS = 'blobs'
+CARPETA_TEMPORAL = 'tmp'
+TAMANO_BLOQUE = 1024 * 1024
+TAMANO_LOTE_RECOLECCION = 500
+HORAS_CONSERVAR_TEMPORALES = 24
+RECONTAR_CADA_HORAS = 24
+
+# blobs/ab/<sha256>.ext (el archivo) y blobs/ab/<sha256>_medium.jpg (sus derivados)
+RUTA_BLOB = re.compile(rf'(?:^|/){CARPETA_BLOBS}/[0-9a-f]{{2}}/([0-9a-f]{{64}})(?:\.[A-Za-z0-9]+)?$')
+RUTA_DEL_ALMACEN = re.compile(rf'(?:^|/){CARPETA_BLOBS}/[0-9a-f]{{2}}/[0-9a-f]{{64}}[._]')
+
+# Modelos cuyo url_almacenamiento puede apuntar a un blob
+MODELOS_CON_ARCHIVO = (
+    UsuarioFotoPerfil, BeneficiarioFoto, ActividadPortada, Evidencia, CambioEvidencia,
+    EventosEvidenciasCambios, ActividadArchivo, EventosGaleria, ComunidadGaleria, RegionGaleria,
+    ComunidadArchivo, RegionArchivo,
+)
+
+
+def ruta_media(url):
+    """Ruta absoluta dentro de MEDIA_ROOT de una URL '/media/...' o relativa ('perfiles_img/...')"""
+    relativa = str(url or '').strip().replace('\\', '/')
+    for prefijo in (settings.MEDIA_URL or '', '/media/', 'media/'):
+        if prefijo and relativa.startswith(prefijo):
+            relativa = relativa[len(prefijo):]
+            break
+    relativa = relativa.lstrip('/')
+    if not relativa:
+        return None
+    media_root = os.path.normpath(str(settings.MEDIA_ROOT))
+    ruta = os.path.normpath(os.path.join(media_root, relativa))
+    if not ruta.startswith(media_root + os.sep):
+        return None
+    return ruta
+
+
+def url_media(ruta_relativa):
+    """URL pública ('/media/blobs/...') de una ruta relativa a MEDIA_ROOT"""
+    return f"{(settings.MEDIA_URL or '/media/').rstrip('/')}/{ruta_relativa}"
+
+
+def url_como(url_referencia, ruta_relativa):
+    """URL de `ruta_relativa` con el mismo formato que `url_referencia` ('/media/...' o relativa)"""
+    if str(url_referencia or '').startswith('/'):
+        return url_media(ruta_relativa)
+    return ruta_relativa
+
+
+def sha_de_url(url):
+    """SHA-256 del blob al que apunta la URL, o None si no es un archivo del almacén"""
+    coincidencia = RUTA_BLOB.search(str(url or '').replace('\\', '/'))
+    return coincidencia.group(1) if coincidencia else None
+
+
+def es_archivo_del_almacen(url):
+    """True para un blob o uno de sus derivados: no se borran por URL sino con la recolección"""
+    return bool(RUTA_DEL_ALMACEN.search(str(url or '').replace('\\', '/')))
+
+
+def carpeta_temporal():
+    carpeta = os.path.join(str(settings.MEDIA_ROOT), CARPETA_BLOBS, CARPETA_TEMPORAL)
+    os.makedirs(carpeta, exist_ok=True)
+    return carpeta
+
+
+def _normalizar_extension(extension):
+    extension = (extension or '').strip().lower()
+    if extension and not extension.startswith('.'):
+        extension = f'.{extension}'
+    return extension if re.fullmatch(r'\.[a-z0-9]{1,10}', extension) else ''
+
+
+def _eliminar(ruta):
+    if ruta and os.path.exists(ruta):
+        try:
+            os.remove(ruta)
+        except OSError as exc:
+            logger.warning('No se pudo eliminar %s: %s', ruta, exc)
+
+
+def _registrar(ruta_temporal, sha256, tamanio, extension, optimizado):
+    """Mueve el archivo temporal a su lugar en el almacén (o lo descarta si ya existe)"""
+    with transaction.atomic():
+        blob = ArchivoBlob.objects.select_for_update().filter(sha256=sha256).first()
+        ruta = blob.ruta if blob else f'{CARPETA_BLOBS}/{sha256[:2]}/{sha256}{_normalizar_extension(extension)}'
+        destino = os.path.join(str(settings.MEDIA_ROOT), ruta)
+
+        if blob and os.path.exists(destino):
+            # Contenido repetido: se reutiliza el archivo existente
+            _eliminar(ruta_temporal)
+            campos = []
+            if blob.referencias <= 0:
+                # Reinicia la gracia para que la recolección no lo elimine antes de usarse
+                blob.sin_referencias_desde = timezone.now()
+                campos.append('sin_referencias_desde')
+            if optimizado and not blob.optimizado:
+                blob.optimizado = True
+                campos.append('optimizado')
+            if campos:
+                blob.save(update_fields=campos)
+            return ruta
+
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        os.chmod(ruta_temporal, getattr(settings, 'FILE_UPLOAD_PERMISSIONS', None) or 0o644)
+        os.replace(ruta_temporal, destino)
+        if blob is None:
+            ArchivoBlob.objects.get_or_create(
+                sha256=sha256,
+                defaults={
+                    'ruta': ruta,
+                    'tamanio': tamanio,
+                    'optimizado': optimizado,
+                    'sin_referencias_desde': timezone.now(),
+                },
+            )
+    return ruta
+
+
+def guardar(archivo, extension='', optimizado=False):
+    """
+    Guarda un archivo subido (UploadedFile) en el almacén.
+    Retorna su ruta relativa a MEDIA_ROOT ('blobs/ab/<sha256>.ext').
+    """
+    descriptor, ruta_temporal = tempfile.mkstemp(dir=carpeta_temporal())
+    resumen = hashlib.sha256()
+    tamanio = 0
+    try:
+        with os.fdopen(descriptor, 'wb') as destino:
+            for bloque in archivo.chunks(TAMANO_BLOQUE):
+                resumen.update(bloque)
+                destino.write(bloque)
+                tamanio += len(bloque)
+        return _registrar(ruta_temporal, resumen.hexdigest(), tamanio, extension, optimizado)
+    finally:
+        _eliminar(ruta_temporal)
+
+
+def guardar_ruta(ruta_origen, extension=None, optimizado=False, mover=False, sha256_esperado=None):
+    """
+    Guarda en el almacén un archivo que ya está en disco; con mover=True el archivo
+    (que debe estar en el mismo volumen, p. ej. carpeta_temporal()) se mueve en lugar de copiarse.
+    Con `sha256_esperado` se lanza ValueError si el contenido no coincide (y el archivo se descarta).
+    Retorna la ruta relativa a MEDIA_ROOT.
+    """
+    if extension is None:
+        extension = os.path.splitext(ruta_origen)[1]
+    resumen = hashlib.sha256()
+    if mover:
+        ruta_temporal = ruta_origen
+        with open(ruta_origen, 'rb') as origen:
+            for bloque in iter(lambda: origen.read(TAMANO_BLOQUE), b''):
+                resumen.update(bloque)
+    else:
+        descriptor, ruta_temporal = tempfile.mkstemp(dir=carpeta_temporal())
+        with open(ruta_origen, 'rb') as origen, os.fdopen(descriptor, 'wb') as destino:
+            for bloque in iter(lambda: origen.read(TAMANO_BLOQUE), b''):
+                resumen.update(bloque)
+                destino.write(bloque)
+    try:
+        sha256 = resumen.hexdigest()
+        if sha256_esperado and sha256 != sha256_esperado.lower():
+            raise ValueError('El SHA-256 del archivo no coincide con el esperado')
+        return _registrar(ruta_temporal, sha256, os.path.getsize(ruta_temporal), extension, optimizado)
+    finally:
+        _eliminar(ruta_temporal)
+
+
+def es_optimizado(url):
+    """True si la URL apunta a un blob que ya es la versión optimizada de una imagen"""
+    sha256 = sha_de_url(url)
+    return bool(sha256) and ArchivoBlob.objects.filter(sha256=sha256, optimizado=True).exists()
+
+
+def sumar_referencias(url, cantidad=1):
+    sha256 = sha_de_url(url)
+    if sha256 and cantidad:
+        ArchivoBlob.objects.filter(sha256=sha256).update(
+            referencias=F('referencias') + cantidad,
+            sin_referencias_desde=None,
+        )
+
+
+def restar_referencias(url, cantidad=1):
+    sha256 = sha_de_url(url)
+    if sha256 and cantidad:
+        ArchivoBlob.objects.filter(sha256=sha256).update(
+            referencias=Greatest(F('referencias') - cantidad, Value(0)),
+            sin_referencias_desde=Case(
+                When(referencias__lte=cantidad, then=Value(timezone.now())),
+                default=F('sin_referencias_desde'),
+            ),
+        )
+
+
+def _eliminar_blob_en_disco(ruta):
+    """Elimina el archivo del blob y sus derivados (<sha256>_*)"""
+    ruta_absoluta = os.path.join(str(settings.MEDIA_ROOT), ruta)
+    for derivado in glob.glob(f'{os.path.splitext(ruta_absoluta)[0]}_*'):
+        _eliminar(derivado)
+    _eliminar(ruta_absoluta)
+
+
+def _urls_posibles(ruta):
+    return [ruta, url_media(ruta)]
+
+
+def _contar_referencias_reales(blobs):
+    """{sha256: registros que lo usan} para los blobs [(sha256, ruta)] según las tablas"""
+    urls = {}
+    for sha256, ruta in blobs:
+        for url in _urls_posibles(ruta):
+            urls[url] = sha256
+    conteos = Counter()
+    for modelo in MODELOS_CON_ARCHIVO:
+        filas = (
+            modelo.objects.filter(url_almacenamiento__in=list(urls))
+            .order_by()
+            .values_list('url_almacenamiento')
+            .annotate(total=Count('pk'))
+        )
+        for url, total in filas:
+            conteos[urls[url]] += total
+    return conteos
+
+
+def _limpiar_temporales(horas=HORAS_CONSERVAR_TEMPORALES):
+    """Archivos temporales que dejó una subida o un proceso interrumpido"""
+    limite = timezone.now().timestamp() - horas * 3600
+    for entrada in os.scandir(carpeta_temporal()):
+        try:
+            if entrada.is_file() and entrada.stat().st_mtime < limite:
+                _eliminar(entrada.path)
+        except OSError:
+            continue
+
+
+def recolectar(gracia_horas=None, tamano=TAMANO_LOTE_RECOLECCION):
+    """
+    Elimina los blobs sin referencias desde hace más de `gracia_horas` horas que ningún registro
+    usa. Retorna (blobs eliminados, bytes liberados).
+    """
+    if gracia_horas is None:
+        gracia_horas = settings.MEDIA_BLOB_GRACIA_HORAS
+    limite = timezone.now() - timedelta(hours=gracia_horas)
+    candidatos = list(
+        ArchivoBlob.objects
+        .filter(referencias__lte=0, sin_referencias_desde__lt=limite)
+        .values_list('sha256', 'ruta')[:tamano]
+    )
+    _limpiar_temporales()
+    if not candidatos:
+        return 0, 0
+
+    # El contador dice 0, pero se confirma en las tablas antes de borrar
+    en_uso = _contar_referencias_reales(candidatos)
+    for sha256, total in en_uso.items():
+        logger.warning('Blob %s con %s referencias sin contar, se corrige el contador', sha256, total)
+        ArchivoBlob.objects.filter(sha256=sha256).update(referencias=total, sin_referencias_desde=None)
+
+    eliminados = 0
+    liberados = 0
+    for sha256, _ruta in candidatos:
+        if sha256 in en_uso:
+            continue
+        with transaction.atomic():
+            # Bloquea la fila: una subida del mismo contenido espera y vuelve a escribir el archivo
+            blob = (
+                ArchivoBlob.objects.select_for_update(skip_locked=True)
+                .filter(sha256=sha256, referencias__lte=0, sin_referencias_desde__lt=limite)
+                .first()
+            )
+            if blob is None:
+                continue
+            _eliminar_blob_en_disco(blob.ruta)
+            blob.delete()
+        eliminados += 1
+        liberados += blob.tamanio
+    return eliminados, liberados
+
+
+def recontar():
+    """Recalcula `referencias` de todos los blobs desde las tablas; retorna cuántos se corrigieron"""
+    conteos = Counter()
+    for modelo in MODELOS_CON_ARCHIVO:
+        filas = (
+            modelo.objects.filter(url_almacenamiento__contains=f'{CARPETA_BLOBS}/')
+            .order_by()
+            .values_list('url_almacenamiento')
+            .annotate(total=Count('pk'))
+        )
+        for url, total in filas:
+            sha256 = sha_de_url(url)
+            if sha256:
+                conteos[sha256] += total
+
+    corregidos = 0
+    ahora = timezone.now()
+    for sha256, referencias in ArchivoBlob.objects.values_list('sha256', 'referencias').iterator():
+        reales = conteos.get(sha256, 0)
+        if referencias == reales:
+            continue
+        # Condicionado al valor leído: no pisa un cambio hecho mientras se contaba
+        corregidos += ArchivoBlob.objects.filter(sha256=sha256, referencias=referencias).update(
+            referencias=reales,
+            sin_referencias_desde=None if reales else ahora,
+        )
+    return corregidos
+
+
+def _copiar(origen, destino):
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    try:
+        os.link(origen, destino)
+    except FileExistsError:
+        pass
+    except OSError:
+        shutil.copy2(origen, destino)
+
+
+def migrar_archivo(ruta_original, urls):
+    """
+    Mueve al almacén un archivo anterior (carpetas galeria_img, evidencias, ...) y cambia las
+    URLs `urls` que apuntan a él en todos los modelos, incluidos sus tamaños derivados.
+    Retorna (registros actualizados, True si el contenido ya estaba en el almacén).
+    """
+    nombre = os.path.basename(ruta_original)
+    base_original, extension = os.path.splitext(ruta_original)
+    resumen = hashlib.sha256()
+    with open(ruta_original, 'rb') as origen:
+        for bloque in iter(lambda: origen.read(TAMANO_BLOQUE), b''):
+            resumen.update(bloque)
+    existia = ArchivoBlob.objects.filter(sha256=resumen.hexdigest()).exists()
+
+    # Las versiones optimizadas anteriores terminan en _opt: no se vuelven a comprimir
+    optimizado = os.path.splitext(nombre)[0].endswith('_opt')
+    copiados = []
+    with transaction.atomic():
+        ruta_blob = guardar_ruta(ruta_original, extension, optimizado=optimizado)
+        base_blob = os.path.join(str(settings.MEDIA_ROOT), os.path.splitext(ruta_blob)[0])
+        actualizados = 0
+        for modelo in MODELOS_CON_ARCHIVO:
+            tiene_variantes = any(campo.name == 'variantes' for campo in modelo._meta.concrete_fields)
+            for url in urls:
+                registros = modelo.objects.filter(url_almacenamiento=url)
+                if tiene_variantes:
+                    # Cada registro guarda sus propias URLs de derivados
+                    for registro_id, variantes in registros.exclude(variantes__isnull=True).values_list('pk', 'variantes'):
+                        nuevas = {}
+                        for clave, url_variante in variantes.items():
+                            ruta_variante = ruta_media(url_variante)
+                            sufijo = os.path.basename(ruta_variante or '')[len(os.path.basename(base_original)):]
+                            if ruta_variante and os.path.exists(ruta_variante) and sufijo.startswith('_'):
+                                _copiar(ruta_variante, base_blob + sufijo)
+                                copiados.append(ruta_variante)
+                                nuevas[clave] = url_como(url_variante, os.path.splitext(ruta_blob)[0] + sufijo)
+                            else:
+                                nuevas[clave] = url_variante
+                        modelo.objects.filter(pk=registro_id).update(variantes=nuevas)
+                total = registros.update(url_almacenamiento=url_como(url, ruta_blob))
+                if total:
+                    sumar_referencias(ruta_blob, total)
+                    actualizados += total
+        transaction.on_commit(lambda: [_eliminar(ruta) for ruta in [ruta_original] + copiados])
+    return actualizados, existia
@@ -8,9 +8,15 @@ class WebmagaConfig(AppConfig):
     name = 'webmaga'
 
     def ready(self):
-        """Crea las carpetas de media necesarias si no existen"""
+        """Crea las carpetas de media necesarias si no existen, conecta las señales y el registro de esquema"""
         self._crear_carpetas_media()
 
+        from .signals import conectar_senales
+        conectar_senales()
+
+        from . import schema_registry
+        schema_registry.conectar(self)
+
     @staticmethod
     def _crear_carpetas_media():
         """Crea todas las carpetas de media necesarias para el sistema"""
@@ -26,6 +32,7 @@ class WebmagaConfig(AppConfig):
             'comunidades_archivos',
             'regiones_portada_img',
             'regiones_archivos',
+            'blobs',
         ]
         
         # Obtener la ruta base de media
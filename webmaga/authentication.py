@@ -4,8 +4,16 @@ Backend de autenticación personalizado para usar la tabla usuarios de MAGA
 from django.contrib.auth.backends import BaseBackend
 from django.contrib.auth.models import User
 from django.contrib.auth.hashers import check_password, make_password
+from django.db import connection
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from . import usuario_actual
 from .models import Usuario
-from datetime import datetime
+from datetime import timedelta
+
+INTENTOS_ANTES_DE_BLOQUEO = 5
+MINUTOS_BLOQUEO = 30
 
 
 class UsuarioMAGABackend(BaseBackend):
@@ -16,15 +24,15 @@ class UsuarioMAGABackend(BaseBackend):
     def authenticate(self, request, username=None, password=None, **kwargs):
         """
         Autentica un usuario contra la tabla usuarios de MAGA
+        - Una sola consulta busca por username o email (y, en PostgreSQL, valida el hash de crypt())
+        - Intentos fallidos, bloqueo y último login se guardan en un solo UPDATE
+        - El User de Django solo se guarda si cambió algún dato
         """
         if username is None or password is None:
             return None
         
         try:
-            # Buscar usuario por username o email
-            usuario_maga = Usuario.objects.filter(
-                username=username
-            ).first() or Usuario.objects.filter(email=username).first()
+            usuario_maga = self._buscar_usuario(username, password)
             
             if not usuario_maga:
                 return None
@@ -34,48 +42,27 @@ class UsuarioMAGABackend(BaseBackend):
             if not usuario_maga.activo:
                 return None
             
+            ahora = timezone.now()
+            
             # Verificar si está bloqueado
             # NOTA: Esto aplica tanto para usuarios admin como personal
-            if usuario_maga.bloqueado_hasta:
-                from django.utils import timezone
-                if usuario_maga.bloqueado_hasta > timezone.now():
-                    return None
+            if usuario_maga.bloqueado_hasta and usuario_maga.bloqueado_hasta > ahora:
+                return None
             
             # Verificar la contraseña
             # Tu BD tiene password_hash, necesitamos verificarlo
-            if self._check_password(password, usuario_maga.password_hash):
-                # Resetear intentos fallidos si el login es exitoso
-                if usuario_maga.intentos_fallidos > 0:
-                    usuario_maga.intentos_fallidos = 0
-                    usuario_maga.bloqueado_hasta = None
-                    usuario_maga.save(update_fields=['intentos_fallidos', 'bloqueado_hasta'])
-                
-                # Actualizar último login
-                from django.utils import timezone
-                usuario_maga.ultimo_login = timezone.now()
-                usuario_maga.save(update_fields=['ultimo_login'])
-                
-                # Crear o obtener el User de Django para la sesión
-                # NOTA: Los usuarios admin (rol == 'admin') se autentican igual que los personal
-                # La única diferencia es que se les asigna is_staff=True e is_superuser=True
-                user, created = User.objects.get_or_create(
-                    username=usuario_maga.username,
-                    defaults={
-                        'email': usuario_maga.email,
-                        'is_active': usuario_maga.activo,
-                        'is_staff': usuario_maga.rol == 'admin',  # Admin tiene acceso al admin de Django
-                        'is_superuser': usuario_maga.rol == 'admin'  # Admin tiene todos los permisos
-                    }
+            if self._verificar(password, usuario_maga):
+                # Resetear intentos fallidos y actualizar último login
+                Usuario.objects.filter(pk=usuario_maga.pk).update(
+                    ultimo_login=ahora,
+                    intentos_fallidos=0,
+                    bloqueado_hasta=None,
                 )
+                usuario_maga.ultimo_login = ahora
+                usuario_maga.intentos_fallidos = 0
+                usuario_maga.bloqueado_hasta = None
                 
-                # Actualizar campos si el usuario ya existía
-                # NOTA: Si un usuario cambió de rol, se actualiza aquí
-                if not created:
-                    user.email = usuario_maga.email
-                    user.is_active = usuario_maga.activo
-                    user.is_staff = usuario_maga.rol == 'admin'
-                    user.is_superuser = usuario_maga.rol == 'admin'
-                    user.save()
+                user = self._sincronizar_user(usuario_maga)
                 
                 # Guardar el ID del usuario MAGA en el objeto User de Django
                 user.backend = f'{self.__module__}.{self.__class__.__name__}'
@@ -83,19 +70,21 @@ class UsuarioMAGABackend(BaseBackend):
                 # Agregar datos adicionales al user object
                 user.usuario_maga_id = usuario_maga.id
                 user.rol_maga = usuario_maga.rol
+                # get_usuario_maga(user) no vuelve a consultar en esta petición
+                setattr(user, usuario_actual.ATRIBUTO_PETICION, usuario_maga)
                 
                 return user
             else:
-                # Incrementar intentos fallidos
-                usuario_maga.intentos_fallidos += 1
-                
-                # Bloquear después de 5 intentos fallidos (30 minutos)
-                if usuario_maga.intentos_fallidos >= 5:
-                    from datetime import timedelta
-                    from django.utils import timezone
-                    usuario_maga.bloqueado_hasta = timezone.now() + timedelta(minutes=30)
-                
-                usuario_maga.save(update_fields=['intentos_fallidos', 'bloqueado_hasta'])
+                # Incrementar intentos fallidos y bloquear después de 5 (30 minutos).
+                # En el SET, intentos_fallidos todavía tiene el valor anterior al incremento.
+                Usuario.objects.filter(pk=usuario_maga.pk).update(
+                    intentos_fallidos=F('intentos_fallidos') + 1,
+                    bloqueado_hasta=Case(
+                        When(intentos_fallidos__gte=INTENTOS_ANTES_DE_BLOQUEO - 1,
+                             then=Value(ahora + timedelta(minutes=MINUTOS_BLOQUEO))),
+                        default=F('bloqueado_hasta'),
+                    ),
+                )
                 return None
                 
         except Exception as e:
@@ -103,6 +92,62 @@ class UsuarioMAGABackend(BaseBackend):
             print(f"Error en autenticación: {e}")
             return None
     
+    def _buscar_usuario(self, username, password):
+        """
+        Usuario por username o, si no hay, por email, en una sola consulta.
+        En PostgreSQL la misma consulta compara la contraseña con crypt() (atributo _clave_valida).
+        """
+        usuarios = Usuario.objects.select_related('puesto', 'colaborador').filter(
+            Q(username=username) | Q(email=username)
+        )
+        if connection.vendor == 'postgresql':
+            usuarios = usuarios.annotate(_clave_valida=RawSQL(
+                "CASE WHEN left(usuarios.password_hash, 1) = '$' "
+                "THEN usuarios.password_hash = crypt(%s, usuarios.password_hash) END",
+                [password],
+            ))
+        candidatos = list(usuarios[:2])
+        for usuario in candidatos:
+            if usuario.username == username:
+                return usuario
+        return candidatos[0] if candidatos else None
+    
+    def _verificar(self, password_plain, usuario_maga):
+        """Valida la contraseña usando el resultado de crypt() de la consulta cuando existe"""
+        password_hash = usuario_maga.password_hash
+        if password_hash and (password_hash.startswith('pbkdf2_sha256') or password_hash.startswith('bcrypt$')):
+            return check_password(password_plain, password_hash)
+        if password_plain == password_hash:
+            return True
+        clave_valida = getattr(usuario_maga, '_clave_valida', None)
+        if clave_valida is not None:
+            return bool(clave_valida)
+        return self._check_password(password_plain, password_hash)
+    
+    def _sincronizar_user(self, usuario_maga):
+        """
+        Crear o obtener el User de Django para la sesión
+        NOTA: Los usuarios admin (rol == 'admin') se autentican igual que los personal
+        La única diferencia es que se les asigna is_staff=True e is_superuser=True
+        """
+        datos = {
+            'email': usuario_maga.email,
+            'is_active': usuario_maga.activo,
+            'is_staff': usuario_maga.rol == 'admin',  # Admin tiene acceso al admin de Django
+            'is_superuser': usuario_maga.rol == 'admin',  # Admin tiene todos los permisos
+        }
+        user, created = User.objects.get_or_create(username=usuario_maga.username, defaults=datos)
+        
+        # Actualizar campos si el usuario ya existía y algo cambió
+        # NOTA: Si un usuario cambió de rol, se actualiza aquí
+        if not created:
+            cambios = [campo for campo, valor in datos.items() if getattr(user, campo) != valor]
+            if cambios:
+                for campo in cambios:
+                    setattr(user, campo, datos[campo])
+                user.save(update_fields=cambios)
+        return user
+    
     def get_user(self, user_id):
         """
         Obtiene el usuario de Django por ID
@@ -0,0 +1,162 @@
+"""
+Listado completo de beneficiarios (módulo de beneficiarios)
+Recorre los beneficiarios activos por páginas con paginación por cursor (keyset) sobre
+(creado_en, id) en orden descendente, de modo que cada página cuesta lo mismo sin importar
+cuántos registros haya antes. Las reinscripciones y los atributos se cargan por página
+(una consulta cada uno) en lugar de una consulta por beneficiario.
+"""
+import base64
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+from django.db.models import Prefetch, Q
+
+from .models import ActividadBeneficiario, Beneficiario, BeneficiarioAtributo, BeneficiarioReinscripcion
+from .views_utils import obtener_detalle_beneficiario
+
+TAMANO_PAGINA_DEFECTO = 200
+TAMANO_PAGINA_MAXIMO = 1000
+
+
+class CursorInvalido(ValueError):
+    """El cursor recibido no tiene el formato esperado"""
+
+
+def codificar_cursor(beneficiario):
+    texto = f'{beneficiario.creado_en.isoformat()}|{beneficiario.id}'
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve (creado_en, id) del último beneficiario de la página anterior"""
+    try:
+        texto = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        creado_en, beneficiario_id = texto.split('|')
+        return datetime.fromisoformat(creado_en), uuid.UUID(beneficiario_id)
+    except (ValueError, UnicodeError) as e:
+        raise CursorInvalido('Cursor de paginación inválido') from e
+
+
+def _beneficiarios_base():
+    return Beneficiario.objects.filter(activo=True).select_related(
+        'tipo', 'comunidad', 'comunidad__region'
+    ).prefetch_related(
+        'individual', 'familia', 'institucion',
+        Prefetch(
+            'actividades',  # related_name en ActividadBeneficiario es 'actividades'
+            queryset=ActividadBeneficiario.objects.select_related('actividad', 'actividad__tipo').filter(
+                actividad__eliminado_en__isnull=True
+            ),
+            to_attr='actividades_prefetch'
+        )
+    ).order_by('-creado_en', '-id')
+
+
+def _reinscripciones_por_actividad(beneficiarios):
+    """Fechas de reinscripción (más recientes primero) por ActividadBeneficiario de la página"""
+    ids = [ab.id for ben in beneficiarios for ab in ben.actividades_prefetch]
+    fechas = defaultdict(list)
+    if ids:
+        for actividad_benef_id, fecha in BeneficiarioReinscripcion.objects.filter(
+            actividad_beneficiario_id__in=ids
+        ).order_by('actividad_beneficiario_id', '-fecha_reinscripcion').values_list(
+            'actividad_beneficiario_id', 'fecha_reinscripcion'
+        ):
+            fechas[actividad_benef_id].append(fecha)
+    return fechas
+
+
+def _atributos_por_individual(beneficiarios):
+    """Atributos de los beneficiarios individuales de la página"""
+    ids = [ben.individual.id for ben in beneficiarios if hasattr(ben, 'individual') and ben.individual]
+    atributos = defaultdict(list)
+    if ids:
+        for attr in BeneficiarioAtributo.objects.filter(
+            beneficiario_individual_id__in=ids
+        ).select_related('atributo_tipo').order_by('atributo_tipo__nombre', 'valor'):
+            atributos[attr.beneficiario_individual_id].append({
+                'id': str(attr.id),
+                'tipo_id': str(attr.atributo_tipo.id),
+                'tipo_nombre': attr.atributo_tipo.nombre,
+                'tipo_codigo': attr.atributo_tipo.codigo,
+                'valor': attr.valor,
+                'descripcion': attr.descripcion or ''
+            })
+    return atributos
+
+
+def _serializar_proyecto(ab, fechas_reinscripcion):
+    # Usar fecha_reinscripcion si existe (más reciente), sino usar creado_en
+    fecha_asociacion = ab.fecha_reinscripcion if ab.fecha_reinscripcion else ab.creado_en
+    anos_reinscripcion = sorted({fecha.year for fecha in fechas_reinscripcion if fecha}, reverse=True)
+    return {
+        'id': str(ab.actividad.id),
+        'nombre': ab.actividad.nombre,
+        'fecha': ab.actividad.fecha.isoformat() if ab.actividad.fecha else None,
+        'fecha_agregacion': ab.creado_en.isoformat() if ab.creado_en else None,  # Fecha original en que el beneficiario fue añadido al proyecto
+        'fecha_reinscripcion': ab.fecha_reinscripcion.isoformat() if ab.fecha_reinscripcion else None,  # Fecha de reinscripción/actualización (última)
+        'fecha_asociacion': fecha_asociacion.isoformat() if fecha_asociacion else None,  # Fecha más reciente (reinscripción o creación)
+        'tipo': ab.actividad.tipo.nombre if ab.actividad.tipo else None,
+        'tiene_reinscripciones': len(anos_reinscripcion) > 0,  # Indica si se ha reinscrito alguna vez
+        'anos_reinscripcion': anos_reinscripcion,  # Lista de años en que se ha reinscrito
+        'fechas_reinscripcion': [fecha.isoformat() for fecha in fechas_reinscripcion if fecha]  # Lista completa (para comparativas)
+    }
+
+
+def serializar_pagina(beneficiarios):
+    """Convierte una página de beneficiarios (de _beneficiarios_base) en diccionarios para la API"""
+    reinscripciones = _reinscripciones_por_actividad(beneficiarios)
+    atributos = _atributos_por_individual(beneficiarios)
+
+    resultado = []
+    for ben in beneficiarios:
+        nombre_display, info_adicional, detalles, tipo_envio = obtener_detalle_beneficiario(ben)
+        individual = ben.individual if hasattr(ben, 'individual') else None
+        resultado.append({
+            'id': str(ben.id),
+            'nombre': nombre_display,
+            'tipo': tipo_envio,
+            'tipo_display': tipo_envio.title() if tipo_envio else '',
+            'comunidad_id': str(ben.comunidad_id) if ben.comunidad_id else None,
+            'comunidad_nombre': ben.comunidad.nombre if ben.comunidad else None,
+            'region_id': str(ben.comunidad.region_id) if ben.comunidad and ben.comunidad.region_id else None,
+            'region_nombre': ben.comunidad.region.nombre if ben.comunidad and ben.comunidad.region else None,
+            'detalles': detalles,
+            'proyectos': [_serializar_proyecto(ab, reinscripciones.get(ab.id, [])) for ab in ben.actividades_prefetch],
+            'atributos': atributos.get(individual.id, []) if individual else [],
+            'creado_en': ben.creado_en.isoformat() if ben.creado_en else None,
+            'actualizado_en': ben.actualizado_en.isoformat() if ben.actualizado_en else None
+        })
+    return resultado
+
+
+def pagina_beneficiarios(cursor=None, limite=TAMANO_PAGINA_DEFECTO):
+    """
+    Devuelve (beneficiarios, siguiente_cursor) a partir del cursor dado.
+    siguiente_cursor es None cuando no hay más páginas.
+    """
+    limite = max(1, min(int(limite), TAMANO_PAGINA_MAXIMO))
+    beneficiarios = _beneficiarios_base()
+    if cursor:
+        creado_en, beneficiario_id = decodificar_cursor(cursor)
+        beneficiarios = beneficiarios.filter(
+            Q(creado_en__lt=creado_en) | Q(creado_en=creado_en, id__lt=beneficiario_id)
+        )
+
+    # Se pide un registro de más para saber si existe otra página
+    pagina = list(beneficiarios[:limite + 1])
+    hay_mas = len(pagina) > limite
+    pagina = pagina[:limite]
+    siguiente = codificar_cursor(pagina[-1]) if hay_mas else None
+    return serializar_pagina(pagina), siguiente
+
+
+def iterar_beneficiarios(tamano_pagina=TAMANO_PAGINA_DEFECTO):
+    """Genera todos los beneficiarios activos, cargando una página a la vez"""
+    cursor = None
+    while True:
+        pagina, cursor = pagina_beneficiarios(cursor, tamano_pagina)
+        yield from pagina
+        if not cursor:
+            break
@@ -0,0 +1,208 @@
+"""
+Backend de caché compartido entre procesos (SQLite en modo WAL)
+Los workers de Gunicorn son procesos separados: con LocMemCache cada uno tenía su propia
+caché fría, las invalidaciones solo llegaban al worker que hacía el cambio y los contadores
+de django-ratelimit se multiplicaban por el número de workers.
+Este backend guarda las entradas en un archivo SQLite local del contenedor (sin servicios
+externos). WAL permite lecturas concurrentes mientras otro proceso escribe, y las operaciones
+de lectura-modificación-escritura (add, incr, touch) se hacen dentro de BEGIN IMMEDIATE,
+por lo que son atómicas entre procesos.
+
+Uso en settings.CACHES:
+    'BACKEND': 'webmaga.cache_backend.SQLiteCache',
+    'LOCATION': '/tmp/webmaga-cache.sqlite3',
+"""
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Los enteros se guardan como INTEGER (no pickle) para que incr no tenga que deserializar
+SQL_CREATE = """
+CREATE TABLE IF NOT EXISTS cache (
+    clave TEXT PRIMARY KEY,
+    valor BLOB,
+    expira REAL
+) WITHOUT ROWID
+"""
+SQL_INDEX = "CREATE INDEX IF NOT EXISTS idx_cache_expira ON cache(expira)"
+
+# Fracción de escrituras que revisan si hay que purgar entradas vencidas o sobrantes
+PROBABILIDAD_PURGA = 0.01
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._ruta = location
+        self._local = threading.local()
+        self._inicializada = False
+        self._lock_init = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Conexión (una por hilo y por proceso: las conexiones no sobreviven un fork)
+    # ------------------------------------------------------------------
+    def _conexion(self):
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is not None and self._local.pid == os.getpid():
+            return conexion
+
+        directorio = os.path.dirname(self._ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        conexion = sqlite3.connect(self._ruta, timeout=10, isolation_level=None, check_same_thread=False)
+        conexion.execute('PRAGMA busy_timeout = 10000')
+        conexion.execute('PRAGMA journal_mode = WAL')
+        conexion.execute('PRAGMA synchronous = NORMAL')
+        with self._lock_init:
+            if not self._inicializada:
+                conexion.execute(SQL_CREATE)
+                conexion.execute(SQL_INDEX)
+                self._inicializada = True
+        self._local.conexion = conexion
+        self._local.pid = os.getpid()
+        return conexion
+
+    def _transaccion(self):
+        """Transacción de escritura: toma el candado del archivo al iniciar"""
+        return _TransaccionInmediata(self._conexion())
+
+    # ------------------------------------------------------------------
+    # Serialización
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _serializar(valor):
+        if isinstance(valor, int) and not isinstance(valor, bool):
+            return valor
+        return pickle.dumps(valor, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _deserializar(valor):
+        if isinstance(valor, int):
+            return valor
+        return pickle.loads(valor)
+
+    @staticmethod
+    def _vigente(expira, ahora):
+        return expira is None or expira > ahora
+
+    def _leer(self, conexion, clave, ahora):
+        fila = conexion.execute('SELECT valor, expira FROM cache WHERE clave = ?', (clave,)).fetchone()
+        if fila is None or not self._vigente(fila[1], ahora):
+            return None
+        return fila
+
+    # ------------------------------------------------------------------
+    # API de BaseCache
+    # ------------------------------------------------------------------
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        valor = self._serializar(value)
+        expira = self.get_backend_timeout(timeout)
+        with self._transaccion() as conexion:
+            if self._leer(conexion, clave, time.time()) is not None:
+                return False
+            conexion.execute(
+                'INSERT OR REPLACE INTO cache (clave, valor, expira) VALUES (?, ?, ?)',
+                (clave, valor, expira)
+            )
+        self._tal_vez_purgar()
+        return True
+
+    def get(self, key, default=None, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        fila = self._leer(self._conexion(), clave, time.time())
+        if fila is None:
+            return default
+        return self._deserializar(fila[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        self._conexion().execute(
+            'INSERT OR REPLACE INTO cache (clave, valor, expira) VALUES (?, ?, ?)',
+            (clave, self._serializar(value), self.get_backend_timeout(timeout))
+        )
+        self._tal_vez_purgar()
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        with self._transaccion() as conexion:
+            if self._leer(conexion, clave, time.time()) is None:
+                return False
+            conexion.execute(
+                'UPDATE cache SET expira = ? WHERE clave = ?',
+                (self.get_backend_timeout(timeout), clave)
+            )
+        return True
+
+    def delete(self, key, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        cursor = self._conexion().execute('DELETE FROM cache WHERE clave = ?', (clave,))
+        return cursor.rowcount > 0
+
+    def has_key(self, key, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        return self._leer(self._conexion(), clave, time.time()) is not None
+
+    def incr(self, key, delta=1, version=None):
+        """Incremento atómico entre procesos (contadores de django-ratelimit, generaciones)"""
+        clave = self.make_and_validate_key(key, version=version)
+        with self._transaccion() as conexion:
+            fila = self._leer(conexion, clave, time.time())
+            if fila is None:
+                raise ValueError("Key '%s' not found" % key)
+            nuevo = self._deserializar(fila[0]) + delta
+            conexion.execute(
+                'UPDATE cache SET valor = ? WHERE clave = ?',
+                (self._serializar(nuevo), clave)
+            )
+        return nuevo
+
+    def clear(self):
+        self._conexion().execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # La conexión se reutiliza entre peticiones del mismo hilo
+        pass
+
+    # ------------------------------------------------------------------
+    # Purga
+    # ------------------------------------------------------------------
+    def _tal_vez_purgar(self):
+        if random.random() < PROBABILIDAD_PURGA:
+            self.purgar()
+
+    def purgar(self):
+        """Elimina las entradas vencidas y, si se supera MAX_ENTRIES, las más próximas a vencer"""
+        with self._transaccion() as conexion:
+            conexion.execute('DELETE FROM cache WHERE expira IS NOT NULL AND expira <= ?', (time.time(),))
+            total = conexion.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+            if total > self._max_entries:
+                sobrantes = total - self._max_entries + (self._max_entries // self._cull_frequency if self._cull_frequency else 0)
+                conexion.execute(
+                    'DELETE FROM cache WHERE clave IN ('
+                    'SELECT clave FROM cache ORDER BY expira IS NULL, expira LIMIT ?)',
+                    (sobrantes,)
+                )
+
+
+class _TransaccionInmediata:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK sobre una conexión en modo autocommit"""
+
+    def __init__(self, conexion):
+        self.conexion = conexion
+
+    def __enter__(self):
+        self.conexion.execute('BEGIN IMMEDIATE')
+        return self.conexion
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conexion.execute('COMMIT')
+        else:
+            self.conexion.execute('ROLLBACK')
+        return False
@@ -0,0 +1,99 @@
+"""
+Eventos del calendario (FullCalendar)
+Cada rango de fechas se resuelve con un número fijo de consultas: las actividades del rango
+y todo su personal asignado en una sola consulta. Además se calculan validadores HTTP
+(ETag / Last-Modified) con tres agregados pequeños, para que el calendario, que vuelve a pedir
+el rango en cada cambio de vista, reciba 304 si nada cambió.
+"""
+import hashlib
+from collections import defaultdict
+
+from django.db.models import Count, Max, Q
+
+from .models import Actividad, ActividadPersonal, Usuario
+
+
+def _filtro_rango(start, end):
+    # Eventos con fecha en el rango O eventos sin fecha pero creados en el rango
+    return Q(fecha__gte=start, fecha__lte=end) | Q(fecha__isnull=True, creado_en__date__gte=start, creado_en__date__lte=end)
+
+
+def validadores_rango(start, end):
+    """
+    Devuelve (etag, ultima_modificacion) del rango.
+    Se consideran también las actividades eliminadas del rango (eliminarlas actualiza
+    actualizado_en), el personal asignado (altas y cambios actualizan actualizado_en, bajas el
+    conteo) y los usuarios responsables o asignados, cuyos nombres aparecen en la respuesta.
+    """
+    actividades_rango = Actividad.objects.filter(_filtro_rango(start, end))
+    actividades = actividades_rango.aggregate(
+        total=Count('id'),
+        activas=Count('id', filter=Q(eliminado_en__isnull=True)),
+        ultima=Max('actualizado_en'),
+    )
+    vigentes = actividades_rango.filter(eliminado_en__isnull=True)
+    personal = ActividadPersonal.objects.filter(actividad__in=vigentes).aggregate(
+        total=Count('id'), ultima=Max('actualizado_en'),
+    )
+    usuarios = Usuario.objects.filter(
+        Q(id__in=vigentes.values('responsable_id'))
+        | Q(id__in=ActividadPersonal.objects.filter(actividad__in=vigentes).values('usuario_id'))
+    ).aggregate(ultima=Max('actualizado_en'))
+
+    fechas = [f for f in (actividades['ultima'], personal['ultima'], usuarios['ultima']) if f]
+    ultima_modificacion = max(fechas) if fechas else None
+    firma = '|'.join(str(v) for v in (
+        start, end, actividades['total'], actividades['activas'], actividades['ultima'],
+        personal['total'], personal['ultima'], usuarios['ultima'],
+    ))
+    return hashlib.md5(firma.encode('utf-8')).hexdigest(), ultima_modificacion
+
+
+def eventos_calendario(start, end):
+    """Eventos del rango con el formato que espera el calendario. Muestra todos los eventos sin importar estado."""
+    actividades = list(Actividad.objects.filter(
+        eliminado_en__isnull=True
+    ).filter(_filtro_rango(start, end)).select_related('tipo', 'comunidad', 'comunidad__region', 'responsable'))
+
+    # Personal asignado (tabla ActividadPersonal) de todas las actividades del rango
+    usuarios_asignados_map = defaultdict(set)
+    personal_nombres_map = defaultdict(list)
+    for ap in ActividadPersonal.objects.filter(
+        actividad_id__in=[a.id for a in actividades]
+    ).select_related('usuario'):
+        if ap.usuario_id:
+            usuarios_asignados_map[ap.actividad_id].add(str(ap.usuario_id))
+            personal_nombres_map[ap.actividad_id].append(ap.usuario.nombre if ap.usuario.nombre else ap.usuario.username)
+
+    data = []
+    for a in actividades:
+        # IDs de usuarios asignados a través de ActividadPersonal, más el responsable
+        usuarios_ids = usuarios_asignados_map.get(a.id, set()).copy()
+        if a.responsable_id:
+            usuarios_ids.add(str(a.responsable_id))
+
+        # Nombres de responsables/encargados (usuario.nombre o username)
+        responsables_nombres = []
+        if a.responsable:
+            responsables_nombres.append(a.responsable.nombre if a.responsable.nombre else a.responsable.username)
+        for nombre in personal_nombres_map.get(a.id, []):
+            if nombre not in responsables_nombres:
+                responsables_nombres.append(nombre)
+
+        # Usar fecha del evento si existe, sino usar fecha de creación como fallback
+        event_date = None
+        if a.fecha:
+            event_date = a.fecha.isoformat()
+        elif a.creado_en:
+            event_date = a.creado_en.date().isoformat()
+
+        data.append({
+            'date': event_date,
+            'name': a.nombre,
+            'description': a.descripcion,
+            'status': a.estado,
+            'responsable': a.responsable.username if a.responsable else None,
+            'owners': ', '.join(responsables_nombres) if responsables_nombres else None,  # Texto con todos los responsables/encargados
+            'usuarios_asignados_ids': list(usuarios_ids),
+        })
+    return data
@@ -1,7 +1,7 @@
 """
 Context processors personalizados - Sistema simplificado con 2 roles: admin y personal
 """
-from .models import Usuario
+from . import usuario_actual
 
 
 def usuario_maga(request):
@@ -20,22 +20,14 @@ def usuario_maga(request):
     if not request.user.is_authenticated:
         return context
     
-    try:
-        usuario = Usuario.objects.filter(
-            username=request.user.username,
-            activo=True
-        ).first()
+    usuario = usuario_actual.usuario_maga(request.user)
+    if usuario:
+        context['usuario_maga'] = usuario
+        context['es_admin'] = usuario.rol == 'admin'
+        context['es_personal'] = usuario.rol == 'personal'
         
-        if usuario:
-            context['usuario_maga'] = usuario
-            context['es_admin'] = usuario.rol == 'admin'
-            context['es_personal'] = usuario.rol == 'personal'
-            
-            # Permisos
-            context['puede_gestionar_eventos'] = usuario.rol == 'admin'
-            context['puede_generar_reportes'] = True  # Todos los autenticados
-    
-    except Usuario.DoesNotExist:
-        pass
+        # Permisos
+        context['puede_gestionar_eventos'] = usuario.rol == 'admin'
+        context['puede_generar_reportes'] = True  # Todos los autenticados
     
     return context
@@ -0,0 +1,169 @@
+"""
+Bandeja de salida de correos (tabla correos_salientes)
+Los códigos de recuperación, la confirmación de cambio de contraseña y los mensajes de asistencia
+técnica se enviaban con send_mail dentro de la petición: un servidor SMTP lento mantenía ocupado
+un worker de Gunicorn durante todo el intercambio.
+
+- Las vistas llaman a encolar_correo y responden de inmediato.
+- El comando `python manage.py procesar_correos` toma los correos pendientes en lotes
+  (SELECT ... FOR UPDATE SKIP LOCKED, así pueden correr varios workers) y los envía usando una
+  sola conexión SMTP por lote.
+- Si un envío falla se reintenta con espera exponencial (BACKOFF_BASE_SEGUNDOS, 2x, 4x, ... hasta
+  BACKOFF_MAXIMO_SEGUNDOS); después de max_intentos queda como 'fallido'.
+- Un lote tomado por un worker que se cayó vuelve a la cola después de ABANDONO_MINUTOS.
+- Un correo con expira_en (el código de recuperación vence a los 10 minutos) no se envía ni se
+  reintenta después de esa fecha: queda como 'fallido'.
+- En desarrollo basta con EMAIL_BACKEND de consola o de archivos (variables de entorno).
+"""
+import logging
+import smtplib
+from datetime import timedelta
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import CorreoSaliente
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = 20
+BACKOFF_BASE_SEGUNDOS = 30
+BACKOFF_MAXIMO_SEGUNDOS = 60 * 60
+ABANDONO_MINUTOS = 10
+DIAS_CONSERVAR_ENVIADOS = 30
+
+
+def encolar_correo(tipo, asunto, mensaje_texto, remitente, destinatarios, mensaje_html=None, expira_en=None):
+    """Registra un correo para que lo envíe el worker y lo retorna"""
+    return CorreoSaliente.objects.create(
+        tipo=tipo,
+        asunto=asunto,
+        mensaje_texto=mensaje_texto,
+        mensaje_html=mensaje_html,
+        remitente=remitente,
+        destinatarios=list(destinatarios),
+        expira_en=expira_en,
+    )
+
+
+def _espera_reintento(intentos):
+    return min(BACKOFF_MAXIMO_SEGUNDOS, BACKOFF_BASE_SEGUNDOS * 2 ** max(intentos - 1, 0))
+
+
+def _reclamar_lote(tamano):
+    """Marca como 'enviando' los siguientes correos listos para enviarse y los retorna"""
+    ahora = timezone.now()
+    limite_abandono = ahora - timedelta(minutes=ABANDONO_MINUTOS)
+    listos = Q(estado='pendiente', siguiente_intento_en__lte=ahora) | Q(estado='enviando', siguiente_intento_en__lt=limite_abandono)
+    with transaction.atomic():
+        # Los que vencieron antes de enviarse ya no se envían
+        vencidos = CorreoSaliente.objects.filter(listos, expira_en__lte=ahora).update(
+            estado='fallido', error_mensaje='El correo venció antes de poder enviarse',
+        )
+        if vencidos:
+            logger.warning('%s correo(s) vencidos antes de enviarse marcados como fallidos', vencidos)
+        correos = list(
+            CorreoSaliente.objects
+            .select_for_update(skip_locked=True)
+            .filter(listos)
+            .filter(Q(expira_en__isnull=True) | Q(expira_en__gt=ahora))
+            .order_by('siguiente_intento_en')[:tamano]
+        )
+        for correo in correos:
+            correo.estado = 'enviando'
+            correo.intentos += 1
+            # Mientras está 'enviando', siguiente_intento_en guarda cuándo se tomó
+            correo.siguiente_intento_en = ahora
+            correo.save(update_fields=['estado', 'intentos', 'siguiente_intento_en'])
+    return correos
+
+
+def _construir_mensaje(correo, conexion):
+    mensaje = EmailMultiAlternatives(
+        correo.asunto,
+        correo.mensaje_texto,
+        correo.remitente,
+        correo.destinatarios,
+        connection=conexion,
+    )
+    if correo.mensaje_html:
+        mensaje.attach_alternative(correo.mensaje_html, 'text/html')
+    return mensaje
+
+
+def _marcar_enviado(correo):
+    correo.estado = 'enviado'
+    correo.enviado_en = timezone.now()
+    correo.error_mensaje = None
+    correo.save(update_fields=['estado', 'enviado_en', 'error_mensaje'])
+
+
+def _marcar_error(correo, exc):
+    correo.error_mensaje = f'{type(exc).__name__}: {exc}'
+    siguiente = timezone.now() + timedelta(seconds=_espera_reintento(correo.intentos))
+    if correo.intentos >= correo.max_intentos:
+        correo.estado = 'fallido'
+        logger.error('Correo %s descartado después de %s intentos: %s', correo.id, correo.intentos, exc)
+    elif correo.expira_en and siguiente >= correo.expira_en:
+        correo.estado = 'fallido'
+        logger.error('Correo %s descartado: vence antes del siguiente intento: %s', correo.id, exc)
+    else:
+        correo.estado = 'pendiente'
+        correo.siguiente_intento_en = siguiente
+        logger.warning('Correo %s no enviado (intento %s), se reintentará: %s', correo.id, correo.intentos, exc)
+    correo.save(update_fields=['estado', 'error_mensaje', 'siguiente_intento_en'])
+
+
+def _cerrar(conexion):
+    try:
+        conexion.close()
+    except Exception:
+        pass
+
+
+def procesar_lote(tamano=TAMANO_LOTE):
+    """
+    Envía un lote de correos pendientes con una sola conexión.
+    Retorna {id: 'enviado' | 'error'} (vacío si no había nada que enviar).
+    """
+    correos = _reclamar_lote(tamano)
+    if not correos:
+        return {}
+
+    resultados = {}
+    conexion = get_connection(fail_silently=False)
+    try:
+        try:
+            conexion.open()
+        except Exception as exc:
+            # Sin servidor de correo: todo el lote vuelve a la cola con espera
+            for correo in correos:
+                _marcar_error(correo, exc)
+                resultados[correo.id] = 'error'
+            return resultados
+
+        for correo in correos:
+            try:
+                if not conexion.send_messages([_construir_mensaje(correo, conexion)]):
+                    raise smtplib.SMTPException('El servidor no aceptó el mensaje')
+            except Exception as exc:
+                _marcar_error(correo, exc)
+                resultados[correo.id] = 'error'
+                # Conexión perdida: send_messages abre una nueva para el siguiente correo
+                if isinstance(exc, smtplib.SMTPServerDisconnected) or not isinstance(exc, smtplib.SMTPException):
+                    _cerrar(conexion)
+                continue
+            _marcar_enviado(correo)
+            resultados[correo.id] = 'enviado'
+    finally:
+        _cerrar(conexion)
+    return resultados
+
+
+def limpiar_enviados(dias=DIAS_CONSERVAR_ENVIADOS):
+    """Elimina los correos enviados hace más de `dias` días; retorna cuántos se eliminaron"""
+    limite = timezone.now() - timedelta(days=dias)
+    eliminados, _ = CorreoSaliente.objects.filter(estado='enviado', enviado_en__lt=limite).delete()
+    return eliminados
@@ -0,0 +1,212 @@
+"""
+Estadísticas del dashboard ejecutivo
+Los conteos de actividades salen de la tabla resumen_actividades (una fila por mes, tipo,
+estado, comunidad y responsable), que el trigger trg_actividades_resumen mantiene al día en
+PostgreSQL. Todas las distribuciones del dashboard se calculan sobre esas filas, por lo que
+cada carga hace unas pocas lecturas pequeñas en lugar de una consulta por tipo o estado.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Count, Max, Q
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import (
+    Actividad, ActividadBeneficiario, ActividadCambio, Colaborador, Comunidad,
+    EventoCambioColaborador, ResumenActividad, TipoActividad, Usuario,
+)
+
+ESTADOS_ACTIVIDAD = ['planificado', 'en_progreso', 'completado', 'cancelado']
+
+
+def filas_resumen_actividades():
+    """
+    Filas (mes, tipo_id, estado, comunidad_id, responsable_id, total) de actividades no eliminadas.
+    En motores distintos de PostgreSQL (sin trigger) se calculan al vuelo con un GROUP BY.
+    """
+    if connection.vendor == 'postgresql':
+        return list(ResumenActividad.objects.values(
+            'mes', 'tipo_id', 'estado', 'comunidad_id', 'responsable_id', 'total'
+        ))
+    return list(
+        Actividad.objects.filter(eliminado_en__isnull=True).annotate(
+            mes=TruncMonth('fecha')
+        ).values('mes', 'tipo_id', 'estado', 'comunidad_id', 'responsable_id').annotate(
+            total=Count('id')
+        ).order_by()
+    )
+
+
+def _top(conteos, cantidad, clave):
+    return sorted(conteos.items(), key=lambda item: clave(item[1]), reverse=True)[:cantidad]
+
+
+def _actividades_por_mes(filas, actividades_base, ahora):
+    """Actividades por mes desde hace 365 días (el primer mes solo cuenta desde esa fecha)"""
+    fecha_limite = timezone.localtime(ahora - timedelta(days=365)).date()
+    primer_mes = fecha_limite.replace(day=1)
+
+    por_mes = defaultdict(int)
+    for fila in filas:
+        if fila['mes'] and fila['mes'] >= primer_mes:
+            por_mes[fila['mes']] += fila['total']
+
+    # El resumen es mensual: descontar los días del primer mes anteriores al límite
+    if por_mes.get(primer_mes) and fecha_limite > primer_mes:
+        por_mes[primer_mes] -= actividades_base.filter(fecha__gte=primer_mes, fecha__lt=fecha_limite).count()
+
+    return [
+        {'mes': mes.strftime('%Y-%m'), 'total': total}
+        for mes, total in sorted(por_mes.items())
+        if total > 0
+    ]
+
+
+def _actividades_recientes(actividades_base, ahora):
+    """Actividades con cambios de usuarios o colaboradores en los últimos 7 días"""
+    fecha_limite = ahora - timedelta(days=7)
+    actividades_recientes = list(actividades_base.filter(
+        Q(id__in=ActividadCambio.objects.filter(fecha_cambio__gte=fecha_limite).values('actividad_id')) |
+        Q(id__in=EventoCambioColaborador.objects.filter(fecha_cambio__gte=fecha_limite).values('actividad_id'))
+    ).select_related('comunidad')[:10])
+
+    # Fecha del cambio más reciente de cada actividad (dos consultas agrupadas)
+    ids = [act.id for act in actividades_recientes]
+    ultimo_cambio = {}
+    for modelo in (ActividadCambio, EventoCambioColaborador):
+        for actividad_id, fecha_cambio in modelo.objects.filter(actividad_id__in=ids).values(
+            'actividad_id'
+        ).annotate(ultimo=Max('fecha_cambio')).values_list('actividad_id', 'ultimo').order_by():
+            if fecha_cambio and (actividad_id not in ultimo_cambio or fecha_cambio > ultimo_cambio[actividad_id]):
+                ultimo_cambio[actividad_id] = fecha_cambio
+
+    lista = [
+        {
+            'nombre': act.nombre,
+            'fecha': act.fecha.strftime('%Y-%m-%d') if act.fecha else '-',
+            'comunidad': act.comunidad.nombre if act.comunidad else 'Sin comunidad',
+            'estado': act.estado,
+            'fecha_ultimo_cambio': ultimo_cambio[act.id].strftime('%Y-%m-%d %H:%M') if act.id in ultimo_cambio else '-'
+        }
+        for act in actividades_recientes
+    ]
+    # Ordenar por fecha de último cambio (más reciente primero)
+    lista.sort(key=lambda x: x['fecha_ultimo_cambio'], reverse=True)
+    return lista
+
+
+def calcular_estadisticas_dashboard():
+    """Datos que retorna api_dashboard_stats"""
+    ahora = timezone.now()
+    inicio_mes = timezone.localdate(ahora).replace(day=1)
+    actividades_base = Actividad.objects.filter(eliminado_en__isnull=True)
+    filas = filas_resumen_actividades()
+
+    total_actividades = 0
+    por_estado = defaultdict(int)
+    por_tipo = defaultdict(int)
+    por_comunidad = defaultdict(int)
+    por_responsable = defaultdict(lambda: {'completadas': 0, 'en_progreso': 0})
+    actividades_completadas_mes = 0
+    for fila in filas:
+        total = fila['total']
+        total_actividades += total
+        por_estado[fila['estado']] += total
+        por_tipo[fila['tipo_id']] += total
+        por_comunidad[fila['comunidad_id']] += total
+        if fila['estado'] == 'completado' and fila['mes'] and fila['mes'] >= inicio_mes:
+            actividades_completadas_mes += total
+        if fila['responsable_id']:
+            conteos = por_responsable[fila['responsable_id']]
+            if fila['estado'] == 'completado':
+                conteos['completadas'] += total
+            elif fila['estado'] == 'en_progreso':
+                conteos['en_progreso'] += total
+
+    # Nombres de comunidades/regiones y responsables presentes en el resumen
+    comunidades_info = {
+        c['id']: (c['nombre'], c['region__nombre'])
+        for c in Comunidad.objects.filter(id__in=[c for c in por_comunidad if c]).values('id', 'nombre', 'region__nombre')
+    }
+    responsables_info = {
+        u['id']: (u['username'], u['puesto__nombre'])
+        for u in Usuario.objects.filter(id__in=list(por_responsable)).values('id', 'username', 'puesto__nombre')
+    }
+
+    # Distribución por tipo (solo tipos activos con actividades)
+    distribucion_por_tipo = {}
+    for tipo_id, nombre in TipoActividad.objects.filter(activo=True).values_list('id', 'nombre'):
+        if por_tipo.get(tipo_id):
+            distribucion_por_tipo[nombre] = por_tipo[tipo_id]
+
+    # Actividades por región (Top 5)
+    por_region = defaultdict(int)
+    for comunidad_id, total in por_comunidad.items():
+        por_region[comunidades_info.get(comunidad_id, (None, None))[1]] += total
+    actividades_por_region_list = [
+        {'region': region or 'Sin región', 'total': total}
+        for region, total in _top(por_region, 5, lambda total: total)
+    ]
+
+    # Top 5 comunidades más activas (agrupadas por nombre de comunidad y región)
+    comunidades_agrupadas = defaultdict(lambda: {'total': 0, 'ids': []})
+    for comunidad_id, total in por_comunidad.items():
+        grupo = comunidades_agrupadas[comunidades_info.get(comunidad_id, (None, None))]
+        grupo['total'] += total
+        grupo['ids'].append(comunidad_id)
+    top_comunidades = _top(comunidades_agrupadas, 5, lambda grupo: grupo['total'])
+
+    ids_top = [c for _, grupo in top_comunidades for c in grupo['ids']]
+    filtro_ultima = Q(comunidad_id__in=[c for c in ids_top if c])
+    if None in ids_top:
+        filtro_ultima |= Q(comunidad_id__isnull=True)
+    ultima_por_comunidad = dict(
+        actividades_base.filter(filtro_ultima).values('comunidad_id').annotate(
+            ultima=Max('fecha')
+        ).values_list('comunidad_id', 'ultima').order_by()
+    ) if ids_top else {}
+
+    top_comunidades_list = []
+    for (nombre, region), grupo in top_comunidades:
+        fechas = [ultima_por_comunidad[c] for c in grupo['ids'] if ultima_por_comunidad.get(c)]
+        top_comunidades_list.append({
+            'comunidad': nombre or 'Sin comunidad',
+            'region': region or 'Sin región',
+            'total_actividades': grupo['total'],
+            'ultima_actividad': max(fechas).strftime('%Y-%m-%d') if fechas else '-'
+        })
+
+    # Top 5 responsables más productivos (agrupados por usuario y puesto)
+    responsables_agrupados = defaultdict(lambda: {'completadas': 0, 'en_progreso': 0})
+    for responsable_id, conteos in por_responsable.items():
+        grupo = responsables_agrupados[responsables_info.get(responsable_id, (None, None))]
+        grupo['completadas'] += conteos['completadas']
+        grupo['en_progreso'] += conteos['en_progreso']
+    top_responsables_list = [
+        {
+            'responsable': username or 'Sin responsable',
+            'puesto': puesto or '-',
+            'completadas': conteos['completadas'],
+            'en_progreso': conteos['en_progreso']
+        }
+        for (username, puesto), conteos in _top(responsables_agrupados, 5, lambda conteos: conteos['completadas'])
+    ]
+
+    return {
+        'total_actividades': total_actividades,
+        'comunidades_alcanzadas': len(por_comunidad),
+        'total_comunidades_municipio': Comunidad.objects.filter(activo=True).count(),
+        'trabajadores_activos': Colaborador.objects.filter(activo=True).count(),
+        'beneficiarios_alcanzados': ActividadBeneficiario.objects.values('beneficiario_id').distinct().count(),
+        'actividades_completadas_mes': actividades_completadas_mes,
+        'actividades_pendientes': por_estado['planificado'] + por_estado['en_progreso'],
+        'actividades_por_mes': _actividades_por_mes(filas, actividades_base, ahora),
+        'distribucion_por_tipo': distribucion_por_tipo,
+        'actividades_por_region': actividades_por_region_list,
+        'estado_actividades': {estado: por_estado[estado] for estado in ESTADOS_ACTIVIDAD},
+        'top_comunidades': top_comunidades_list,
+        'top_responsables': top_responsables_list,
+        'actividades_trabajadas_recientemente': _actividades_recientes(actividades_base, ahora),
+    }
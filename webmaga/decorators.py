@@ -7,23 +7,15 @@ from django.http import JsonResponse
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from functools import wraps
-from .models import Usuario
+from . import usuario_actual
 
 
 def get_usuario_maga(user):
     """
     Obtiene el usuario MAGA asociado al usuario de Django
+    (se resuelve una vez por petición, ver webmaga/usuario_actual.py)
     """
-    if not user.is_authenticated:
-        return None
-    
-    try:
-        return Usuario.objects.filter(
-            username=user.username,
-            activo=True
-        ).first()
-    except Usuario.DoesNotExist:
-        return None
+    return usuario_actual.usuario_maga(user)
 
 
 def solo_administrador(view_func):
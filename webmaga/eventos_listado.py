@@ -0,0 +1,191 @@
+"""
+Listado de eventos para la gestión de eventos (api_listar_eventos)
+Los conteos de personal y beneficiarios se calculan en SQL (subconsultas) y solo se cargan
+las relaciones de los campos pedidos:
+- campos planos (nombre, tipo, responsable, conteos, portada...): una consulta con values()
+- comunidades / personal_nombres: consulta de la página con prefetch de esas relaciones
+Con limite/offset el costo depende del tamaño de la página, no del historial completo.
+"""
+from django.db.models import Count, IntegerField, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.timezone import localtime
+
+from .models import Actividad, ActividadBeneficiario, ActividadComunidad, ActividadPersonal
+from .views_utils import obtener_comunidades_evento, obtener_portada_evento
+
+# Campos disponibles, en el orden en que se devuelven
+CAMPOS_EVENTO = (
+    'id', 'nombre', 'tipo', 'comunidad', 'comunidades', 'comunidades_resumen', 'fecha', 'estado',
+    'descripcion', 'personal_count', 'personal_nombres', 'beneficiarios_count', 'responsable',
+    'creado_en', 'portada',
+)
+# Columnas que muestra la tabla de gestión de eventos (view=summary, ver renderEventos en
+# gestioneseventos.js); la PWA guarda los mismos campos para mostrar la tabla sin conexión
+CAMPOS_RESUMEN = (
+    'id', 'nombre', 'tipo', 'comunidad', 'comunidades_resumen', 'fecha', 'estado', 'personal_count',
+    'personal_nombres', 'beneficiarios_count', 'creado_en',
+)
+# Campos que requieren cargar relaciones completas (no salen de una proyección values())
+CAMPOS_RELACIONES = {'comunidades', 'comunidades_resumen', 'personal_nombres'}
+
+
+class CampoInvalido(ValueError):
+    """Se pidió un campo que no existe en el listado de eventos"""
+
+
+def validar_campos(texto):
+    """Convierte 'a,b,c' en la tupla de campos (en el orden de CAMPOS_EVENTO); 'id' siempre se incluye"""
+    pedidos = {c.strip() for c in texto.split(',') if c.strip()}
+    desconocidos = pedidos - set(CAMPOS_EVENTO)
+    if desconocidos:
+        raise CampoInvalido(f"Campos no válidos: {', '.join(sorted(desconocidos))}")
+    pedidos.add('id')
+    return tuple(c for c in CAMPOS_EVENTO if c in pedidos)
+
+
+def _conteo(modelo):
+    return Coalesce(
+        Subquery(
+            modelo.objects.filter(actividad=OuterRef('pk')).order_by().values('actividad').annotate(
+                total=Count('id')
+            ).values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def _descripcion_corta(descripcion):
+    descripcion = descripcion or ''
+    return descripcion[:100] + '...' if len(descripcion) > 100 else descripcion
+
+
+def _nombre_usuario(nombre, username):
+    return nombre if nombre else username
+
+
+def _eventos_base():
+    return Actividad.objects.filter(eliminado_en__isnull=True).annotate(
+        personal_count=_conteo(ActividadPersonal),
+        beneficiarios_count=_conteo(ActividadBeneficiario),
+    ).order_by('-creado_en')
+
+
+def _filas_planas(eventos, campos):
+    """Campos planos con una sola consulta values()"""
+    comunidad_relacionada = ActividadComunidad.objects.filter(
+        actividad=OuterRef('pk')
+    ).order_by('creado_en', 'id').values('comunidad__nombre')[:1]
+    filas = eventos.annotate(
+        comunidad_relacionada=Subquery(comunidad_relacionada)
+    ).values(
+        'id', 'nombre', 'tipo__nombre', 'comunidad__nombre', 'comunidad_relacionada', 'fecha', 'estado',
+        'descripcion', 'personal_count', 'beneficiarios_count', 'responsable_id', 'responsable__nombre',
+        'responsable__username', 'creado_en', 'portada__id', 'portada__archivo_nombre',
+        'portada__archivo_tipo', 'portada__url_almacenamiento',
+    )
+
+    resultado = []
+    for fila in filas:
+        valores = {
+            'id': str(fila['id']),
+            'nombre': fila['nombre'],
+            'tipo': fila['tipo__nombre'] or 'Sin tipo',
+            'comunidad': fila['comunidad_relacionada'] or fila['comunidad__nombre'] or 'Sin comunidad',
+            'fecha': str(fila['fecha']),
+            'estado': fila['estado'],
+            'descripcion': _descripcion_corta(fila['descripcion']),
+            'personal_count': fila['personal_count'],
+            'beneficiarios_count': fila['beneficiarios_count'],
+            'responsable': _nombre_usuario(
+                fila['responsable__nombre'], fila['responsable__username']
+            ) if fila['responsable_id'] else 'Sin responsable',
+            'creado_en': localtime(fila['creado_en']).strftime('%d/%m/%Y %H:%M'),
+            'portada': {
+                'id': str(fila['portada__id']),
+                'nombre': fila['portada__archivo_nombre'],
+                'tipo': fila['portada__archivo_tipo'] or '',
+                'url': fila['portada__url_almacenamiento'],
+            } if fila['portada__id'] else None,
+        }
+        resultado.append({campo: valores[campo] for campo in campos})
+    return resultado
+
+
+def _filas_completas(eventos, campos):
+    """Campos con relaciones (comunidades, nombres del personal) cargadas con prefetch"""
+    eventos = eventos.select_related('tipo', 'comunidad', 'comunidad__region', 'responsable', 'portada')
+    if {'comunidad', 'comunidades', 'comunidades_resumen'} & set(campos):
+        eventos = eventos.prefetch_related(
+            Prefetch('comunidades_relacionadas', queryset=ActividadComunidad.objects.select_related(
+                'comunidad__region', 'region'
+            ).order_by('creado_en', 'id'))
+        )
+    if 'personal_nombres' in campos:
+        eventos = eventos.prefetch_related(
+            Prefetch('personal', queryset=ActividadPersonal.objects.select_related('usuario', 'colaborador'))
+        )
+
+    resultado = []
+    for evento in eventos:
+        valores = {
+            'id': str(evento.id),
+            'nombre': evento.nombre,
+            'tipo': evento.tipo.nombre if evento.tipo else 'Sin tipo',
+            'fecha': str(evento.fecha),
+            'estado': evento.estado,
+            'descripcion': _descripcion_corta(evento.descripcion),
+            'personal_count': evento.personal_count,
+            'beneficiarios_count': evento.beneficiarios_count,
+            'responsable': _nombre_usuario(
+                evento.responsable.nombre, evento.responsable.username
+            ) if evento.responsable else 'Sin responsable',
+            'creado_en': localtime(evento.creado_en).strftime('%d/%m/%Y %H:%M'),
+            'portada': obtener_portada_evento(evento),
+        }
+
+        if 'comunidades_relacionadas' in getattr(evento, '_prefetched_objects_cache', {}):
+            comunidades_detalle = obtener_comunidades_evento(evento)
+            if comunidades_detalle:
+                valores['comunidades_resumen'] = ', '.join([c['comunidad_nombre'] for c in comunidades_detalle if c['comunidad_nombre']])
+                valores['comunidad'] = comunidades_detalle[0]['comunidad_nombre']
+            else:
+                valores['comunidades_resumen'] = evento.comunidad.nombre if evento.comunidad else 'Sin comunidades'
+                valores['comunidad'] = evento.comunidad.nombre if evento.comunidad else 'Sin comunidad'
+            valores['comunidades'] = comunidades_detalle
+
+        if 'personal_nombres' in campos:
+            # Nombres del personal (nombre completo o username como fallback), máximo 3
+            personal_nombres = []
+            for ap in list(evento.personal.all())[:3]:
+                if ap.usuario:
+                    personal_nombres.append(_nombre_usuario(ap.usuario.nombre, ap.usuario.username))
+                elif ap.colaborador:
+                    personal_nombres.append(ap.colaborador.nombre)
+            if evento.personal_count > 3:
+                personal_nombres.append(f'+{evento.personal_count - 3} más')
+            valores['personal_nombres'] = ', '.join(personal_nombres) if personal_nombres else 'Sin personal'
+
+        resultado.append({campo: valores[campo] for campo in campos})
+    return resultado
+
+
+def listar_eventos(campos=CAMPOS_EVENTO, limite=None, offset=0, buscar=None):
+    """
+    Devuelve (eventos, total) de los eventos no eliminados, más recientes primero.
+    Con buscar solo se incluyen los eventos cuyo nombre lo contiene.
+    Sin limite se devuelven todos y total es la cantidad devuelta.
+    """
+    eventos = _eventos_base()
+    if buscar:
+        eventos = eventos.filter(nombre__icontains=buscar)
+    total = None
+    if limite is not None:
+        total = eventos.count()
+        eventos = eventos[offset:offset + limite]
+
+    if CAMPOS_RELACIONES & set(campos):
+        lista = _filas_completas(eventos, campos)
+    else:
+        lista = _filas_planas(eventos, campos)
+    return lista, total if total is not None else len(lista)
@@ -181,12 +181,119 @@ def compress_if_needed(uploaded_file, **kwargs):
     return uploaded_file
 
 
+# Tamaños derivados que se generan para galerías y fotos (de mayor a menor)
+VARIANT_SIZES = ('medium', 'thumbnail')
+
+_OUTPUT_FORMATS = {
+    'JPEG': ('.jpg', 'image/jpeg'),
+    'WEBP': ('.webp', 'image/webp'),
+    'PNG': ('.png', 'image/png'),
+}
+
+
+def _flatten_for_jpeg(img):
+    """Convierte RGBA/LA/P a RGB sobre fondo blanco (JPEG no admite transparencia)"""
+    if img.mode not in ('RGBA', 'LA', 'P'):
+        return img.convert('RGB') if img.mode != 'RGB' else img
+    if img.mode == 'P':
+        img = img.convert('RGBA')
+    background = Image.new('RGB', img.size, (255, 255, 255))
+    background.paste(img, mask=img.split()[-1])
+    return background
+
+
+def _save_to_disk(img, path, format_output, quality):
+    """Guarda la imagen con la misma codificación que compress_image; retorna el tamaño en bytes"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as output:
+        if format_output == 'JPEG':
+            img.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+        elif format_output == 'WEBP':
+            img.save(output, format='WEBP', quality=quality, method=6)
+        elif format_output == 'PNG':
+            img.save(output, format='PNG', optimize=True, compress_level=6)
+        else:
+            raise ValueError(f"Formato no soportado: {format_output}")
+    # Renombrar al final: quien lea la ruta nunca ve un archivo a medio escribir
+    os.replace(temp_path, path)
+    return os.path.getsize(path)
+
+
+def process_image_on_disk(source_path, target_base_path, full_settings, compress_full=True, variants=()):
+    """
+    Genera, con una sola lectura de la imagen, la versión optimizada y los tamaños derivados.
+    Se ejecuta en los procesos del worker de imágenes (procesar_imagenes), por eso solo
+    recibe rutas y no toca la base de datos.
+    
+    Args:
+        source_path: Ruta absoluta de la imagen original
+        target_base_path: Ruta base de los archivos generados, sin extensión
+        full_settings: Configuración del tamaño completo (get_compression_settings)
+        compress_full: Si se genera la versión optimizada del tamaño completo
+        variants: Tamaños derivados a generar (nombres de get_compression_settings),
+            cada uno en el formato configurado y en WebP, más el tamaño completo en WebP
+    
+    Returns:
+        dict: {'full': (ruta, tamaño en bytes, content_type) o None,
+               'variants': {'medium': ruta, 'medium_webp': ruta, ..., 'full_webp': ruta}}
+    """
+    with Image.open(source_path) as original:
+        try:
+            from PIL import ImageOps
+            img = ImageOps.exif_transpose(original)
+        except Exception:
+            img = original
+        img = _flatten_for_jpeg(img)
+        img.load()
+
+    full = img.copy()
+    full.thumbnail((full_settings['max_width'], full_settings['max_height']), Image.Resampling.LANCZOS)
+    logger.info(f"📐 {os.path.basename(source_path)}: {img.width}x{img.height} → {full.width}x{full.height}")
+
+    result = {'full': None, 'variants': {}}
+    full_format = full_settings.get('format_output', 'JPEG')
+    if compress_full:
+        extension, content_type = _OUTPUT_FORMATS[full_format]
+        path = f"{target_base_path}_opt{extension}"
+        size = _save_to_disk(full, path, full_format, full_settings['quality'])
+        result['full'] = (path, size, content_type)
+
+    if variants:
+        path = f"{target_base_path}_opt.webp"
+        _save_to_disk(full, path, 'WEBP', full_settings['quality'])
+        result['variants']['full_webp'] = path
+
+        # De mayor a menor: cada tamaño se reduce a partir del anterior
+        current = full
+        previous = None
+        for name in sorted(variants, key=lambda n: -get_compression_settings(n)['max_width']):
+            config = get_compression_settings(name)
+            if previous and current.width <= config['max_width'] and current.height <= config['max_height']:
+                # La imagen ya cabe en este tamaño: se reutilizan los archivos del anterior
+                result['variants'][name] = result['variants'][previous]
+                result['variants'][f'{name}_webp'] = result['variants'][f'{previous}_webp']
+                continue
+            current = current.copy()
+            current.thumbnail((config['max_width'], config['max_height']), Image.Resampling.LANCZOS)
+            variant_format = config.get('format_output', 'JPEG')
+            extension = _OUTPUT_FORMATS[variant_format][0]
+            path = f"{target_base_path}_{name}{extension}"
+            _save_to_disk(current, path, variant_format, config['quality'])
+            result['variants'][name] = path
+            path = f"{target_base_path}_{name}.webp"
+            _save_to_disk(current, path, 'WEBP', config['quality'])
+            result['variants'][f'{name}_webp'] = path
+            previous = name
+
+    return result
+
+
 def get_compression_settings(image_type='default'):
     """
     Obtiene configuración de compresión según el tipo de imagen.
     
     Args:
-        image_type: Tipo de imagen ('profile', 'gallery', 'evidence', 'thumbnail', 'default')
+        image_type: Tipo de imagen ('profile', 'gallery', 'evidence', 'medium', 'thumbnail', 'default')
     
     Returns:
         dict: Configuración de compresión
@@ -213,6 +320,13 @@ def get_compression_settings(image_type='default'):
             'format_output': 'JPEG',
             'min_size_kb': 500
         },
+        'medium': {
+            'max_width': 960,
+            'max_height': 960,
+            'quality': 80,
+            'format_output': 'JPEG',
+            'min_size_kb': 200
+        },
         'thumbnail': {
             'max_width': 400,
             'max_height': 400,
@@ -0,0 +1,405 @@
+"""
+Procesamiento diferido de imágenes subidas (tabla procesamiento_imagenes)
+Las vistas de subida (galerías, evidencias, fotos de perfil y de beneficiarios) comprimían la
+imagen con Pillow dentro de la petición: una subida de varias fotos desde campo ocupaba un
+worker de Gunicorn durante segundos. Además los listados servían la imagen completa
+(1920x1080) aunque la tarjeta la mostrara a 400px.
+
+- La vista guarda el archivo original tal como llega, crea su registro y llama a
+  programar_procesamiento, que deja un trabajo pendiente (en la misma transacción si la vista
+  usa una).
+- El comando `python manage.py procesar_imagenes` toma los trabajos en lotes
+  (SELECT ... FOR UPDATE SKIP LOCKED) y los procesa en un pool de procesos
+  (image_compression.process_image_on_disk): con una sola lectura de la imagen genera la
+  versión optimizada (si supera min_size_kb) y, para los modelos con campo `variantes`, los
+  tamaños VARIANT_SIZES (mediano y miniatura) en JPEG y WebP, más el tamaño completo en WebP.
+- Con los archivos ya escritos, url_almacenamiento y variantes se cambian con un solo UPDATE
+  condicionado a que el registro siga apuntando al original. Si el registro se eliminó o su
+  imagen se reemplazó mientras tanto, no se cambia nada y se borran los archivos generados.
+- Si el original está en el almacén por contenido (almacen_archivos), la versión optimizada se
+  guarda también como blob, los derivados quedan junto a él y el original solo pierde una
+  referencia: lo elimina la recolección del almacén cuando ningún registro lo usa.
+- Un original fuera del almacén se conserva MINUTOS_CONSERVAR_ORIGINAL minutos más para las
+  páginas que ya lo tenían cargado; después lo elimina la limpieza del mismo comando.
+- Los listados usan url_variante: la miniatura o el tamaño mediano si ya existen, la imagen
+  completa mientras tanto.
+- Las imágenes ya guardadas se procesan con `python manage.py generar_variantes_imagenes`.
+"""
+import logging
+import os
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import almacen_archivos, response_cache
+from .almacen_archivos import ruta_media
+from .image_compression import VARIANT_SIZES, get_compression_settings, is_image_file, process_image_on_disk
+from .models import (
+    BeneficiarioFoto, ComunidadGaleria, Evidencia, EventosGaleria, ProcesamientoImagen, RegionGaleria,
+    UsuarioFotoPerfil,
+)
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = 8
+ABANDONO_MINUTOS = 10
+MINUTOS_CONSERVAR_ORIGINAL = 60
+DIAS_CONSERVAR_TRABAJOS = 7
+# Las fotos de perfil se limitaban a 5MB después de comprimir; el original puede ser mayor
+TAMANO_MAXIMO_ORIGINAL = 25 * 1024 * 1024
+SUFIJO_OPTIMIZADA = '_opt'
+
+# Modelos con tamaños derivados y su configuración de compresión (para generar_variantes_imagenes)
+TIPO_POR_MODELO_CON_VARIANTES = {
+    EventosGaleria: 'gallery',
+    ComunidadGaleria: 'gallery',
+    RegionGaleria: 'gallery',
+    Evidencia: 'evidence',
+    UsuarioFotoPerfil: 'profile',
+    BeneficiarioFoto: 'profile',
+}
+
+
+def tiene_variantes(modelo):
+    return modelo in TIPO_POR_MODELO_CON_VARIANTES
+
+
+def requiere_compresion(archivo, tipo_compresion):
+    """Indica si la imagen subida se va a comprimir en segundo plano"""
+    if not getattr(settings, 'COMPRESS_IMAGES', True) or not is_image_file(archivo):
+        return False
+    min_size_kb = get_compression_settings(tipo_compresion).get('min_size_kb', 300)
+    return archivo.size > min_size_kb * 1024
+
+
+def programar_procesamiento(modelo, registro_id, url_almacenamiento, archivo, tipo_compresion):
+    """
+    Registra la compresión y los tamaños derivados de la imagen recién guardada del registro.
+    Retorna el trabajo creado, o None si la imagen no necesita procesarse.
+    """
+    if not requiere_compresion(archivo, tipo_compresion):
+        if not (tiene_variantes(modelo) and is_image_file(archivo)):
+            return None
+    return ProcesamientoImagen.objects.create(
+        modelo=modelo._meta.label,
+        registro_id=str(registro_id),
+        url_original=url_almacenamiento,
+        tipo_compresion=tipo_compresion,
+        tamanio_original=archivo.size,
+    )
+
+
+def _eliminar(ruta):
+    if ruta and os.path.exists(ruta):
+        try:
+            os.remove(ruta)
+        except OSError as exc:
+            logger.warning('No se pudo eliminar %s: %s', ruta, exc)
+
+
+def eliminar_variantes(variantes):
+    """
+    Elimina los archivos de los tamaños derivados de una imagen
+    (los de un blob del almacén se eliminan con el blob)
+    """
+    for url in set((variantes or {}).values()):
+        if not almacen_archivos.es_archivo_del_almacen(url):
+            _eliminar(ruta_media(url))
+
+
+def url_variante(instancia, nombre):
+    """
+    URL del tamaño derivado `nombre` ('thumbnail', 'medium', 'thumbnail_webp', ...) de la imagen,
+    o url_almacenamiento mientras no se haya generado (None para las variantes WebP)
+    """
+    url = (getattr(instancia, 'variantes', None) or {}).get(nombre)
+    if url or nombre.endswith('_webp'):
+        return url
+    return instancia.url_almacenamiento
+
+
+def urls_variantes(instancia):
+    """Campos de tamaños derivados que se agregan a las respuestas de galerías"""
+    return {
+        'url_miniatura': url_variante(instancia, 'thumbnail'),
+        'url_miniatura_webp': url_variante(instancia, 'thumbnail_webp'),
+        'url_mediana': url_variante(instancia, 'medium'),
+        'url_mediana_webp': url_variante(instancia, 'medium_webp'),
+    }
+
+
+def _reclamar_lote(tamano):
+    """Marca como 'procesando' los siguientes trabajos pendientes y los retorna"""
+    ahora = timezone.now()
+    limite_abandono = ahora - timedelta(minutes=ABANDONO_MINUTOS)
+    with transaction.atomic():
+        trabajos = list(
+            ProcesamientoImagen.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                Q(estado='pendiente') |
+                Q(estado='procesando', iniciado_en__lt=limite_abandono)
+            )
+            .order_by('creado_en')[:tamano]
+        )
+        for trabajo in trabajos:
+            trabajo.estado = 'procesando'
+            trabajo.intentos += 1
+            trabajo.iniciado_en = ahora
+            trabajo.save(update_fields=['estado', 'intentos', 'iniciado_en'])
+    return trabajos
+
+
+def _preparar(trabajo):
+    """Argumentos de process_image_on_disk para el trabajo"""
+    ruta_original = ruta_media(trabajo.url_original)
+    if not ruta_original or not os.path.exists(ruta_original):
+        raise FileNotFoundError(f'No existe el archivo original {trabajo.url_original}')
+    base = os.path.splitext(ruta_original)[0]
+    opciones = get_compression_settings(trabajo.tipo_compresion)
+    # Una imagen que ya es la versión optimizada (generar_variantes_imagenes) no se vuelve a comprimir
+    if almacen_archivos.sha_de_url(trabajo.url_original):
+        ya_optimizada = almacen_archivos.es_optimizado(trabajo.url_original)
+        # Nombre único por trabajo: _aplicar los mueve junto al blob que quede en el registro
+        base = os.path.join(almacen_archivos.carpeta_temporal(), str(trabajo.id))
+    else:
+        ya_optimizada = base.endswith(SUFIJO_OPTIMIZADA)
+        if ya_optimizada:
+            base = base[:-len(SUFIJO_OPTIMIZADA)]
+    comprimir = (
+        getattr(settings, 'COMPRESS_IMAGES', True)
+        and not ya_optimizada
+        and (trabajo.tamanio_original or 0) > opciones.get('min_size_kb', 300) * 1024
+    )
+    variantes = VARIANT_SIZES if tiene_variantes(apps.get_model(trabajo.modelo)) else ()
+    return ruta_original, base, opciones, comprimir, variantes
+
+
+def _url_en_carpeta(url_original, ruta):
+    """Misma carpeta y mismo formato de URL que el original, con el nombre del archivo generado"""
+    directorio = url_original.replace('\\', '/').rsplit('/', 1)[0] if '/' in url_original else ''
+    nombre = os.path.basename(ruta)
+    return f'{directorio}/{nombre}' if directorio else nombre
+
+
+def _guardar_en_almacen(trabajo, completa, rutas_variantes):
+    """
+    Guarda la versión optimizada como blob y mueve los derivados (generados en la carpeta
+    temporal con el id del trabajo) junto al blob que quedará en el registro.
+    Retorna (completa, rutas_variantes) con las rutas finales.
+    """
+    if completa:
+        ruta_relativa = almacen_archivos.guardar_ruta(completa[0], optimizado=True, mover=True)
+        completa = (os.path.join(str(settings.MEDIA_ROOT), ruta_relativa),) + tuple(completa[1:])
+        destino = completa[0]
+    else:
+        destino = ruta_media(trabajo.url_original)
+    base_destino = os.path.splitext(destino)[0]
+    prefijo = str(trabajo.id)
+    movidos = {}
+    for ruta in set(rutas_variantes.values()):
+        # <id>_medium.jpg -> <sha256>_medium.jpg (si ya existe, es el mismo contenido)
+        movidos[ruta] = base_destino + os.path.basename(ruta)[len(prefijo):]
+        os.replace(ruta, movidos[ruta])
+    return completa, {nombre: movidos[ruta] for nombre, ruta in rutas_variantes.items()}
+
+
+def _terminar(trabajo, estado, error=None):
+    trabajo.estado = estado
+    trabajo.error_mensaje = error
+    trabajo.completado_en = timezone.now()
+    trabajo.save(update_fields=['estado', 'error_mensaje', 'completado_en', 'url_optimizada', 'tamanio_optimizado'])
+
+
+def _marcar_error(trabajo, exc):
+    error = f'{type(exc).__name__}: {exc}'
+    if isinstance(exc, FileNotFoundError) or trabajo.intentos >= trabajo.max_intentos:
+        logger.error('Imagen %s %s sin comprimir: %s', trabajo.modelo, trabajo.registro_id, error)
+        _terminar(trabajo, 'fallido', error)
+        return
+    logger.warning('Imagen %s %s no comprimida (intento %s), se reintentará: %s',
+                   trabajo.modelo, trabajo.registro_id, trabajo.intentos, error)
+    trabajo.estado = 'pendiente'
+    trabajo.error_mensaje = error
+    trabajo.save(update_fields=['estado', 'error_mensaje'])
+
+
+def _aplicar(trabajo, resultado):
+    """
+    Cambia la URL del registro a la versión optimizada y guarda sus tamaños derivados,
+    solo si el registro sigue apuntando al original
+    """
+    completa = resultado['full']
+    rutas_variantes = resultado['variants']
+    if completa and trabajo.tamanio_original and completa[1] >= trabajo.tamanio_original:
+        # No vale la pena: se conserva el original como imagen completa
+        _eliminar(completa[0])
+        completa = None
+    if not completa and not rutas_variantes:
+        _terminar(trabajo, 'descartado', 'La versión optimizada no es más pequeña que el original')
+        return 'descartado'
+
+    en_almacen = bool(almacen_archivos.sha_de_url(trabajo.url_original))
+    if en_almacen:
+        completa, rutas_variantes = _guardar_en_almacen(trabajo, completa, rutas_variantes)
+        media_root = str(settings.MEDIA_ROOT)
+
+        def url_generada(ruta):
+            relativa = os.path.relpath(ruta, media_root).replace(os.sep, '/')
+            return almacen_archivos.url_como(trabajo.url_original, relativa)
+    else:
+        def url_generada(ruta):
+            return _url_en_carpeta(trabajo.url_original, ruta)
+
+    modelo = apps.get_model(trabajo.modelo)
+    campos_modelo = {campo.name for campo in modelo._meta.concrete_fields}
+    valores = {}
+    if completa:
+        ruta_completa, tamanio, content_type = completa
+        trabajo.url_optimizada = url_generada(ruta_completa)
+        trabajo.tamanio_optimizado = tamanio
+        valores['url_almacenamiento'] = trabajo.url_optimizada
+        if 'archivo_tamanio' in campos_modelo:
+            valores['archivo_tamanio'] = tamanio
+        if 'archivo_tipo' in campos_modelo:
+            valores['archivo_tipo'] = content_type
+    if rutas_variantes:
+        valores['variantes'] = {nombre: url_generada(ruta) for nombre, ruta in rutas_variantes.items()}
+    if 'actualizado_en' in campos_modelo:
+        valores['actualizado_en'] = timezone.now()
+
+    generados = list(rutas_variantes.values()) + ([completa[0]] if completa else [])
+    with transaction.atomic():
+        actualizados = modelo.objects.filter(
+            pk=trabajo.registro_id,
+            url_almacenamiento=trabajo.url_original,
+        ).update(**valores)
+        if not actualizados:
+            if not en_almacen:
+                # Los archivos del almacén sin referencias los elimina su recolección
+                transaction.on_commit(lambda: [_eliminar(ruta) for ruta in generados])
+            trabajo.url_optimizada = None
+            trabajo.tamanio_optimizado = None
+            _terminar(trabajo, 'descartado', 'El registro se eliminó o cambió de imagen antes de procesarla')
+            return 'descartado'
+        if completa and en_almacen:
+            # update() no dispara post_save: la referencia pasa del original a la versión optimizada
+            almacen_archivos.sumar_referencias(trabajo.url_optimizada)
+            almacen_archivos.restar_referencias(trabajo.url_original)
+        _terminar(trabajo, 'completado')
+        # update() no dispara post_save: invalidar aquí las respuestas que incluyen la URL
+        nombre_modelo = modelo.__name__
+        transaction.on_commit(lambda: response_cache.invalidar_por_modelo(nombre_modelo))
+    return 'completado'
+
+
+def procesar_lote(ejecutor=None, tamano=TAMANO_LOTE):
+    """
+    Procesa un lote de imágenes pendientes, en paralelo si se recibe un ejecutor
+    (concurrent.futures). Retorna {id: 'completado' | 'descartado' | 'error'}.
+    Si un proceso del pool muere, los trabajos del lote vuelven a la cola y se lanza
+    BrokenProcessPool para que el worker cree un pool nuevo.
+    """
+    trabajos = _reclamar_lote(tamano)
+    if not trabajos:
+        return {}
+
+    pendientes = []
+    resultados = {}
+    pool_roto = None
+    for trabajo in trabajos:
+        try:
+            argumentos = _preparar(trabajo)
+            if ejecutor is None:
+                resultados[trabajo.id] = _aplicar(trabajo, process_image_on_disk(*argumentos))
+            else:
+                pendientes.append((trabajo, ejecutor.submit(process_image_on_disk, *argumentos)))
+        except Exception as exc:
+            pool_roto = pool_roto or (exc if isinstance(exc, BrokenProcessPool) else None)
+            _marcar_error(trabajo, exc)
+            resultados[trabajo.id] = 'error'
+
+    for trabajo, futuro in pendientes:
+        try:
+            resultados[trabajo.id] = _aplicar(trabajo, futuro.result())
+        except Exception as exc:
+            pool_roto = pool_roto or (exc if isinstance(exc, BrokenProcessPool) else None)
+            _marcar_error(trabajo, exc)
+            resultados[trabajo.id] = 'error'
+
+    if pool_roto is not None:
+        raise pool_roto
+    return resultados
+
+
+def limpiar(minutos_original=MINUTOS_CONSERVAR_ORIGINAL, dias=DIAS_CONSERVAR_TRABAJOS):
+    """
+    Elimina los originales de las imágenes ya reemplazadas hace más de `minutos_original`
+    minutos y los trabajos terminados hace más de `dias` días.
+    Retorna (originales eliminados, trabajos eliminados).
+    """
+    ahora = timezone.now()
+    reemplazados = ProcesamientoImagen.objects.filter(
+        estado='completado',
+        url_optimizada__isnull=False,
+        original_eliminado=False,
+        completado_en__lt=ahora - timedelta(minutes=minutos_original),
+    )
+    ids = []
+    for trabajo in reemplazados.only('id', 'url_original').iterator():
+        if not almacen_archivos.es_archivo_del_almacen(trabajo.url_original):
+            _eliminar(ruta_media(trabajo.url_original))
+        ids.append(trabajo.id)
+    if ids:
+        ProcesamientoImagen.objects.filter(id__in=ids).update(original_eliminado=True)
+
+    trabajos, _ = ProcesamientoImagen.objects.filter(
+        Q(estado='completado', original_eliminado=True) |
+        Q(estado='completado', url_optimizada__isnull=True) |
+        Q(estado__in=['descartado', 'fallido']),
+        completado_en__lt=ahora - timedelta(days=dias),
+    ).delete()
+    return len(ids), trabajos
+
+
+def programar_existentes(modelo, regenerar=False, limite=None):
+    """
+    Registra el procesamiento de las imágenes ya guardadas de `modelo` que aún no tienen
+    tamaños derivados (todas con regenerar=True). Retorna (programadas, archivos faltantes).
+    """
+    registros = modelo.objects.exclude(url_almacenamiento='').order_by('pk')
+    if not regenerar:
+        registros = registros.filter(variantes__isnull=True)
+    if modelo is Evidencia:
+        registros = registros.filter(es_imagen=True)
+    en_cola = set(
+        ProcesamientoImagen.objects
+        .filter(modelo=modelo._meta.label, estado__in=['pendiente', 'procesando'])
+        .values_list('registro_id', flat=True)
+    )
+
+    trabajos = []
+    faltantes = 0
+    for registro_id, url in registros.values_list('pk', 'url_almacenamiento').iterator():
+        if str(registro_id) in en_cola:
+            continue
+        ruta = ruta_media(url)
+        if not ruta or not os.path.exists(ruta):
+            faltantes += 1
+            continue
+        trabajos.append(ProcesamientoImagen(
+            modelo=modelo._meta.label,
+            registro_id=str(registro_id),
+            url_original=url,
+            tipo_compresion=TIPO_POR_MODELO_CON_VARIANTES[modelo],
+            tamanio_original=os.path.getsize(ruta),
+        ))
+        if limite and len(trabajos) >= limite:
+            break
+    ProcesamientoImagen.objects.bulk_create(trabajos, batch_size=500)
+    return len(trabajos), faltantes
@@ -0,0 +1,80 @@
+"""
+Genera los tamaños derivados (miniatura, mediano y WebP) de las imágenes ya guardadas.
+
+Las imágenes se registran en la cola de procesamiento_imagenes y las procesa el worker
+procesar_imagenes, igual que las subidas nuevas.
+
+Uso:
+    python manage.py generar_variantes_imagenes                    # registra las que faltan
+    python manage.py generar_variantes_imagenes --procesar         # y las procesa antes de terminar
+    python manage.py generar_variantes_imagenes --modelo ComunidadGaleria --limite 500
+    python manage.py generar_variantes_imagenes --regenerar        # vuelve a generar todas
+"""
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from webmaga.imagenes_diferidas import TIPO_POR_MODELO_CON_VARIANTES, programar_existentes
+
+
+class Command(BaseCommand):
+    help = 'Registra en la cola de imágenes las imágenes guardadas que no tienen tamaños derivados'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modelo',
+            action='append',
+            choices=[modelo.__name__ for modelo in TIPO_POR_MODELO_CON_VARIANTES],
+            help='Solo este modelo (se puede repetir; por defecto todos)',
+        )
+        parser.add_argument(
+            '--limite',
+            type=int,
+            default=None,
+            help='Máximo de imágenes a registrar por modelo',
+        )
+        parser.add_argument(
+            '--regenerar',
+            action='store_true',
+            help='Registrar también las imágenes que ya tienen tamaños derivados',
+        )
+        parser.add_argument(
+            '--procesar',
+            action='store_true',
+            help='Procesar la cola al terminar (procesar_imagenes --una-vez) en lugar de dejarla al worker',
+        )
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            default=None,
+            help='Procesos de compresión al usar --procesar',
+        )
+
+    def handle(self, *args, **options):
+        nombres = options['modelo']
+        modelos = [
+            modelo for modelo in TIPO_POR_MODELO_CON_VARIANTES
+            if not nombres or modelo.__name__ in nombres
+        ]
+        if not modelos:
+            raise CommandError('No hay modelos para procesar')
+
+        total = 0
+        for modelo in modelos:
+            programadas, faltantes = programar_existentes(
+                modelo,
+                regenerar=options['regenerar'],
+                limite=options['limite'],
+            )
+            total += programadas
+            mensaje = f'📸 {modelo.__name__}: {programadas} imagen(es) en cola'
+            if faltantes:
+                mensaje += f', {faltantes} sin archivo en disco'
+            self.stdout.write(mensaje)
+
+        self.stdout.write(f'✅ Total en cola: {total}')
+
+        if options['procesar'] and total:
+            argumentos = ['--una-vez']
+            if options['procesos'] is not None:
+                argumentos += ['--procesos', str(options['procesos'])]
+            call_command('procesar_imagenes', *argumentos, stdout=self.stdout)
@@ -0,0 +1,101 @@
+"""
+Mueve al almacén de archivos por contenido (MEDIA_ROOT/blobs) los archivos subidos antes
+de que existiera: fotos de perfil, galerías, evidencias y archivos adjuntos.
+
+Los archivos con el mismo contenido quedan en un solo blob y las URLs de todos los registros
+(y de sus tamaños derivados) se actualizan. Las imágenes que el worker de imágenes todavía
+no procesa se omiten; basta con volver a ejecutar el comando más tarde.
+
+Uso:
+    python manage.py migrar_archivos_almacen
+    python manage.py migrar_archivos_almacen --modelo Evidencia --limite 1000
+"""
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from webmaga import almacen_archivos
+from webmaga.models import ProcesamientoImagen
+
+
+class Command(BaseCommand):
+    help = 'Mueve los archivos subidos anteriormente al almacén por contenido'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modelo',
+            action='append',
+            choices=[modelo.__name__ for modelo in almacen_archivos.MODELOS_CON_ARCHIVO],
+            help='Solo los archivos de este modelo (se puede repetir; por defecto todos)',
+        )
+        parser.add_argument(
+            '--limite',
+            type=int,
+            default=None,
+            help='Máximo de archivos a migrar',
+        )
+
+    def handle(self, *args, **options):
+        nombres = options['modelo']
+        modelos = [
+            modelo for modelo in almacen_archivos.MODELOS_CON_ARCHIVO
+            if not nombres or modelo.__name__ in nombres
+        ]
+        if not modelos:
+            raise CommandError('No hay modelos para migrar')
+
+        en_proceso = set(
+            ProcesamientoImagen.objects
+            .filter(estado__in=['pendiente', 'procesando'])
+            .values_list('url_original', flat=True)
+        )
+
+        # Un mismo archivo físico puede estar referenciado con URLs distintas ('/media/x' y 'x')
+        urls_por_archivo = defaultdict(set)
+        omitidas = 0
+        for modelo in modelos:
+            urls = (
+                modelo.objects
+                .exclude(url_almacenamiento__isnull=True)
+                .exclude(url_almacenamiento='')
+                .values_list('url_almacenamiento', flat=True)
+                .distinct()
+            )
+            for url in urls.iterator():
+                if almacen_archivos.es_archivo_del_almacen(url):
+                    continue
+                if url in en_proceso:
+                    omitidas += 1
+                    continue
+                ruta = almacen_archivos.ruta_media(url)
+                if ruta:
+                    urls_por_archivo[ruta].add(url)
+
+        migrados = 0
+        repetidos = 0
+        faltantes = 0
+        registros = 0
+        for ruta, urls in urls_por_archivo.items():
+            if options['limite'] is not None and migrados >= options['limite']:
+                break
+            try:
+                actualizados, existia = almacen_archivos.migrar_archivo(ruta, sorted(urls))
+            except FileNotFoundError:
+                faltantes += 1
+                continue
+            migrados += 1
+            registros += actualizados
+            if existia:
+                repetidos += 1
+            if migrados % 100 == 0:
+                self.stdout.write(f'📦 {migrados} archivo(s) migrados...')
+
+        mensaje = (
+            f'✅ Archivos migrados: {migrados} ({repetidos} con contenido repetido), '
+            f'registros actualizados: {registros}'
+        )
+        if faltantes:
+            mensaje += f', {faltantes} sin archivo en disco'
+        if omitidas:
+            mensaje += f', {omitidas} pendientes de comprimir'
+        self.stdout.write(mensaje)
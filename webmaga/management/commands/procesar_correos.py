@@ -0,0 +1,84 @@
+"""
+Worker que envía la bandeja de salida de correos (tabla correos_salientes).
+
+Uso:
+    python manage.py procesar_correos            # bucle continuo
+    python manage.py procesar_correos --una-vez  # vacía la cola y termina
+"""
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from webmaga.correo_saliente import TAMANO_LOTE, limpiar_enviados, procesar_lote
+
+
+class Command(BaseCommand):
+    help = 'Envía en lotes los correos pendientes de la bandeja de salida'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Envía los correos pendientes y termina en lugar de quedarse escuchando',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2.0,
+            help='Segundos de espera entre consultas cuando la cola está vacía (por defecto 2)',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=TAMANO_LOTE,
+            help=f'Correos por conexión SMTP (por defecto {TAMANO_LOTE})',
+        )
+        parser.add_argument(
+            '--limpieza-cada',
+            type=int,
+            default=3600,
+            help='Segundos entre limpiezas de correos ya enviados (por defecto 3600)',
+        )
+
+    def handle(self, *args, **options):
+        self._detener = False
+        signal.signal(signal.SIGTERM, self._solicitar_detencion)
+        signal.signal(signal.SIGINT, self._solicitar_detencion)
+
+        intervalo = options['intervalo']
+        una_vez = options['una_vez']
+        ultima_limpieza = 0
+
+        self.stdout.write('🔄 Worker de correos iniciado')
+
+        while not self._detener:
+            close_old_connections()
+
+            if time.monotonic() - ultima_limpieza >= options['limpieza_cada']:
+                eliminados = limpiar_enviados()
+                if eliminados:
+                    self.stdout.write(f'🧹 Correos enviados eliminados: {eliminados}')
+                ultima_limpieza = time.monotonic()
+
+            resultados = procesar_lote(tamano=options['lote'])
+            valores = list(resultados.values())
+
+            # Sin correos listos, o solo errores (se reintentan con espera)
+            if not valores or all(v == 'error' for v in valores):
+                if valores:
+                    self.stdout.write(f'⚠️ Correos no enviados: {len(valores)} (ver logs)')
+                if una_vez:
+                    break
+                time.sleep(intervalo)
+                continue
+
+            self.stdout.write(
+                f"✅ Lote enviado: {valores.count('enviado')} enviados, {valores.count('error')} con error"
+            )
+
+        self.stdout.write('🛑 Worker de correos detenido')
+
+    def _solicitar_detencion(self, signum, frame):
+        self._detener = True
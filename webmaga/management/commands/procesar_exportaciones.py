@@ -0,0 +1,78 @@
+"""
+Worker que procesa la cola de exportaciones de reportes (tabla exportaciones_reporte).
+
+Uso:
+    python manage.py procesar_exportaciones            # bucle continuo
+    python manage.py procesar_exportaciones --una-vez  # vacía la cola y termina
+"""
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from webmaga.pdf_converter import precalentar_convertidor
+from webmaga.report_jobs import limpiar_exportaciones_antiguas, procesar_siguiente_exportacion
+
+
+class Command(BaseCommand):
+    help = 'Procesa en segundo plano los trabajos de exportación de reportes PDF/Word'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Procesa los trabajos pendientes y termina en lugar de quedarse escuchando',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2.0,
+            help='Segundos de espera entre consultas cuando la cola está vacía (por defecto 2)',
+        )
+        parser.add_argument(
+            '--limpieza-cada',
+            type=int,
+            default=600,
+            help='Segundos entre limpiezas de exportaciones antiguas (por defecto 600)',
+        )
+
+    def handle(self, *args, **options):
+        self._detener = False
+        signal.signal(signal.SIGTERM, self._solicitar_detencion)
+        signal.signal(signal.SIGINT, self._solicitar_detencion)
+
+        intervalo = options['intervalo']
+        una_vez = options['una_vez']
+        ultima_limpieza = 0
+
+        self.stdout.write('🔄 Worker de exportaciones iniciado')
+
+        # Arrancar LibreOffice antes del primer trabajo para no pagar el arranque en frío
+        if precalentar_convertidor() is not None:
+            self.stdout.write('🔥 Convertidor LibreOffice precalentado')
+
+        while not self._detener:
+            close_old_connections()
+
+            if time.monotonic() - ultima_limpieza >= options['limpieza_cada']:
+                eliminadas = limpiar_exportaciones_antiguas()
+                if eliminadas:
+                    self.stdout.write(f'🧹 Exportaciones antiguas eliminadas: {eliminadas}')
+                ultima_limpieza = time.monotonic()
+
+            resultado = procesar_siguiente_exportacion()
+
+            if resultado is None:
+                if una_vez:
+                    break
+                time.sleep(intervalo)
+            elif resultado:
+                self.stdout.write('✅ Exportación completada')
+            else:
+                self.stdout.write('⚠️ Exportación fallida (ver logs)')
+
+        self.stdout.write('🛑 Worker de exportaciones detenido')
+
+    def _solicitar_detencion(self, signum, frame):
+        self._detener = True
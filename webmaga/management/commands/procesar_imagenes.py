@@ -0,0 +1,138 @@
+"""
+Worker que comprime las imágenes subidas (tabla procesamiento_imagenes).
+
+Uso:
+    python manage.py procesar_imagenes              # bucle continuo
+    python manage.py procesar_imagenes --una-vez    # vacía la cola y termina
+    python manage.py procesar_imagenes --procesos 4 # tamaño del pool de compresión
+
+En cada limpieza también se recolectan los blobs del almacén de archivos sin referencias
+(ver webmaga/almacen_archivos.py), se eliminan las subidas por partes abandonadas
+(webmaga/subidas_por_partes.py) y una vez al día se recuentan las referencias de los blobs.
+"""
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from webmaga import almacen_archivos, subidas_por_partes
+from webmaga.imagenes_diferidas import TAMANO_LOTE, limpiar, procesar_lote
+
+
+class Command(BaseCommand):
+    help = 'Comprime en un pool de procesos las imágenes subidas pendientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Procesa las imágenes pendientes y termina en lugar de quedarse escuchando',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2.0,
+            help='Segundos de espera entre consultas cuando la cola está vacía (por defecto 2)',
+        )
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            default=max(1, (os.cpu_count() or 2) // 2),
+            help='Procesos que comprimen en paralelo (por defecto la mitad de los CPU; 0 = sin pool)',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=TAMANO_LOTE,
+            help=f'Imágenes tomadas por consulta (por defecto {TAMANO_LOTE})',
+        )
+        parser.add_argument(
+            '--limpieza-cada',
+            type=int,
+            default=600,
+            help='Segundos entre limpiezas de originales reemplazados (por defecto 600)',
+        )
+
+    def handle(self, *args, **options):
+        self._detener = False
+        signal.signal(signal.SIGTERM, self._solicitar_detencion)
+        signal.signal(signal.SIGINT, self._solicitar_detencion)
+
+        intervalo = options['intervalo']
+        una_vez = options['una_vez']
+        procesos = options['procesos']
+        lote = max(options['lote'], procesos)
+        ultima_limpieza = 0
+        ultimo_recuento = time.monotonic()
+
+        ejecutor = self._crear_ejecutor(procesos)
+
+        self.stdout.write(f'🔄 Worker de imágenes iniciado ({procesos} proceso(s) de compresión)')
+
+        try:
+            while not self._detener:
+                close_old_connections()
+
+                if time.monotonic() - ultima_limpieza >= options['limpieza_cada']:
+                    originales, trabajos = limpiar()
+                    if originales or trabajos:
+                        self.stdout.write(f'🧹 Originales eliminados: {originales}, trabajos eliminados: {trabajos}')
+                    self._recolectar_blobs()
+                    subidas = subidas_por_partes.limpiar()
+                    if subidas:
+                        self.stdout.write(f'🧹 Subidas por partes abandonadas eliminadas: {subidas}')
+                    ultima_limpieza = time.monotonic()
+
+                if time.monotonic() - ultimo_recuento >= almacen_archivos.RECONTAR_CADA_HORAS * 3600:
+                    corregidos = almacen_archivos.recontar()
+                    if corregidos:
+                        self.stdout.write(f'🧹 Referencias de blobs corregidas: {corregidos}')
+                    ultimo_recuento = time.monotonic()
+
+                try:
+                    resultados = procesar_lote(ejecutor=ejecutor, tamano=lote)
+                except BrokenProcessPool:
+                    # Un proceso del pool murió (p. ej. sin memoria): el lote vuelve a la cola
+                    self.stdout.write('⚠️ El pool de compresión se detuvo, creando uno nuevo')
+                    ejecutor.shutdown(wait=False)
+                    ejecutor = self._crear_ejecutor(procesos)
+                    continue
+                valores = list(resultados.values())
+
+                if not valores:
+                    if una_vez:
+                        break
+                    time.sleep(intervalo)
+                    continue
+
+                self.stdout.write(
+                    f"✅ Lote procesado: {valores.count('completado')} comprimidas, "
+                    f"{valores.count('descartado')} descartadas, {valores.count('error')} con error"
+                )
+        finally:
+            if ejecutor is not None:
+                ejecutor.shutdown(wait=True)
+
+        self.stdout.write('🛑 Worker de imágenes detenido')
+
+    def _recolectar_blobs(self):
+        eliminados, liberados = almacen_archivos.recolectar()
+        if eliminados:
+            self.stdout.write(f'🧹 Blobs sin referencias eliminados: {eliminados} ({liberados / (1024 * 1024):.1f} MB)')
+
+    def _crear_ejecutor(self, procesos):
+        if procesos <= 0:
+            return None
+        # 'spawn': los procesos del pool no heredan las conexiones a la base de datos
+        return ProcessPoolExecutor(
+            max_workers=procesos,
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+
+    def _solicitar_detencion(self, signum, frame):
+        self._detener = True
@@ -0,0 +1,72 @@
+"""
+Worker que aplica la cola de sincronización offline (tabla cola_sincronizacion).
+
+Uso:
+    python manage.py procesar_sincronizacion            # bucle continuo
+    python manage.py procesar_sincronizacion --una-vez  # vacía la cola y termina
+"""
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from webmaga.sync_queue import TAMANO_LOTE, procesar_lote
+
+
+class Command(BaseCommand):
+    help = 'Aplica en lotes las operaciones offline pendientes de la cola de sincronización'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Procesa las operaciones pendientes y termina en lugar de quedarse escuchando',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=5.0,
+            help='Segundos de espera entre consultas cuando la cola está vacía (por defecto 5)',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=TAMANO_LOTE,
+            help=f'Operaciones por transacción (por defecto {TAMANO_LOTE})',
+        )
+
+    def handle(self, *args, **options):
+        self._detener = False
+        signal.signal(signal.SIGTERM, self._solicitar_detencion)
+        signal.signal(signal.SIGINT, self._solicitar_detencion)
+
+        intervalo = options['intervalo']
+        una_vez = options['una_vez']
+
+        self.stdout.write('🔄 Worker de sincronización iniciado')
+
+        while not self._detener:
+            close_old_connections()
+
+            resultados = procesar_lote(tamano=options['lote'])
+            valores = list(resultados.values())
+
+            # Sin operaciones, o solo errores (se reintentan en la siguiente vuelta)
+            if not valores or all(v == 'error' for v in valores):
+                if valores:
+                    self.stdout.write(f'⚠️ Operaciones con error: {len(valores)} (ver logs)')
+                if una_vez:
+                    break
+                time.sleep(intervalo)
+                continue
+
+            self.stdout.write(
+                f"✅ Lote aplicado: {valores.count('aplicado')} aplicadas, "
+                f"{valores.count('conflicto')} con conflicto, {valores.count('error')} con error"
+            )
+
+        self.stdout.write('🛑 Worker de sincronización detenido')
+
+    def _solicitar_detencion(self, signum, frame):
+        self._detener = True
@@ -0,0 +1,49 @@
+"""
+Elimina del almacén de archivos los blobs que ningún registro usa.
+
+El worker procesar_imagenes ya lo hace en cada limpieza; este comando sirve para
+ejecutarlo a mano o desde cron cuando el worker no está activo.
+
+Uso:
+    python manage.py recolectar_archivos                    # respeta MEDIA_BLOB_GRACIA_HORAS
+    python manage.py recolectar_archivos --gracia-horas 0   # sin esperar el plazo de gracia
+    python manage.py recolectar_archivos --recontar         # recalcula antes las referencias
+"""
+from django.core.management.base import BaseCommand
+
+from webmaga import almacen_archivos
+
+
+class Command(BaseCommand):
+    help = 'Elimina los blobs del almacén de archivos sin referencias'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--gracia-horas',
+            type=float,
+            default=None,
+            help='Horas que un blob sin referencias se conserva (por defecto MEDIA_BLOB_GRACIA_HORAS)',
+        )
+        parser.add_argument(
+            '--recontar',
+            action='store_true',
+            help='Recalcular las referencias de todos los blobs desde las tablas antes de recolectar',
+        )
+
+    def handle(self, *args, **options):
+        if options['recontar']:
+            corregidos = almacen_archivos.recontar()
+            self.stdout.write(f'🔄 Referencias corregidas: {corregidos}')
+
+        total_eliminados = 0
+        total_liberados = 0
+        while True:
+            eliminados, liberados = almacen_archivos.recolectar(gracia_horas=options['gracia_horas'])
+            total_eliminados += eliminados
+            total_liberados += liberados
+            if eliminados < almacen_archivos.TAMANO_LOTE_RECOLECCION:
+                break
+
+        self.stdout.write(
+            f'✅ Blobs eliminados: {total_eliminados} ({total_liberados / (1024 * 1024):.1f} MB liberados)'
+        )
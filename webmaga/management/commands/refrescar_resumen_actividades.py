@@ -0,0 +1,25 @@
+"""
+Recalcula por completo la tabla resumen_actividades del dashboard.
+
+El trigger trg_actividades_resumen la mantiene al día; este comando solo hace falta si se
+cargaron actividades con los triggers deshabilitados (restauraciones, COPY masivos).
+
+Uso:
+    python manage.py refrescar_resumen_actividades
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+
+class Command(BaseCommand):
+    help = 'Recalcula la tabla de resumen de actividades usada por el dashboard ejecutivo'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('El resumen de actividades solo existe en PostgreSQL')
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute('SELECT refrescar_resumen_actividades()')
+            filas = cursor.fetchone()[0]
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Resumen de actividades recalculado: {filas} fila(s)'))
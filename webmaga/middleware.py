@@ -1,4 +1,7 @@
 from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
+
+from . import usuario_actual
 
 
 class NoCacheMiddleware(MiddlewareMixin):
@@ -21,3 +24,13 @@ class NoCacheMiddleware(MiddlewareMixin):
         
         return response
 
+
+class UsuarioMagaMiddleware(MiddlewareMixin):
+    """
+    Expone request.usuario_maga: el Usuario MAGA (con puesto y colaborador) de la petición.
+    Se resuelve la primera vez que se usa y es el mismo que devuelve get_usuario_maga(request.user).
+    Si no hay usuario MAGA se comporta como falso (usar "if not request.usuario_maga").
+    """
+    
+    def process_request(self, request):
+        request.usuario_maga = SimpleLazyObject(lambda: usuario_actual.usuario_maga(request.user))
@@ -23,7 +23,7 @@ class Migration(migrations.Migration):
 
     initial = False
 
-    dependencies = []
+    dependencies = [('webmaga', '0002_db_objects')]
 
     operations = [
         migrations.RunSQL(sql=SQL_CREATE_TABLE, reverse_sql=SQL_DROP_TABLE),
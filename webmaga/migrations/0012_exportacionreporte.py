@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:00
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webmaga', '0011_agregar_fecha_reinscripcion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportacionReporte',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('tipo_exportacion', models.CharField(choices=[('reporte', 'Reporte general'), ('beneficiarios', 'Reporte de beneficiarios')], default='reporte', max_length=20)),
+                ('report_type', models.CharField(blank=True, max_length=100, null=True)),
+                ('formato', models.CharField(choices=[('pdf', 'PDF'), ('word', 'Word')], default='pdf', max_length=10)),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completado', 'Completado'), ('fallido', 'Fallido')], default='pendiente', max_length=20)),
+                ('intentos', models.IntegerField(default=0)),
+                ('archivo_nombre', models.CharField(blank=True, max_length=255, null=True)),
+                ('archivo_tipo', models.CharField(blank=True, max_length=100, null=True)),
+                ('archivo_tamanio', models.BigIntegerField(blank=True, null=True)),
+                ('ruta_archivo', models.TextField(blank=True, null=True)),
+                ('error_mensaje', models.TextField(blank=True, null=True)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('iniciado_en', models.DateTimeField(blank=True, null=True)),
+                ('completado_en', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(db_column='usuario_id', on_delete=django.db.models.deletion.CASCADE, related_name='exportaciones_reporte', to='webmaga.usuario')),
+            ],
+            options={
+                'verbose_name': 'Exportación de Reporte',
+                'verbose_name_plural': 'Exportaciones de Reportes',
+                'db_table': 'exportaciones_reporte',
+                'ordering': ['-creado_en'],
+                'indexes': [models.Index(fields=['estado', 'creado_en'], name='exportacion_estado_76bfbe_idx'), models.Index(fields=['usuario', 'creado_en'], name='exportacion_usuario_1db125_idx')],
+            },
+        ),
+    ]
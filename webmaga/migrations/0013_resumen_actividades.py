@@ -0,0 +1,151 @@
+# Tabla de resumen para el dashboard ejecutivo, mantenida por trigger
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+SQL_CREATE = """
+-- Conteo de actividades no eliminadas por mes, tipo, estado, comunidad y responsable
+CREATE TABLE IF NOT EXISTS resumen_actividades (
+    id BIGSERIAL PRIMARY KEY,
+    mes DATE NOT NULL,
+    tipo_id UUID NOT NULL,
+    estado VARCHAR(50) NOT NULL,
+    comunidad_id UUID,
+    responsable_id UUID,
+    total INTEGER NOT NULL DEFAULT 0,
+    actualizado_en TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Clave única (comunidad y responsable pueden ser NULL)
+CREATE UNIQUE INDEX IF NOT EXISTS ux_resumen_actividades_clave ON resumen_actividades (
+    mes, tipo_id, estado,
+    COALESCE(comunidad_id, '00000000-0000-0000-0000-000000000000'::uuid),
+    COALESCE(responsable_id, '00000000-0000-0000-0000-000000000000'::uuid)
+);
+CREATE INDEX IF NOT EXISTS idx_resumen_actividades_mes ON resumen_actividades(mes);
+
+-- Suma (o resta) una actividad en el grupo correspondiente
+CREATE OR REPLACE FUNCTION ajustar_resumen_actividades(
+    p_fecha DATE,
+    p_tipo_id UUID,
+    p_estado VARCHAR,
+    p_comunidad_id UUID,
+    p_responsable_id UUID,
+    p_delta INTEGER
+)
+RETURNS VOID AS $$
+DECLARE
+    v_mes DATE := date_trunc('month', p_fecha)::date;
+BEGIN
+    INSERT INTO resumen_actividades (mes, tipo_id, estado, comunidad_id, responsable_id, total)
+    VALUES (v_mes, p_tipo_id, p_estado, p_comunidad_id, p_responsable_id, p_delta)
+    ON CONFLICT (
+        mes, tipo_id, estado,
+        COALESCE(comunidad_id, '00000000-0000-0000-0000-000000000000'::uuid),
+        COALESCE(responsable_id, '00000000-0000-0000-0000-000000000000'::uuid)
+    )
+    DO UPDATE SET total = resumen_actividades.total + EXCLUDED.total,
+                  actualizado_en = CURRENT_TIMESTAMP;
+
+    IF p_delta < 0 THEN
+        DELETE FROM resumen_actividades
+        WHERE mes = v_mes
+          AND tipo_id = p_tipo_id
+          AND estado = p_estado
+          AND comunidad_id IS NOT DISTINCT FROM p_comunidad_id
+          AND responsable_id IS NOT DISTINCT FROM p_responsable_id
+          AND total <= 0;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Se ejecuta después de actualizar_timestamp/incrementar_version (BEFORE UPDATE),
+-- con la fila ya definitiva
+CREATE OR REPLACE FUNCTION actualizar_resumen_actividades()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND OLD.fecha IS NOT DISTINCT FROM NEW.fecha
+       AND OLD.tipo_id IS NOT DISTINCT FROM NEW.tipo_id
+       AND OLD.estado IS NOT DISTINCT FROM NEW.estado
+       AND OLD.comunidad_id IS NOT DISTINCT FROM NEW.comunidad_id
+       AND OLD.responsable_id IS NOT DISTINCT FROM NEW.responsable_id
+       AND (OLD.eliminado_en IS NULL) = (NEW.eliminado_en IS NULL) THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.eliminado_en IS NULL THEN
+        PERFORM ajustar_resumen_actividades(OLD.fecha, OLD.tipo_id, OLD.estado, OLD.comunidad_id, OLD.responsable_id, -1);
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.eliminado_en IS NULL THEN
+        PERFORM ajustar_resumen_actividades(NEW.fecha, NEW.tipo_id, NEW.estado, NEW.comunidad_id, NEW.responsable_id, 1);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_actividades_resumen ON actividades;
+CREATE TRIGGER trg_actividades_resumen AFTER INSERT OR UPDATE OR DELETE ON actividades
+    FOR EACH ROW EXECUTE FUNCTION actualizar_resumen_actividades();
+
+-- Recalcula el resumen completo (carga inicial o para corregir diferencias)
+CREATE OR REPLACE FUNCTION refrescar_resumen_actividades()
+RETURNS INTEGER AS $$
+DECLARE
+    v_filas INTEGER;
+BEGIN
+    LOCK TABLE resumen_actividades IN EXCLUSIVE MODE;
+    DELETE FROM resumen_actividades;
+    INSERT INTO resumen_actividades (mes, tipo_id, estado, comunidad_id, responsable_id, total)
+    SELECT date_trunc('month', fecha)::date, tipo_id, estado, comunidad_id, responsable_id, COUNT(*)
+    FROM actividades
+    WHERE eliminado_en IS NULL
+    GROUP BY 1, 2, 3, 4, 5;
+    GET DIAGNOSTICS v_filas = ROW_COUNT;
+    RETURN v_filas;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT refrescar_resumen_actividades();
+"""
+
+SQL_DROP = """
+DROP TRIGGER IF EXISTS trg_actividades_resumen ON actividades;
+DROP FUNCTION IF EXISTS actualizar_resumen_actividades();
+DROP FUNCTION IF EXISTS refrescar_resumen_actividades();
+DROP FUNCTION IF EXISTS ajustar_resumen_actividades(DATE, UUID, VARCHAR, UUID, UUID, INTEGER);
+DROP TABLE IF EXISTS resumen_actividades;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webmaga', '0012_exportacionreporte'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=SQL_CREATE, reverse_sql=SQL_DROP),
+        migrations.CreateModel(
+            name='ResumenActividad',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('mes', models.DateField()),
+                ('estado', models.CharField(max_length=50)),
+                ('total', models.IntegerField(default=0)),
+                ('actualizado_en', models.DateTimeField(blank=True, null=True)),
+                ('tipo', models.ForeignKey(db_column='tipo_id', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='webmaga.tipoactividad')),
+                ('comunidad', models.ForeignKey(blank=True, db_column='comunidad_id', db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='webmaga.comunidad')),
+                ('responsable', models.ForeignKey(blank=True, db_column='responsable_id', db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='webmaga.usuario')),
+            ],
+            options={
+                'verbose_name': 'Resumen de Actividades',
+                'verbose_name_plural': 'Resúmenes de Actividades',
+                'db_table': 'resumen_actividades',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Índice para la paginación por cursor del listado de beneficiarios (creado_en, id)
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webmaga', '0013_resumen_actividades'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+            CREATE INDEX IF NOT EXISTS idx_beneficiarios_activos_creado
+                ON beneficiarios (creado_en DESC, id DESC) WHERE activo = TRUE;
+            -- beneficiario_reinscripciones se crea fuera de las migraciones (modelo no gestionado)
+            DO $$
+            BEGIN
+                IF to_regclass('beneficiario_reinscripciones') IS NOT NULL THEN
+                    CREATE INDEX IF NOT EXISTS idx_beneficiario_reinscripciones_actividad_benef
+                        ON beneficiario_reinscripciones (actividad_beneficiario_id, fecha_reinscripcion DESC);
+                END IF;
+            END $$;
+            """,
+            reverse_sql="""
+            DROP INDEX IF EXISTS idx_beneficiario_reinscripciones_actividad_benef;
+            DROP INDEX IF EXISTS idx_beneficiarios_activos_creado;
+            """,
+        ),
+    ]
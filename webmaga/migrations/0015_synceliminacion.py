@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webmaga', '0014_indice_beneficiarios_creado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncEliminacion',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('entidad', models.CharField(max_length=50)),
+                ('registro_id', models.CharField(max_length=64)),
+                ('eliminado_en', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Eliminación sincronizable',
+                'verbose_name_plural': 'Eliminaciones sincronizables',
+                'db_table': 'sync_eliminaciones',
+                'ordering': ['id'],
+            },
+        ),
+        # Índices para la sincronización incremental por fecha de actualización
+        migrations.RunSQL(
+            sql="""
+            CREATE INDEX IF NOT EXISTS idx_actividades_actualizado ON actividades (actualizado_en, id);
+            CREATE INDEX IF NOT EXISTS idx_beneficiarios_actualizado ON beneficiarios (actualizado_en, id);
+            CREATE INDEX IF NOT EXISTS idx_comunidades_actualizado ON comunidades (actualizado_en, id);
+            """,
+            reverse_sql="""
+            DROP INDEX IF EXISTS idx_comunidades_actualizado;
+            DROP INDEX IF EXISTS idx_beneficiarios_actualizado;
+            DROP INDEX IF EXISTS idx_actividades_actualizado;
+            """,
+        ),
+    ]
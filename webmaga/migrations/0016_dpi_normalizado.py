@@ -0,0 +1,116 @@
+# DPI normalizado (solo dígitos) en columnas indexadas, mantenidas por triggers
+# buscar_conflicto_dpi y la verificación masiva de DPIs comparan contra estas columnas
+# en lugar de aplicar REPLACE sobre dpi en cada fila (lo que impedía usar los índices).
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webmaga', '0015_synceliminacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='beneficiarioindividual',
+            name='dpi_normalizado',
+            field=models.CharField(blank=True, editable=False, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='beneficiariofamilia',
+            name='dpi_jefe_familia_normalizado',
+            field=models.CharField(blank=True, editable=False, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='beneficiarioinstitucion',
+            name='dpi_representante_normalizado',
+            field=models.CharField(blank=True, editable=False, max_length=20, null=True),
+        ),
+        migrations.RunSQL(
+            sql="""
+            CREATE OR REPLACE FUNCTION normalizar_dpi(valor TEXT)
+            RETURNS TEXT AS $$
+                SELECT NULLIF(regexp_replace(COALESCE(valor, ''), '[^0-9]', '', 'g'), '');
+            $$ LANGUAGE sql IMMUTABLE;
+
+            CREATE OR REPLACE FUNCTION actualizar_dpi_normalizado_individual()
+            RETURNS TRIGGER AS $$
+            BEGIN
+                NEW.dpi_normalizado = normalizar_dpi(NEW.dpi);
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            CREATE OR REPLACE FUNCTION actualizar_dpi_normalizado_familia()
+            RETURNS TRIGGER AS $$
+            BEGIN
+                NEW.dpi_jefe_familia_normalizado = normalizar_dpi(NEW.dpi_jefe_familia);
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            CREATE OR REPLACE FUNCTION actualizar_dpi_normalizado_institucion()
+            RETURNS TRIGGER AS $$
+            BEGIN
+                NEW.dpi_representante_normalizado = normalizar_dpi(NEW.dpi_representante);
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            DROP TRIGGER IF EXISTS trg_beneficiarios_ind_dpi ON beneficiarios_individuales;
+            CREATE TRIGGER trg_beneficiarios_ind_dpi BEFORE INSERT OR UPDATE ON beneficiarios_individuales
+                FOR EACH ROW EXECUTE FUNCTION actualizar_dpi_normalizado_individual();
+
+            DROP TRIGGER IF EXISTS trg_beneficiarios_fam_dpi ON beneficiarios_familias;
+            CREATE TRIGGER trg_beneficiarios_fam_dpi BEFORE INSERT OR UPDATE ON beneficiarios_familias
+                FOR EACH ROW EXECUTE FUNCTION actualizar_dpi_normalizado_familia();
+
+            DROP TRIGGER IF EXISTS trg_beneficiarios_inst_dpi ON beneficiarios_instituciones;
+            CREATE TRIGGER trg_beneficiarios_inst_dpi BEFORE INSERT OR UPDATE ON beneficiarios_instituciones
+                FOR EACH ROW EXECUTE FUNCTION actualizar_dpi_normalizado_institucion();
+
+            -- Llenar las columnas existentes sin tocar actualizado_en (la PWA sincroniza por esa fecha)
+            DO $$
+            DECLARE
+                t RECORD;
+            BEGIN
+                FOR t IN SELECT * FROM (VALUES
+                    ('beneficiarios_individuales', 'trg_beneficiarios_ind_timestamp', 'dpi_normalizado', 'dpi'),
+                    ('beneficiarios_familias', 'trg_beneficiarios_fam_timestamp', 'dpi_jefe_familia_normalizado', 'dpi_jefe_familia'),
+                    ('beneficiarios_instituciones', 'trg_beneficiarios_inst_timestamp', 'dpi_representante_normalizado', 'dpi_representante')
+                ) AS v(tabla, trigger_timestamp, columna, origen)
+                LOOP
+                    IF EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = t.trigger_timestamp) THEN
+                        EXECUTE format('ALTER TABLE %I DISABLE TRIGGER %I', t.tabla, t.trigger_timestamp);
+                    END IF;
+                    EXECUTE format('UPDATE %I SET %I = normalizar_dpi(%I) WHERE %I IS NOT NULL', t.tabla, t.columna, t.origen, t.origen);
+                    IF EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = t.trigger_timestamp) THEN
+                        EXECUTE format('ALTER TABLE %I ENABLE TRIGGER %I', t.tabla, t.trigger_timestamp);
+                    END IF;
+                END LOOP;
+            END $$;
+            """,
+            reverse_sql="""
+            DROP TRIGGER IF EXISTS trg_beneficiarios_inst_dpi ON beneficiarios_instituciones;
+            DROP TRIGGER IF EXISTS trg_beneficiarios_fam_dpi ON beneficiarios_familias;
+            DROP TRIGGER IF EXISTS trg_beneficiarios_ind_dpi ON beneficiarios_individuales;
+            DROP FUNCTION IF EXISTS actualizar_dpi_normalizado_institucion();
+            DROP FUNCTION IF EXISTS actualizar_dpi_normalizado_familia();
+            DROP FUNCTION IF EXISTS actualizar_dpi_normalizado_individual();
+            DROP FUNCTION IF EXISTS normalizar_dpi(TEXT);
+            """,
+        ),
+        migrations.AddIndex(
+            model_name='beneficiarioindividual',
+            index=models.Index(fields=['dpi_normalizado'], name='idx_benef_ind_dpi_norm'),
+        ),
+        migrations.AddIndex(
+            model_name='beneficiariofamilia',
+            index=models.Index(fields=['dpi_jefe_familia_normalizado'], name='idx_benef_fam_dpi_norm'),
+        ),
+        migrations.AddIndex(
+            model_name='beneficiarioinstitucion',
+            index=models.Index(fields=['dpi_representante_normalizado'], name='idx_benef_inst_dpi_norm'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:10
+
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webmaga', '0016_dpi_normalizado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorreoSaliente',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('tipo', models.CharField(choices=[('recuperacion', 'Código de recuperación'), ('password_actualizado', 'Contraseña actualizada'), ('asistencia', 'Asistencia técnica')], max_length=30)),
+                ('remitente', models.CharField(max_length=255)),
+                ('destinatarios', models.JSONField(default=list)),
+                ('asunto', models.CharField(max_length=255)),
+                ('mensaje_texto', models.TextField()),
+                ('mensaje_html', models.TextField(blank=True, null=True)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('enviando', 'Enviando'), ('enviado', 'Enviado'), ('fallido', 'Fallido')], default='pendiente', max_length=20)),
+                ('intentos', models.IntegerField(default=0)),
+                ('max_intentos', models.IntegerField(default=6)),
+                ('siguiente_intento_en', models.DateTimeField(default=django.utils.timezone.now)),
+                ('error_mensaje', models.TextField(blank=True, null=True)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('enviado_en', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Correo saliente',
+                'verbose_name_plural': 'Correos salientes',
+                'db_table': 'correos_salientes',
+                'ordering': ['-creado_en'],
+                'indexes': [models.Index(fields=['estado', 'siguiente_intento_en'], name='idx_correos_estado_siguiente')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:05
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webmaga', '0017_correosaliente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcesamientoImagen',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('modelo', models.CharField(max_length=100)),
+                ('registro_id', models.CharField(max_length=64)),
+                ('url_original', models.TextField()),
+                ('url_optimizada', models.TextField(blank=True, null=True)),
+                ('tipo_compresion', models.CharField(choices=[('profile', 'Foto de perfil'), ('gallery', 'Galería'), ('evidence', 'Evidencia')], default='gallery', max_length=20)),
+                ('tamanio_original', models.BigIntegerField(blank=True, null=True)),
+                ('tamanio_optimizado', models.BigIntegerField(blank=True, null=True)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completado', 'Completado'), ('descartado', 'Descartado'), ('fallido', 'Fallido')], default='pendiente', max_length=20)),
+                ('intentos', models.IntegerField(default=0)),
+                ('max_intentos', models.IntegerField(default=3)),
+                ('error_mensaje', models.TextField(blank=True, null=True)),
+                ('original_eliminado', models.BooleanField(default=False)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('iniciado_en', models.DateTimeField(blank=True, null=True)),
+                ('completado_en', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Procesamiento de imagen',
+                'verbose_name_plural': 'Procesamiento de imágenes',
+                'db_table': 'procesamiento_imagenes',
+                'ordering': ['-creado_en'],
+                'indexes': [models.Index(fields=['estado', 'creado_en'], name='idx_proc_imagenes_estado')],
+            },
+        ),
+    ]
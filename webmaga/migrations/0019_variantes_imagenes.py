@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webmaga', '0018_procesamientoimagen'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuariofotoperfil',
+            name='variantes',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='beneficiariofoto',
+            name='variantes',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='evidencia',
+            name='variantes',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='eventosgaleria',
+            name='variantes',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='comunidadgaleria',
+            name='variantes',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='regiongaleria',
+            name='variantes',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
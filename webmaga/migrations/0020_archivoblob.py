@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webmaga', '0019_variantes_imagenes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivoBlob',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('ruta', models.CharField(max_length=255)),
+                ('tamanio', models.BigIntegerField()),
+                ('referencias', models.IntegerField(default=0)),
+                ('optimizado', models.BooleanField(default=False)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('sin_referencias_desde', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Archivo almacenado',
+                'verbose_name_plural': 'Archivos almacenados',
+                'db_table': 'archivos_blob',
+                'ordering': ['-creado_en'],
+                'indexes': [models.Index(fields=['referencias', 'sin_referencias_desde'], name='idx_archivos_blob_referencias')],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:30
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webmaga', '0020_archivoblob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubidaArchivo',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('destino', models.CharField(choices=[('evento', 'Evento'), ('region', 'Región'), ('comunidad', 'Comunidad')], max_length=20)),
+                ('objeto_id', models.UUIDField()),
+                ('archivo_nombre', models.CharField(max_length=255)),
+                ('archivo_tipo', models.CharField(blank=True, max_length=100, null=True)),
+                ('ultima_modificacion', models.BigIntegerField(blank=True, null=True)),
+                ('tamanio_total', models.BigIntegerField()),
+                ('sha256', models.CharField(blank=True, max_length=64, null=True)),
+                ('recibido', models.BigIntegerField(default=0)),
+                ('nombre', models.CharField(blank=True, max_length=255, null=True)),
+                ('descripcion', models.TextField(blank=True, null=True)),
+                ('estado', models.CharField(choices=[('en_curso', 'En curso'), ('completada', 'Completada'), ('cancelada', 'Cancelada')], default='en_curso', max_length=20)),
+                ('archivo_id', models.UUIDField(blank=True, null=True)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+                ('usuario', models.ForeignKey(db_column='usuario_id', on_delete=django.db.models.deletion.CASCADE, related_name='subidas_archivos', to='webmaga.usuario')),
+            ],
+            options={
+                'verbose_name': 'Subida por partes',
+                'verbose_name_plural': 'Subidas por partes',
+                'db_table': 'subidas_archivos',
+                'ordering': ['-creado_en'],
+                'indexes': [
+                    models.Index(fields=['usuario', 'destino', 'objeto_id', 'estado'], name='idx_subidas_archivos_usuario'),
+                    models.Index(fields=['estado', 'actualizado_en'], name='idx_subidas_archivos_estado'),
+                ],
+            },
+        ),
+    ]
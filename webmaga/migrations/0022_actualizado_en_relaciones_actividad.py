@@ -0,0 +1,65 @@
+# actualizado_en en actividad_personal y actividad_comunidades, mantenido por trigger
+# La sincronización incremental (sync_delta) y los validadores del calendario usaban creado_en
+# como marca de cambio de estas tablas, por lo que un UPDATE (rol en el evento, región de la
+# comunidad) nunca llegaba a la PWA ni cambiaba el ETag.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webmaga', '0021_subidaarchivo'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql="""
+                    ALTER TABLE actividad_personal ADD COLUMN IF NOT EXISTS actualizado_en TIMESTAMPTZ;
+                    UPDATE actividad_personal SET actualizado_en = COALESCE(creado_en, CURRENT_TIMESTAMP) WHERE actualizado_en IS NULL;
+                    ALTER TABLE actividad_personal ALTER COLUMN actualizado_en SET DEFAULT CURRENT_TIMESTAMP;
+                    ALTER TABLE actividad_personal ALTER COLUMN actualizado_en SET NOT NULL;
+
+                    ALTER TABLE actividad_comunidades ADD COLUMN IF NOT EXISTS actualizado_en TIMESTAMPTZ;
+                    UPDATE actividad_comunidades SET actualizado_en = COALESCE(creado_en, CURRENT_TIMESTAMP) WHERE actualizado_en IS NULL;
+                    ALTER TABLE actividad_comunidades ALTER COLUMN actualizado_en SET DEFAULT CURRENT_TIMESTAMP;
+                    ALTER TABLE actividad_comunidades ALTER COLUMN actualizado_en SET NOT NULL;
+
+                    DROP TRIGGER IF EXISTS trg_actividad_personal_timestamp ON actividad_personal;
+                    CREATE TRIGGER trg_actividad_personal_timestamp BEFORE UPDATE ON actividad_personal
+                        FOR EACH ROW EXECUTE FUNCTION actualizar_timestamp();
+
+                    DROP TRIGGER IF EXISTS trg_actividad_comunidades_timestamp ON actividad_comunidades;
+                    CREATE TRIGGER trg_actividad_comunidades_timestamp BEFORE UPDATE ON actividad_comunidades
+                        FOR EACH ROW EXECUTE FUNCTION actualizar_timestamp();
+
+                    -- Índices para la sincronización incremental por fecha de actualización
+                    CREATE INDEX IF NOT EXISTS idx_actividad_personal_actualizado ON actividad_personal (actualizado_en, id);
+                    CREATE INDEX IF NOT EXISTS idx_actividad_comunidades_actualizado ON actividad_comunidades (actualizado_en, id);
+                    """,
+                    reverse_sql="""
+                    DROP INDEX IF EXISTS idx_actividad_comunidades_actualizado;
+                    DROP INDEX IF EXISTS idx_actividad_personal_actualizado;
+                    DROP TRIGGER IF EXISTS trg_actividad_comunidades_timestamp ON actividad_comunidades;
+                    DROP TRIGGER IF EXISTS trg_actividad_personal_timestamp ON actividad_personal;
+                    ALTER TABLE actividad_comunidades DROP COLUMN IF EXISTS actualizado_en;
+                    ALTER TABLE actividad_personal DROP COLUMN IF EXISTS actualizado_en;
+                    """,
+                ),
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name='actividadpersonal',
+                    name='actualizado_en',
+                    field=models.DateTimeField(auto_now=True),
+                ),
+                migrations.AddField(
+                    model_name='actividadcomunidad',
+                    name='actualizado_en',
+                    field=models.DateTimeField(auto_now=True),
+                ),
+            ],
+        ),
+    ]
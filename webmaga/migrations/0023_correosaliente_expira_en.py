@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webmaga', '0022_actualizado_en_relaciones_actividad'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='correosaliente',
+            name='expira_en',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
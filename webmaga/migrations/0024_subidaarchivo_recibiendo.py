@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 22:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webmaga', '0023_correosaliente_expira_en'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subidaarchivo',
+            name='recibiendo_por',
+            field=models.UUIDField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='subidaarchivo',
+            name='recibiendo_hasta',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,7 +1,14 @@
 from django.db import models
 from django.utils import timezone
+import re
 import uuid
 
+
+def dpi_solo_digitos(valor):
+    """DPI normalizado que se guarda en las columnas *_normalizado (mismo criterio que el trigger)"""
+    digitos = re.sub(r'[^0-9]', '', valor or '')
+    return digitos or None
+
 # =====================================================
 # MODELOS BASE
 # =====================================================
@@ -126,6 +133,7 @@ class UsuarioFotoPerfil(models.Model):
     archivo_tipo = models.CharField(max_length=100, blank=True, null=True)
     archivo_tamanio = models.BigIntegerField(blank=True, null=True)
     url_almacenamiento = models.TextField()
+    variantes = models.JSONField(blank=True, null=True, editable=False)
     creado_en = models.DateTimeField(auto_now_add=True)
     actualizado_en = models.DateTimeField(auto_now=True)
     
@@ -391,6 +399,8 @@ class BeneficiarioIndividual(models.Model):
     apellido_casada = models.CharField(max_length=150, blank=True, null=True)
     comunidad_linguistica = models.CharField(max_length=100, blank=True, null=True)
     dpi = models.CharField(max_length=20, unique=True, blank=True, null=True)
+    # Solo dígitos del DPI; en PostgreSQL lo mantiene el trigger trg_beneficiarios_ind_dpi
+    dpi_normalizado = models.CharField(max_length=20, blank=True, null=True, editable=False)
     fecha_nacimiento = models.DateField(blank=True, null=True)
     genero = models.CharField(max_length=20, choices=GENERO_CHOICES, blank=True, null=True)
     telefono = models.CharField(max_length=20, blank=True, null=True)
@@ -401,6 +411,13 @@ class BeneficiarioIndividual(models.Model):
         db_table = 'beneficiarios_individuales'
         verbose_name = 'Beneficiario Individual'
         verbose_name_plural = 'Beneficiarios Individuales'
+        indexes = [
+            models.Index(fields=['dpi_normalizado'], name='idx_benef_ind_dpi_norm'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        self.dpi_normalizado = dpi_solo_digitos(self.dpi)
+        super().save(*args, **kwargs)
     
     def __str__(self):
         nombre_completo = f"{self.primer_nombre or self.nombre or ''} {self.primer_apellido or self.apellido or ''}".strip()
@@ -421,6 +438,7 @@ class BeneficiarioFoto(models.Model):
     archivo_tipo = models.CharField(max_length=100, blank=True, null=True)
     archivo_tamanio = models.BigIntegerField(blank=True, null=True)
     url_almacenamiento = models.TextField()
+    variantes = models.JSONField(blank=True, null=True, editable=False)
     creado_en = models.DateTimeField(auto_now_add=True)
     actualizado_en = models.DateTimeField(auto_now=True)
     
@@ -486,6 +504,8 @@ class BeneficiarioFamilia(models.Model):
     nombre_familia = models.CharField(max_length=150)
     jefe_familia = models.CharField(max_length=150)
     dpi_jefe_familia = models.CharField(max_length=20, unique=True, blank=True, null=True)
+    # Solo dígitos del DPI; en PostgreSQL lo mantiene el trigger trg_beneficiarios_fam_dpi
+    dpi_jefe_familia_normalizado = models.CharField(max_length=20, blank=True, null=True, editable=False)
     telefono = models.CharField(max_length=20, blank=True, null=True)
     numero_miembros = models.IntegerField(blank=True, null=True)
     creado_en = models.DateTimeField(auto_now_add=True)
@@ -495,6 +515,13 @@ class BeneficiarioFamilia(models.Model):
         db_table = 'beneficiarios_familias'
         verbose_name = 'Beneficiario Familia'
         verbose_name_plural = 'Beneficiarios Familias'
+        indexes = [
+            models.Index(fields=['dpi_jefe_familia_normalizado'], name='idx_benef_fam_dpi_norm'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        self.dpi_jefe_familia_normalizado = dpi_solo_digitos(self.dpi_jefe_familia)
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return self.nombre_familia
@@ -518,6 +545,8 @@ class BeneficiarioInstitucion(models.Model):
     tipo_institucion = models.CharField(max_length=50, choices=TIPO_INSTITUCION_CHOICES)
     representante_legal = models.CharField(max_length=150, blank=True, null=True)
     dpi_representante = models.CharField(max_length=20, blank=True, null=True)
+    # Solo dígitos del DPI; en PostgreSQL lo mantiene el trigger trg_beneficiarios_inst_dpi
+    dpi_representante_normalizado = models.CharField(max_length=20, blank=True, null=True, editable=False)
     telefono = models.CharField(max_length=20, blank=True, null=True)
     email = models.EmailField(max_length=100, blank=True, null=True)
     numero_beneficiarios_directos = models.IntegerField(blank=True, null=True)
@@ -528,6 +557,13 @@ class BeneficiarioInstitucion(models.Model):
         db_table = 'beneficiarios_instituciones'
         verbose_name = 'Beneficiario Institución'
         verbose_name_plural = 'Beneficiarios Instituciones'
+        indexes = [
+            models.Index(fields=['dpi_representante_normalizado'], name='idx_benef_inst_dpi_norm'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        self.dpi_representante_normalizado = dpi_solo_digitos(self.dpi_representante)
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return self.nombre_institucion
@@ -592,6 +628,7 @@ class ActividadPersonal(models.Model):
     colaborador = models.ForeignKey('Colaborador', on_delete=models.CASCADE, related_name='actividades_participacion', db_column='colaborador_id', null=True, blank=True)
     rol_en_actividad = models.CharField(max_length=50)
     creado_en = models.DateTimeField(auto_now_add=True)
+    actualizado_en = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'actividad_personal'
@@ -679,6 +716,7 @@ class ActividadComunidad(models.Model):
     comunidad = models.ForeignKey(Comunidad, on_delete=models.CASCADE, related_name='actividades_relacionadas', db_column='comunidad_id')
     region = models.ForeignKey(Region, on_delete=models.SET_NULL, null=True, blank=True, related_name='actividades_relacionadas', db_column='region_id')
     creado_en = models.DateTimeField(auto_now_add=True)
+    actualizado_en = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = 'actividad_comunidades'
@@ -721,6 +759,7 @@ class Evidencia(models.Model):
     archivo_tipo = models.CharField(max_length=100, blank=True, null=True)
     archivo_tamanio = models.BigIntegerField(blank=True, null=True)
     url_almacenamiento = models.TextField()
+    variantes = models.JSONField(blank=True, null=True, editable=False)
     descripcion = models.TextField(blank=True, null=True)
     es_imagen = models.BooleanField(default=True)
     creado_por = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True, related_name='evidencias_creadas', db_column='creado_por')
@@ -893,6 +932,7 @@ class EventosGaleria(models.Model):
     archivo_tipo = models.CharField(max_length=100, blank=True, null=True)
     archivo_tamanio = models.BigIntegerField(blank=True, null=True)
     url_almacenamiento = models.TextField()
+    variantes = models.JSONField(blank=True, null=True, editable=False)
     descripcion = models.TextField(blank=True, null=True)
     creado_por = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True, related_name='imagenes_galeria_creadas', db_column='creado_por')
     creado_en = models.DateTimeField(auto_now_add=True)
@@ -914,6 +954,7 @@ class ComunidadGaleria(models.Model):
     comunidad = models.ForeignKey(Comunidad, on_delete=models.CASCADE, related_name='galeria', db_column='comunidad_id')
     archivo_nombre = models.CharField(max_length=255)
     url_almacenamiento = models.TextField()
+    variantes = models.JSONField(blank=True, null=True, editable=False)
     descripcion = models.TextField(blank=True, null=True)
     creado_por = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True, db_column='creado_por')
     creado_en = models.DateTimeField(auto_now_add=True)
@@ -934,6 +975,7 @@ class RegionGaleria(models.Model):
     region = models.ForeignKey(Region, on_delete=models.CASCADE, related_name='galeria', db_column='region_id')
     archivo_nombre = models.CharField(max_length=255)
     url_almacenamiento = models.TextField()
+    variantes = models.JSONField(blank=True, null=True, editable=False)
     descripcion = models.TextField(blank=True, null=True)
     creado_por = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True, db_column='creado_por')
     creado_en = models.DateTimeField(auto_now_add=True)
@@ -1227,3 +1269,299 @@ class RecordatorioColaborador(models.Model):
 
     def __str__(self):
         return f"{self.colaborador} en {self.recordatorio}"
+
+
+# =====================================================
+# MODELOS DE EXPORTACIÓN DE REPORTES
+# =====================================================
+
+class ExportacionReporte(models.Model):
+    """Trabajos de exportación de reportes (PDF/Word) procesados en segundo plano"""
+
+    TIPO_CHOICES = [
+        ('reporte', 'Reporte general'),
+        ('beneficiarios', 'Reporte de beneficiarios'),
+    ]
+
+    FORMATO_CHOICES = [
+        ('pdf', 'PDF'),
+        ('word', 'Word'),
+    ]
+
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('completado', 'Completado'),
+        ('fallido', 'Fallido'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='exportaciones_reporte', db_column='usuario_id')
+    tipo_exportacion = models.CharField(max_length=20, choices=TIPO_CHOICES, default='reporte')
+    report_type = models.CharField(max_length=100, blank=True, null=True)
+    formato = models.CharField(max_length=10, choices=FORMATO_CHOICES, default='pdf')
+    parametros = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    intentos = models.IntegerField(default=0)
+    archivo_nombre = models.CharField(max_length=255, blank=True, null=True)
+    archivo_tipo = models.CharField(max_length=100, blank=True, null=True)
+    archivo_tamanio = models.BigIntegerField(blank=True, null=True)
+    ruta_archivo = models.TextField(blank=True, null=True)
+    error_mensaje = models.TextField(blank=True, null=True)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    iniciado_en = models.DateTimeField(blank=True, null=True)
+    completado_en = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'exportaciones_reporte'
+        verbose_name = 'Exportación de Reporte'
+        verbose_name_plural = 'Exportaciones de Reportes'
+        ordering = ['-creado_en']
+        indexes = [
+            models.Index(fields=['estado', 'creado_en']),
+            models.Index(fields=['usuario', 'creado_en']),
+        ]
+
+    def __str__(self):
+        return f"{self.report_type or self.tipo_exportacion} ({self.formato}) - {self.get_estado_display()}"
+
+
+# =====================================================
+# RESÚMENES DEL DASHBOARD
+# =====================================================
+
+class ResumenActividad(models.Model):
+    """
+    Conteo de actividades no eliminadas por mes, tipo, estado, comunidad y responsable.
+    La tabla la mantiene el trigger trg_actividades_resumen (migración 0013) en cada
+    INSERT/UPDATE/DELETE de actividades; desde Django solo se lee.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    mes = models.DateField()
+    tipo = models.ForeignKey(TipoActividad, on_delete=models.DO_NOTHING, related_name='+', db_column='tipo_id', db_constraint=False)
+    estado = models.CharField(max_length=50)
+    comunidad = models.ForeignKey(Comunidad, on_delete=models.DO_NOTHING, null=True, blank=True, related_name='+', db_column='comunidad_id', db_constraint=False)
+    responsable = models.ForeignKey(Usuario, on_delete=models.DO_NOTHING, null=True, blank=True, related_name='+', db_column='responsable_id', db_constraint=False)
+    total = models.IntegerField(default=0)
+    actualizado_en = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'resumen_actividades'
+        verbose_name = 'Resumen de Actividades'
+        verbose_name_plural = 'Resúmenes de Actividades'
+        managed = False
+
+    def __str__(self):
+        return f"{self.mes:%Y-%m} {self.estado}: {self.total}"
+
+
+# =====================================================
+# SINCRONIZACIÓN INCREMENTAL (PWA OFFLINE)
+# =====================================================
+
+class SyncEliminacion(models.Model):
+    """
+    Registro de filas eliminadas físicamente (DELETE) de las entidades que se sincronizan
+    con la PWA. Lo escribe la señal post_delete (webmaga/signals.py) y lo lee
+    api_sync_cambios para informar las eliminaciones desde el último cursor.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    entidad = models.CharField(max_length=50)
+    registro_id = models.CharField(max_length=64)
+    eliminado_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'sync_eliminaciones'
+        verbose_name = 'Eliminación sincronizable'
+        verbose_name_plural = 'Eliminaciones sincronizables'
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.entidad} {self.registro_id} ({self.eliminado_en:%Y-%m-%d %H:%M})"
+
+
+# =====================================================
+# CORREOS SALIENTES
+# =====================================================
+
+class CorreoSaliente(models.Model):
+    """
+    Bandeja de salida de correos. Las vistas registran el mensaje y responden de inmediato;
+    el comando procesar_correos los envía en lotes (webmaga/correo_saliente.py).
+    """
+
+    TIPO_CHOICES = [
+        ('recuperacion', 'Código de recuperación'),
+        ('password_actualizado', 'Contraseña actualizada'),
+        ('asistencia', 'Asistencia técnica'),
+    ]
+
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('enviando', 'Enviando'),
+        ('enviado', 'Enviado'),
+        ('fallido', 'Fallido'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tipo = models.CharField(max_length=30, choices=TIPO_CHOICES)
+    remitente = models.CharField(max_length=255)
+    destinatarios = models.JSONField(default=list)
+    asunto = models.CharField(max_length=255)
+    mensaje_texto = models.TextField()
+    mensaje_html = models.TextField(blank=True, null=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    intentos = models.IntegerField(default=0)
+    max_intentos = models.IntegerField(default=6)
+    siguiente_intento_en = models.DateTimeField(default=timezone.now)
+    # Después de esta fecha el contenido ya no sirve (p. ej. el código de recuperación venció)
+    expira_en = models.DateTimeField(blank=True, null=True)
+    error_mensaje = models.TextField(blank=True, null=True)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    enviado_en = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'correos_salientes'
+        verbose_name = 'Correo saliente'
+        verbose_name_plural = 'Correos salientes'
+        ordering = ['-creado_en']
+        indexes = [
+            models.Index(fields=['estado', 'siguiente_intento_en'], name='idx_correos_estado_siguiente'),
+        ]
+
+    def __str__(self):
+        return f"{self.asunto} ({self.get_estado_display()})"
+
+
+class ProcesamientoImagen(models.Model):
+    """
+    Compresión pendiente de una imagen subida. La vista guarda el original y responde; el comando
+    procesar_imagenes genera la versión optimizada y actualiza url_almacenamiento del registro
+    (webmaga/imagenes_diferidas.py).
+    """
+
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('completado', 'Completado'),
+        ('descartado', 'Descartado'),
+        ('fallido', 'Fallido'),
+    ]
+
+    TIPO_CHOICES = [
+        ('profile', 'Foto de perfil'),
+        ('gallery', 'Galería'),
+        ('evidence', 'Evidencia'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    modelo = models.CharField(max_length=100)
+    registro_id = models.CharField(max_length=64)
+    url_original = models.TextField()
+    url_optimizada = models.TextField(blank=True, null=True)
+    tipo_compresion = models.CharField(max_length=20, choices=TIPO_CHOICES, default='gallery')
+    tamanio_original = models.BigIntegerField(blank=True, null=True)
+    tamanio_optimizado = models.BigIntegerField(blank=True, null=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    intentos = models.IntegerField(default=0)
+    max_intentos = models.IntegerField(default=3)
+    error_mensaje = models.TextField(blank=True, null=True)
+    original_eliminado = models.BooleanField(default=False)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    iniciado_en = models.DateTimeField(blank=True, null=True)
+    completado_en = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'procesamiento_imagenes'
+        verbose_name = 'Procesamiento de imagen'
+        verbose_name_plural = 'Procesamiento de imágenes'
+        ordering = ['-creado_en']
+        indexes = [
+            models.Index(fields=['estado', 'creado_en'], name='idx_proc_imagenes_estado'),
+        ]
+
+    def __str__(self):
+        return f"{self.modelo} {self.registro_id} ({self.get_estado_display()})"
+
+
+class ArchivoBlob(models.Model):
+    """
+    Archivo subido guardado una sola vez por contenido (MEDIA_ROOT/blobs/<2>/<sha256>.<ext>).
+    `referencias` cuenta los registros cuyo url_almacenamiento apunta al archivo; al llegar a 0
+    lo elimina la recolección después de un tiempo de gracia (webmaga/almacen_archivos.py).
+    """
+
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    ruta = models.CharField(max_length=255)
+    tamanio = models.BigIntegerField()
+    referencias = models.IntegerField(default=0)
+    optimizado = models.BooleanField(default=False)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    sin_referencias_desde = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'archivos_blob'
+        verbose_name = 'Archivo almacenado'
+        verbose_name_plural = 'Archivos almacenados'
+        ordering = ['-creado_en']
+        indexes = [
+            models.Index(fields=['referencias', 'sin_referencias_desde'], name='idx_archivos_blob_referencias'),
+        ]
+
+    def __str__(self):
+        return f"{self.ruta} ({self.referencias} ref.)"
+
+
+class SubidaArchivo(models.Model):
+    """
+    Subida por partes (reanudable) de un archivo de evento, región o comunidad. Las partes se
+    escriben en orden sobre un archivo en disco; `recibido` indica desde qué byte continúa el
+    cliente tras un corte (webmaga/subidas_por_partes.py).
+    """
+
+    DESTINO_CHOICES = [
+        ('evento', 'Evento'),
+        ('region', 'Región'),
+        ('comunidad', 'Comunidad'),
+    ]
+
+    ESTADO_CHOICES = [
+        ('en_curso', 'En curso'),
+        ('completada', 'Completada'),
+        ('cancelada', 'Cancelada'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='subidas_archivos', db_column='usuario_id')
+    destino = models.CharField(max_length=20, choices=DESTINO_CHOICES)
+    objeto_id = models.UUIDField()
+    archivo_nombre = models.CharField(max_length=255)
+    archivo_tipo = models.CharField(max_length=100, blank=True, null=True)
+    ultima_modificacion = models.BigIntegerField(blank=True, null=True)
+    tamanio_total = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True, null=True)
+    recibido = models.BigIntegerField(default=0)
+    # Turno de la petición que está escribiendo una parte (ver recibir_parte)
+    recibiendo_por = models.UUIDField(blank=True, null=True)
+    recibiendo_hasta = models.DateTimeField(blank=True, null=True)
+    nombre = models.CharField(max_length=255, blank=True, null=True)
+    descripcion = models.TextField(blank=True, null=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='en_curso')
+    archivo_id = models.UUIDField(blank=True, null=True)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'subidas_archivos'
+        verbose_name = 'Subida por partes'
+        verbose_name_plural = 'Subidas por partes'
+        ordering = ['-creado_en']
+        indexes = [
+            models.Index(fields=['usuario', 'destino', 'objeto_id', 'estado'], name='idx_subidas_archivos_usuario'),
+            models.Index(fields=['estado', 'actualizado_en'], name='idx_subidas_archivos_estado'),
+        ]
+
+    def __str__(self):
+        return f"{self.archivo_nombre} ({self.recibido}/{self.tamanio_total})"
@@ -0,0 +1,396 @@
+"""
+Convertidor Word → PDF con instancias de LibreOffice precalentadas
+Mantiene un pool de procesos soffice en modo headless (escuchando en un socket UNO)
+para que cada conversión no pague el arranque en frío de LibreOffice.
+
+- Concurrencia acotada: cada instancia atiende una conversión a la vez; las demás esperan en cola.
+- Health check: un hilo monitor verifica periódicamente que cada proceso siga vivo y respondiendo.
+- Reinicio automático: instancias caídas, colgadas (timeout) o con demasiadas conversiones se reinician.
+
+Si el módulo `uno` de LibreOffice no está disponible en el intérprete, cada instancia conserva
+un perfil de usuario ya inicializado y la conversión se hace con `soffice --convert-to`,
+que sigue evitando la creación del perfil en cada PDF.
+"""
+import atexit
+import glob
+import logging
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from io import BytesIO
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _buscar_comando_libreoffice():
+    """Retorna la ruta del ejecutable de LibreOffice, o None si no está instalado"""
+    for cmd in ['soffice', 'libreoffice']:
+        ruta = shutil.which(cmd)
+        if ruta:
+            return ruta
+    return None
+
+
+def _importar_uno(comando):
+    """
+    Intenta importar el puente Python-UNO. Si no está en el intérprete actual,
+    prueba con la carpeta `program/` de la instalación de LibreOffice.
+    """
+    try:
+        import uno  # noqa: F401
+        return True
+    except ImportError:
+        pass
+
+    if not comando:
+        return False
+
+    ruta_real = os.path.realpath(comando)
+    candidatos = [os.path.dirname(ruta_real)]
+    candidatos += glob.glob(os.path.join(os.path.dirname(os.path.dirname(ruta_real)), 'lib', 'libreoffice', 'program'))
+    for carpeta in candidatos:
+        if os.path.exists(os.path.join(carpeta, 'uno.py')) and carpeta not in sys.path:
+            sys.path.append(carpeta)
+            try:
+                import uno  # noqa: F401
+                return True
+            except Exception:
+                sys.path.remove(carpeta)
+    return False
+
+
+def _puerto_libre():
+    """Obtiene un puerto TCP libre en localhost (evita choques entre procesos de Gunicorn/workers)"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class InstanciaLibreOffice:
+    """Un proceso soffice headless con su propio perfil de usuario"""
+
+    def __init__(self, indice, comando, usar_uno):
+        self.indice = indice
+        self.comando = comando
+        self.usar_uno = usar_uno
+        self.perfil_dir = os.path.join(settings.LIBREOFFICE_PROFILE_DIR, f'{os.getpid()}-{indice}')
+        self.puerto = None
+        self.proceso = None
+        self.perfil_listo = False
+        self.conversiones = 0
+        self.ultimo_uso = time.monotonic()
+        self.lock = threading.Lock()
+
+    @property
+    def perfil_url(self):
+        return 'file://' + os.path.abspath(self.perfil_dir).replace(os.sep, '/')
+
+    def iniciar(self):
+        """Arranca el proceso (modo UNO) o inicializa el perfil (modo --convert-to)"""
+        os.makedirs(self.perfil_dir, exist_ok=True)
+
+        if not self.usar_uno:
+            if not self.perfil_listo:
+                subprocess.run([
+                    self.comando,
+                    f'-env:UserInstallation={self.perfil_url}',
+                    '--headless', '--norestore', '--nologo', '--terminate_after_init',
+                ], capture_output=True, timeout=settings.LIBREOFFICE_CONVERSION_TIMEOUT)
+                self.perfil_listo = True
+            self.conversiones = 0
+            return
+
+        self.puerto = _puerto_libre()
+        self.proceso = subprocess.Popen([
+            self.comando,
+            f'-env:UserInstallation={self.perfil_url}',
+            '--headless', '--invisible', '--nologo', '--norestore', '--nodefault', '--nolockcheck',
+            f'--accept=socket,host=127.0.0.1,port={self.puerto};urp;StarOffice.ComponentContext',
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.conversiones = 0
+
+        # Esperar a que el socket UNO acepte conexiones
+        limite = time.monotonic() + settings.LIBREOFFICE_CONVERSION_TIMEOUT
+        while time.monotonic() < limite:
+            if self.proceso.poll() is not None:
+                raise RuntimeError(f'LibreOffice terminó al iniciar (código {self.proceso.returncode})')
+            if self._socket_responde():
+                logger.info("Instancia LibreOffice %s lista en el puerto %s", self.indice, self.puerto)
+                return
+            time.sleep(0.25)
+        self.detener()
+        raise RuntimeError('LibreOffice no respondió a tiempo al iniciar')
+
+    def detener(self):
+        """Termina el proceso soffice si está corriendo"""
+        if self.proceso is not None:
+            try:
+                self.proceso.terminate()
+                self.proceso.wait(timeout=10)
+            except Exception:
+                try:
+                    self.proceso.kill()
+                except Exception:
+                    pass
+            self.proceso = None
+
+    def reiniciar(self):
+        logger.warning("Reiniciando instancia LibreOffice %s", self.indice)
+        self.detener()
+        self.iniciar()
+
+    def _socket_responde(self):
+        if not self.puerto:
+            return False
+        try:
+            with socket.create_connection(('127.0.0.1', self.puerto), timeout=1):
+                return True
+        except OSError:
+            return False
+
+    def esta_viva(self):
+        """Health check: el proceso sigue corriendo y el socket UNO acepta conexiones"""
+        if not self.usar_uno:
+            return self.perfil_listo
+        return self.proceso is not None and self.proceso.poll() is None and self._socket_responde()
+
+    def convertir(self, ruta_docx, ruta_pdf):
+        """Convierte un archivo .docx a .pdf usando esta instancia"""
+        self.ultimo_uso = time.monotonic()
+        if self.usar_uno:
+            self._convertir_uno(ruta_docx, ruta_pdf)
+        else:
+            self._convertir_subproceso(ruta_docx, ruta_pdf)
+        self.conversiones += 1
+
+    def _convertir_subproceso(self, ruta_docx, ruta_pdf):
+        subprocess.run([
+            self.comando,
+            f'-env:UserInstallation={self.perfil_url}',
+            '--headless', '--norestore', '--nologo',
+            '--convert-to', 'pdf',
+            '--outdir', os.path.dirname(ruta_pdf),
+            ruta_docx,
+        ], check=True, capture_output=True, timeout=settings.LIBREOFFICE_CONVERSION_TIMEOUT)
+
+    def _convertir_uno(self, ruta_docx, ruta_pdf):
+        resultado = {}
+
+        def _ejecutar():
+            try:
+                import uno
+                from com.sun.star.beans import PropertyValue
+
+                def _propiedad(nombre, valor):
+                    p = PropertyValue()
+                    p.Name = nombre
+                    p.Value = valor
+                    return p
+
+                local = uno.getComponentContext()
+                resolver = local.ServiceManager.createInstanceWithContext('com.sun.star.bridge.UnoUrlResolver', local)
+                contexto = resolver.resolve(
+                    f'uno:socket,host=127.0.0.1,port={self.puerto};urp;StarOffice.ComponentContext'
+                )
+                desktop = contexto.ServiceManager.createInstanceWithContext('com.sun.star.frame.Desktop', contexto)
+                documento = desktop.loadComponentFromURL(
+                    uno.systemPathToFileUrl(os.path.abspath(ruta_docx)), '_blank', 0, (_propiedad('Hidden', True),)
+                )
+                try:
+                    documento.storeToURL(
+                        uno.systemPathToFileUrl(os.path.abspath(ruta_pdf)),
+                        (_propiedad('FilterName', 'writer_pdf_Export'),)
+                    )
+                finally:
+                    documento.close(True)
+            except Exception as e:
+                resultado['error'] = e
+
+        hilo = threading.Thread(target=_ejecutar, daemon=True)
+        hilo.start()
+        hilo.join(settings.LIBREOFFICE_CONVERSION_TIMEOUT)
+        if hilo.is_alive():
+            # Instancia colgada: al matar el proceso la llamada UNO pendiente termina con error
+            self.detener()
+            raise TimeoutError('La conversión con LibreOffice excedió el tiempo límite')
+        if 'error' in resultado:
+            raise resultado['error']
+
+
+class PoolLibreOffice:
+    """Pool de instancias LibreOffice con cola de conversiones y monitor de salud"""
+
+    def __init__(self, tamanio, comando, usar_uno):
+        self.comando = comando
+        self.usar_uno = usar_uno
+        self.instancias = [InstanciaLibreOffice(i, comando, usar_uno) for i in range(tamanio)]
+        self.disponibles = queue.Queue()
+        for instancia in self.instancias:
+            self.disponibles.put(instancia)
+        self._detenido = threading.Event()
+        self._monitor = threading.Thread(target=self._monitorear, name='libreoffice-monitor', daemon=True)
+        self._monitor.start()
+
+    def _asegurar_activa(self, instancia):
+        if not instancia.esta_viva():
+            if instancia.proceso is not None or instancia.perfil_listo:
+                instancia.reiniciar()
+            else:
+                instancia.iniciar()
+        elif instancia.conversiones >= settings.LIBREOFFICE_MAX_CONVERSIONES:
+            # Reciclar periódicamente para liberar memoria acumulada por soffice
+            instancia.reiniciar()
+
+    def convertir(self, ruta_docx, ruta_pdf):
+        """Espera una instancia libre (concurrencia acotada al tamaño del pool) y convierte"""
+        try:
+            instancia = self.disponibles.get(timeout=settings.LIBREOFFICE_QUEUE_TIMEOUT)
+        except queue.Empty:
+            raise TimeoutError('No hay instancias de LibreOffice disponibles en este momento')
+
+        try:
+            with instancia.lock:
+                self._asegurar_activa(instancia)
+                try:
+                    instancia.convertir(ruta_docx, ruta_pdf)
+                except (TimeoutError, subprocess.TimeoutExpired):
+                    # Un documento que cuelga la conversión no se reintenta; la instancia
+                    # se vuelve a iniciar en el siguiente uso
+                    instancia.detener()
+                    raise
+                except Exception:
+                    # Reintentar una vez con la instancia reiniciada
+                    logger.exception("Falló la conversión en la instancia %s, reintentando", instancia.indice)
+                    instancia.reiniciar()
+                    instancia.convertir(ruta_docx, ruta_pdf)
+        finally:
+            self.disponibles.put(instancia)
+
+    def precalentar(self):
+        """Inicia todas las instancias por adelantado"""
+        for instancia in self.instancias:
+            with instancia.lock:
+                try:
+                    self._asegurar_activa(instancia)
+                except Exception:
+                    logger.exception("No se pudo precalentar la instancia LibreOffice %s", instancia.indice)
+
+    def estado(self):
+        """Resumen del estado del pool (para diagnóstico)"""
+        return {
+            'modo': 'uno' if self.usar_uno else 'convert-to',
+            'instancias': [
+                {
+                    'indice': inst.indice,
+                    'viva': inst.esta_viva(),
+                    'puerto': inst.puerto,
+                    'conversiones': inst.conversiones,
+                }
+                for inst in self.instancias
+            ],
+            'disponibles': self.disponibles.qsize(),
+        }
+
+    def _monitorear(self):
+        """Health check periódico: reinicia instancias caídas y apaga las inactivas"""
+        while not self._detenido.wait(settings.LIBREOFFICE_HEALTHCHECK_SECONDS):
+            if not self.usar_uno:
+                continue
+            for instancia in self.instancias:
+                # Si está ocupada convirtiendo, se revisará en la siguiente vuelta
+                if not instancia.lock.acquire(blocking=False):
+                    continue
+                try:
+                    if instancia.proceso is None:
+                        continue
+                    inactiva = time.monotonic() - instancia.ultimo_uso > settings.LIBREOFFICE_IDLE_SECONDS
+                    if inactiva:
+                        logger.info("Apagando instancia LibreOffice %s por inactividad", instancia.indice)
+                        instancia.detener()
+                    elif not instancia.esta_viva():
+                        instancia.reiniciar()
+                except Exception:
+                    logger.exception("Error en el health check de LibreOffice (instancia %s)", instancia.indice)
+                finally:
+                    instancia.lock.release()
+
+    def detener(self):
+        self._detenido.set()
+        for instancia in self.instancias:
+            instancia.detener()
+            shutil.rmtree(instancia.perfil_dir, ignore_errors=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def obtener_pool():
+    """Retorna el pool del proceso actual (se crea en el primer uso), o None sin LibreOffice"""
+    global _pool
+    if _pool is not None:
+        return _pool
+    with _pool_lock:
+        if _pool is None:
+            comando = _buscar_comando_libreoffice()
+            if not comando:
+                return None
+            usar_uno = _importar_uno(comando)
+            _pool = PoolLibreOffice(settings.LIBREOFFICE_POOL_SIZE, comando, usar_uno)
+            atexit.register(_pool.detener)
+            logger.info(
+                "Pool LibreOffice creado: %s instancia(s), modo=%s",
+                settings.LIBREOFFICE_POOL_SIZE,
+                'uno' if usar_uno else 'convert-to',
+            )
+    return _pool
+
+
+def precalentar_convertidor():
+    """Arranca las instancias antes de la primera conversión (usado por los workers)"""
+    pool = obtener_pool()
+    if pool is not None:
+        pool.precalentar()
+    return pool
+
+
+def convertir_docx_a_pdf(contenido_docx, nombre_base='reporte'):
+    """
+    Convierte el contenido de un .docx a PDF con el pool de LibreOffice.
+    Retorna un BytesIO con el PDF, o None si LibreOffice no está disponible o falló.
+    """
+    pool = obtener_pool()
+    if pool is None:
+        return None
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        ruta_docx = os.path.join(temp_dir, f'{nombre_base}.docx')
+        ruta_pdf = os.path.join(temp_dir, f'{nombre_base}.pdf')
+        with open(ruta_docx, 'wb') as f:
+            f.write(contenido_docx)
+
+        print("🔄 Convirtiendo Word a PDF con LibreOffice (pool)...")
+        pool.convertir(ruta_docx, ruta_pdf)
+
+        if not os.path.exists(ruta_pdf):
+            return None
+        pdf_file = BytesIO()
+        with open(ruta_pdf, 'rb') as f:
+            pdf_file.write(f.read())
+        pdf_file.seek(0)
+        print("✅ PDF generado exitosamente desde Word (LibreOffice)")
+        return pdf_file
+    except Exception as e:
+        print(f"⚠️ LibreOffice no disponible o falló: {e}")
+        return None
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
@@ -0,0 +1,270 @@
+"""
+Programador de recordatorios (rueda de tiempo en memoria)
+Los endpoints de recordatorios (pendientes, check-background, notificaciones y el canal SSE)
+responden desde una instantánea en memoria en lugar de consultar la tabla en cada petición:
+
+- La instantánea contiene los recordatorios que todavía pueden notificarse: con notificación
+  activa, due_at dentro de la ventana de 15 minutos o futuro, y no enviados (o con "recordar").
+  Se carga con una consulta y se comparte entre procesos a través de la caché (SQLite), con la
+  versión de recordatorios como etiqueta; un proceso solo vuelve a la base de datos cuando la
+  versión cambió y nadie guardó todavía la instantánea nueva.
+- Cada destinatario (colaborador del usuario o, si no tiene, el usuario creador) tiene sus
+  recordatorios ordenados por due_at y una rueda de ranuras de RESOLUCION_SEGUNDOS, así
+  "qué vence ahora" revisa solo las ranuras de la ventana sin importar cuántos haya.
+- Crear, modificar o eliminar recordatorios incrementa la versión (señales y vistas SQL).
+- Marcar como enviado se refleja de inmediato en memoria y se guarda en la BD en lotes
+  (un UPDATE cada RETRASO_ENVIADOS segundos para todas las marcas acumuladas).
+"""
+import atexit
+import bisect
+import logging
+import threading
+from datetime import timedelta
+
+import pytz
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Prefetch, Q
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from .models import Recordatorio, RecordatorioColaborador
+from .schema_registry import tiene_columna
+
+logger = logging.getLogger(__name__)
+
+CLAVE_VERSION = 'recordatorios:version'
+CLAVE_INSTANTANEA = 'recordatorios:instantanea'
+VENTANA_SEGUNDOS = 15 * 60  # Un recordatorio se sigue notificando hasta 15 minutos después de su hora
+RESOLUCION_SEGUNDOS = 60  # Tamaño de cada ranura de la rueda
+RETRASO_ENVIADOS = 2  # Segundos que se acumulan las marcas de "enviado" antes de guardarlas
+
+ZONA_GUATEMALA = pytz.timezone('America/Guatemala')
+
+
+def version_actual():
+    return cache.get(CLAVE_VERSION, 0)
+
+
+def invalidar():
+    """Avisar a todos los procesos que los recordatorios cambiaron"""
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        cache.add(CLAVE_VERSION, 1, None)
+
+
+def destinatario(usuario_maga):
+    """Clave de los recordatorios que recibe el usuario: su colaborador o, si no tiene, él mismo como creador"""
+    colaborador = getattr(usuario_maga, 'colaborador', None)
+    if colaborador:
+        return ('colaborador', str(colaborador.id))
+    return ('usuario', str(usuario_maga.id))
+
+
+def _cargar_instantanea(ahora):
+    """Recordatorios que todavía se pueden notificar, como diccionarios (se guardan en la caché)"""
+    recordatorios = Recordatorio.objects.filter(
+        enviar_notificacion=True,
+        due_at__gte=ahora - timedelta(seconds=VENTANA_SEGUNDOS),
+    ).select_related('actividad').prefetch_related(
+        Prefetch('colaboradores', queryset=RecordatorioColaborador.objects.select_related(
+            'colaborador'
+        ).order_by('colaborador__nombre'))
+    ).order_by('due_at')
+    if tiene_columna('recordatorios', 'recordar'):
+        recordatorios = recordatorios.annotate(
+            recordar=RawSQL('COALESCE(recordatorios.recordar, FALSE)', [])
+        ).filter(Q(enviado=False) | Q(enviado__isnull=True) | Q(recordar=True))
+    else:
+        recordatorios = recordatorios.filter(Q(enviado=False) | Q(enviado__isnull=True))
+
+    filas = []
+    for r in recordatorios:
+        owners = [rc.colaborador.nombre for rc in r.colaboradores.all()]
+        filas.append({
+            'id': str(r.id),
+            'titulo': r.titulo,
+            'descripcion': r.descripcion,
+            'due_at': r.due_at,
+            'recordar': bool(getattr(r, 'recordar', False)),
+            'enviado': bool(r.enviado),
+            'evento_nombre': r.actividad.nombre if r.actividad else None,
+            'owners_text': ', '.join(owners) if owners else 'Sin personal asignado',
+            'colaboradores': [str(rc.colaborador_id) for rc in r.colaboradores.all()],
+            'creado_por': str(r.created_by_id) if r.created_by_id else None,
+        })
+    return filas
+
+
+class _Indice:
+    """Recordatorios de la instantánea indexados por destinatario"""
+
+    def __init__(self, filas):
+        self.por_id = {}
+        self.ordenados = {}  # clave -> recordatorios ordenados por due_at
+        self.fechas = {}  # clave -> due_at de los ordenados (para bisect)
+        self.ranuras = {}  # clave -> {ranura: [recordatorios]}
+        for fila in filas:
+            self.por_id[fila['id']] = fila
+            claves = [('colaborador', c) for c in fila['colaboradores']]
+            if fila['creado_por']:
+                claves.append(('usuario', fila['creado_por']))
+            ranura = int(fila['due_at'].timestamp() // RESOLUCION_SEGUNDOS)
+            for clave in claves:
+                self.ordenados.setdefault(clave, []).append(fila)
+                self.ranuras.setdefault(clave, {}).setdefault(ranura, []).append(fila)
+        for clave, lista in self.ordenados.items():
+            lista.sort(key=lambda f: f['due_at'])
+            self.fechas[clave] = [f['due_at'] for f in lista]
+
+
+class ProgramadorRecordatorios:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._indice = _Indice([])
+        self._enviados = set()
+        self._temporizador = None
+
+    def _actual(self, ahora):
+        version = version_actual()
+        with self._lock:
+            if version == self._version:
+                return self._indice
+        guardada = cache.get(CLAVE_INSTANTANEA)
+        if guardada and guardada[0] == version:
+            filas = guardada[1]
+        else:
+            filas = _cargar_instantanea(ahora)
+            cache.set(CLAVE_INSTANTANEA, (version, filas), None)
+        indice = _Indice(filas)
+        with self._lock:
+            # Las marcas de enviado que aún no se guardan siguen valiendo
+            for id_recordatorio in self._enviados:
+                if id_recordatorio in indice.por_id:
+                    indice.por_id[id_recordatorio]['enviado'] = True
+            self._version, self._indice = version, indice
+        return indice
+
+    def _ventana(self, indice, clave, ahora):
+        """Recordatorios del destinatario con due_at en la ventana (ahora - 15 min, ahora]"""
+        ranuras = indice.ranuras.get(clave)
+        if not ranuras:
+            return []
+        desde = ahora - timedelta(seconds=VENTANA_SEGUNDOS)
+        primera = int(desde.timestamp() // RESOLUCION_SEGUNDOS)
+        ultima = int(ahora.timestamp() // RESOLUCION_SEGUNDOS)
+        encontrados = []
+        for ranura in range(primera, ultima + 1):
+            encontrados.extend(f for f in ranuras.get(ranura, ()) if desde <= f['due_at'] <= ahora)
+        encontrados.sort(key=lambda f: f['due_at'])
+        return encontrados
+
+    def pendientes(self, clave, ahora, incluir_futuros=True):
+        """
+        Recordatorios a notificar (misma regla que la consulta original de los endpoints):
+        futuros no enviados y, dentro de los 15 minutos posteriores, los que tienen "recordar".
+        Con incluir_futuros=False solo los que ya vencieron (check-background).
+        """
+        indice = self._actual(ahora)
+        resultado = [f for f in self._ventana(indice, clave, ahora) if f['recordar'] or (f['due_at'] == ahora and not f['enviado'])]
+        if incluir_futuros:
+            ordenados = indice.ordenados.get(clave, [])
+            inicio = bisect.bisect_right(indice.fechas.get(clave, []), ahora)
+            resultado.extend(f for f in ordenados[inicio:] if not f['enviado'])
+        return resultado
+
+    def vencidos(self, clave, ahora):
+        """Recordatorios ya vencidos dentro de la ventana y todavía no enviados (canal SSE)"""
+        return [f for f in self._ventana(self._actual(ahora), clave, ahora) if not f['enviado']]
+
+    def proximo(self, clave, ahora):
+        """Fecha del siguiente recordatorio no enviado que vence después de ahora (None si no hay)"""
+        indice = self._actual(ahora)
+        ordenados = indice.ordenados.get(clave, [])
+        for fila in ordenados[bisect.bisect_right(indice.fechas.get(clave, []), ahora):]:
+            if not fila['enviado']:
+                return fila['due_at']
+        return None
+
+    def hay_vencidos(self, clave, desde, hasta):
+        """¿Algún recordatorio no enviado del destinatario vence en (desde, hasta]?"""
+        indice = self._actual(hasta)
+        fechas = indice.fechas.get(clave, [])
+        ordenados = indice.ordenados.get(clave, [])
+        return any(
+            not f['enviado']
+            for f in ordenados[bisect.bisect_right(fechas, desde):bisect.bisect_right(fechas, hasta)]
+        )
+
+    def pertenece(self, id_recordatorio, clave):
+        """True/False si el recordatorio está en la instantánea; None si no está (hay que ir a la BD)"""
+        fila = self._actual(timezone.now()).por_id.get(str(id_recordatorio))
+        if fila is None:
+            return None
+        tipo, identificador = clave
+        if tipo == 'colaborador':
+            return identificador in fila['colaboradores']
+        return fila['creado_por'] == identificador
+
+    def marcar_enviado(self, id_recordatorio):
+        """Marca el recordatorio como enviado; el UPDATE se hace en lote unos segundos después"""
+        id_recordatorio = str(id_recordatorio)
+        with self._lock:
+            fila = self._indice.por_id.get(id_recordatorio)
+            if fila is not None:
+                fila['enviado'] = True
+            self._enviados.add(id_recordatorio)
+            if self._temporizador is None:
+                self._temporizador = threading.Timer(RETRASO_ENVIADOS, self._guardar_en_hilo)
+                self._temporizador.daemon = True
+                self._temporizador.start()
+
+    def _guardar_en_hilo(self):
+        try:
+            self.guardar_enviados()
+        finally:
+            connections.close_all()
+
+    def guardar_enviados(self):
+        """Guarda en un solo UPDATE las marcas de enviado acumuladas"""
+        with self._lock:
+            ids, self._enviados = self._enviados, set()
+            if self._temporizador is not None:
+                self._temporizador.cancel()
+                self._temporizador = None
+        if not ids:
+            return
+        try:
+            Recordatorio.objects.filter(id__in=ids).update(enviado=True)
+        except Exception:
+            logger.error('No se pudieron guardar %s recordatorios enviados', len(ids), exc_info=True)
+            with self._lock:
+                self._enviados |= ids
+            return
+        invalidar()
+
+
+def formatear(fila, ahora):
+    """Formato de respuesta de los endpoints de recordatorios (hora de Guatemala)"""
+    due_at = fila['due_at'].astimezone(ZONA_GUATEMALA)
+    return {
+        'id': fila['id'],
+        'titulo': fila['titulo'] or 'Recordatorio',
+        'descripcion': fila['descripcion'] or '',
+        'due_at': due_at.isoformat(),
+        'due_at_timestamp': int(due_at.timestamp() * 1000),  # En milisegundos
+        'tiempo_restante_segundos': int((due_at - ahora).total_seconds()),
+        'recordar': fila['recordar'],
+        'evento_nombre': fila['evento_nombre'] or 'Sin evento',
+        'fecha': due_at.strftime('%d/%m/%Y'),
+        'hora': due_at.strftime('%H:%M'),
+        'owners_text': fila['owners_text'],
+        'enviado': fila['enviado'],
+    }
+
+
+programador = ProgramadorRecordatorios()
+atexit.register(programador.guardar_enviados)
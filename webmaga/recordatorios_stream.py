@@ -0,0 +1,29 @@
+"""
+Entrega de recordatorios por Server-Sent Events (api_reminders_stream)
+En lugar de que el Service Worker consulte api_reminders_check_background cada 30 segundos,
+abre una conexión a /api/reminders/stream/ y el servidor envía los recordatorios cuando vencen.
+
+- Los vencimientos salen del programador en memoria (webmaga/recordatorios_programador.py),
+  que solo vuelve a la base de datos cuando cambia la versión de recordatorios.
+- Mientras no vence nada, una conexión abierta solo lee la versión de la caché cada
+  INTERVALO_REVISION segundos: no hay consultas a la base de datos.
+- Bajo ASGI (config/asgi.py) la conexión queda abierta hasta DURACION_MAXIMA. Bajo WSGI
+  (Gunicorn síncrono) se responde una sola vez y el campo retry de SSE indica al cliente
+  cuándo reconectar (al siguiente vencimiento, con un máximo de INTERVALO_RECONEXION_WSGI).
+"""
+from .recordatorios_programador import formatear, programador
+
+INTERVALO_REVISION = 30  # Segundos entre lecturas de la versión (y comentarios keep-alive)
+DURACION_MAXIMA = 10 * 60  # El cliente reconecta después de este tiempo
+INTERVALO_RECONEXION_WSGI = 60
+
+
+def recordatorios_vencidos(clave, ahora):
+    """Recordatorios vencidos y no enviados, con el formato de api_reminders_check_background"""
+    return [formatear(fila, ahora) for fila in programador.vencidos(clave, ahora)]
+
+
+def segundos_hasta(fecha, ahora, maximo):
+    if fecha is None:
+        return maximo
+    return max(0.0, min(maximo, (fecha - ahora).total_seconds()))
@@ -0,0 +1,216 @@
+"""
+Caché en disco de archivos de reportes generados (PDF/Word)
+Cada archivo se identifica por un hash SHA-256 del tipo de reporte, los filtros normalizados,
+el formato y un sello de versión de los datos (marcas, versiones y conteos de todas las tablas
+que leen los reportes). Cuando los datos cambian el sello cambia, por lo que las
+entradas viejas dejan de usarse solas y terminan eliminadas por el desalojo LRU por tamaño.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# Parámetros que son conjuntos de IDs/valores: el orden en que llegan no cambia el reporte
+PARAMETROS_CONJUNTO = {
+    'region', 'comunidad', 'comunidades', 'estado', 'tipo_actividad', 'tipo_beneficiario',
+    'evento', 'eventos', 'colaboradores', 'usuarios', 'proyectos',
+}
+
+# Parámetros que no afectan el contenido del archivo
+PARAMETROS_IGNORADOS = {'formato', '_', 't', 'csrfmiddlewaretoken'}
+
+
+def _carpeta_cache():
+    carpeta = os.path.join(str(settings.REPORT_STORAGE_ROOT), settings.REPORT_CACHE_DIR)
+    os.makedirs(carpeta, exist_ok=True)
+    return carpeta
+
+
+def normalizar_filtros(parametros):
+    """
+    Normaliza los filtros de un reporte para que combinaciones equivalentes
+    (orden distinto, espacios, valores vacíos) produzcan la misma clave.
+    """
+    normalizados = {}
+    for key, valor in (parametros or {}).items():
+        if key in PARAMETROS_IGNORADOS:
+            continue
+        valores = valor if isinstance(valor, list) else [valor]
+        partes = []
+        for v in valores:
+            if v is None:
+                continue
+            partes.extend(p.strip() for p in str(v).split(','))
+        partes = [p for p in partes if p]
+        if not partes:
+            continue
+        if key in PARAMETROS_CONJUNTO:
+            partes = sorted(set(partes))
+        normalizados[key] = partes
+    return normalizados
+
+
+# Tablas que leen los reportes y expresiones (marca, suma) de su sello. Las tablas con
+# actualizado_en (mantenido por trigger) usan esa fecha; las que solo tienen creado_en suman
+# hashtext de la fila completa para detectar también una edición. De usuarios solo interesan
+# los datos que muestran los reportes: su actualizado_en cambia con cada login
+SELLO_TABLAS = [
+    ('actividades', 'MAX(actualizado_en)', 'SUM(version)'),
+    ('beneficiarios', 'MAX(actualizado_en)', 'SUM(version)'),
+    ('comunidades', 'MAX(actualizado_en)', 'SUM(version)'),
+    ('actividad_beneficiarios', 'MAX(COALESCE(fecha_reinscripcion, creado_en))', 'SUM(version)'),
+    ('actividad_comunidades', 'MAX(actualizado_en)', None),
+    ('actividad_personal', 'MAX(actualizado_en)', None),
+    ('beneficiarios_individuales', 'MAX(actualizado_en)', None),
+    ('beneficiarios_familias', 'MAX(actualizado_en)', None),
+    ('beneficiarios_instituciones', 'MAX(actualizado_en)', None),
+    ('colaboradores', 'MAX(actualizado_en)', None),
+    ('puestos', 'MAX(actualizado_en)', None),
+    ('regiones', 'MAX(actualizado_en)', None),
+    ('tipos_actividad', 'MAX(actualizado_en)', None),
+    ('actividad_cambios', 'MAX(creado_en)', 'SUM(hashtext(t::text)::bigint)'),
+    ('eventos_cambios_colaboradores', 'MAX(creado_en)', 'SUM(hashtext(t::text)::bigint)'),
+    ('eventos_evidencias_cambios', 'MAX(creado_en)', 'SUM(hashtext(t::text)::bigint)'),
+    ('cambio_evidencias', 'MAX(creado_en)', 'SUM(hashtext(t::text)::bigint)'),
+    ('evidencias', 'MAX(creado_en)', 'SUM(hashtext(t::text)::bigint)'),
+    ('usuarios', 'NULL', "SUM(hashtext(concat_ws('|', id, username, nombre, email, puesto_id, activo))::bigint)"),
+]
+
+
+def sello_version_datos():
+    """
+    Sello que cambia cada vez que se inserta, actualiza o elimina una fila de las tablas que
+    leen los reportes (SELLO_TABLAS, una sola consulta agregada).
+    """
+    consulta = '\nUNION ALL\n'.join(
+        f"SELECT '{tabla}', {marca}, {suma or 'NULL'}, COUNT(*) FROM {tabla} t"
+        for tabla, marca, suma in SELLO_TABLAS
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(consulta)
+        filas = cursor.fetchall()
+    return '|'.join(
+        f"{tabla}:{maximo.isoformat() if hasattr(maximo, 'isoformat') else maximo}:{suma or 0}:{total}"
+        for tabla, maximo, suma, total in filas
+    )
+
+
+def clave_reporte(tipo_exportacion, report_type, formato, parametros, sello=None):
+    """Clave de contenido (SHA-256) de un archivo de reporte"""
+    material = {
+        'tipo': tipo_exportacion,
+        'report_type': report_type,
+        'formato': formato,
+        'filtros': normalizar_filtros(parametros),
+        'datos': sello if sello is not None else sello_version_datos(),
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _rutas(clave):
+    carpeta = _carpeta_cache()
+    return os.path.join(carpeta, f'{clave}.bin'), os.path.join(carpeta, f'{clave}.json')
+
+
+def obtener(clave):
+    """
+    Busca un archivo en caché. Retorna un dict con 'ruta', 'ruta_relativa', 'archivo_nombre',
+    'content_type' y 'tamanio', o None si no existe o expiró.
+    """
+    if not settings.REPORT_CACHE_ENABLED:
+        return None
+
+    ruta_archivo, ruta_meta = _rutas(clave)
+    try:
+        with open(ruta_meta, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        estadistica = os.stat(ruta_archivo)
+    except (OSError, ValueError):
+        return None
+
+    if time.time() - meta.get('creado_en', 0) > settings.REPORT_CACHE_MAX_AGE_SECONDS:
+        _eliminar_entrada(clave)
+        return None
+
+    # Marcar como usado recientemente (el mtime es el reloj del LRU)
+    try:
+        os.utime(ruta_archivo, None)
+    except OSError:
+        pass
+
+    meta['ruta'] = ruta_archivo
+    meta['ruta_relativa'] = f"{settings.REPORT_CACHE_DIR}/{clave}.bin"
+    meta['tamanio'] = estadistica.st_size
+    return meta
+
+
+def guardar(clave, contenido, archivo_nombre, content_type, registros=None):
+    """Guarda un archivo generado en la caché y aplica el desalojo LRU por tamaño"""
+    if not settings.REPORT_CACHE_ENABLED:
+        return None
+
+    ruta_archivo, ruta_meta = _rutas(clave)
+    meta = {
+        'archivo_nombre': archivo_nombre,
+        'content_type': content_type,
+        'registros': registros,
+        'creado_en': time.time(),
+    }
+    try:
+        # Escritura atómica: temporal + rename, el metadato se escribe al final
+        with open(f'{ruta_archivo}.tmp', 'wb') as f:
+            f.write(contenido)
+        os.replace(f'{ruta_archivo}.tmp', ruta_archivo)
+        with open(f'{ruta_meta}.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(f'{ruta_meta}.tmp', ruta_meta)
+    except OSError as e:
+        logger.warning("No se pudo guardar el reporte en caché (%s): %s", clave, e)
+        return None
+
+    desalojar()
+    return obtener(clave)
+
+
+def _eliminar_entrada(clave):
+    for ruta in _rutas(clave):
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+
+def desalojar(max_bytes=None):
+    """Elimina los archivos usados menos recientemente hasta quedar bajo el tamaño máximo"""
+    max_bytes = settings.REPORT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    carpeta = _carpeta_cache()
+    entradas = []
+    total = 0
+    for nombre in os.listdir(carpeta):
+        if not nombre.endswith('.bin'):
+            continue
+        try:
+            estadistica = os.stat(os.path.join(carpeta, nombre))
+        except OSError:
+            continue
+        entradas.append((estadistica.st_mtime, estadistica.st_size, nombre[:-4]))
+        total += estadistica.st_size
+
+    if total <= max_bytes:
+        return 0
+
+    eliminadas = 0
+    for _, tamanio, clave in sorted(entradas):
+        if total <= max_bytes:
+            break
+        _eliminar_entrada(clave)
+        total -= tamanio
+        eliminadas += 1
+    logger.info("Caché de reportes: %s archivo(s) desalojados", eliminadas)
+    return eliminadas
@@ -19,6 +19,8 @@ from docx.oxml.ns import qn
 from docx.oxml import OxmlElement
 from io import BytesIO
 
+from .pdf_converter import convertir_docx_a_pdf
+
 # Intentar importar xhtml2pdf (compatible con Windows)
 try:
     from xhtml2pdf import pisa
@@ -445,58 +447,11 @@ def generate_pdf_report(report_type, report_data, filters_info=None):
             print(f"⚠️ docx2pdf no disponible o falló: {e}")
             pass
         
-        # MÉTODO 2: Intentar conversión con LibreOffice (Linux/Mac)
-        try:
-            import subprocess
-            import tempfile
-            import shutil
-            
-            # Verificar si libreoffice está disponible
-            libreoffice_cmd = None
-            for cmd in ['libreoffice', 'soffice']:
-                if shutil.which(cmd):
-                    libreoffice_cmd = cmd
-                    break
-            
-            if libreoffice_cmd:
-                print("🔄 Convirtiendo Word a PDF con LibreOffice...")
-                
-                # Crear directorio temporal
-                temp_dir = tempfile.mkdtemp()
-                temp_word_path = os.path.join(temp_dir, 'reporte.docx')
-                
-                # Guardar Word en archivo temporal
-                with open(temp_word_path, 'wb') as f:
-                    f.write(word_buffer.read())
-                
-                # Convertir con LibreOffice en modo headless
-                subprocess.run([
-                    libreoffice_cmd,
-                    '--headless',
-                    '--convert-to', 'pdf',
-                    '--outdir', temp_dir,
-                    temp_word_path
-                ], check=True, capture_output=True, timeout=30)
-                
-                # Leer el PDF generado
-                pdf_path = os.path.join(temp_dir, 'reporte.pdf')
-                if os.path.exists(pdf_path):
-                    pdf_file = BytesIO()
-                    with open(pdf_path, 'rb') as f:
-                        pdf_file.write(f.read())
-                    
-                    # Limpiar directorio temporal
-                    try:
-                        shutil.rmtree(temp_dir)
-                    except:
-                        pass
-                    
-                    pdf_file.seek(0)
-                    print("✅ PDF generado exitosamente desde Word (LibreOffice)")
-                    return pdf_file
-        except Exception as e:
-            print(f"⚠️ LibreOffice no disponible o falló: {e}")
-            pass
+        # MÉTODO 2: Conversión con el pool de LibreOffice precalentado (Linux/Mac)
+        word_buffer.seek(0)
+        pdf_file = convertir_docx_a_pdf(word_buffer.read(), 'reporte')
+        if pdf_file is not None:
+            return pdf_file
         
         # MÉTODO 3: Fallback a WeasyPrint si está disponible
         if WEASYPRINT_AVAILABLE:
@@ -3128,58 +3083,10 @@ def generate_pdf_report_beneficiarios(report_data):
         word_content = word_buffer.read()
         word_buffer.seek(0)
         
-        # MÉTODO 1: Intentar conversión con LibreOffice (Linux/Mac)
-        try:
-            import subprocess
-            import tempfile
-            import shutil
-            
-            # Verificar si libreoffice está disponible
-            libreoffice_cmd = None
-            for cmd in ['libreoffice', 'soffice']:
-                if shutil.which(cmd):
-                    libreoffice_cmd = cmd
-                    break
-            
-            if libreoffice_cmd:
-                print("🔄 Convirtiendo Word a PDF con LibreOffice...")
-                
-                # Crear directorio temporal
-                temp_dir = tempfile.mkdtemp()
-                temp_word_path = os.path.join(temp_dir, 'reporte_beneficiarios.docx')
-                
-                # Guardar Word en archivo temporal usando el contenido guardado
-                with open(temp_word_path, 'wb') as f:
-                    f.write(word_content)
-                
-                # Convertir con LibreOffice en modo headless
-                subprocess.run([
-                    libreoffice_cmd,
-                    '--headless',
-                    '--convert-to', 'pdf',
-                    '--outdir', temp_dir,
-                    temp_word_path
-                ], check=True, capture_output=True, timeout=60)
-                
-                # Leer el PDF generado
-                pdf_path = os.path.join(temp_dir, 'reporte_beneficiarios.pdf')
-                if os.path.exists(pdf_path):
-                    pdf_file = BytesIO()
-                    with open(pdf_path, 'rb') as f:
-                        pdf_file.write(f.read())
-                    
-                    # Limpiar directorio temporal
-                    try:
-                        shutil.rmtree(temp_dir)
-                    except:
-                        pass
-                    
-                    pdf_file.seek(0)
-                    print("✅ PDF generado exitosamente desde Word (LibreOffice)")
-                    return pdf_file
-        except Exception as e:
-            print(f"⚠️ LibreOffice no disponible o falló: {e}")
-            pass
+        # MÉTODO 1: Conversión con el pool de LibreOffice precalentado (Linux/Mac)
+        pdf_file = convertir_docx_a_pdf(word_content, 'reporte_beneficiarios')
+        if pdf_file is not None:
+            return pdf_file
         
         # MÉTODO 2: Intentar conversión con docx2pdf (Windows)
         try:
@@ -3555,58 +3462,10 @@ def generate_pdf_comparison(comparison_data):
         word_content = word_buffer.read()
         word_buffer.close()  # Cerrar el buffer original
         
-        # MÉTODO 1: Intentar conversión con LibreOffice (Linux/Mac)
-        try:
-            import subprocess
-            import tempfile
-            import shutil
-            
-            # Verificar si libreoffice está disponible
-            libreoffice_cmd = None
-            for cmd in ['libreoffice', 'soffice']:
-                if shutil.which(cmd):
-                    libreoffice_cmd = cmd
-                    break
-            
-            if libreoffice_cmd:
-                print("🔄 Convirtiendo Word a PDF con LibreOffice...")
-                
-                # Crear directorio temporal
-                temp_dir = tempfile.mkdtemp()
-                temp_word_path = os.path.join(temp_dir, 'comparativa_beneficiarios.docx')
-                
-                # Guardar Word en archivo temporal usando el contenido guardado
-                with open(temp_word_path, 'wb') as f:
-                    f.write(word_content)
-                
-                # Convertir con LibreOffice en modo headless
-                subprocess.run([
-                    libreoffice_cmd,
-                    '--headless',
-                    '--convert-to', 'pdf',
-                    '--outdir', temp_dir,
-                    temp_word_path
-                ], check=True, capture_output=True, timeout=60)
-                
-                # Leer el PDF generado
-                pdf_path = os.path.join(temp_dir, 'comparativa_beneficiarios.pdf')
-                if os.path.exists(pdf_path):
-                    pdf_file = BytesIO()
-                    with open(pdf_path, 'rb') as f:
-                        pdf_file.write(f.read())
-                    
-                    # Limpiar directorio temporal
-                    try:
-                        shutil.rmtree(temp_dir)
-                    except:
-                        pass
-                    
-                    pdf_file.seek(0)
-                    print("✅ PDF generado exitosamente desde Word (LibreOffice)")
-                    return pdf_file
-        except Exception as e:
-            print(f"⚠️ LibreOffice no disponible o falló: {e}")
-            pass
+        # MÉTODO 1: Conversión con el pool de LibreOffice precalentado (Linux/Mac)
+        pdf_file = convertir_docx_a_pdf(word_content, 'comparativa_beneficiarios')
+        if pdf_file is not None:
+            return pdf_file
         
         # MÉTODO 2: Intentar conversión con docx2pdf (Windows)
         try:
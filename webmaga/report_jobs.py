@@ -0,0 +1,308 @@
+"""
+Cola de exportación de reportes en segundo plano
+Los endpoints registran un trabajo en la tabla exportaciones_reporte y el comando
+`python manage.py procesar_exportaciones` genera el archivo fuera del ciclo de la petición,
+de modo que un PDF grande no bloquea un worker de Gunicorn ni alcanza su timeout.
+"""
+import logging
+import os
+import re
+import shutil
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.db import transaction
+from django.db.models import Q
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+
+from .models import ExportacionReporte
+
+logger = logging.getLogger(__name__)
+
+
+def _carpeta_exportaciones():
+    """Ruta absoluta de la carpeta donde se guardan los archivos generados"""
+    carpeta = os.path.join(str(settings.REPORT_STORAGE_ROOT), settings.REPORT_EXPORT_DIR)
+    os.makedirs(carpeta, exist_ok=True)
+    return carpeta
+
+
+def parametros_desde_querydict(querydict, excluir=('formato',)):
+    """Convierte un QueryDict en un dict serializable (listas solo cuando hay varios valores)"""
+    parametros = {}
+    for key in querydict.keys():
+        if key in excluir:
+            continue
+        valores = querydict.getlist(key)
+        parametros[key] = valores if len(valores) > 1 else (valores[0] if valores else '')
+    return parametros
+
+
+def encolar_exportacion(usuario_maga, tipo_exportacion, formato, parametros, report_type=None):
+    """Registra un nuevo trabajo de exportación pendiente y lo retorna"""
+    return ExportacionReporte.objects.create(
+        usuario=usuario_maga,
+        tipo_exportacion=tipo_exportacion,
+        report_type=report_type,
+        formato=formato,
+        parametros=parametros or {},
+    )
+
+
+def serializar_exportacion(trabajo):
+    """Representación JSON del estado de un trabajo de exportación"""
+    data = {
+        'id': str(trabajo.id),
+        'tipo_exportacion': trabajo.tipo_exportacion,
+        'report_type': trabajo.report_type,
+        'formato': trabajo.formato,
+        'estado': trabajo.estado,
+        'intentos': trabajo.intentos,
+        'creado_en': trabajo.creado_en.isoformat() if trabajo.creado_en else None,
+        'iniciado_en': trabajo.iniciado_en.isoformat() if trabajo.iniciado_en else None,
+        'completado_en': trabajo.completado_en.isoformat() if trabajo.completado_en else None,
+        'archivo_nombre': trabajo.archivo_nombre,
+        'archivo_tamanio': trabajo.archivo_tamanio,
+        'error': trabajo.error_mensaje if trabajo.estado == 'fallido' else None,
+        'download_url': None,
+    }
+    if trabajo.estado == 'completado':
+        data['download_url'] = f'/api/exportaciones/{trabajo.id}/descargar/'
+    return data
+
+
+def _construir_request(trabajo):
+    """
+    Construye una petición GET equivalente a la que hizo el usuario, para reutilizar
+    las mismas vistas de exportación síncronas desde el worker.
+    """
+    user = User.objects.filter(username=trabajo.usuario.username).first()
+    if user is None:
+        raise Exception(f'No existe el usuario de Django para {trabajo.usuario.username}')
+
+    query = QueryDict(mutable=True)
+    for key, valor in (trabajo.parametros or {}).items():
+        if isinstance(valor, list):
+            query.setlist(key, [str(v) for v in valor])
+        elif valor is not None:
+            query[key] = str(valor)
+    query['formato'] = trabajo.formato
+
+    request = HttpRequest()
+    request.method = 'GET'
+    request.GET = query
+    request.user = user
+    request.path = (
+        f'/api/reportes/exportar/{trabajo.report_type}/'
+        if trabajo.tipo_exportacion == 'reporte'
+        else '/api/beneficiarios/exportar-reporte/'
+    )
+    request.META = {
+        'REMOTE_ADDR': '127.0.0.1',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'HTTP_HOST': 'localhost',
+        'QUERY_STRING': query.urlencode(),
+    }
+    # Los decoradores de permisos usan django.contrib.messages al rechazar la petición
+    request._messages = CookieStorage(request)
+    return request
+
+
+def _generar_respuesta(trabajo):
+    """Ejecuta la vista de exportación correspondiente y retorna su HttpResponse"""
+    # Importación diferida para evitar dependencias circulares con views.py
+    from . import views
+
+    request = _construir_request(trabajo)
+    if trabajo.tipo_exportacion == 'beneficiarios':
+        return views.api_exportar_reporte_beneficiarios(request)
+    return views.api_exportar_reporte(request, trabajo.report_type)
+
+
+def _nombre_desde_respuesta(response, trabajo):
+    """Extrae el nombre de archivo del header Content-Disposition"""
+    disposition = response.get('Content-Disposition', '')
+    match = re.search(r'filename="?([^";]+)"?', disposition)
+    if match:
+        return match.group(1)
+    extension = 'pdf' if trabajo.formato == 'pdf' else 'docx'
+    return f"reporte_{trabajo.report_type or trabajo.tipo_exportacion}.{extension}"
+
+
+def _marcar_abandonados_agotados(limite_abandono):
+    """
+    Marca como fallidos los trabajos abandonados en 'procesando' que ya usaron todos sus
+    intentos: ningún worker los vuelve a reclamar y la limpieza no los borra, así que sin
+    esto el cliente que consulta su estado esperaría para siempre.
+    """
+    return (
+        ExportacionReporte.objects
+        .filter(
+            estado='procesando',
+            iniciado_en__lt=limite_abandono,
+            intentos__gte=settings.REPORT_EXPORT_MAX_INTENTOS,
+        )
+        .update(
+            estado='fallido',
+            error_mensaje='El proceso de exportación se interrumpió y se agotaron los intentos',
+            completado_en=timezone.now(),
+        )
+    )
+
+
+def _reclamar_siguiente_trabajo():
+    """
+    Toma el siguiente trabajo pendiente (o abandonado por un worker caído) y lo marca
+    como 'procesando'. SKIP LOCKED permite ejecutar varios workers en paralelo.
+    """
+    limite_abandono = timezone.now() - timedelta(minutes=settings.REPORT_EXPORT_TIMEOUT_MINUTES)
+    _marcar_abandonados_agotados(limite_abandono)
+    with transaction.atomic():
+        trabajo = (
+            ExportacionReporte.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                Q(estado='pendiente') |
+                Q(estado='procesando', iniciado_en__lt=limite_abandono)
+            )
+            .filter(intentos__lt=settings.REPORT_EXPORT_MAX_INTENTOS)
+            .order_by('creado_en')
+            .first()
+        )
+        if trabajo is None:
+            return None
+        trabajo.estado = 'procesando'
+        trabajo.intentos += 1
+        trabajo.iniciado_en = timezone.now()
+        trabajo.save(update_fields=['estado', 'intentos', 'iniciado_en'])
+    return trabajo
+
+
+def _ruta_destino(trabajo, archivo_nombre):
+    """Rutas (relativa a REPORT_STORAGE_ROOT y absoluta) del archivo de un trabajo"""
+    extension = os.path.splitext(archivo_nombre)[1] or ('.pdf' if trabajo.formato == 'pdf' else '.docx')
+    ruta_relativa = f"{settings.REPORT_EXPORT_DIR}/{trabajo.id}{extension}"
+    ruta_absoluta = os.path.join(_carpeta_exportaciones(), f"{trabajo.id}{extension}")
+    return ruta_relativa, ruta_absoluta
+
+
+def _marcar_completado(trabajo, archivo_nombre, content_type, tamanio, ruta_relativa):
+    trabajo.estado = 'completado'
+    trabajo.archivo_nombre = archivo_nombre
+    trabajo.archivo_tipo = (content_type or '').split(';')[0].strip() or None
+    trabajo.archivo_tamanio = tamanio
+    trabajo.ruta_archivo = ruta_relativa
+    trabajo.error_mensaje = None
+    trabajo.completado_en = timezone.now()
+    trabajo.save(update_fields=[
+        'estado', 'archivo_nombre', 'archivo_tipo', 'archivo_tamanio',
+        'ruta_archivo', 'error_mensaje', 'completado_en',
+    ])
+
+
+def completar_desde_cache(trabajo, entrada):
+    """
+    Completa un trabajo con un archivo que ya está en la caché de reportes, sin pasar por la cola.
+    Se usa un enlace duro (o una copia) para que el desalojo de la caché no afecte la descarga.
+    """
+    ruta_relativa, ruta_absoluta = _ruta_destino(trabajo, entrada['archivo_nombre'])
+    try:
+        os.link(entrada['ruta'], ruta_absoluta)
+    except OSError:
+        shutil.copyfile(entrada['ruta'], ruta_absoluta)
+    trabajo.iniciado_en = timezone.now()
+    trabajo.save(update_fields=['iniciado_en'])
+    _marcar_completado(
+        trabajo, entrada['archivo_nombre'], entrada['content_type'], entrada['tamanio'], ruta_relativa
+    )
+    return trabajo
+
+
+def ejecutar_exportacion(trabajo):
+    """Genera el archivo de un trabajo ya reclamado y actualiza su estado"""
+    try:
+        response = _generar_respuesta(trabajo)
+        content_type = response.get('Content-Type', '')
+        if response.status_code != 200 or 'application/json' in content_type:
+            try:
+                import json
+                detalle = json.loads(response.content.decode('utf-8')).get('error')
+            except Exception:
+                detalle = None
+            raise Exception(detalle or f'La exportación respondió con estado {response.status_code}')
+
+        archivo_nombre = _nombre_desde_respuesta(response, trabajo)
+        ruta_relativa, ruta_absoluta = _ruta_destino(trabajo, archivo_nombre)
+
+        # Escribir en un temporal y renombrar para que la descarga nunca vea un archivo a medias
+        ruta_temporal = f"{ruta_absoluta}.tmp"
+        tamanio = 0
+        try:
+            with open(ruta_temporal, 'wb') as f:
+                # Las respuestas servidas desde la caché de reportes son FileResponse (streaming)
+                partes = response.streaming_content if response.streaming else [response.content]
+                for parte in partes:
+                    f.write(parte)
+                    tamanio += len(parte)
+        finally:
+            response.close()
+        os.replace(ruta_temporal, ruta_absoluta)
+
+        _marcar_completado(trabajo, archivo_nombre, content_type, tamanio, ruta_relativa)
+        logger.info(
+            "Exportación completada: id=%s, tipo=%s, formato=%s, tamaño=%s bytes",
+            trabajo.id, trabajo.report_type or trabajo.tipo_exportacion, trabajo.formato, tamanio,
+        )
+        return True
+    except Exception as e:
+        logger.exception("Error al procesar la exportación %s", trabajo.id)
+        # Si aún quedan intentos, el trabajo vuelve a la cola
+        agotado = trabajo.intentos >= settings.REPORT_EXPORT_MAX_INTENTOS
+        trabajo.estado = 'fallido' if agotado else 'pendiente'
+        trabajo.error_mensaje = str(e)
+        trabajo.completado_en = timezone.now() if agotado else None
+        trabajo.save(update_fields=['estado', 'error_mensaje', 'completado_en'])
+        return False
+
+
+def procesar_siguiente_exportacion():
+    """
+    Procesa un trabajo de la cola.
+    Retorna None si no había trabajos, o True/False según el resultado.
+    """
+    trabajo = _reclamar_siguiente_trabajo()
+    if trabajo is None:
+        return None
+    return ejecutar_exportacion(trabajo)
+
+
+def ruta_absoluta_exportacion(trabajo):
+    """Ruta en disco del archivo generado, o None si no existe"""
+    if not trabajo.ruta_archivo:
+        return None
+    raiz = os.path.normpath(str(settings.REPORT_STORAGE_ROOT))
+    ruta = os.path.normpath(os.path.join(raiz, trabajo.ruta_archivo))
+    if not ruta.startswith(raiz + os.sep) or not os.path.exists(ruta):
+        return None
+    return ruta
+
+
+def limpiar_exportaciones_antiguas():
+    """Elimina registros y archivos de exportaciones más antiguas que la retención configurada"""
+    limite = timezone.now() - timedelta(hours=settings.REPORT_EXPORT_RETENTION_HOURS)
+    antiguas = ExportacionReporte.objects.filter(creado_en__lt=limite).exclude(estado='procesando')
+    eliminadas = 0
+    for trabajo in antiguas.iterator():
+        ruta = ruta_absoluta_exportacion(trabajo)
+        if ruta:
+            try:
+                os.remove(ruta)
+            except OSError as e:
+                logger.warning("No se pudo eliminar el archivo %s: %s", ruta, e)
+        trabajo.delete()
+        eliminadas += 1
+    return eliminadas
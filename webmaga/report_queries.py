@@ -0,0 +1,1379 @@
+"""
+Capa de datos de los reportes
+Contiene la lectura de filtros y las consultas de cada tipo de reporte, compartidas por
+api_generar_reporte (JSON para el frontend) y api_exportar_reporte (PDF/Word).
+Cada reporte se resuelve con un número fijo de consultas SQL: las agregaciones se hacen con
+GROUP BY sobre la unión de la comunidad directa de la actividad (actividades.comunidad_id) y
+las comunidades relacionadas (actividad_comunidades), en lugar de consultar por cada fila.
+"""
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, time
+
+from django.db import connection
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .models import (
+    Actividad, ActividadBeneficiario, ActividadCambio, ActividadComunidad,
+    Beneficiario, Colaborador, Comunidad, EventoCambioColaborador, EventosEvidenciasCambios,
+    Region, TipoActividad, TipoBeneficiario, Usuario,
+)
+
+
+class ReporteError(Exception):
+    """Error de validación de un reporte (se responde con el status indicado)"""
+
+    def __init__(self, mensaje, status=400):
+        super().__init__(mensaje)
+        self.mensaje = mensaje
+        self.status = status
+
+
+# =====================================================
+# FILTROS
+# =====================================================
+
+def _lista_param(querydict, nombre):
+    """Valores separados por coma de un parámetro, sin espacios ni vacíos"""
+    valor = querydict.get(nombre, '')
+    if not valor:
+        return []
+    return [v.strip() for v in valor.split(',') if v.strip()]
+
+
+def filtros_desde_querydict(querydict):
+    """Lee los filtros de reportes desde request.GET (mismos nombres que usa el frontend)"""
+    return {
+        'fecha_inicio': querydict.get('fecha_inicio'),
+        'fecha_fin': querydict.get('fecha_fin'),
+        'periodo': querydict.get('periodo', 'todo'),
+        'region_ids': _lista_param(querydict, 'region'),
+        'comunidad_ids': _lista_param(querydict, 'comunidad'),
+        'estados': _lista_param(querydict, 'estado'),
+        'tipo_actividad': _lista_param(querydict, 'tipo_actividad'),
+        'responsable_id': querydict.get('responsable'),
+        'tipo_beneficiario': _lista_param(querydict, 'tipo_beneficiario'),
+        'agrupar_por': querydict.get('agrupar_por', 'region'),  # 'region' o 'comunidad'
+        'comunidades': _lista_param(querydict, 'comunidades'),
+        'evento': querydict.get('evento'),
+        'eventos_seleccionados': _lista_param(querydict, 'evento'),
+        'eventos': _lista_param(querydict, 'eventos'),
+        'colaboradores': _lista_param(querydict, 'colaboradores'),
+        'usuarios': _lista_param(querydict, 'usuarios'),
+        'apartados': _lista_param(querydict, 'apartados'),
+        'mostrar_evidencias': querydict.get('mostrar_evidencias', 'true').lower() == 'true',
+    }
+
+
+def descripcion_filtros(filtros):
+    """Texto de filtros aplicados que se imprime en los reportes exportados"""
+    partes = []
+    if filtros['fecha_inicio']:
+        partes.append(f"Desde: {filtros['fecha_inicio']}")
+    if filtros['fecha_fin']:
+        partes.append(f"Hasta: {filtros['fecha_fin']}")
+    if filtros['estados']:
+        partes.append(f"Estados: {', '.join(filtros['estados'])}")
+    if filtros['tipo_actividad']:
+        partes.append(f"Tipos: {', '.join(filtros['tipo_actividad'])}")
+    if filtros['comunidades']:
+        partes.append(f"Comunidades: {len(filtros['comunidades'])} seleccionadas")
+    if filtros['eventos_seleccionados']:
+        partes.append(f"Eventos: {len(filtros['eventos_seleccionados'])} seleccionados")
+    return ' | '.join(partes) if partes else 'Sin filtros aplicados'
+
+
+def _rango_periodo(filtros):
+    """Fechas (datetime aware) del período seleccionado, o (None, None) para 'todo el tiempo'"""
+    periodo = filtros['periodo']
+    if periodo == 'ultimo_mes':
+        return timezone.now() - timedelta(days=30), timezone.now()
+    if periodo == 'ultima_semana':
+        return timezone.now() - timedelta(days=7), timezone.now()
+    if periodo == 'rango' and filtros['fecha_inicio'] and filtros['fecha_fin']:
+        try:
+            inicio = datetime.strptime(filtros['fecha_inicio'], '%Y-%m-%d')
+            # Para fecha_fin, usar el final del día (23:59:59.999999)
+            fin = datetime.combine(datetime.strptime(filtros['fecha_fin'], '%Y-%m-%d').date(), time.max)
+            if timezone.is_naive(inicio):
+                inicio = timezone.make_aware(inicio)
+            if timezone.is_naive(fin):
+                fin = timezone.make_aware(fin)
+            return inicio, fin
+        except ValueError:
+            return None, None
+    return None, None
+
+
+def _filtrar_tipo_actividad(queryset, tipos_nombres, campo='tipo_id'):
+    """
+    Filtra por los tipos de actividad seleccionados. Si ninguno coincide con un tipo activo
+    no se aplica el filtro (se muestran TODOS los tipos).
+    """
+    if not tipos_nombres:
+        return queryset
+    tipo_ids = list(TipoActividad.objects.filter(nombre__in=tipos_nombres, activo=True).values_list('id', flat=True))
+    if tipo_ids:
+        queryset = queryset.filter(**{f'{campo}__in': tipo_ids})
+    return queryset
+
+
+def filtrar_por_comunidades(actividades, comunidades_ids):
+    """Actividades cuya comunidad directa o alguna comunidad relacionada (M2M) está en el filtro"""
+    if not comunidades_ids:
+        return actividades
+    return actividades.filter(
+        Q(comunidad_id__in=comunidades_ids) |
+        Q(id__in=ActividadComunidad.objects.filter(comunidad_id__in=comunidades_ids).values('actividad_id'))
+    )
+
+
+def _ids_tipos_beneficiario(tipos_nombres):
+    """
+    Mapea los valores del frontend ('individual', 'familia', 'institucion', 'otro') a IDs de
+    tipos_beneficiario. La base de datos usa 'institución' con tilde; 'otro' no existe.
+    """
+    tipos_bd = {nombre.lower(): tipo_id for tipo_id, nombre in TipoBeneficiario.objects.values_list('id', 'nombre')}
+    tipo_ids = set()
+    for nombre in tipos_nombres:
+        nombre = nombre.strip().lower()
+        if nombre == 'institucion':
+            nombre = 'institución'
+        if nombre in tipos_bd:
+            tipo_ids.add(tipos_bd[nombre])
+    return list(tipo_ids)
+
+
+def _uuid(valor):
+    """Normaliza IDs leídos con SQL crudo (UUID en PostgreSQL, texto en otros motores)"""
+    return valor if isinstance(valor, uuid.UUID) else uuid.UUID(str(valor))
+
+
+def _fecha_guatemala(fecha):
+    """Fecha/hora en formato dd/mm/YYYY HH:MM en la zona horaria de Guatemala"""
+    if not fecha:
+        return ''
+    import pytz
+    guatemala_tz = pytz.timezone('America/Guatemala')
+    if timezone.is_aware(fecha):
+        fecha_local = fecha.astimezone(guatemala_tz)
+    else:
+        fecha_local = timezone.make_aware(fecha, guatemala_tz)
+    return fecha_local.strftime('%d/%m/%Y %H:%M')
+
+
+def _nombre_beneficiario(beneficiario):
+    """Nombre visible del beneficiario (requiere select_related de individual/familia/institucion)"""
+    if hasattr(beneficiario, 'individual'):
+        return f"{beneficiario.individual.nombre} {beneficiario.individual.apellido}".strip()
+    if hasattr(beneficiario, 'familia'):
+        return beneficiario.familia.nombre_familia
+    if hasattr(beneficiario, 'institucion'):
+        return beneficiario.institucion.nombre_institucion
+    return ''
+
+
+def actividades_filtradas(filtros, report_type=None):
+    """Query base de actividades no eliminadas con los filtros generales aplicados"""
+    actividades = Actividad.objects.filter(eliminado_en__isnull=True)
+
+    # Si no se proporcionan fechas (período "todo_el_tiempo"), NO aplicar filtros de fecha
+    if filtros['fecha_inicio'] and filtros['fecha_inicio'].strip():
+        actividades = actividades.filter(fecha__gte=filtros['fecha_inicio'])
+    if filtros['fecha_fin'] and filtros['fecha_fin'].strip():
+        actividades = actividades.filter(fecha__lte=filtros['fecha_fin'])
+
+    # Para 'actividades-por-region-comunidad' la ubicación se filtra con 'comunidades',
+    # considerando también las comunidades relacionadas (M2M)
+    if report_type != 'actividades-por-region-comunidad':
+        if filtros['region_ids']:
+            actividades = actividades.filter(comunidad__region_id__in=filtros['region_ids'])
+        if filtros['comunidad_ids']:
+            actividades = actividades.filter(comunidad_id__in=filtros['comunidad_ids'])
+
+    if filtros['estados']:
+        actividades = actividades.filter(estado__in=filtros['estados'])
+
+    actividades = _filtrar_tipo_actividad(actividades, filtros['tipo_actividad'])
+
+    if filtros['responsable_id']:
+        actividades = actividades.filter(responsable_id=filtros['responsable_id'])
+    if filtros['eventos_seleccionados']:
+        actividades = actividades.filter(id__in=filtros['eventos_seleccionados'])
+    return actividades
+
+
+# =====================================================
+# ACTIVIDADES POR REGIÓN O COMUNIDAD
+# =====================================================
+
+# Pares (actividad, grupo) según la agrupación: comunidad directa + comunidades relacionadas,
+# o región de la comunidad directa + región de la relación + región de la comunidad relacionada
+_SQL_GRUPOS = {
+    'comunidad': """
+        SELECT a.id AS actividad_id, a.comunidad_id AS grupo_id
+        FROM actividades a
+        WHERE a.id IN (SELECT id FROM act) AND a.comunidad_id IS NOT NULL
+        UNION
+        SELECT ac.actividad_id, ac.comunidad_id
+        FROM actividad_comunidades ac
+        WHERE ac.actividad_id IN (SELECT id FROM act)
+    """,
+    'region': """
+        SELECT a.id AS actividad_id, c.region_id AS grupo_id
+        FROM actividades a JOIN comunidades c ON c.id = a.comunidad_id
+        WHERE a.id IN (SELECT id FROM act) AND c.region_id IS NOT NULL
+        UNION
+        SELECT ac.actividad_id, ac.region_id
+        FROM actividad_comunidades ac
+        WHERE ac.actividad_id IN (SELECT id FROM act) AND ac.region_id IS NOT NULL
+        UNION
+        SELECT ac.actividad_id, cm.region_id
+        FROM actividad_comunidades ac JOIN comunidades cm ON cm.id = ac.comunidad_id
+        WHERE ac.actividad_id IN (SELECT id FROM act) AND cm.region_id IS NOT NULL
+    """,
+}
+
+# Grupo al que pertenece un beneficiario (para los beneficiarios "exclusivos")
+_SQL_GRUPO_BENEFICIARIO = {
+    'comunidad': 'b.comunidad_id',
+    'region': 'bc.region_id',
+}
+
+_SQL_CONTEOS_BENEFICIARIOS = """
+    COUNT(DISTINCT ab.beneficiario_id),
+    COUNT(DISTINCT CASE WHEN tb.nombre = 'individual' THEN ab.beneficiario_id END),
+    COUNT(DISTINCT CASE WHEN tb.nombre = 'familia' THEN ab.beneficiario_id END),
+    COUNT(DISTINCT CASE WHEN tb.nombre = 'institución' THEN ab.beneficiario_id END)
+"""
+
+_SQL_JOIN_BENEFICIARIOS = """
+    JOIN actividad_beneficiarios ab ON ab.actividad_id = {actividad}
+    JOIN beneficiarios b ON b.id = ab.beneficiario_id
+    LEFT JOIN tipos_beneficiario tb ON tb.id = b.tipo_id
+    LEFT JOIN comunidades bc ON bc.id = b.comunidad_id
+"""
+
+
+def _grupos_y_conteos(actividades, agrupar_por):
+    """
+    Ejecuta en dos consultas:
+    - los pares (actividad, grupo) de la agrupación
+    - los conteos de beneficiarios (distintos) por grupo, para todas las actividades
+      y para las actividades sin grupo, con GROUP BY
+    Retorna (pares, conteos) donde conteos tiene las claves grupo_id, 'todas' y 'sin_grupo'.
+    """
+    act_sql, act_params = actividades.values('id').query.sql_with_params()
+    cte = f"WITH act AS ({act_sql}), grupos AS ({_SQL_GRUPOS[agrupar_por]})"
+    grupo_beneficiario = _SQL_GRUPO_BENEFICIARIO[agrupar_por]
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"{cte} SELECT actividad_id, grupo_id FROM grupos", act_params)
+        pares = [(_uuid(actividad_id), _uuid(grupo_id)) for actividad_id, grupo_id in cursor.fetchall()]
+
+        cursor.execute(f"""
+            {cte}
+            SELECT 'grupo', g.grupo_id, {_SQL_CONTEOS_BENEFICIARIOS},
+                COUNT(DISTINCT CASE WHEN tb.nombre = 'individual' AND {grupo_beneficiario} = g.grupo_id
+                      THEN ab.beneficiario_id END)
+            FROM grupos g {_SQL_JOIN_BENEFICIARIOS.format(actividad='g.actividad_id')}
+            GROUP BY g.grupo_id
+            UNION ALL
+            SELECT 'todas', NULL, {_SQL_CONTEOS_BENEFICIARIOS},
+                COUNT(DISTINCT CASE WHEN tb.nombre = 'individual'
+                      AND {grupo_beneficiario} IN (SELECT grupo_id FROM grupos)
+                      THEN ab.beneficiario_id END)
+            FROM act {_SQL_JOIN_BENEFICIARIOS.format(actividad='act.id')}
+            UNION ALL
+            SELECT 'sin_grupo', NULL, {_SQL_CONTEOS_BENEFICIARIOS}, 0
+            FROM act {_SQL_JOIN_BENEFICIARIOS.format(actividad='act.id')}
+            WHERE act.id NOT IN (SELECT actividad_id FROM grupos)
+        """, act_params)
+        conteos = {}
+        for clave, grupo_id, total, individuales, familias, instituciones, exclusivos in cursor.fetchall():
+            conteos[_uuid(grupo_id) if clave == 'grupo' else clave] = {
+                'total_beneficiarios': total,
+                'beneficiarios_individuales': individuales,
+                'beneficiarios_familias': familias,
+                'beneficiarios_instituciones': instituciones,
+                'beneficiarios_exclusivos': exclusivos,
+            }
+    return pares, conteos
+
+
+def _fila_resumen(nombre, region, actividades_info, conteos, actividades_detalle=None):
+    """Entrada del reporte con totales, responsables y colaboradores de un conjunto de actividades"""
+    conteos = conteos or {}
+    responsables = sorted({a['responsable'] for a in actividades_info if a['responsable'] != '-'})
+    colaboradores = sorted({a['colaborador'] for a in actividades_info if a['colaborador'] != '-'})
+    return {
+        'nombre': nombre,
+        'region': region,
+        'total_actividades': len(actividades_info),
+        'total_beneficiarios': conteos.get('total_beneficiarios', 0),
+        'beneficiarios_individuales': conteos.get('beneficiarios_individuales', 0),
+        'beneficiarios_familias': conteos.get('beneficiarios_familias', 0),
+        'beneficiarios_instituciones': conteos.get('beneficiarios_instituciones', 0),
+        'beneficiarios_exclusivos': conteos.get('beneficiarios_exclusivos', 0),
+        'responsables': ', '.join(responsables) if responsables else '-',
+        'colaboradores': ', '.join(colaboradores) if colaboradores else '-',
+        # Las actividades en detalle solo se incluyen una vez, en "Todas las Actividades"
+        'actividades': actividades_detalle or [],
+    }
+
+
+def _reporte_actividades_por_region_comunidad(filtros):
+    agrupar_por = 'comunidad' if filtros['agrupar_por'] == 'comunidad' else 'region'
+    actividades = filtrar_por_comunidades(
+        actividades_filtradas(filtros, 'actividades-por-region-comunidad'),
+        filtros['comunidades'],
+    )
+
+    pares, conteos = _grupos_y_conteos(actividades, agrupar_por)
+
+    # Detalle de cada actividad (una sola vez aunque pertenezca a varios grupos)
+    comunidades_m2m = defaultdict(list)
+    for actividad_id, comunidad_nombre in ActividadComunidad.objects.filter(
+        actividad_id__in=actividades.values('id')
+    ).values_list('actividad_id', 'comunidad__nombre'):
+        comunidades_m2m[actividad_id].append(comunidad_nombre)
+
+    beneficiarios_por_actividad = dict(
+        ActividadBeneficiario.objects.filter(
+            actividad_id__in=actividades.values('id')
+        ).values('actividad_id').annotate(
+            total=Count('beneficiario_id', distinct=True)
+        ).values_list('actividad_id', 'total')
+    )
+
+    actividades_info = {}
+    for act in actividades.select_related('comunidad', 'responsable', 'colaborador', 'tipo'):
+        nombres_comunidades = list(comunidades_m2m.get(act.id, []))
+        if act.comunidad:
+            nombres_comunidades.append(act.comunidad.nombre)
+        nombres_comunidades = sorted(set(nombres_comunidades))
+        actividades_info[act.id] = {
+            'nombre': act.nombre,
+            'fecha': act.fecha.strftime('%Y-%m-%d') if act.fecha else '-',
+            'estado': act.estado,
+            'tipo_actividad': act.tipo.nombre if act.tipo else '-',
+            'comunidad': ', '.join(nombres_comunidades) if nombres_comunidades else '-',
+            'responsable': act.responsable.username if act.responsable else '-',
+            'colaborador': act.colaborador.nombre if act.colaborador else '-',
+            'total_beneficiarios': beneficiarios_por_actividad.get(act.id, 0),
+        }
+
+    actividades_por_grupo = defaultdict(list)
+    for actividad_id, grupo_id in pares:
+        if actividad_id in actividades_info:
+            actividades_por_grupo[grupo_id].append(actividades_info[actividad_id])
+
+    # Nombres de los grupos
+    if agrupar_por == 'comunidad':
+        grupos = [
+            (c['id'], c['nombre'], c['region__nombre'] or 'Sin región')
+            for c in Comunidad.objects.filter(id__in=actividades_por_grupo.keys()).values('id', 'nombre', 'region__nombre')
+        ]
+    else:
+        grupos = [
+            (r['id'], r['nombre'], r['nombre'])
+            for r in Region.objects.filter(id__in=actividades_por_grupo.keys()).values('id', 'nombre')
+        ]
+    grupos.sort(key=lambda g: (g[1] or '').lower())
+
+    data = [
+        _fila_resumen(nombre, region, actividades_por_grupo[grupo_id], conteos.get(grupo_id))
+        for grupo_id, nombre, region in grupos
+    ]
+
+    if actividades_info:
+        # Ordenadas por fecha (más reciente primero)
+        todas = sorted(actividades_info.values(), key=lambda x: x['fecha'], reverse=True)
+        data.append(_fila_resumen(
+            'Todas las Actividades', 'Todas las Regiones', todas, conteos.get('todas'), actividades_detalle=todas
+        ))
+
+    # Actividades sin grupo (solo si NO hay filtro de comunidades)
+    if not filtros['comunidades']:
+        con_grupo = {actividad_id for actividad_id, _ in pares}
+        sin_grupo = [info for actividad_id, info in actividades_info.items() if actividad_id not in con_grupo]
+        if sin_grupo:
+            nombre = 'Sin comunidad asignada' if agrupar_por == 'comunidad' else 'Sin región asignada'
+            fila = _fila_resumen(nombre, 'Sin región', sin_grupo, conteos.get('sin_grupo'))
+            fila['beneficiarios_exclusivos'] = 0  # No tienen comunidad/región asignada
+            data.append(fila)
+
+    return {'data': data, 'total': len(data)}
+
+
+# =====================================================
+# BENEFICIARIOS POR REGIÓN O COMUNIDAD
+# =====================================================
+
+def _reporte_beneficiarios_por_region_comunidad(filtros):
+    # Para este reporte NO se filtra por fechas ni estados (búsqueda global)
+    actividades = Actividad.objects.filter(eliminado_en__isnull=True)
+    actividades = _filtrar_tipo_actividad(actividades, filtros['tipo_actividad'])
+    if filtros['eventos_seleccionados']:
+        actividades = actividades.filter(id__in=filtros['eventos_seleccionados'])
+    actividades = filtrar_por_comunidades(actividades, filtros['comunidades'])
+
+    beneficiarios_query = ActividadBeneficiario.objects.filter(
+        actividad_id__in=actividades.values('id')
+    ).select_related(
+        'beneficiario', 'beneficiario__tipo', 'beneficiario__comunidad', 'beneficiario__comunidad__region',
+        'beneficiario__individual', 'beneficiario__familia', 'beneficiario__institucion', 'actividad'
+    )
+
+    if filtros['comunidades']:
+        beneficiarios_query = beneficiarios_query.filter(beneficiario__comunidad_id__in=filtros['comunidades'])
+
+    if filtros['tipo_beneficiario']:
+        tipo_ids = _ids_tipos_beneficiario(filtros['tipo_beneficiario'])
+        if tipo_ids:
+            beneficiarios_query = beneficiarios_query.filter(beneficiario__tipo_id__in=tipo_ids)
+
+    # Beneficiarios únicos con los eventos en los que participan
+    beneficiarios_dict = {}
+    for ab in beneficiarios_query:
+        benef = ab.beneficiario
+        benef_id = str(benef.id)
+
+        if benef_id not in beneficiarios_dict:
+            email = ''
+            if hasattr(benef, 'individual'):
+                dpi = benef.individual.dpi or ''
+                telefono = benef.individual.telefono or ''
+            elif hasattr(benef, 'familia'):
+                dpi = benef.familia.dpi_jefe_familia or ''
+                telefono = benef.familia.telefono or ''
+            elif hasattr(benef, 'institucion'):
+                dpi = benef.institucion.dpi_representante or ''
+                telefono = benef.institucion.telefono or ''
+                email = benef.institucion.email or ''
+            else:
+                dpi = ''
+                telefono = ''
+
+            tipo_display = '-'
+            if benef.tipo:
+                try:
+                    tipo_display = benef.tipo.get_nombre_display()
+                except Exception:
+                    tipo_display = benef.tipo.nombre.capitalize() if benef.tipo.nombre else '-'
+
+            beneficiarios_dict[benef_id] = {
+                'comunidad_id': str(benef.comunidad.id) if benef.comunidad else 'sin_comunidad',
+                'comunidad': benef.comunidad.nombre if benef.comunidad else 'Sin comunidad',
+                'region': benef.comunidad.region.nombre if benef.comunidad and benef.comunidad.region else 'Sin región',
+                'nombre': _nombre_beneficiario(benef) or 'Sin nombre',
+                'tipo': tipo_display,
+                'dpi': dpi,
+                'documento': dpi,
+                'telefono': telefono,
+                'email': email,
+                'eventos': [],
+            }
+
+        evento_nombre = ab.actividad.nombre if ab.actividad else None
+        if evento_nombre and evento_nombre not in beneficiarios_dict[benef_id]['eventos']:
+            beneficiarios_dict[benef_id]['eventos'].append(evento_nombre)
+
+    # Agrupar beneficiarios por comunidad (en el orden en que aparece cada comunidad)
+    por_comunidad = defaultdict(list)
+    for benef_data in beneficiarios_dict.values():
+        por_comunidad[benef_data['comunidad_id']].append(benef_data)
+
+    data = []
+    for beneficiarios in por_comunidad.values():
+        for benef_data in beneficiarios:
+            data.append({
+                'comunidad': benef_data['comunidad'],
+                'region': benef_data['region'],
+                'nombre': benef_data['nombre'],
+                'tipo': benef_data['tipo'],
+                'dpi': benef_data['dpi'],
+                'documento': benef_data['documento'],
+                'telefono': benef_data['telefono'],
+                'email': benef_data['email'],
+                'evento': ', '.join(benef_data['eventos']) if benef_data['eventos'] else '-',
+            })
+    return {'data': data, 'total': len(data)}
+
+
+# =====================================================
+# CONTEOS SIMPLES
+# =====================================================
+
+def _reporte_actividades_por_region(filtros):
+    resultado = actividades_filtradas(filtros).values('comunidad__region__nombre').annotate(
+        total=Count('id')
+    ).order_by('-total')
+    data = [
+        {
+            'region': item['comunidad__region__nombre'] or 'Sin región',
+            'total_actividades': item['total'],
+        }
+        for item in resultado
+    ]
+    return {'data': data, 'total': len(data)}
+
+
+def _reporte_actividades_por_comunidad(filtros):
+    resultado = actividades_filtradas(filtros).values('comunidad__nombre', 'comunidad__region__nombre').annotate(
+        total=Count('id')
+    ).order_by('-total')
+    data = [
+        {
+            'comunidad': item['comunidad__nombre'] or 'Sin comunidad',
+            'region': item['comunidad__region__nombre'] or 'Sin región',
+            'total_actividades': item['total'],
+        }
+        for item in resultado
+    ]
+    return {'data': data, 'total': len(data)}
+
+
+def _reporte_generico(filtros):
+    """Reporte genérico: lista de actividades (máximo 100)"""
+    actividades = actividades_filtradas(filtros).select_related(
+        'comunidad', 'comunidad__region', 'tipo', 'responsable'
+    )[:100]
+    data = [
+        {
+            'nombre': act.nombre,
+            'fecha': act.fecha.strftime('%Y-%m-%d') if act.fecha else '-',
+            'estado': act.estado,
+            'tipo': act.tipo.nombre if act.tipo else '-',
+            'comunidad': act.comunidad.nombre if act.comunidad else '-',
+            'region': act.comunidad.region.nombre if act.comunidad and act.comunidad.region else '-',
+            'responsable': act.responsable.username if act.responsable else '-',
+        }
+        for act in actividades
+    ]
+    return {'data': data, 'total': len(data)}
+
+
+# =====================================================
+# ACTIVIDAD DEL PERSONAL Y AVANCES
+# =====================================================
+
+def _cambios_colaboradores_filtrados(filtros, fecha_inicio, fecha_fin):
+    """Cambios de colaboradores activos con los filtros de fecha y colaboradores aplicados"""
+    cambios = EventoCambioColaborador.objects.filter(colaborador__isnull=False, colaborador__activo=True)
+    if fecha_inicio:
+        cambios = cambios.filter(fecha_cambio__gte=fecha_inicio)
+    if fecha_fin:
+        cambios = cambios.filter(fecha_cambio__lte=fecha_fin)
+    if filtros['colaboradores']:
+        cambios = cambios.filter(colaborador_id__in=filtros['colaboradores'])
+    return cambios
+
+
+def _datos_colaborador(colaborador):
+    return {
+        'colaborador_id': str(colaborador.id),
+        'nombre': colaborador.nombre,
+        'puesto': colaborador.puesto.nombre if colaborador.puesto else '-',
+        'telefono': colaborador.telefono or '-',
+        'total_eventos': set(),
+        'total_avances': 0,
+        'eventos': {},
+        'tiene_avances': False,
+    }
+
+
+def _reporte_actividad_de_personal(filtros):
+    fecha_inicio, fecha_fin = _rango_periodo(filtros)
+    colaboradores_filtro = filtros['colaboradores']
+
+    cambios = _cambios_colaboradores_filtrados(filtros, fecha_inicio, fecha_fin).select_related(
+        'colaborador', 'colaborador__puesto', 'actividad', 'actividad__tipo',
+        'actividad__comunidad', 'actividad__comunidad__tipo'
+    )
+    if filtros['comunidades']:
+        cambios = cambios.filter(actividad__comunidad_id__in=filtros['comunidades'])
+    if filtros['eventos']:
+        cambios = cambios.filter(actividad_id__in=filtros['eventos'])
+    if filtros['estados']:
+        cambios = cambios.filter(actividad__estado__in=filtros['estados'])
+    if filtros['tipo_actividad']:
+        tipo_ids = TipoActividad.objects.filter(nombre__in=filtros['tipo_actividad'], activo=True).values('id')
+        cambios = cambios.filter(actividad__tipo_id__in=tipo_ids)
+
+    # Si hay filtro de colaboradores, SOLO se reportan esos colaboradores (aunque no tengan avances)
+    colaboradores_dict = {}
+    if colaboradores_filtro:
+        for col in Colaborador.objects.filter(id__in=colaboradores_filtro, activo=True).select_related('puesto'):
+            colaboradores_dict[str(col.id)] = _datos_colaborador(col)
+
+    for cambio in cambios:
+        colaborador = cambio.colaborador
+        actividad = cambio.actividad
+        if not colaborador or not actividad:
+            continue
+
+        col_id = str(colaborador.id)
+        if col_id not in colaboradores_dict:
+            if colaboradores_filtro:
+                continue
+            colaboradores_dict[col_id] = _datos_colaborador(colaborador)
+
+        col_data = colaboradores_dict[col_id]
+        col_data['tiene_avances'] = True
+
+        actividad_id = str(actividad.id)
+        if actividad_id not in col_data['eventos']:
+            col_data['eventos'][actividad_id] = {
+                'nombre': actividad.nombre,
+                'estado': actividad.estado,
+                'tipo': actividad.tipo.nombre if actividad.tipo else '-',
+                'comunidad': actividad.comunidad.nombre if actividad.comunidad else '-',
+                'tipo_comunidad': actividad.comunidad.tipo.nombre if actividad.comunidad and actividad.comunidad.tipo else '-',
+                'total_avances': 0,
+                'fecha_primer_avance': None,
+                'fecha_ultimo_avance': None,
+            }
+            col_data['total_eventos'].add(actividad_id)
+
+        evento_data = col_data['eventos'][actividad_id]
+        evento_data['total_avances'] += 1
+        col_data['total_avances'] += 1
+
+        fecha_cambio = cambio.fecha_cambio
+        if fecha_cambio:
+            if not evento_data['fecha_primer_avance'] or fecha_cambio < evento_data['fecha_primer_avance']:
+                evento_data['fecha_primer_avance'] = fecha_cambio
+            if not evento_data['fecha_ultimo_avance'] or fecha_cambio > evento_data['fecha_ultimo_avance']:
+                evento_data['fecha_ultimo_avance'] = fecha_cambio
+
+    data = []
+    for col_data in colaboradores_dict.values():
+        eventos_list = []
+        if col_data['tiene_avances']:
+            for evento_data in col_data['eventos'].values():
+                eventos_list.append({
+                    'nombre': evento_data['nombre'],
+                    'estado': evento_data['estado'],
+                    'tipo': evento_data['tipo'],
+                    'comunidad': evento_data['comunidad'],
+                    'tipo_comunidad': evento_data['tipo_comunidad'],
+                    'total_avances': evento_data['total_avances'],
+                    'fecha_primer_avance': evento_data['fecha_primer_avance'].strftime('%d/%m/%Y') if evento_data['fecha_primer_avance'] else '-',
+                    'fecha_ultimo_avance': evento_data['fecha_ultimo_avance'].strftime('%d/%m/%Y') if evento_data['fecha_ultimo_avance'] else '-',
+                })
+        data.append({
+            'colaborador_id': col_data['colaborador_id'],
+            'nombre': col_data['nombre'],
+            'puesto': col_data['puesto'],
+            'telefono': col_data['telefono'],
+            'total_eventos': len(col_data['total_eventos']),
+            'total_avances': col_data['total_avances'],
+            'eventos': eventos_list,
+            'sin_avances': not col_data['tiene_avances'],
+        })
+
+    # Ordenar por total de avances descendente (los sin avances van al final)
+    data.sort(key=lambda x: (x['total_avances'], x['nombre']), reverse=True)
+    return {'data': data, 'total': len(data)}
+
+
+def _reporte_avances_eventos_generales(filtros):
+    fecha_inicio, fecha_fin = _rango_periodo(filtros)
+
+    cambios = _cambios_colaboradores_filtrados(filtros, fecha_inicio, fecha_fin).filter(
+        actividad__eliminado_en__isnull=True
+    ).select_related(
+        'colaborador', 'actividad', 'actividad__tipo', 'actividad__comunidad',
+        'actividad__comunidad__region', 'comunidad'
+    ).prefetch_related(
+        'actividad__comunidades_relacionadas__comunidad__region',
+        'actividad__comunidades_relacionadas__region'
+    )
+    if filtros['comunidades']:
+        cambios = cambios.filter(
+            Q(actividad__comunidad_id__in=filtros['comunidades']) |
+            Q(actividad__comunidades_relacionadas__comunidad_id__in=filtros['comunidades'])
+        ).distinct()
+    if filtros['eventos']:
+        cambios = cambios.filter(actividad_id__in=filtros['eventos'])
+    if filtros['tipo_actividad']:
+        tipo_ids = TipoActividad.objects.filter(nombre__in=filtros['tipo_actividad'], activo=True).values('id')
+        cambios = cambios.filter(actividad__tipo_id__in=tipo_ids)
+
+    # Un avance puede tener varios colaboradores: se reporta un registro por grupo_id
+    primer_cambio_por_grupo = {}
+    for cambio in cambios:
+        if cambio.actividad and cambio.colaborador and cambio.grupo_id not in primer_cambio_por_grupo:
+            primer_cambio_por_grupo[cambio.grupo_id] = cambio
+
+    grupo_ids = list(primer_cambio_por_grupo.keys())
+
+    # Colaboradores de todos los grupos en una sola consulta
+    colaboradores_por_grupo = defaultdict(list)
+    for fila in EventoCambioColaborador.objects.filter(grupo_id__in=grupo_ids).values(
+        'grupo_id', 'colaborador__id', 'colaborador__nombre'
+    ):
+        colaboradores_por_grupo[fila['grupo_id']].append(fila)
+
+    # Evidencias de todos los grupos en una sola consulta (sin repetir el mismo archivo)
+    evidencias_por_grupo = defaultdict(dict)
+    if filtros['mostrar_evidencias'] and grupo_ids:
+        for evidencia in EventosEvidenciasCambios.objects.filter(cambio__grupo_id__in=grupo_ids).values(
+            'id', 'archivo_nombre', 'archivo_tipo', 'url_almacenamiento', 'descripcion', 'cambio__grupo_id'
+        ):
+            evidencias_grupo = evidencias_por_grupo[evidencia['cambio__grupo_id']]
+            url = evidencia['url_almacenamiento']
+            if url not in evidencias_grupo:
+                evidencias_grupo[url] = {
+                    'id': str(evidencia['id']),
+                    'nombre': evidencia['archivo_nombre'],
+                    'url': url,
+                    'tipo': evidencia['archivo_tipo'] or '',
+                    'es_imagen': evidencia['archivo_tipo'] and evidencia['archivo_tipo'].startswith('image/'),
+                    'descripcion': evidencia['descripcion'] or '',
+                }
+
+    data = []
+    for grupo_id, cambio in primer_cambio_por_grupo.items():
+        actividad = cambio.actividad
+        comunidades_nombres = []
+        regiones_nombres = []
+        if actividad.comunidad:
+            comunidades_nombres.append(actividad.comunidad.nombre)
+            if actividad.comunidad.region:
+                regiones_nombres.append(actividad.comunidad.region.nombre)
+        for relacion in actividad.comunidades_relacionadas.all():
+            if relacion.comunidad and relacion.comunidad.nombre not in comunidades_nombres:
+                comunidades_nombres.append(relacion.comunidad.nombre)
+            if relacion.region and relacion.region.nombre not in regiones_nombres:
+                regiones_nombres.append(relacion.region.nombre)
+            elif relacion.comunidad and relacion.comunidad.region and relacion.comunidad.region.nombre not in regiones_nombres:
+                regiones_nombres.append(relacion.comunidad.region.nombre)
+
+        colaboradores_grupo = colaboradores_por_grupo[grupo_id]
+        colaboradores_nombres = [c['colaborador__nombre'] for c in colaboradores_grupo if c['colaborador__nombre']]
+
+        data.append({
+            'evento_id': str(actividad.id),
+            'evento': {
+                'id': str(actividad.id),
+                'nombre': actividad.nombre,
+                'estado': actividad.estado,
+                'tipo': actividad.tipo.nombre if actividad.tipo else '-',
+            },
+            'comunidad': ', '.join(comunidades_nombres) if comunidades_nombres else '-',
+            'region': ', '.join(regiones_nombres) if regiones_nombres else None,
+            'comunidad_avance': cambio.comunidad.nombre if cambio.comunidad else None,
+            'comunidad_avance_id': str(cambio.comunidad.id) if cambio.comunidad else None,
+            'colaboradores_ids': [str(c['colaborador__id']) for c in colaboradores_grupo if c['colaborador__id']],
+            'colaboradores_nombres': colaboradores_nombres,
+            'colaborador_nombre': ', '.join(colaboradores_nombres) if colaboradores_nombres else 'Sin nombre',
+            'descripcion_cambio': cambio.descripcion_cambio,
+            'fecha_cambio': cambio.fecha_cambio.isoformat() if cambio.fecha_cambio else None,
+            'fecha_display': _fecha_guatemala(cambio.fecha_cambio),
+            'evidencias': list(evidencias_por_grupo[grupo_id].values()),
+        })
+
+    return {'data': data, 'total': len(data)}
+
+
+# =====================================================
+# COMUNIDADES
+# =====================================================
+
+def _pares_actividad_comunidad(actividades):
+    """(actividad_id, comunidad_id) de la comunidad directa y de las relacionadas, en una consulta"""
+    directas = actividades.filter(comunidad_id__isnull=False).values_list('id', 'comunidad_id').order_by()
+    relacionadas = ActividadComunidad.objects.filter(
+        actividad_id__in=actividades.values('id')
+    ).values_list('actividad_id', 'comunidad_id').order_by()
+    return set(directas.union(relacionadas))
+
+
+def _reporte_comunidades(filtros):
+    fecha_inicio, fecha_fin = _rango_periodo(filtros)
+
+    actividades = Actividad.objects.filter(eliminado_en__isnull=True)
+    if fecha_inicio:
+        actividades = actividades.filter(fecha__gte=fecha_inicio.date())
+    if fecha_fin:
+        actividades = actividades.filter(fecha__lte=fecha_fin.date())
+    actividades = _filtrar_tipo_actividad(actividades, filtros['tipo_actividad'])
+    if filtros['eventos_seleccionados']:
+        actividades = actividades.filter(id__in=filtros['eventos_seleccionados'])
+    actividades = filtrar_por_comunidades(actividades, filtros['comunidades'])
+
+    pares = _pares_actividad_comunidad(actividades)
+    actividades_por_comunidad = defaultdict(set)
+    for actividad_id, comunidad_id in pares:
+        actividades_por_comunidad[comunidad_id].add(actividad_id)
+
+    comunidades_ids = filtros['comunidades'] or list(actividades_por_comunidad.keys())
+    comunidades = list(Comunidad.objects.filter(id__in=comunidades_ids, activo=True).select_related('tipo', 'region'))
+
+    # Proyectos: todas las actividades involucradas, en el orden del modelo (fecha descendente)
+    actividades_info = {
+        act.id: {
+            'nombre': act.nombre,
+            'tipo': act.tipo.nombre if act.tipo else '-',
+            'estado': act.estado,
+            'fecha': act.fecha.strftime('%Y-%m-%d') if act.fecha else '-',
+        }
+        for act in Actividad.objects.filter(id__in={a for a, _ in pares}).select_related('tipo')
+    }
+    orden_actividades = {actividad_id: i for i, actividad_id in enumerate(actividades_info)}
+
+    # Beneficiarios activos de cada comunidad que participan en actividades de esa comunidad
+    participaciones = defaultdict(list)
+    for actividad_id, beneficiario_id, comunidad_id, actividad_nombre in ActividadBeneficiario.objects.filter(
+        actividad_id__in=actividades.values('id'),
+        beneficiario__comunidad_id__in=[c.id for c in comunidades],
+        beneficiario__activo=True,
+    ).values_list('actividad_id', 'beneficiario_id', 'beneficiario__comunidad_id', 'actividad__nombre'):
+        if actividad_id in actividades_por_comunidad.get(comunidad_id, ()):
+            participaciones[beneficiario_id].append(actividad_nombre)
+
+    beneficiarios_por_comunidad = defaultdict(list)
+    for beneficiario in Beneficiario.objects.filter(id__in=participaciones.keys()).select_related(
+        'tipo', 'individual', 'familia', 'institucion'
+    ):
+        tipo_beneficiario = beneficiario.tipo.nombre if beneficiario.tipo else '-'
+        beneficiarios_por_comunidad[beneficiario.comunidad_id].append({
+            'nombre': _nombre_beneficiario(beneficiario) or 'Sin nombre',
+            'tipo': tipo_beneficiario.capitalize() if tipo_beneficiario else '-',
+            'eventos': list(dict.fromkeys(participaciones[beneficiario.id])),
+        })
+
+    comunidades_data = []
+    for comunidad in comunidades:
+        ids_comunidad = sorted(actividades_por_comunidad.get(comunidad.id, ()), key=lambda a: orden_actividades.get(a, 0))
+        proyectos_data = [actividades_info[a] for a in ids_comunidad if a in actividades_info]
+        beneficiarios_data = beneficiarios_por_comunidad.get(comunidad.id, [])
+        comunidades_data.append({
+            'nombre': comunidad.nombre,
+            'cocode': comunidad.cocode or '-',
+            'region': comunidad.region.nombre if comunidad.region else '-',
+            'tipo': comunidad.tipo.nombre if comunidad.tipo else '-',
+            'numero_beneficiarios': len(beneficiarios_data),
+            'numero_proyectos': len(proyectos_data),
+            'proyectos': proyectos_data,
+            'beneficiarios': beneficiarios_data,
+        })
+
+    # El frontend espera un objeto con 'comunidades'
+    return {'data': {'comunidades': comunidades_data}, 'total': len(comunidades_data)}
+
+
+# =====================================================
+# EVENTO INDIVIDUAL
+# =====================================================
+
+def _reporte_evento_individual(filtros):
+    from django.db.models import Prefetch
+    from .schema_registry import tiene_columna
+    from .views_utils import obtener_cambios_evento, obtener_detalle_beneficiario, obtener_portada_evento
+
+    evento_id = filtros['evento']
+    if not evento_id:
+        raise ReporteError('Debe seleccionar un evento')
+
+    # Verificar si las columnas comunidad_id y region_id existen en eventos_cambios_colaboradores
+    has_cambios_colaboradores_comunidad = tiene_columna('eventos_cambios_colaboradores', 'comunidad_id')
+    has_cambios_colaboradores_region = tiene_columna('eventos_cambios_colaboradores', 'region_id')
+
+    prefetch_fields = [
+        'personal__usuario__puesto',
+        'personal__colaborador__puesto',
+        'beneficiarios__beneficiario__individual',
+        'beneficiarios__beneficiario__familia',
+        'beneficiarios__beneficiario__institucion',
+        'beneficiarios__beneficiario__tipo',
+        'beneficiarios__beneficiario__comunidad__region',
+        'evidencias',
+        'archivos',
+        'galeria_imagenes',
+        'cambios__responsable',
+        'comunidades_relacionadas__comunidad__region',
+        'comunidades_relacionadas__region'
+    ]
+
+    # Solo precargar cambios_colaboradores si las columnas existen;
+    # si no, obtener_cambios_evento maneja la carga de manera segura
+    if has_cambios_colaboradores_comunidad or has_cambios_colaboradores_region:
+        cambios_colaboradores_queryset = EventoCambioColaborador.objects.select_related('colaborador').prefetch_related('evidencias')
+        if has_cambios_colaboradores_comunidad:
+            cambios_colaboradores_queryset = cambios_colaboradores_queryset.select_related('comunidad')
+        if has_cambios_colaboradores_region:
+            cambios_colaboradores_queryset = cambios_colaboradores_queryset.select_related('region')
+        prefetch_fields.append(Prefetch('cambios_colaboradores', queryset=cambios_colaboradores_queryset))
+
+    try:
+        evento = Actividad.objects.select_related(
+            'tipo', 'comunidad', 'comunidad__region', 'responsable', 'colaborador', 'portada'
+        ).prefetch_related(*prefetch_fields).get(id=evento_id, eliminado_en__isnull=True)
+    except Actividad.DoesNotExist:
+        raise ReporteError('Evento no encontrado', status=404)
+
+    personal_data = []
+    for ap in evento.personal.all():
+        if ap.usuario:
+            personal_data.append({
+                'id': str(ap.usuario.id),
+                'username': ap.usuario.username,
+                'nombre': ap.usuario.nombre or ap.usuario.username,
+                'rol': ap.rol_en_actividad,
+                'rol_display': ap.usuario.get_rol_display() if hasattr(ap.usuario, 'get_rol_display') else ap.usuario.rol,
+                'puesto': ap.usuario.puesto.nombre if ap.usuario.puesto else 'Sin puesto',
+                'tipo': 'usuario'
+            })
+        elif ap.colaborador:
+            personal_data.append({
+                'id': str(ap.colaborador.id),
+                'username': ap.colaborador.correo or '',
+                'nombre': ap.colaborador.nombre,
+                'rol': ap.rol_en_actividad,
+                'rol_display': 'Personal Fijo' if ap.colaborador.es_personal_fijo else 'Colaborador Externo',
+                'puesto': ap.colaborador.puesto.nombre if ap.colaborador.puesto else 'Sin puesto',
+                'tipo': 'colaborador'
+            })
+
+    beneficiarios_data = []
+    for ab in evento.beneficiarios.all():
+        benef = ab.beneficiario
+        nombre_display, info_adicional, detalles, tipo_envio = obtener_detalle_beneficiario(benef)
+        if benef.tipo and hasattr(benef.tipo, 'get_nombre_display'):
+            tipo_display = benef.tipo.get_nombre_display()
+        else:
+            tipo_display = tipo_envio.title() if tipo_envio else ''
+        beneficiarios_data.append({
+            'id': str(benef.id),
+            'tipo': tipo_envio,
+            'nombre': nombre_display,
+            'info_adicional': info_adicional,
+            'tipo_display': tipo_display,
+            'detalles': detalles
+        })
+
+    # Galería de imágenes (desde eventos_galeria)
+    evidencias_data = []
+    for imagen in evento.galeria_imagenes.all():
+        evidencias_data.append({
+            'id': str(imagen.id),
+            'nombre': imagen.archivo_nombre,
+            'url': imagen.url_almacenamiento,
+            'tipo': imagen.archivo_tipo or '',
+            'es_imagen': True,
+            'descripcion': imagen.descripcion or ''
+        })
+
+    # Archivos del proyecto (evidencias en /media/evidencias + archivos de actividad_archivos)
+    archivos_data = []
+    for evidencia in evento.evidencias.all():
+        url = evidencia.url_almacenamiento or ''
+        if '/media/evidencias/' not in url.lower():
+            continue
+        archivos_data.append({
+            'id': str(evidencia.id),
+            'nombre': evidencia.archivo_nombre,
+            'url': url,
+            'tipo': evidencia.archivo_tipo or 'application/octet-stream',
+            'tamanio': evidencia.archivo_tamanio,
+            'descripcion': evidencia.descripcion or '',
+            'es_evidencia': True,
+            'es_imagen': evidencia.es_imagen,
+            'es_galeria': False,
+            'creado_en': evidencia.creado_en.isoformat() if evidencia.creado_en else None
+        })
+    for archivo in evento.archivos.all():
+        archivos_data.append({
+            'id': str(archivo.id),
+            'nombre': archivo.nombre_archivo,
+            'url': archivo.url_almacenamiento,
+            'tipo': archivo.archivo_tipo or 'application/octet-stream',
+            'tamanio': archivo.archivo_tamanio,
+            'descripcion': archivo.descripcion or '',
+            'es_evidencia': False,
+            'es_imagen': False,
+            'es_galeria': False,
+            'creado_en': archivo.creado_en.isoformat() if archivo.creado_en else None
+        })
+
+    ubicacion = 'Sin ubicación'
+    if evento.comunidad:
+        if evento.comunidad.region:
+            ubicacion = f"{evento.comunidad.nombre}, {evento.comunidad.region.nombre}"
+        else:
+            ubicacion = evento.comunidad.nombre
+
+    try:
+        fecha_str = evento.fecha.strftime('%Y-%m-%d') if evento.fecha else ''
+        fecha_display = evento.fecha.strftime('%d/%m/%Y') if evento.fecha else ''
+    except Exception:
+        fecha_str = ''
+        fecha_display = ''
+
+    evento_data = {
+        'id': str(evento.id),
+        'nombre': evento.nombre or 'Sin nombre',
+        'tipo': evento.tipo.nombre if evento.tipo else 'Sin tipo',
+        'descripcion': evento.descripcion or '',
+        'ubicacion': ubicacion,
+        'comunidad': evento.comunidad.nombre if evento.comunidad else 'Sin comunidad',
+        'region': evento.comunidad.region.nombre if evento.comunidad and evento.comunidad.region else None,
+        'fecha': fecha_str,
+        'fecha_display': fecha_display,
+        'estado': evento.estado,
+        'responsable': (evento.responsable.nombre if evento.responsable and evento.responsable.nombre else evento.responsable.username) if evento.responsable else 'Sin responsable',
+        'personal': personal_data,
+        'beneficiarios': beneficiarios_data,
+        'evidencias': evidencias_data,
+        'archivos': archivos_data,
+        'portada': obtener_portada_evento(evento),
+        'cambios': obtener_cambios_evento(evento),  # Siempre incluir, incluso si está vacío
+    }
+
+    # El frontend espera data.evento (no data.data)
+    return {'data': {'evento': evento_data}, 'total': 1}
+
+
+# =====================================================
+# ACTIVIDAD DE USUARIOS
+# =====================================================
+
+def _datos_usuario(usuario, puesto):
+    return {
+        'id': str(usuario.id),
+        'username': usuario.username,
+        'nombre': usuario.nombre or usuario.username,
+        'rol': usuario.rol,
+        'rol_display': usuario.get_rol_display() if hasattr(usuario, 'get_rol_display') else usuario.rol,
+        'puesto': puesto,
+        'puesto_nombre': puesto,
+        'cambios': [],
+        'total_cambios': 0,
+    }
+
+
+def _reporte_actividad_usuarios(filtros):
+    fecha_inicio, fecha_fin = _rango_periodo(filtros)
+    usuarios_filtro = filtros['usuarios']
+    evento_filtro = filtros['evento'].strip() if filtros['evento'] else None
+
+    actividades = Actividad.objects.filter(eliminado_en__isnull=True)
+    actividades = _filtrar_tipo_actividad(actividades, filtros['tipo_actividad'])
+    if evento_filtro:
+        actividades = actividades.filter(id=evento_filtro)
+    actividades = filtrar_por_comunidades(actividades, filtros['comunidades'])
+
+    # Cambios de usuarios (ActividadCambio)
+    cambios_usuarios = ActividadCambio.objects.filter(
+        actividad_id__in=actividades.values('id')
+    ).select_related('responsable', 'responsable__puesto', 'actividad')
+    if fecha_inicio:
+        cambios_usuarios = cambios_usuarios.filter(fecha_cambio__gte=fecha_inicio)
+    if fecha_fin:
+        cambios_usuarios = cambios_usuarios.filter(fecha_cambio__lte=fecha_fin)
+    if usuarios_filtro:
+        cambios_usuarios = cambios_usuarios.filter(responsable_id__in=usuarios_filtro)
+
+    # Cambios de colaboradores que tienen usuario (EventoCambioColaborador)
+    colaboradores_con_usuario = Colaborador.objects.filter(activo=True, usuario__isnull=False)
+    if usuarios_filtro:
+        colaboradores_con_usuario = colaboradores_con_usuario.filter(usuario_id__in=usuarios_filtro)
+    cambios_colaboradores = EventoCambioColaborador.objects.filter(
+        actividad_id__in=actividades.values('id'),
+        colaborador_id__in=colaboradores_con_usuario.values('id')
+    ).select_related('colaborador', 'colaborador__puesto', 'colaborador__usuario', 'colaborador__usuario__puesto', 'actividad')
+    if fecha_inicio:
+        cambios_colaboradores = cambios_colaboradores.filter(fecha_cambio__gte=fecha_inicio)
+    if fecha_fin:
+        cambios_colaboradores = cambios_colaboradores.filter(fecha_cambio__lte=fecha_fin)
+
+    usuarios_dict = {}
+
+    for cambio in cambios_usuarios:
+        usuario = cambio.responsable
+        if not usuario:
+            continue
+        usuario_id = str(usuario.id)
+        if usuario_id not in usuarios_dict:
+            usuarios_dict[usuario_id] = _datos_usuario(usuario, usuario.puesto.nombre if usuario.puesto else None)
+        usuarios_dict[usuario_id]['cambios'].append({
+            'tipo_cambio': 'Cambio de Actividad',
+            'descripcion': cambio.descripcion_cambio,
+            'fecha': cambio.fecha_cambio.isoformat() if cambio.fecha_cambio else None,
+            'fecha_display': _fecha_guatemala(cambio.fecha_cambio),
+            'evento_id': str(cambio.actividad.id),
+            'evento_nombre': cambio.actividad.nombre
+        })
+        usuarios_dict[usuario_id]['total_cambios'] += 1
+
+    # Un cambio con varias comunidades se guarda en varias filas con el mismo grupo_id:
+    # se cuenta una sola vez por usuario y grupo
+    grupos_procesados = set()
+    for cambio in cambios_colaboradores:
+        colaborador = cambio.colaborador
+        if not colaborador or not colaborador.usuario:
+            continue
+        usuario = colaborador.usuario
+        usuario_id = str(usuario.id)
+        clave_grupo = (usuario_id, str(cambio.grupo_id or cambio.id))
+        if clave_grupo in grupos_procesados:
+            continue
+        grupos_procesados.add(clave_grupo)
+
+        if usuario_id not in usuarios_dict:
+            puesto = colaborador.puesto.nombre if colaborador.puesto else (usuario.puesto.nombre if usuario.puesto else None)
+            usuarios_dict[usuario_id] = _datos_usuario(usuario, puesto)
+        usuarios_dict[usuario_id]['cambios'].append({
+            'tipo_cambio': 'Cambio por Colaborador',
+            'descripcion': cambio.descripcion_cambio,
+            'fecha': cambio.fecha_cambio.isoformat() if cambio.fecha_cambio else None,
+            'fecha_display': _fecha_guatemala(cambio.fecha_cambio),
+            'evento_id': str(cambio.actividad.id),
+            'evento_nombre': cambio.actividad.nombre
+        })
+        usuarios_dict[usuario_id]['total_cambios'] += 1
+
+    # Si hay filtro de usuarios pero no tienen cambios, agregarlos sin actividad
+    if usuarios_filtro:
+        for usuario in Usuario.objects.filter(activo=True, id__in=usuarios_filtro).select_related('puesto'):
+            usuario_id = str(usuario.id)
+            if usuario_id not in usuarios_dict:
+                usuarios_dict[usuario_id] = _datos_usuario(usuario, usuario.puesto.nombre if usuario.puesto else None)
+                usuarios_dict[usuario_id]['sin_actividad'] = True
+
+    usuarios_lista = sorted(usuarios_dict.values(), key=lambda x: x['total_cambios'], reverse=True)
+    return {'data': {'usuarios': usuarios_lista}, 'total': len(usuarios_lista)}
+
+
+# =====================================================
+# REPORTE GENERAL
+# =====================================================
+
+def _reporte_general(filtros):
+    apartados = filtros['apartados']
+    if not apartados:
+        return {'data': {}, 'total': 0}
+
+    fecha_inicio = filtros['fecha_inicio']
+    fecha_fin = filtros['fecha_fin']
+    periodo = filtros['periodo']
+    if periodo == 'ultimo_mes':
+        fecha_inicio = (timezone.now() - timedelta(days=30)).date()
+        fecha_fin = timezone.now().date()
+    elif periodo == 'ultima_semana':
+        fecha_inicio = (timezone.now() - timedelta(days=7)).date()
+        fecha_fin = timezone.now().date()
+    elif periodo == 'rango' and fecha_inicio and fecha_fin:
+        try:
+            fecha_inicio = datetime.strptime(fecha_inicio, '%Y-%m-%d').date()
+            fecha_fin = datetime.strptime(fecha_fin, '%Y-%m-%d').date()
+        except ValueError:
+            fecha_inicio = None
+            fecha_fin = None
+
+    actividades = Actividad.objects.filter(eliminado_en__isnull=True)
+    if fecha_inicio:
+        actividades = actividades.filter(fecha__gte=fecha_inicio)
+    if fecha_fin:
+        actividades = actividades.filter(fecha__lte=fecha_fin)
+    actividad_ids = actividades.values('id')
+    beneficiarios_actividades = ActividadBeneficiario.objects.filter(actividad_id__in=actividad_ids)
+
+    reporte_data = {}
+
+    if 'total_eventos' in apartados:
+        lista_eventos = [
+            {
+                'nombre': evento.nombre,
+                'tipo': evento.tipo.nombre if evento.tipo else '-',
+                'estado': evento.get_estado_display() if hasattr(evento, 'get_estado_display') else evento.estado,
+                'fecha': evento.fecha.strftime('%d/%m/%Y') if evento.fecha else '-',
+                'comunidad': evento.comunidad.nombre if evento.comunidad else '-',
+                'beneficiarios': evento.num_beneficiarios,
+            }
+            for evento in actividades.select_related('tipo', 'comunidad').annotate(
+                num_beneficiarios=Count('beneficiarios')
+            )[:100]
+        ]
+        reporte_data['total_eventos'] = {
+            'total': actividades.count(),
+            'lista_eventos': lista_eventos
+        }
+
+    if 'tipos_eventos' in apartados:
+        tipos_eventos = {
+            'capacitacion': 0,
+            'entrega': 0,
+            'proyecto_ayuda': 0
+        }
+        for tipo in actividades.values('tipo__nombre').annotate(total=Count('id')):
+            nombre = (tipo['tipo__nombre'] or '').lower()
+            if 'capacitación' in nombre or 'capacitacion' in nombre:
+                tipos_eventos['capacitacion'] = tipo['total']
+            elif 'entrega' in nombre:
+                tipos_eventos['entrega'] = tipo['total']
+            elif 'proyecto' in nombre or 'ayuda' in nombre:
+                tipos_eventos['proyecto_ayuda'] = tipo['total']
+        reporte_data['tipos_eventos'] = tipos_eventos
+
+    if 'total_beneficiarios' in apartados:
+        reporte_data['total_beneficiarios'] = beneficiarios_actividades.values('beneficiario_id').distinct().count()
+
+    if 'tipos_beneficiarios' in apartados:
+        tipos_benef = {
+            'individual': 0,
+            'familia': 0,
+            'institucion': 0,
+            'mujeres': 0,
+            'hombres': 0
+        }
+        for tipo_nombre, genero in Beneficiario.objects.filter(
+            id__in=beneficiarios_actividades.values('beneficiario_id')
+        ).values_list('tipo__nombre', 'individual__genero'):
+            tipo_nombre = (tipo_nombre or '').lower()
+            if 'individual' in tipo_nombre:
+                tipos_benef['individual'] += 1
+                genero = (genero or '').lower()
+                if 'femenino' in genero or 'mujer' in genero:
+                    tipos_benef['mujeres'] += 1
+                elif 'masculino' in genero or 'hombre' in genero:
+                    tipos_benef['hombres'] += 1
+            elif 'familia' in tipo_nombre:
+                tipos_benef['familia'] += 1
+            elif 'institución' in tipo_nombre or 'institucion' in tipo_nombre:
+                tipos_benef['institucion'] += 1
+        reporte_data['tipos_beneficiarios'] = tipos_benef
+
+    if 'total_comunidades' in apartados:
+        actividades_por_comunidad = defaultdict(set)
+        for actividad_id, comunidad_id in _pares_actividad_comunidad(actividades):
+            actividades_por_comunidad[comunidad_id].add(actividad_id)
+
+        beneficiarios_por_comunidad = dict(
+            Beneficiario.objects.filter(comunidad_id__in=actividades_por_comunidad.keys())
+            .values('comunidad_id').annotate(total=Count('id')).values_list('comunidad_id', 'total')
+        )
+        comunidades_lista = [
+            {
+                'nombre': comunidad.nombre,
+                'cocode': comunidad.cocode or '-',
+                'region': comunidad.region.nombre if comunidad.region else '-',
+                'tipo': comunidad.tipo.nombre if comunidad.tipo else '-',
+                'total_eventos': len(actividades_por_comunidad[comunidad.id]),
+                'total_beneficiarios': beneficiarios_por_comunidad.get(comunidad.id, 0),
+            }
+            for comunidad in Comunidad.objects.filter(
+                id__in=actividades_por_comunidad.keys()
+            ).select_related('region', 'tipo')
+        ]
+        comunidades_lista.sort(key=lambda x: x['nombre'])
+        reporte_data['total_comunidades'] = {
+            'total': len(actividades_por_comunidad),
+            'lista_comunidades': comunidades_lista
+        }
+
+    if 'total_avances' in apartados:
+        reporte_data['total_avances'] = EventoCambioColaborador.objects.filter(actividad_id__in=actividad_ids).count()
+
+    if 'comunidades_mas_beneficiarios' in apartados:
+        # Eventos por comunidad: uno por la comunidad directa y uno por cada relación
+        comunidades_stats = {}
+
+        def _agregar_evento(comunidad_id, nombre, region, total):
+            if comunidad_id not in comunidades_stats:
+                comunidades_stats[comunidad_id] = {
+                    'nombre': nombre,
+                    'region': region or '-',
+                    'total_eventos': 0,
+                    'total_beneficiarios': set(),
+                }
+            comunidades_stats[comunidad_id]['total_eventos'] += total
+
+        for fila in actividades.filter(comunidad_id__isnull=False).values(
+            'comunidad_id', 'comunidad__nombre', 'comunidad__region__nombre'
+        ).annotate(total=Count('id')).order_by():
+            _agregar_evento(fila['comunidad_id'], fila['comunidad__nombre'], fila['comunidad__region__nombre'], fila['total'])
+        for fila in ActividadComunidad.objects.filter(actividad_id__in=actividad_ids).values(
+            'comunidad_id', 'comunidad__nombre', 'comunidad__region__nombre'
+        ).annotate(total=Count('id')).order_by():
+            _agregar_evento(fila['comunidad_id'], fila['comunidad__nombre'], fila['comunidad__region__nombre'], fila['total'])
+
+        for beneficiario_id, comunidad_id in beneficiarios_actividades.filter(
+            beneficiario__comunidad_id__in=comunidades_stats.keys()
+        ).values_list('beneficiario_id', 'beneficiario__comunidad_id').distinct():
+            comunidades_stats[comunidad_id]['total_beneficiarios'].add(beneficiario_id)
+
+        comunidades_list = [
+            {
+                'nombre': stats['nombre'],
+                'region': stats['region'],
+                'total_beneficiarios': len(stats['total_beneficiarios']),
+                'total_eventos': stats['total_eventos'],
+            }
+            for stats in comunidades_stats.values()
+        ]
+        comunidades_list.sort(key=lambda x: (x['total_beneficiarios'], x['total_eventos']), reverse=True)
+        reporte_data['comunidades_mas_beneficiarios'] = comunidades_list[:10]  # Top 10
+
+    if 'eventos_mas_beneficiarios' in apartados:
+        eventos_stats = [
+            {
+                'nombre': actividad.nombre,
+                'tipo': actividad.tipo.nombre if actividad.tipo else '-',
+                'estado': actividad.get_estado_display() if hasattr(actividad, 'get_estado_display') else actividad.estado,
+                'total_beneficiarios': actividad.num_beneficiarios,
+                'comunidad': actividad.comunidad.nombre if actividad.comunidad else '-',
+            }
+            for actividad in actividades.select_related('tipo', 'comunidad').annotate(
+                num_beneficiarios=Count('beneficiarios')
+            )[:100]
+        ]
+        eventos_stats.sort(key=lambda x: x['total_beneficiarios'], reverse=True)
+        reporte_data['eventos_mas_beneficiarios'] = eventos_stats[:10]  # Top 10
+
+    if 'evento_mas_avances' in apartados:
+        # En empate gana el evento con el avance más reciente
+        evento = actividades.annotate(
+            total_avances=Count('cambios_colaboradores'),
+            ultimo_avance=Max('cambios_colaboradores__fecha_cambio'),
+        ).filter(total_avances__gt=0).select_related('tipo', 'comunidad').order_by('-total_avances', '-ultimo_avance').first()
+        reporte_data['evento_mas_avances'] = {
+            'nombre': evento.nombre,
+            'tipo': evento.tipo.nombre if evento.tipo else '-',
+            'estado': evento.get_estado_display() if hasattr(evento, 'get_estado_display') else evento.estado,
+            'comunidad': evento.comunidad.nombre if evento.comunidad else '-',
+            'total_avances': evento.total_avances,
+        } if evento else {}
+
+    return {'data': reporte_data, 'total': len(apartados)}
+
+
+# =====================================================
+# PUNTO DE ENTRADA
+# =====================================================
+
+GENERADORES_REPORTE = {
+    'actividades-por-region-comunidad': _reporte_actividades_por_region_comunidad,
+    'beneficiarios-por-region-comunidad': _reporte_beneficiarios_por_region_comunidad,
+    'actividades-por-region': _reporte_actividades_por_region,
+    'actividades-por-comunidad': _reporte_actividades_por_comunidad,
+    'actividad-de-personal': _reporte_actividad_de_personal,
+    'avances-eventos-generales': _reporte_avances_eventos_generales,
+    'comunidades': _reporte_comunidades,
+    'reporte-evento-individual': _reporte_evento_individual,
+    'actividad-usuarios': _reporte_actividad_usuarios,
+    'reporte-general': _reporte_general,
+}
+
+
+def generar_reporte(report_type, filtros):
+    """
+    Genera los datos de un reporte. Retorna el mismo dict que api_generar_reporte envía como
+    JSON ({'data': ..., 'total': ...}). Lanza ReporteError si la solicitud no es válida.
+    """
+    generador = GENERADORES_REPORTE.get(report_type, _reporte_generico)
+    return generador(filtros)
@@ -0,0 +1,147 @@
+"""
+Caché de respuestas para las APIs que se consultan en cada carga de página (dashboard e inicio)
+Usa el backend CACHES['default'] con semántica stale-while-revalidate:
+- respuesta vigente (dentro de su TTL y sin invalidar): se sirve directo
+- respuesta vencida o invalidada: un solo proceso la recalcula (candado con cache.add)
+  y mientras tanto los demás siguen recibiendo la versión anterior
+- sin respuesta guardada: el primero la calcula y los demás esperan a que aparezca
+Guardar una Actividad, Beneficiario, Comunidad (y los modelos de los que depende cada
+endpoint) incrementa la generación del endpoint, ver webmaga/signals.py.
+"""
+import hashlib
+import logging
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+# Modelos cuyo guardado/eliminación invalida cada endpoint (nombres de modelo de webmaga)
+DEPENDENCIAS = {
+    'dashboard_stats': {
+        'Actividad', 'Beneficiario', 'Comunidad', 'ActividadBeneficiario', 'Colaborador',
+        'ActividadCambio', 'EventoCambioColaborador', 'TipoActividad', 'Region', 'Usuario',
+    },
+    'ultimos_proyectos': {
+        'Actividad', 'Beneficiario', 'Comunidad', 'ActividadPersonal', 'Evidencia', 'ActividadPortada',
+        'TarjetaDato', 'Region',
+    },
+    'ultimos_eventos_inicio': {
+        'Actividad', 'Beneficiario', 'Comunidad', 'Evidencia', 'ActividadPortada', 'TarjetaDato',
+    },
+    'cambios_recientes': {
+        'Actividad', 'Beneficiario', 'Comunidad', 'ActividadCambio', 'Usuario',
+    },
+    'regiones_recientes': {
+        'Actividad', 'Beneficiario', 'Comunidad', 'Region', 'RegionGaleria',
+    },
+}
+
+# Encabezados de la respuesta original que se conservan al servirla desde caché
+ENCABEZADOS_CONSERVADOS = ('Cache-Control', 'Pragma', 'Expires')
+
+
+def _clave_generacion(nombre):
+    return f'respuesta:gen:{nombre}'
+
+
+def _clave_candado(clave):
+    return f'{clave}:candado'
+
+
+def generacion(nombre):
+    """Generación actual del endpoint (cambia cada vez que se invalida)"""
+    return cache.get(_clave_generacion(nombre), 0)
+
+
+def invalidar(*nombres):
+    """Marca como vencidas las respuestas guardadas de los endpoints indicados"""
+    for nombre in nombres:
+        clave = _clave_generacion(nombre)
+        try:
+            cache.incr(clave)
+        except ValueError:
+            cache.set(clave, 1, None)
+
+
+def invalidar_por_modelo(nombre_modelo):
+    """Invalida los endpoints que dependen del modelo guardado o eliminado"""
+    nombres = [nombre for nombre, modelos in DEPENDENCIAS.items() if nombre_modelo in modelos]
+    if nombres:
+        invalidar(*nombres)
+    return nombres
+
+
+def _clave_respuesta(nombre, request, parametros):
+    valores = '&'.join(f'{p}={request.GET.get(p, "")}' for p in parametros)
+    return f'respuesta:{nombre}:{hashlib.md5(valores.encode("utf-8")).hexdigest()}'
+
+
+def _guardar(clave, response, gen, ttl):
+    entrada = {
+        'contenido': response.content,
+        'content_type': response['Content-Type'],
+        'encabezados': {h: response[h] for h in ENCABEZADOS_CONSERVADOS if response.has_header(h)},
+        'calculado_en': time.time(),
+        'generacion': gen,
+    }
+    cache.set(clave, entrada, ttl + settings.API_CACHE_STALE_SECONDS)
+
+
+def _desde_entrada(entrada, estado):
+    response = HttpResponse(entrada['contenido'], content_type=entrada['content_type'])
+    for encabezado, valor in entrada['encabezados'].items():
+        response[encabezado] = valor
+    response['X-Respuesta-Cache'] = estado
+    return response
+
+
+def respuesta_cacheada(nombre, parametros=()):
+    """
+    Decorador: guarda en caché las respuestas 200 de una vista GET.
+    `parametros` son los query params que cambian la respuesta (ej: 'limite').
+    Debe ir debajo de los decoradores de permisos para que estos se sigan evaluando.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            ttl = settings.API_CACHE_TTLS.get(nombre)
+            if not settings.API_CACHE_ENABLED or not ttl or request.method != 'GET':
+                return view_func(request, *args, **kwargs)
+
+            clave = _clave_respuesta(nombre, request, parametros)
+            gen = generacion(nombre)
+            entrada = cache.get(clave)
+
+            if entrada and entrada['generacion'] == gen and time.time() - entrada['calculado_en'] < ttl:
+                return _desde_entrada(entrada, 'HIT')
+
+            candado = _clave_candado(clave)
+            tiene_candado = cache.add(candado, 1, settings.API_CACHE_LOCK_SECONDS)
+            if not tiene_candado:
+                # Otro proceso ya la está recalculando
+                if entrada:
+                    return _desde_entrada(entrada, 'STALE')
+                limite = time.time() + settings.API_CACHE_WAIT_SECONDS
+                while time.time() < limite:
+                    time.sleep(0.05)
+                    entrada = cache.get(clave)
+                    if entrada:
+                        return _desde_entrada(entrada, 'HIT')
+                logger.warning("Caché de respuestas: tiempo de espera agotado para %s, se calcula de nuevo", nombre)
+
+            try:
+                response = view_func(request, *args, **kwargs)
+                if response.status_code == 200 and not getattr(response, 'streaming', False):
+                    _guardar(clave, response, gen, ttl)
+                    response['X-Respuesta-Cache'] = 'MISS'
+                return response
+            finally:
+                if tiene_candado:
+                    cache.delete(candado)
+
+        return wrapper
+    return decorator
@@ -0,0 +1,66 @@
+"""
+Registro de columnas opcionales del esquema
+Algunas columnas se agregaron a la base de datos fuera de las migraciones (recordatorios.recordar,
+eventos_cambios_colaboradores.comunidad_id / region_id) y las vistas revisan si existen antes de
+usarlas. En lugar de consultar information_schema en cada petición, las columnas de las tablas
+registradas se leen una vez por proceso (al abrir la primera conexión) y se vuelven a leer
+después de cada migrate.
+"""
+import logging
+import threading
+
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+logger = logging.getLogger(__name__)
+
+# Tablas cuyas columnas se consultan en tiempo de ejecución
+TABLAS = ('recordatorios', 'eventos_cambios_colaboradores')
+
+_lock = threading.Lock()
+_columnas = None
+
+
+def _leer_columnas():
+    columnas = {}
+    with connection.cursor() as cursor:
+        existentes = set(connection.introspection.table_names(cursor))
+        for tabla in TABLAS:
+            if tabla in existentes:
+                descripcion = connection.introspection.get_table_description(cursor, tabla)
+                columnas[tabla] = frozenset(columna.name for columna in descripcion)
+            else:
+                columnas[tabla] = frozenset()
+    return columnas
+
+
+def refrescar(**kwargs):
+    """Vuelve a leer las columnas de las tablas registradas"""
+    global _columnas
+    try:
+        columnas = _leer_columnas()
+    except Exception as e:
+        # Sin base de datos disponible: se intentará de nuevo en el siguiente uso
+        logger.warning('No se pudo leer el esquema de la base de datos: %s', e)
+        return
+    with _lock:
+        _columnas = columnas
+
+
+def tiene_columna(tabla, columna):
+    """¿La columna existe en la tabla? (tabla debe estar en TABLAS)"""
+    if _columnas is None:
+        refrescar()
+    return columna in (_columnas or {}).get(tabla, ())
+
+
+def _al_conectar(sender, connection, **kwargs):
+    if _columnas is None and connection.alias == 'default':
+        refrescar()
+
+
+def conectar(app_config):
+    """Llamado desde WebmagaConfig.ready(): carga al abrir la primera conexión y refresca tras migrate"""
+    connection_created.connect(_al_conectar, dispatch_uid='schema_registry_conexion')
+    post_migrate.connect(refrescar, sender=app_config, dispatch_uid='schema_registry_migrate')
@@ -0,0 +1,216 @@
+"""
+Entrega de archivos media (MEDIA_URL) en producción
+Antes cada petición a /media/ pasaba por django.views.static.serve: el archivo se leía por
+bloques dentro del worker de Gunicorn, sin ETag, sin Cache-Control y sin soporte de Range
+(un PDF o video grande se volvía a descargar completo si la conexión se cortaba).
+
+- ETag fuerte con el mismo formato que usa nginx ("mtime-tamaño" en hexadecimal), así el
+  navegador revalida igual aunque el archivo lo entregue el proxy; If-None-Match e
+  If-Modified-Since responden 304 sin abrir el archivo.
+- Los nombres con un UUID o un hash (todas las subidas usan uno) nunca se reutilizan para otro
+  contenido: se envían con Cache-Control de un año e `immutable`. El resto se revalida siempre.
+  Solo las imágenes de las galerías públicas (CARPETAS_PUBLICAS) son `public`; evidencias,
+  archivos, fotos de perfil y blobs/ (donde el almacén mezcla galerías con evidencias) van como
+  `private` para que ningún proxy o CDN compartido los guarde.
+- Las carpetas de CARPETAS_PRIVADAS (subidas a medio recibir, temporales del almacén y copias de
+  reportes que quedaron en MEDIA_ROOT antes de REPORT_STORAGE_ROOT) responden 404.
+- Range de un solo intervalo (bytes=a-b, bytes=a-, bytes=-n) con 206/416 e If-Range; varios
+  intervalos se responden con el archivo completo, como permite el RFC 9110.
+- Con MEDIA_SENDFILE='nginx' (X-Accel-Redirect) o 'apache' (X-Sendfile) la vista solo valida
+  la ruta y arma los encabezados: el proxy envía el archivo y atiende los Range. Ejemplo nginx:
+
+      location /media-interna/ {
+          internal;
+          alias /app/media/;
+      }
+
+- Sin proxy, el archivo completo se entrega con FileResponse, que Gunicorn envía con
+  os.sendfile (wsgi.file_wrapper) sin copiarlo por Python.
+"""
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+TAMANO_BLOQUE = 64 * 1024
+
+# UUID (subidas) o hash hexadecimal de 32+ caracteres (SHA-256, MD5) en el nombre del archivo
+NOMBRE_INMUTABLE = re.compile(
+    r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|[0-9a-f]{32,}',
+    re.IGNORECASE,
+)
+RANGO_BYTES = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Carpetas de MEDIA_ROOT que nunca se entregan por /media/
+CARPETAS_PRIVADAS = ('reportes_exportados', 'reportes_cache', 'blobs/tmp')
+
+# Carpetas con imágenes de galerías y portadas visibles en el sitio público
+CARPETAS_PUBLICAS = ('galeria_img', 'comunidades_galeria', 'eventos_portada_img', 'regiones_portada_img')
+
+
+def es_nombre_inmutable(ruta):
+    """True si el nombre del archivo identifica un único contenido (UUID o hash)"""
+    return bool(NOMBRE_INMUTABLE.search(os.path.basename(ruta)))
+
+
+def etag_archivo(info):
+    """ETag fuerte a partir del os.stat del archivo (mismo formato que nginx)"""
+    return f'"{int(info.st_mtime):x}-{info.st_size:x}"'
+
+
+def _en_carpeta(relativa, carpetas):
+    """True si la ruta relativa (con '/') está dentro de alguna de las carpetas"""
+    return any(relativa == carpeta or relativa.startswith(carpeta + '/') for carpeta in carpetas)
+
+
+def _cache_control(relativa):
+    alcance = 'public' if _en_carpeta(relativa, CARPETAS_PUBLICAS) else 'private'
+    if es_nombre_inmutable(relativa):
+        return f'{alcance}, max-age={settings.MEDIA_CACHE_MAX_AGE}, immutable'
+    return f'{alcance}, max-age=0, must-revalidate'
+
+
+def _tipo_contenido(ruta):
+    content_type, encoding = mimetypes.guess_type(ruta)
+    if encoding:
+        # .gz, .bz2, .xz: se entregan como el archivo comprimido, no como su contenido
+        return {'gzip': 'application/gzip', 'bzip2': 'application/x-bzip', 'xz': 'application/x-xz'}.get(
+            encoding, 'application/octet-stream'
+        )
+    return content_type or 'application/octet-stream'
+
+
+def _rango_solicitado(request, tamano, etag, ultima_modificacion):
+    """
+    (inicio, fin) inclusivos del Range pedido, None para enviar el archivo completo
+    o False si el intervalo no se puede satisfacer (416)
+    """
+    encabezado = request.headers.get('Range')
+    if not encabezado or request.method != 'GET':
+        return None
+
+    if_range = request.headers.get('If-Range')
+    if if_range:
+        # Solo se respeta el Range si el archivo no cambió desde la descarga parcial anterior
+        fecha = parse_http_date_safe(if_range)
+        if if_range.strip() != etag and (fecha is None or fecha != int(ultima_modificacion)):
+            return None
+
+    coincidencia = RANGO_BYTES.match(encabezado.strip().replace(' ', ''))
+    if not coincidencia:
+        # Varios intervalos o unidad desconocida: archivo completo
+        return None
+
+    inicio, fin = coincidencia.groups()
+    if not inicio and not fin:
+        return None
+    if not inicio:
+        # bytes=-n: los últimos n bytes
+        sufijo = int(fin)
+        if sufijo == 0 or tamano == 0:
+            return False
+        return max(tamano - sufijo, 0), tamano - 1
+
+    inicio = int(inicio)
+    fin = int(fin) if fin else tamano - 1
+    if inicio >= tamano or fin < inicio:
+        return False
+    return inicio, min(fin, tamano - 1)
+
+
+def _leer_intervalo(archivo, inicio, longitud):
+    try:
+        archivo.seek(inicio)
+        restante = longitud
+        while restante > 0:
+            bloque = archivo.read(min(TAMANO_BLOQUE, restante))
+            if not bloque:
+                break
+            restante -= len(bloque)
+            yield bloque
+    finally:
+        archivo.close()
+
+
+def _respuesta_delegada(ruta_relativa, ruta_absoluta):
+    """Respuesta vacía con el encabezado para que el proxy envíe el archivo"""
+    response = HttpResponse(content_type=_tipo_contenido(ruta_absoluta))
+    if settings.MEDIA_SENDFILE == 'nginx':
+        prefijo = settings.MEDIA_ACCEL_PREFIX.rstrip('/') + '/'
+        response['X-Accel-Redirect'] = prefijo + quote(ruta_relativa.replace(os.sep, '/'))
+    else:
+        response['X-Sendfile'] = ruta_absoluta
+    return response
+
+
+def servir_archivo(request, ruta_relativa):
+    """Entrega un archivo de MEDIA_ROOT con ETag, Cache-Control y Range (o lo delega al proxy)"""
+    media_root = str(settings.MEDIA_ROOT)
+    try:
+        ruta_absoluta = safe_join(media_root, ruta_relativa)
+    except (SuspiciousFileOperation, ValueError):
+        # Rutas fuera de MEDIA_ROOT (../) o con caracteres nulos
+        raise Http404("Archivo no encontrado")
+
+    relativa = os.path.relpath(ruta_absoluta, media_root).replace(os.sep, '/')
+    if _en_carpeta(relativa, CARPETAS_PRIVADAS):
+        raise Http404("Archivo no encontrado")
+
+    try:
+        info = os.stat(ruta_absoluta)
+    except OSError:
+        raise Http404("Archivo no encontrado")
+    if not stat.S_ISREG(info.st_mode):
+        raise Http404("Archivo no encontrado")
+
+    etag = etag_archivo(info)
+    cache_control = _cache_control(relativa)
+
+    if settings.MEDIA_SENDFILE in ('nginx', 'apache'):
+        # El proxy calcula ETag/Last-Modified y atiende los Range y las peticiones condicionales
+        response = _respuesta_delegada(ruta_relativa, ruta_absoluta)
+        response['Cache-Control'] = cache_control
+        return response
+
+    no_modificado = get_conditional_response(request, etag=etag, last_modified=int(info.st_mtime))
+    if no_modificado is not None:
+        no_modificado['ETag'] = etag
+        no_modificado['Cache-Control'] = cache_control
+        return no_modificado
+
+    tamano = info.st_size
+    rango = _rango_solicitado(request, tamano, etag, info.st_mtime)
+
+    if rango is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{tamano}'
+    elif request.method == 'HEAD':
+        response = HttpResponse(content_type=_tipo_contenido(ruta_absoluta))
+        response['Content-Length'] = str(tamano)
+    elif rango is None:
+        response = FileResponse(open(ruta_absoluta, 'rb'), content_type=_tipo_contenido(ruta_absoluta))
+        response['Content-Length'] = str(tamano)
+    else:
+        inicio, fin = rango
+        longitud = fin - inicio + 1
+        response = StreamingHttpResponse(
+            _leer_intervalo(open(ruta_absoluta, 'rb'), inicio, longitud),
+            status=206,
+            content_type=_tipo_contenido(ruta_absoluta),
+        )
+        response['Content-Range'] = f'bytes {inicio}-{fin}/{tamano}'
+        response['Content-Length'] = str(longitud)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(info.st_mtime)
+    response['Cache-Control'] = cache_control
+    return response
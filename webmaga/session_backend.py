@@ -0,0 +1,42 @@
+"""
+Motor de sesiones con renovación diferida
+Con SESSION_SAVE_EVERY_REQUEST cada petición (incluidas las consultas periódicas del Service
+Worker) escribía django_session en PostgreSQL solo para mover la fecha de expiración.
+
+- Las sesiones se leen primero de la caché compartida (cached_db) y solo van a la base de datos
+  cuando no están en la caché.
+- Cada vez que se guarda una sesión se anota cuándo (CLAVE_RENOVADA). Al cargarla, si la vida que
+  le queda es menor que SESSION_RENOVAR_SI_RESTAN, se marca como modificada: SessionMiddleware la
+  guarda y vuelve a enviar la cookie con SESSION_COOKIE_AGE completo. El resto de las peticiones
+  no escriben nada.
+- La sesión de 7 días se mantiene: mientras el usuario use la app se sigue renovando, como antes.
+
+Uso en settings: SESSION_ENGINE = 'webmaga.session_backend' y SESSION_SAVE_EVERY_REQUEST = False
+"""
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+CLAVE_RENOVADA = '_sesion_renovada_en'
+
+
+class SessionStore(CachedDBStore):
+
+    def load(self):
+        data = super().load()
+        if data and self._necesita_renovacion(data):
+            self.modified = True
+        return data
+
+    def _necesita_renovacion(self, data):
+        renovada_en = data.get(CLAVE_RENOVADA)
+        if renovada_en is None:
+            return True
+        edad = self.get_expiry_age(expiry=data.get('_session_expiry'))
+        restante = renovada_en + edad - time.time()
+        return restante < getattr(settings, 'SESSION_RENOVAR_SI_RESTAN', 0)
+
+    def save(self, must_create=False):
+        self._session[CLAVE_RENOVADA] = int(time.time())
+        super().save(must_create=must_create)
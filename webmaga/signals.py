@@ -0,0 +1,96 @@
+"""
+Señales de modelos
+- Invalidan la caché de respuestas de las APIs de inicio/dashboard (webmaga/response_cache.py)
+  cuando se guarda o elimina un registro del que dependen. La invalidación se hace al confirmar
+  la transacción para que el siguiente cálculo ya vea los datos nuevos.
+- Registran las eliminaciones físicas de las entidades que sincroniza la PWA
+  (webmaga/sync_delta.py), dentro de la misma transacción que el DELETE.
+- Avisan al programador de recordatorios (webmaga/recordatorios_programador.py) que
+  cambiaron los recordatorios, también al confirmar la transacción.
+- Descartan los usuarios MAGA guardados por proceso (webmaga/usuario_actual.py) cuando cambia
+  un usuario, su colaborador o su puesto (al confirmar la transacción).
+- Eliminan los tamaños derivados de una imagen (webmaga/imagenes_diferidas.py) cuando se elimina
+  su registro; las vistas ya eliminan el archivo principal.
+- Cuentan las referencias a los archivos del almacén por contenido (webmaga/almacen_archivos.py)
+  cuando un registro se crea, cambia de url_almacenamiento o se elimina, en la misma transacción.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+
+from . import almacen_archivos, imagenes_diferidas, recordatorios_programador, response_cache, sync_delta, usuario_actual
+from .models import (
+    Actividad, ActividadBeneficiario, ActividadCambio, ActividadPersonal, ActividadPortada,
+    Beneficiario, Colaborador, Comunidad, EventoCambioColaborador, Evidencia, Puesto, Recordatorio,
+    RecordatorioColaborador, Region, RegionGaleria, TarjetaDato, TipoActividad, Usuario,
+)
+
+MODELOS_CACHE_RESPUESTAS = (
+    Actividad, ActividadBeneficiario, ActividadCambio, ActividadPersonal, ActividadPortada,
+    Beneficiario, Colaborador, Comunidad, EventoCambioColaborador, Evidencia, Region,
+    RegionGaleria, TarjetaDato, TipoActividad, Usuario,
+)
+
+
+def _invalidar_cache_respuestas(sender, **kwargs):
+    nombre_modelo = sender.__name__
+    transaction.on_commit(lambda: response_cache.invalidar_por_modelo(nombre_modelo))
+
+
+def _registrar_eliminacion_sync(sender, instance, **kwargs):
+    sync_delta.registrar_eliminacion(sender, instance.pk)
+
+
+def _invalidar_recordatorios(sender, **kwargs):
+    transaction.on_commit(recordatorios_programador.invalidar)
+
+
+def _invalidar_usuarios(sender, **kwargs):
+    transaction.on_commit(usuario_actual.invalidar)
+
+
+def _eliminar_variantes(sender, instance, **kwargs):
+    variantes = instance.variantes
+    if variantes:
+        transaction.on_commit(lambda: imagenes_diferidas.eliminar_variantes(variantes))
+
+
+def _recordar_url_archivo(sender, instance, **kwargs):
+    # Valor cargado de la base de datos (sin consultar si el campo está diferido)
+    instance._url_almacenamiento_guardada = instance.__dict__.get('url_almacenamiento')
+
+
+def _contar_referencias_guardado(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or 'url_almacenamiento' not in instance.__dict__:
+        return
+    if update_fields is not None and 'url_almacenamiento' not in update_fields:
+        return
+    nueva = instance.url_almacenamiento
+    anterior = None if created else getattr(instance, '_url_almacenamiento_guardada', None)
+    if nueva != anterior:
+        almacen_archivos.sumar_referencias(nueva)
+        almacen_archivos.restar_referencias(anterior)
+    instance._url_almacenamiento_guardada = nueva
+
+
+def _contar_referencias_eliminacion(sender, instance, **kwargs):
+    almacen_archivos.restar_referencias(instance.__dict__.get('url_almacenamiento'))
+
+
+def conectar_senales():
+    for modelo in MODELOS_CACHE_RESPUESTAS:
+        post_save.connect(_invalidar_cache_respuestas, sender=modelo, dispatch_uid=f'cache_respuestas_save_{modelo.__name__}')
+        post_delete.connect(_invalidar_cache_respuestas, sender=modelo, dispatch_uid=f'cache_respuestas_delete_{modelo.__name__}')
+    for modelo in sync_delta.ENTIDAD_POR_MODELO:
+        post_delete.connect(_registrar_eliminacion_sync, sender=modelo, dispatch_uid=f'sync_eliminacion_{modelo.__name__}')
+    for modelo in (Recordatorio, RecordatorioColaborador):
+        post_save.connect(_invalidar_recordatorios, sender=modelo, dispatch_uid=f'recordatorios_save_{modelo.__name__}')
+        post_delete.connect(_invalidar_recordatorios, sender=modelo, dispatch_uid=f'recordatorios_delete_{modelo.__name__}')
+    for modelo in (Usuario, Colaborador, Puesto):
+        post_save.connect(_invalidar_usuarios, sender=modelo, dispatch_uid=f'usuarios_save_{modelo.__name__}')
+        post_delete.connect(_invalidar_usuarios, sender=modelo, dispatch_uid=f'usuarios_delete_{modelo.__name__}')
+    for modelo in imagenes_diferidas.TIPO_POR_MODELO_CON_VARIANTES:
+        post_delete.connect(_eliminar_variantes, sender=modelo, dispatch_uid=f'variantes_delete_{modelo.__name__}')
+    for modelo in almacen_archivos.MODELOS_CON_ARCHIVO:
+        post_init.connect(_recordar_url_archivo, sender=modelo, dispatch_uid=f'archivos_init_{modelo.__name__}')
+        post_save.connect(_contar_referencias_guardado, sender=modelo, dispatch_uid=f'archivos_save_{modelo.__name__}')
+        post_delete.connect(_contar_referencias_eliminacion, sender=modelo, dispatch_uid=f'archivos_delete_{modelo.__name__}')
@@ -0,0 +1,360 @@
+"""
+Subida por partes (reanudable) de archivos de eventos, regiones y comunidades (tabla subidas_archivos)
+Los PDF y videos grandes se enviaban en un solo POST multipart: con la conexión inestable del campo
+la subida fallaba y se reiniciaba desde cero, y Django la copiaba completa a un archivo temporal
+antes de que la vista la volviera a copiar al guardarla.
+
+Protocolo (vistas api_subida_* en views.py):
+1. POST /api/subidas/ con destino ('evento', 'region' o 'comunidad'), objeto_id, archivo_nombre y
+   tamanio (opcionales: archivo_tipo, ultima_modificacion, sha256, nombre, descripcion). Si el
+   usuario ya tiene una subida en curso del mismo archivo se retorna esa con los bytes recibidos.
+2. PUT /api/subidas/<id>/ con los bytes de una parte como cuerpo, `Content-Range: bytes a-b/total`
+   y opcionalmente `X-Checksum-Sha256` (hexadecimal) de la parte. `a` debe ser igual a `recibido`;
+   si no, se responde 409 con el valor correcto para que el cliente continúe desde ahí.
+3. GET /api/subidas/<id>/ consulta `recibido` después de un corte; DELETE cancela la subida.
+
+- Cada parte se escribe en MEDIA_ROOT/blobs/tmp/subidas/<id>.part leyendo el cuerpo de la petición
+  por bloques: no pasa por request.FILES ni se carga completa en memoria. Si la parte llega
+  incompleta o su SHA-256 no coincide, el archivo se recorta a `recibido` y se puede reenviar.
+- Cada parte toma un turno (recibiendo_por/recibiendo_hasta) en una transacción corta y la lee
+  fuera de cualquier transacción, renovando el turno mientras siguen llegando bytes: un reintento
+  que llega mientras el envío anterior sigue en curso recibe 409 en lugar de escribir a la vez, y
+  una conexión lenta no deja una transacción abierta ni un bloqueo de fila durante la parte.
+  `recibido` avanza con un UPDATE condicionado al turno y a que siga valiendo el inicio de la parte.
+- Con el último byte el archivo se mueve al almacén por contenido (mismo volumen, sin copiarlo),
+  verificando el SHA-256 completo si el cliente lo envió, y la vista crea el ActividadArchivo,
+  RegionArchivo o ComunidadArchivo igual que en la subida de un solo POST.
+- Las subidas sin actividad por más de SUBIDAS_EXPIRACION_HORAS se eliminan con su archivo
+  parcial en la limpieza del worker procesar_imagenes.
+"""
+import hashlib
+import os
+import re
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from . import almacen_archivos
+from .models import SubidaArchivo
+
+CARPETA_SUBIDAS = 'subidas'
+TAMANO_PARTE = 5 * 1024 * 1024  # Sugerido al cliente
+TAMANO_MAXIMO_PARTE = 32 * 1024 * 1024
+TAMANO_BLOQUE = 256 * 1024
+DURACION_TURNO = timedelta(minutes=2)  # Se renueva a la mitad mientras la parte sigue llegando
+
+RANGO_CONTENIDO = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+SHA256_HEX = re.compile(r'^[0-9a-fA-F]{64}$')
+
+
+class SubidaInvalida(ValueError):
+    """La petición no se puede aplicar a la subida; `status` es el código HTTP a responder"""
+
+    def __init__(self, mensaje, status=400):
+        super().__init__(mensaje)
+        self.status = status
+
+
+def carpeta_subidas():
+    carpeta = os.path.join(almacen_archivos.carpeta_temporal(), CARPETA_SUBIDAS)
+    os.makedirs(carpeta, exist_ok=True)
+    return carpeta
+
+
+def ruta_parcial(subida):
+    return os.path.join(carpeta_subidas(), f'{subida.pk}.part')
+
+
+def _eliminar_parcial(subida):
+    try:
+        os.remove(ruta_parcial(subida))
+    except FileNotFoundError:
+        pass
+
+
+def serializar_subida(subida):
+    return {
+        'subida_id': str(subida.pk),
+        'estado': subida.estado,
+        'recibido': subida.recibido,
+        'tamanio_total': subida.tamanio_total,
+        'tamanio_parte': TAMANO_PARTE,
+        'completada': subida.estado == 'completada',
+        'archivo_id': str(subida.archivo_id) if subida.archivo_id else None,
+    }
+
+
+def _bytes_en_disco(subida):
+    try:
+        return os.path.getsize(ruta_parcial(subida))
+    except OSError:
+        return 0
+
+
+def iniciar(usuario, destino, objeto_id, archivo_nombre, tamanio_total, archivo_tipo=None,
+            ultima_modificacion=None, sha256=None, nombre=None, descripcion=None):
+    """Crea la subida o retorna la que el usuario tiene en curso para el mismo archivo"""
+    archivo_nombre = os.path.basename(str(archivo_nombre or '').replace('\\', '/')).strip()
+    if not archivo_nombre:
+        raise SubidaInvalida('archivo_nombre es requerido')
+    try:
+        tamanio_total = int(tamanio_total)
+        ultima_modificacion = int(ultima_modificacion) if ultima_modificacion not in (None, '') else None
+    except (TypeError, ValueError):
+        raise SubidaInvalida('tamanio y ultima_modificacion deben ser números')
+    maximo = settings.SUBIDAS_TAMANO_MAXIMO_MB * 1024 * 1024
+    if tamanio_total <= 0:
+        raise SubidaInvalida('El archivo está vacío')
+    if tamanio_total > maximo:
+        raise SubidaInvalida(f'El archivo supera el máximo de {settings.SUBIDAS_TAMANO_MAXIMO_MB} MB', status=413)
+    if sha256 and not SHA256_HEX.match(sha256):
+        raise SubidaInvalida('sha256 debe ser un hash hexadecimal de 64 caracteres')
+
+    existente = (
+        SubidaArchivo.objects
+        .filter(
+            usuario=usuario,
+            destino=destino,
+            objeto_id=objeto_id,
+            archivo_nombre=archivo_nombre,
+            tamanio_total=tamanio_total,
+            ultima_modificacion=ultima_modificacion,
+            estado='en_curso',
+        )
+        .order_by('-actualizado_en')
+        .first()
+    )
+    if existente and sha256 and existente.sha256 and existente.sha256 != sha256.lower():
+        existente = None
+
+    if existente:
+        # Lo escrito en disco manda: si el proceso se cortó tras escribir pero antes de guardar
+        # `recibido` (o el archivo parcial se perdió), el cliente continúa desde lo que hay
+        en_disco = _bytes_en_disco(existente)
+        campos = {'recibido': min(existente.recibido, en_disco)}
+        if nombre:
+            campos['nombre'] = nombre
+        if descripcion:
+            campos['descripcion'] = descripcion
+        if sha256 and not existente.sha256:
+            campos['sha256'] = sha256.lower()
+        for campo, valor in campos.items():
+            setattr(existente, campo, valor)
+        existente.save(update_fields=[*campos, 'actualizado_en'])
+        return existente
+
+    return SubidaArchivo.objects.create(
+        usuario=usuario,
+        destino=destino,
+        objeto_id=objeto_id,
+        archivo_nombre=archivo_nombre,
+        archivo_tipo=(archivo_tipo or '')[:100] or None,
+        ultima_modificacion=ultima_modificacion,
+        tamanio_total=tamanio_total,
+        sha256=sha256.lower() if sha256 else None,
+        nombre=nombre or None,
+        descripcion=descripcion or None,
+    )
+
+
+def _bloquear(subida_id, usuario):
+    try:
+        subida = SubidaArchivo.objects.select_for_update(nowait=True).filter(pk=subida_id, usuario=usuario).first()
+    except DatabaseError:
+        raise SubidaInvalida('Otra parte de esta subida se está recibiendo, intenta de nuevo', status=409)
+    if subida is None:
+        raise SubidaInvalida('Subida no encontrada', status=404)
+    return subida
+
+
+def _rango(content_range, longitud, subida):
+    coincidencia = RANGO_CONTENIDO.match((content_range or '').strip())
+    if not coincidencia:
+        raise SubidaInvalida('Content-Range debe tener el formato "bytes inicio-fin/total"')
+    inicio, fin, total = (int(valor) for valor in coincidencia.groups())
+    if total != subida.tamanio_total:
+        raise SubidaInvalida('El total de Content-Range no coincide con el tamaño de la subida')
+    if fin < inicio or fin >= total:
+        raise SubidaInvalida('Content-Range fuera del archivo', status=416)
+    if longitud != fin - inicio + 1:
+        raise SubidaInvalida('Content-Length no coincide con Content-Range')
+    if longitud > TAMANO_MAXIMO_PARTE:
+        raise SubidaInvalida(f'Cada parte puede tener como máximo {TAMANO_MAXIMO_PARTE // (1024 * 1024)} MB', status=413)
+    if inicio != subida.recibido:
+        raise SubidaInvalida('La parte no continúa desde el último byte recibido', status=409)
+    return inicio, fin
+
+
+def _tomar_turno(subida_id, usuario, content_range, longitud):
+    """
+    Reserva la subida para esta petición en una transacción corta.
+    Retorna (subida, turno, inicio, fin); turno es None si la subida ya no recibe partes.
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        subida = _bloquear(subida_id, usuario)
+        if subida.estado != 'en_curso' or subida.recibido >= subida.tamanio_total:
+            return subida, None, None, None
+
+        inicio, fin = _rango(content_range, longitud, subida)
+        if subida.recibiendo_hasta and subida.recibiendo_hasta > ahora:
+            raise SubidaInvalida('Otra parte de esta subida se está recibiendo, intenta de nuevo', status=409)
+        subida.recibiendo_por = uuid.uuid4()
+        subida.recibiendo_hasta = ahora + DURACION_TURNO
+        subida.save(update_fields=['recibiendo_por', 'recibiendo_hasta', 'actualizado_en'])
+    return subida, subida.recibiendo_por, inicio, fin
+
+
+def _con_turno(subida, turno):
+    return SubidaArchivo.objects.filter(pk=subida.pk, recibiendo_por=turno, estado='en_curso')
+
+
+def _renovar_turno(subida, turno):
+    ahora = timezone.now()
+    if not _con_turno(subida, turno).update(recibiendo_hasta=ahora + DURACION_TURNO, actualizado_en=ahora):
+        raise SubidaInvalida('La subida cambió mientras se recibía la parte, consulta su estado', status=409)
+
+
+def _liberar_turno(subida, turno, recortar_a):
+    """Descarta lo escrito desde `recortar_a` y libera el turno, si sigue siendo de esta petición"""
+    with transaction.atomic():
+        if _con_turno(subida, turno).select_for_update().first() is None:
+            # Otra petición tomó la subida (o se canceló): el archivo ya no es de esta
+            return
+        try:
+            os.truncate(ruta_parcial(subida), recortar_a)
+        except FileNotFoundError:
+            pass
+        _con_turno(subida, turno).update(recibiendo_por=None, recibiendo_hasta=None)
+
+
+def _escribir_parte(subida, turno, flujo, inicio, longitud, checksum):
+    resumen = hashlib.sha256()
+    escritos = 0
+    renovado = time.monotonic()
+    descriptor = os.open(ruta_parcial(subida), os.O_WRONLY | os.O_CREAT, 0o600)
+    try:
+        # Un intento anterior pudo dejar bytes de más: se descartan antes de escribir
+        os.ftruncate(descriptor, inicio)
+        os.lseek(descriptor, inicio, os.SEEK_SET)
+        while escritos < longitud:
+            bloque = flujo.read(min(TAMANO_BLOQUE, longitud - escritos))
+            if not bloque:
+                break
+            if time.monotonic() - renovado > DURACION_TURNO.total_seconds() / 2:
+                _renovar_turno(subida, turno)
+                renovado = time.monotonic()
+            resumen.update(bloque)
+            os.write(descriptor, bloque)
+            escritos += len(bloque)
+    finally:
+        os.close(descriptor)
+
+    if escritos != longitud:
+        raise SubidaInvalida('La parte llegó incompleta, envíala de nuevo')
+    if checksum and resumen.hexdigest() != checksum.strip().lower():
+        raise SubidaInvalida('El SHA-256 de la parte no coincide, envíala de nuevo', status=422)
+
+
+def recibir_parte(subida_id, usuario, flujo, content_range, longitud, checksum=None):
+    """
+    Escribe la parte leída de `flujo` (el cuerpo de la petición) a continuación de lo recibido.
+    Retorna la subida actualizada; si ya no está en curso se retorna sin cambios.
+    """
+    subida, turno, inicio, fin = _tomar_turno(subida_id, usuario, content_range, longitud)
+    if turno is None:
+        return subida
+
+    # El cuerpo se lee fuera de cualquier transacción: solo el turno impide escribir a la vez
+    try:
+        _escribir_parte(subida, turno, flujo, inicio, longitud, checksum)
+    except Exception:
+        _liberar_turno(subida, turno, inicio)
+        raise
+
+    ahora = timezone.now()
+    avanzada = _con_turno(subida, turno).filter(recibido=inicio).update(
+        recibido=fin + 1, recibiendo_por=None, recibiendo_hasta=None, actualizado_en=ahora,
+    )
+    if not avanzada:
+        raise SubidaInvalida('La subida cambió mientras se recibía la parte, consulta su estado', status=409)
+    subida.recibido = fin + 1
+    subida.recibiendo_por = None
+    subida.recibiendo_hasta = None
+    subida.actualizado_en = ahora
+    return subida
+
+
+def completar(subida_id, usuario, crear_registro):
+    """
+    Mueve el archivo completo al almacén y crea su registro con
+    crear_registro(subida, ruta_relativa) -> (id del registro, respuesta).
+    Retorna (subida, respuesta); la respuesta es None si la subida no estaba lista para completarse.
+    """
+    try:
+        with transaction.atomic():
+            subida = _bloquear(subida_id, usuario)
+            if subida.estado != 'en_curso' or subida.recibido < subida.tamanio_total:
+                return subida, None
+
+            ruta = ruta_parcial(subida)
+            if _bytes_en_disco(subida) != subida.tamanio_total:
+                raise FileNotFoundError(ruta)
+            extension = os.path.splitext(subida.archivo_nombre)[1].lower()
+            ruta_relativa = almacen_archivos.guardar_ruta(
+                ruta, extension, mover=True, sha256_esperado=subida.sha256
+            )
+
+            archivo_id, respuesta = crear_registro(subida, ruta_relativa)
+            subida.estado = 'completada'
+            subida.archivo_id = archivo_id
+            subida.save(update_fields=['estado', 'archivo_id', 'actualizado_en'])
+        return subida, respuesta
+    except (ValueError, FileNotFoundError) as error:
+        if isinstance(error, SubidaInvalida):
+            raise
+        # SHA-256 distinto o archivo parcial perdido: el cliente vuelve a enviar desde el inicio
+        SubidaArchivo.objects.filter(pk=subida_id).update(recibido=0, actualizado_en=timezone.now())
+        if isinstance(error, ValueError):
+            raise SubidaInvalida('El SHA-256 del archivo no coincide, la subida se reinicia', status=422)
+        raise SubidaInvalida('No se encontró el archivo recibido, la subida se reinicia', status=409)
+
+
+def cancelar(subida_id, usuario):
+    """Marca la subida como cancelada y elimina su archivo parcial"""
+    with transaction.atomic():
+        subida = _bloquear(subida_id, usuario)
+        if subida.estado == 'en_curso':
+            subida.estado = 'cancelada'
+            subida.save(update_fields=['estado', 'actualizado_en'])
+    if subida.estado == 'cancelada':
+        _eliminar_parcial(subida)
+    return subida
+
+
+def limpiar(horas=None):
+    """Elimina las subidas sin actividad reciente y sus archivos parciales; retorna cuántas"""
+    if horas is None:
+        horas = settings.SUBIDAS_EXPIRACION_HORAS
+    limite = timezone.now() - timedelta(hours=horas)
+    vencidas = SubidaArchivo.objects.filter(actualizado_en__lt=limite)
+    eliminadas = 0
+    for subida in vencidas.only('id').iterator():
+        with transaction.atomic():
+            # skip_locked: la fila la tiene completar() o cancelar(); una parte que se está
+            # recibiendo renueva actualizado_en junto con su turno
+            bloqueada = (
+                SubidaArchivo.objects.select_for_update(skip_locked=True)
+                .filter(pk=subida.pk, actualizado_en__lt=limite)
+                .first()
+            )
+            if bloqueada is None:
+                continue
+            _eliminar_parcial(bloqueada)
+            bloqueada.delete()
+        eliminadas += 1
+    return eliminadas
@@ -0,0 +1,246 @@
+"""
+Sincronización incremental para la PWA offline
+Devuelve, en una sola respuesta, las filas insertadas, actualizadas y eliminadas de todas las
+entidades que la PWA guarda en IndexedDB desde la última sincronización.
+
+- Cada entidad se recorre por (marca de tiempo, id), donde la marca es actualizado_en (o la
+  fecha que cambia cuando se modifica la fila). El cursor guarda la posición de cada entidad
+  y el último id de sync_eliminaciones, por lo que la sincronización se puede reanudar.
+- Las eliminaciones lógicas (eliminado_en, activo = False) salen de la propia fila; las
+  eliminaciones físicas se registran en sync_eliminaciones (señal post_delete).
+- Las filas se envían como listas en el orden de "columnas" para que el JSON sea compacto.
+- Las marcas se asignan al escribir la fila (CURRENT_TIMESTAMP de los triggers es el inicio de
+  la transacción; auto_now es la hora del save), no al confirmar: una importación de Excel o un
+  lote de sync_queue que tarda minutos confirma filas con marcas viejas. Por eso el corte es el
+  menor entre ahora - MARGEN_SEGUNDOS y el inicio de la transacción abierta más antigua de otra
+  conexión que ya escribió (pg_stat_activity.xact_start con backend_xid): toda fila que aún no
+  confirma tiene marca posterior al corte y no puede quedar detrás de un cursor ya entregado.
+  Las transacciones de solo lectura (pg_dump, una sesión "idle in transaction" que solo consultó)
+  no retienen el corte. Una transacción de escritura que se queda abierta lo retiene como máximo
+  RETRASO_MAXIMO_SEGUNDOS; pasado ese tiempo el corte avanza y se registra una advertencia.
+"""
+import base64
+import json
+import logging
+from datetime import datetime, timedelta
+
+from django.db import connection
+from django.db.models import BooleanField, ExpressionWrapper, F, Max, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import (
+    Actividad, ActividadBeneficiario, ActividadComunidad, ActividadPersonal, Beneficiario,
+    BeneficiarioFamilia, BeneficiarioIndividual, BeneficiarioInstitucion, Colaborador, Comunidad,
+    Region, SyncEliminacion, TipoActividad,
+)
+
+logger = logging.getLogger(__name__)
+
+LIMITE_DEFECTO = 2000
+LIMITE_MAXIMO = 10000
+MARGEN_SEGUNDOS = 5
+# Máximo que una transacción abierta puede retrasar el corte respecto a ahora
+RETRASO_MAXIMO_SEGUNDOS = 600
+
+# Entidades sincronizables, en el orden en que se envían (los catálogos primero)
+# marca: campo o expresión que cambia cada vez que se modifica la fila
+# eliminado: condición de eliminación lógica (None si la tabla solo tiene DELETE físico)
+ENTIDADES = {
+    'tipos_actividad': {'modelo': TipoActividad, 'marca': F('actualizado_en'), 'eliminado': Q(activo=False)},
+    'regiones': {'modelo': Region, 'marca': F('actualizado_en'), 'eliminado': None},
+    'comunidades': {'modelo': Comunidad, 'marca': F('actualizado_en'), 'eliminado': Q(activo=False)},
+    'colaboradores': {'modelo': Colaborador, 'marca': F('actualizado_en'), 'eliminado': Q(activo=False)},
+    'beneficiarios': {'modelo': Beneficiario, 'marca': F('actualizado_en'), 'eliminado': Q(activo=False)},
+    'beneficiarios_individuales': {'modelo': BeneficiarioIndividual, 'marca': F('actualizado_en'), 'eliminado': None},
+    'beneficiarios_familias': {'modelo': BeneficiarioFamilia, 'marca': F('actualizado_en'), 'eliminado': None},
+    'beneficiarios_instituciones': {'modelo': BeneficiarioInstitucion, 'marca': F('actualizado_en'), 'eliminado': None},
+    'actividades': {'modelo': Actividad, 'marca': F('actualizado_en'), 'eliminado': Q(eliminado_en__isnull=False)},
+    'actividad_personal': {'modelo': ActividadPersonal, 'marca': F('actualizado_en'), 'eliminado': None},
+    'actividad_comunidades': {'modelo': ActividadComunidad, 'marca': F('actualizado_en'), 'eliminado': None},
+    'actividad_beneficiarios': {
+        'modelo': ActividadBeneficiario,
+        'marca': Coalesce('fecha_reinscripcion', 'creado_en'),  # La reinscripción actualiza la fecha
+        'eliminado': None,
+    },
+}
+
+# Nombre de entidad por modelo (para registrar eliminaciones físicas)
+ENTIDAD_POR_MODELO = {definicion['modelo']: nombre for nombre, definicion in ENTIDADES.items()}
+
+
+class CursorInvalido(ValueError):
+    """El cursor de sincronización no tiene el formato esperado"""
+
+
+def columnas(modelo):
+    return [campo.attname for campo in modelo._meta.concrete_fields]
+
+
+def codificar_cursor(estado):
+    texto = json.dumps(estado, separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii')
+
+
+def decodificar_cursor(cursor):
+    try:
+        estado = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        posiciones = estado['e']
+        for nombre, (marca, _) in posiciones.items():
+            if nombre not in ENTIDADES:
+                raise ValueError(nombre)
+            datetime.fromisoformat(marca)
+        return {'e': posiciones, 't': int(estado['t'])}
+    except (ValueError, TypeError, KeyError, UnicodeError) as e:
+        raise CursorInvalido('Cursor de sincronización inválido') from e
+
+
+def registrar_eliminacion(modelo, pk):
+    """Guarda la eliminación física de una fila sincronizable (llamado desde post_delete)"""
+    entidad = ENTIDAD_POR_MODELO.get(modelo)
+    if entidad:
+        SyncEliminacion.objects.create(entidad=entidad, registro_id=str(pk))
+
+
+def _inicio_transaccion_abierta_mas_antigua():
+    """
+    xact_start de la transacción abierta más antigua de otra conexión a esta base de datos que
+    ya escribió (tiene backend_xid); None si no hay ninguna o la base de datos no es PostgreSQL.
+    Todas las conexiones usan el mismo usuario, así que pg_stat_activity muestra xact_start y
+    backend_xid sin privilegios adicionales.
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        # pg_stat_activity se congela en la primera lectura de la transacción actual
+        cursor.execute('SELECT pg_stat_clear_snapshot()')
+        cursor.execute("""
+            SELECT MIN(xact_start) FROM pg_stat_activity
+            WHERE datname = current_database()
+              AND pid <> pg_backend_pid()
+              AND backend_type = 'client backend'
+              AND xact_start IS NOT NULL
+              AND backend_xid IS NOT NULL
+        """)
+        return cursor.fetchone()[0]
+
+
+def _corte_sincronizacion():
+    """Marca hasta la que se pueden entregar cambios sin que una transacción abierta quede atrás"""
+    ahora = timezone.now()
+    corte = ahora - timedelta(seconds=MARGEN_SEGUNDOS)
+    inicio_abierta = _inicio_transaccion_abierta_mas_antigua()
+    if inicio_abierta is not None:
+        # Las filas de esa transacción tienen marca >= xact_start; el corte queda justo antes
+        corte = min(corte, inicio_abierta - timedelta(microseconds=1))
+    limite = ahora - timedelta(seconds=RETRASO_MAXIMO_SEGUNDOS)
+    if corte < limite:
+        logger.warning(
+            'Una transacción abierta desde %s retiene el corte de sincronización más de %s s; '
+            'se usa %s (sus filas pueden no llegar a dispositivos que ya sincronizaron)',
+            inicio_abierta.isoformat(), RETRASO_MAXIMO_SEGUNDOS, limite.isoformat(),
+        )
+        corte = limite
+    return corte
+
+
+def _cambios_entidad(nombre, posicion, corte, limite):
+    """
+    Filas de la entidad posteriores a la posición, hasta el corte.
+    Devuelve (bloque, nueva_posicion, completo).
+    """
+    definicion = ENTIDADES[nombre]
+    modelo = definicion['modelo']
+    cols = columnas(modelo)
+
+    filas = modelo.objects.annotate(
+        _marca=definicion['marca'],
+        _eliminado=ExpressionWrapper(definicion['eliminado'] or Value(False), output_field=BooleanField()),
+    ).filter(_marca__lte=corte)
+
+    desde = None
+    if posicion:
+        desde = datetime.fromisoformat(posicion[0])
+        if posicion[1]:
+            filas = filas.filter(Q(_marca__gt=desde) | Q(_marca=desde, pk__gt=posicion[1]))
+        else:
+            filas = filas.filter(_marca__gt=desde)
+    elif definicion['eliminado'] is not None:
+        # Primera sincronización de la entidad: no hace falta enviar filas ya eliminadas
+        filas = filas.exclude(definicion['eliminado'])
+
+    filas = list(filas.order_by('_marca', 'pk').values_list(*cols, '_marca', '_eliminado')[:limite + 1])
+    completo = len(filas) <= limite
+    filas = filas[:limite]
+
+    bloque = {'columnas': cols, 'insertados': [], 'actualizados': [], 'eliminados': []}
+    indice_pk = cols.index(modelo._meta.pk.attname)
+    indice_creado = cols.index('creado_en')
+    for fila in filas:
+        datos = list(fila[:len(cols)])
+        if fila[-1]:
+            bloque['eliminados'].append(str(datos[indice_pk]))
+        elif desde is None or datos[indice_creado] > desde:
+            bloque['insertados'].append(datos)
+        else:
+            bloque['actualizados'].append(datos)
+
+    if completo:
+        # Todo lo anterior al corte ya se entregó
+        nueva_posicion = [corte.isoformat(), None]
+    else:
+        ultima = filas[-1]
+        nueva_posicion = [ultima[-2].isoformat(), str(ultima[indice_pk])]
+    return bloque, nueva_posicion, completo
+
+
+def cambios_desde(cursor=None, limite=LIMITE_DEFECTO):
+    """Cambios de todas las entidades desde el cursor (None = sincronización inicial completa)"""
+    limite = max(1, min(int(limite), LIMITE_MAXIMO))
+    corte = _corte_sincronizacion()
+
+    if cursor:
+        estado = decodificar_cursor(cursor)
+    else:
+        # En la sincronización inicial se envían las filas vigentes; las eliminaciones
+        # anteriores no interesan
+        estado = {'e': {}, 't': SyncEliminacion.objects.aggregate(ultimo=Max('id'))['ultimo'] or 0}
+
+    cambios = {}
+    restante = limite
+    hay_mas = False
+    for nombre in ENTIDADES:
+        if restante <= 0:
+            hay_mas = True
+            break
+        bloque, estado['e'][nombre], completo = _cambios_entidad(nombre, estado['e'].get(nombre), corte, restante)
+        total = len(bloque['insertados']) + len(bloque['actualizados']) + len(bloque['eliminados'])
+        if total:
+            cambios[nombre] = bloque
+            restante -= total
+        if not completo:
+            hay_mas = True
+            break
+
+    if not hay_mas:
+        eliminaciones = list(SyncEliminacion.objects.filter(
+            id__gt=estado['t'], eliminado_en__lte=corte
+        ).order_by('id').values_list('id', 'entidad', 'registro_id')[:restante + 1])
+        if len(eliminaciones) > restante:
+            hay_mas = True
+            eliminaciones = eliminaciones[:restante]
+        for id_eliminacion, entidad, registro_id in eliminaciones:
+            if entidad in ENTIDADES:
+                bloque = cambios.setdefault(entidad, {
+                    'columnas': columnas(ENTIDADES[entidad]['modelo']),
+                    'insertados': [], 'actualizados': [], 'eliminados': []
+                })
+                bloque['eliminados'].append(registro_id)
+            estado['t'] = id_eliminacion
+
+    return {
+        'cambios': cambios,
+        'cursor': codificar_cursor(estado),
+        'hay_mas': hay_mas,
+        'generado_hasta': corte.isoformat(),
+    }
@@ -0,0 +1,409 @@
+"""
+Procesamiento de la cola de sincronización (tablas cola_sincronizacion y conflictos_sincronizacion)
+La PWA sube en un solo request las operaciones que hizo sin conexión; se guardan en la cola
+(sin duplicados gracias a hash_datos) y se aplican por prioridad en lotes transaccionales:
+- cada operación corre en su propio savepoint, así un error no revierte el lote completo
+- UPDATE/DELETE sobre tablas con columna version usan control de concurrencia optimista:
+  si la versión del servidor no es la que tenía el dispositivo, se registran los campos en
+  conflicto en conflictos_sincronizacion y la operación queda pendiente de resolución
+- las operaciones con error se reintentan hasta max_intentos
+- cada rol solo puede enviar las operaciones de OPERACIONES_POR_ROL (las mismas que le permite
+  la interfaz web), el personal solo modifica los eventos donde está asignado y los valores se
+  validan con full_clean antes de guardar
+Los nombres de tabla son los mismos que usa la descarga incremental (webmaga/sync_delta.py).
+"""
+import hashlib
+import json
+import logging
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .decorators import usuario_puede_gestionar_evento
+from .models import ColaSincronizacion, ConflictoSincronizacion
+from .sync_delta import ENTIDADES
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = 100
+MAX_OPERACIONES_POR_ENVIO = 1000
+
+# Tablas que la PWA puede modificar y prioridad por defecto (las tablas padre se aplican primero)
+TABLAS_EDITABLES = {
+    'beneficiarios': 50,
+    'actividades': 50,
+    'beneficiarios_individuales': 40,
+    'beneficiarios_familias': 40,
+    'beneficiarios_instituciones': 40,
+    'actividad_personal': 10,
+    'actividad_comunidades': 10,
+    'actividad_beneficiarios': 10,
+}
+
+# Operaciones que cada rol puede enviar por tabla. Regiones, comunidades, catálogos y
+# colaboradores solo los gestiona un administrador en la interfaz (@solo_administrador) y no se
+# aceptan desde el dispositivo para ningún rol; la interfaz tampoco permite al personal
+# eliminar beneficiarios. Un rol que no aparece aquí no puede enviar operaciones
+_TODAS = frozenset({'INSERT', 'UPDATE', 'DELETE'})
+_SIN_ELIMINAR = frozenset({'INSERT', 'UPDATE'})
+OPERACIONES_POR_ROL = {
+    'admin': {tabla: _TODAS for tabla in TABLAS_EDITABLES},
+    'personal': {
+        'actividades': _TODAS,
+        'actividad_personal': _TODAS,
+        'actividad_comunidades': _TODAS,
+        'actividad_beneficiarios': _TODAS,
+        'beneficiarios': _SIN_ELIMINAR,
+        'beneficiarios_individuales': _SIN_ELIMINAR,
+        'beneficiarios_familias': _SIN_ELIMINAR,
+        'beneficiarios_instituciones': _SIN_ELIMINAR,
+    },
+}
+
+# Columna que vincula la fila con su registro padre: no se puede cambiar en un UPDATE
+# (mover una relación a otro evento es eliminarla y crear otra, con sus propios permisos)
+CAMPO_PADRE = {
+    'actividad_personal': 'actividad_id',
+    'actividad_comunidades': 'actividad_id',
+    'actividad_beneficiarios': 'actividad_id',
+    'beneficiarios_individuales': 'beneficiario_id',
+    'beneficiarios_familias': 'beneficiario_id',
+    'beneficiarios_instituciones': 'beneficiario_id',
+}
+
+# Columnas que nunca se toman de los datos enviados por el dispositivo
+CAMPOS_PROTEGIDOS = {'id', 'version', 'creado_en', 'actualizado_en', 'ultimo_sync', 'modificado_offline', 'eliminado_en'}
+
+# Eliminación lógica por tabla (campo, valor); el resto se elimina físicamente
+ELIMINACION_LOGICA = {
+    'actividades': ('eliminado_en', timezone.now),
+    'beneficiarios': ('activo', lambda: False),
+}
+
+
+class OperacionInvalida(ValueError):
+    """Una operación enviada por el dispositivo no tiene el formato esperado"""
+
+
+def _modelo(tabla):
+    return ENTIDADES[tabla]['modelo']
+
+
+def _campos_editables(modelo):
+    return {f.attname: f for f in modelo._meta.concrete_fields if f.attname not in CAMPOS_PROTEGIDOS}
+
+
+def _hash_operacion(operacion):
+    contenido = json.dumps(
+        [operacion['operacion'], operacion['tabla'], str(operacion['registro_id']), operacion['datos'],
+         operacion.get('datos_anteriores'), operacion.get('version_local')],
+        sort_keys=True, cls=DjangoJSONEncoder
+    )
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def _verificar_rol(usuario, tabla, operacion):
+    permitidas = OPERACIONES_POR_ROL.get(getattr(usuario, 'rol', None), {}).get(tabla, ())
+    if operacion not in permitidas:
+        raise PermissionError(f'No tienes permisos para enviar {operacion} sobre {tabla}')
+
+
+def validar_operacion(datos, usuario):
+    """
+    Normaliza una operación recibida; lanza OperacionInvalida si no es aplicable y
+    PermissionError si el rol del usuario no puede enviarla
+    """
+    if not isinstance(datos, dict):
+        raise OperacionInvalida('Cada operación debe ser un objeto')
+    operacion = str(datos.get('operacion', '')).upper()
+    tabla = datos.get('tabla')
+    if operacion not in dict(ColaSincronizacion.OPERACION_CHOICES):
+        raise OperacionInvalida(f'Operación no válida: {operacion}')
+    if tabla not in TABLAS_EDITABLES:
+        raise OperacionInvalida(f'Tabla no sincronizable: {tabla}')
+    try:
+        registro_id = uuid.UUID(str(datos.get('registro_id')))
+    except ValueError:
+        raise OperacionInvalida('registro_id debe ser un UUID')
+    valores = datos.get('datos') or {}
+    if not isinstance(valores, dict):
+        raise OperacionInvalida('datos debe ser un objeto')
+    _verificar_rol(usuario, tabla, operacion)
+    desconocidos = set(valores) - set(_campos_editables(_modelo(tabla)))
+    if desconocidos:
+        raise OperacionInvalida(f"Campos no editables en {tabla}: {', '.join(sorted(desconocidos))}")
+    try:
+        version_local = int(datos['version_local']) if datos.get('version_local') is not None else None
+        prioridad = int(datos.get('prioridad', TABLAS_EDITABLES[tabla]))
+    except (TypeError, ValueError):
+        raise OperacionInvalida('version_local y prioridad deben ser números')
+    return {
+        'operacion': operacion,
+        'tabla': tabla,
+        'registro_id': registro_id,
+        'datos': valores,
+        'datos_anteriores': datos.get('datos_anteriores'),
+        'version_local': version_local,
+        'prioridad': prioridad,
+    }
+
+
+def encolar_operaciones(usuario, dispositivo_id, operaciones):
+    """
+    Guarda en la cola las operaciones ya validadas, omitiendo las que ya se habían recibido.
+    Devuelve (ids encolados, cantidad de duplicadas).
+    """
+    for operacion in operaciones:
+        operacion['hash_datos'] = _hash_operacion(operacion)
+
+    existentes = set(ColaSincronizacion.objects.filter(
+        hash_datos__in=[op['hash_datos'] for op in operaciones]
+    ).values_list('tabla', 'registro_id', 'operacion', 'hash_datos'))
+
+    nuevas = []
+    vistos = set()
+    for op in operaciones:
+        clave = (op['tabla'], op['registro_id'], op['operacion'], op['hash_datos'])
+        if clave in existentes or clave in vistos:
+            continue
+        vistos.add(clave)
+        nuevas.append(ColaSincronizacion(
+            usuario=usuario,
+            dispositivo_id=dispositivo_id,
+            operacion=op['operacion'],
+            tabla=op['tabla'],
+            registro_id=op['registro_id'],
+            datos=json.loads(json.dumps(op['datos'], cls=DjangoJSONEncoder)),
+            datos_anteriores=op['datos_anteriores'],
+            version_local=op['version_local'] if op['version_local'] is not None else 1,
+            hash_datos=op['hash_datos'],
+            prioridad=op['prioridad'],
+        ))
+    # ignore_conflicts cubre el caso de otro request enviando las mismas operaciones a la vez
+    ColaSincronizacion.objects.bulk_create(nuevas, ignore_conflicts=True)
+    return [op.id for op in nuevas], len(operaciones) - len(nuevas)
+
+
+# ---------------------------------------------------------------------
+# Aplicación de operaciones
+# ---------------------------------------------------------------------
+
+def _valor_comparable(valor):
+    """Convierte el valor del servidor a lo que enviaría el dispositivo (JSON)"""
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, (uuid.UUID, Decimal)):
+        return str(valor)
+    return valor
+
+
+def _registrar_conflicto(item, registro, version_servidor, motivo):
+    """Guarda un conflicto por cada campo que el dispositivo quiso cambiar y que difiere en el servidor"""
+    conflictos = []
+    if registro is not None:
+        for nombre, valor_local in item.datos.items():
+            valor_servidor = _valor_comparable(getattr(registro, nombre))
+            if valor_servidor != valor_local:
+                conflictos.append(ConflictoSincronizacion(
+                    cola_sincronizacion=item,
+                    tabla=item.tabla,
+                    registro_id=item.registro_id,
+                    campo_conflicto=nombre,
+                    valor_local=valor_local,
+                    valor_servidor=valor_servidor,
+                    version_local=item.version_local,
+                    version_servidor=version_servidor,
+                ))
+    if not conflictos:
+        conflictos.append(ConflictoSincronizacion(
+            cola_sincronizacion=item,
+            tabla=item.tabla,
+            registro_id=item.registro_id,
+            version_local=item.version_local,
+            version_servidor=version_servidor,
+            notas=motivo,
+        ))
+    ConflictoSincronizacion.objects.bulk_create(conflictos)
+    item.tiene_conflicto = True
+    item.version_servidor = version_servidor
+    item.error_mensaje = motivo
+
+
+def _asignar(registro, datos):
+    campos = _campos_editables(type(registro))
+    for nombre, valor in datos.items():
+        setattr(registro, nombre, campos[nombre].to_python(valor))
+
+
+def _marcar_offline(registro, ahora):
+    nombres = {f.attname for f in type(registro)._meta.concrete_fields}
+    if 'modificado_offline' in nombres:
+        registro.modificado_offline = True
+    if 'ultimo_sync' in nombres:
+        registro.ultimo_sync = ahora
+
+
+def _verificar_permiso(item, registro):
+    """
+    Se vuelve a verificar al aplicar (la operación pudo encolarse antes de un cambio de rol):
+    - el rol del usuario puede enviar la operación sobre la tabla
+    - la fila no cambia de registro padre
+    - el personal solo modifica los eventos (y sus relaciones) donde está asignado; en las
+      relaciones se verifica tanto el evento actual de la fila como el que envía el dispositivo
+    """
+    _verificar_rol(item.usuario, item.tabla, item.operacion)
+
+    campo_padre = CAMPO_PADRE.get(item.tabla)
+    if campo_padre and registro is not None and campo_padre in item.datos:
+        campo = _campos_editables(type(registro))[campo_padre]
+        if campo.to_python(item.datos[campo_padre]) != getattr(registro, campo_padre):
+            raise PermissionError(f'No se puede cambiar {campo_padre} de un registro existente en {item.tabla}')
+
+    if item.tabla == 'actividades':
+        # Crear eventos está permitido al personal (igual que api_crear_evento)
+        eventos = [item.registro_id] if registro is not None else []
+    elif item.tabla.startswith('actividad_'):
+        eventos = []
+        if registro is not None:
+            eventos.append(registro.actividad_id)
+        if item.datos.get('actividad_id'):
+            eventos.append(item.datos['actividad_id'])
+        if not eventos:
+            raise OperacionInvalida(f'Falta actividad_id en {item.tabla}')
+    else:
+        return
+    for evento_id in eventos:
+        if not usuario_puede_gestionar_evento(item.usuario, evento_id):
+            raise PermissionError('No tienes permisos para modificar este evento')
+
+
+def _validar_valores(registro):
+    """Valida choices, longitudes, nulos, FK y restricciones del modelo antes de guardar"""
+    try:
+        registro.full_clean(validate_unique=False)
+    except ValidationError as e:
+        raise OperacionInvalida('; '.join(e.messages))
+
+
+def _aplicar(item, ahora):
+    """Aplica una operación. Devuelve 'aplicado' o 'conflicto' (los errores se propagan)"""
+    modelo = _modelo(item.tabla)
+    tiene_version = any(f.attname == 'version' for f in modelo._meta.concrete_fields)
+    registro = modelo.objects.select_for_update().filter(pk=item.registro_id).first()
+    _verificar_permiso(item, registro)
+
+    if item.operacion == 'INSERT':
+        if registro is not None:
+            _registrar_conflicto(item, registro, getattr(registro, 'version', None), 'El registro ya existe en el servidor')
+            return 'conflicto'
+        registro = modelo(pk=item.registro_id)
+        _asignar(registro, item.datos)
+        _marcar_offline(registro, ahora)
+        _validar_valores(registro)
+        registro.save(force_insert=True)
+        item.version_servidor = getattr(registro, 'version', None)
+        return 'aplicado'
+
+    if registro is None:
+        _registrar_conflicto(item, None, None, 'El registro ya no existe en el servidor')
+        return 'conflicto'
+
+    if tiene_version and registro.version != item.version_local:
+        _registrar_conflicto(item, registro, registro.version, 'El registro cambió en el servidor desde la última sincronización')
+        return 'conflicto'
+
+    if item.operacion == 'UPDATE':
+        _asignar(registro, item.datos)
+        _marcar_offline(registro, ahora)
+        _validar_valores(registro)
+        if tiene_version:
+            # En PostgreSQL el trigger incrementar_version hace lo mismo
+            registro.version = registro.version + 1
+        registro.save()
+        item.version_servidor = getattr(registro, 'version', None)
+        return 'aplicado'
+
+    # DELETE
+    if item.tabla in ELIMINACION_LOGICA:
+        campo, valor = ELIMINACION_LOGICA[item.tabla]
+        setattr(registro, campo, valor())
+        _marcar_offline(registro, ahora)
+        if tiene_version:
+            registro.version = registro.version + 1
+        registro.save()
+    else:
+        registro.delete()
+    return 'aplicado'
+
+
+def _pendientes(filtro=None):
+    pendientes = ColaSincronizacion.objects.filter(
+        sincronizado=False,
+        tiene_conflicto=False,
+        intentos__lt=F('max_intentos'),
+    )
+    if filtro is not None:
+        pendientes = pendientes.filter(filtro)
+    return pendientes.order_by('-prioridad', 'creado_en')
+
+
+def procesar_lote(filtro=None, tamano=TAMANO_LOTE):
+    """
+    Aplica un lote de operaciones pendientes en una transacción.
+    SKIP LOCKED permite varios workers (o un request y el worker) a la vez.
+    Devuelve {id_operacion: 'aplicado' | 'conflicto' | 'error'}.
+    """
+    resultados = {}
+    ahora = timezone.now()
+    with transaction.atomic():
+        lote = list(_pendientes(filtro).select_related('usuario').select_for_update(
+            skip_locked=True, of=('self',)
+        )[:tamano])
+        for item in lote:
+            item.intentos += 1
+            item.ultimo_intento = ahora
+            try:
+                with transaction.atomic():
+                    resultado = _aplicar(item, ahora)
+                    # Las FK son diferidas: verificarlas aquí para que una referencia inválida
+                    # revierta solo esta operación y no falle el COMMIT del lote
+                    connection.check_constraints(table_names=[_modelo(item.tabla)._meta.db_table])
+            except Exception as e:
+                logger.warning("Error al aplicar la operación de sincronización %s: %s", item.id, e)
+                item.error_mensaje = str(e)
+                resultado = 'error'
+            else:
+                item.procesado_en = ahora
+                if resultado == 'aplicado':
+                    item.sincronizado = True
+                    item.sincronizado_en = ahora
+                    item.error_mensaje = None
+            item.save(update_fields=[
+                'intentos', 'ultimo_intento', 'procesado_en', 'sincronizado', 'sincronizado_en',
+                'tiene_conflicto', 'version_servidor', 'error_mensaje',
+            ])
+            resultados[item.id] = resultado
+    return resultados
+
+
+def procesar_pendientes(filtro=None, tamano=TAMANO_LOTE, max_lotes=None):
+    """
+    Procesa lotes hasta vaciar la cola (o hasta max_lotes). Devuelve los resultados acumulados.
+    Las operaciones con error quedan pendientes, pero no se reintentan en la misma llamada.
+    """
+    resultados = {}
+    lotes = 0
+    while max_lotes is None or lotes < max_lotes:
+        pendientes = ~Q(id__in=list(resultados))
+        lote = procesar_lote(pendientes & filtro if filtro is not None else pendientes, tamano)
+        if not lote:
+            break
+        resultados.update(lote)
+        lotes += 1
+    return resultados
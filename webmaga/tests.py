@@ -1,3 +1,590 @@
-from django.test import TestCase
+"""
+Pruebas de la aplicación webmaga
+Se ejecutan con `python manage.py test webmaga` contra PostgreSQL: las migraciones y varias
+consultas de reportes usan SQL propio de PostgreSQL.
+"""
+import datetime
+import io
+import os
+import shutil
+import tempfile
+import uuid
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Q
+from django.http import Http404, QueryDict
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from . import correo_saliente, report_cache, report_jobs, subidas_por_partes
+from .authentication import UsuarioMAGABackend
+from .calendar_feed import validadores_rango
+from .eventos_listado import CAMPOS_RESUMEN, listar_eventos
+from .models import (
+    Actividad, ActividadBeneficiario, ActividadCambio, ActividadComunidad, ActividadPersonal,
+    Beneficiario, BeneficiarioFamilia, BeneficiarioIndividual, BeneficiarioInstitucion,
+    ColaSincronizacion, Colaborador, Comunidad, CorreoSaliente, EventoCambioColaborador, EventosEvidenciasCambios, ExportacionReporte,
+    Puesto, Region, SubidaArchivo,
+    TipoActividad, TipoBeneficiario, TipoComunidad, Usuario,
+)
+from .report_queries import GENERADORES_REPORTE, filtros_desde_querydict, generar_reporte
+from .servir_media import servir_archivo
+from .sync_delta import cambios_desde, codificar_cursor
+from .sync_queue import OperacionInvalida, encolar_operaciones, procesar_pendientes, validar_operacion
+
+
+def crear_datos_reportes(cantidad, prefijo):
+    """
+    Crea `cantidad` comunidades con dos actividades cada una. Los beneficiarios, cambios y
+    evidencias de cada actividad también crecen con `cantidad`, de modo que un reporte que
+    consulte por fila haría más consultas con más datos.
+    Retorna la primera actividad creada (para el reporte de evento individual).
+    """
+    tipo_comunidad = TipoComunidad.objects.get(codigo='ALD')
+    tipos_actividad = list(TipoActividad.objects.order_by('nombre'))
+    tipos_beneficiario = {t.nombre: t for t in TipoBeneficiario.objects.all()}
+    puesto = Puesto.objects.create(codigo=f'{prefijo}-P', nombre=f'Técnico {prefijo}')
+
+    region = Region.objects.create(codigo=f'{prefijo}-R', nombre=f'Región {prefijo}')
+    responsable = Usuario.objects.create(
+        username=f'{prefijo}-resp', email=f'{prefijo}-resp@maga.test', password_hash='x',
+        rol='personal', puesto=puesto,
+    )
+    colaboradores = [
+        Colaborador.objects.create(nombre=f'Colaborador {prefijo}-{i}', puesto=puesto)
+        for i in range(cantidad)
+    ]
+
+    primera = None
+    for i in range(cantidad):
+        comunidad = Comunidad.objects.create(
+            codigo=f'{prefijo}-C{i}', nombre=f'Comunidad {prefijo}-{i}', tipo=tipo_comunidad, region=region,
+        )
+        for j in range(2):
+            actividad = Actividad.objects.create(
+                tipo=tipos_actividad[(i + j) % len(tipos_actividad)],
+                nombre=f'Actividad {prefijo}-{i}-{j}',
+                fecha=datetime.date(2024, 1, 1) + datetime.timedelta(days=i * 2 + j),
+                estado=['planificado', 'en_progreso', 'completado'][(i + j) % 3],
+                comunidad=comunidad if j == 0 else None,
+                responsable=responsable,
+                colaborador=colaboradores[i],
+            )
+            primera = primera or actividad
+            ActividadComunidad.objects.create(actividad=actividad, comunidad=comunidad, region=region)
+            ActividadPersonal.objects.create(actividad=actividad, usuario=responsable, rol_en_actividad='responsable')
+
+            for k in range(cantidad):
+                nombre_tipo = ['individual', 'familia', 'institución'][k % 3]
+                beneficiario = Beneficiario.objects.create(tipo=tipos_beneficiario[nombre_tipo], comunidad=comunidad)
+                if nombre_tipo == 'individual':
+                    BeneficiarioIndividual.objects.create(
+                        beneficiario=beneficiario, nombre=f'Nombre {k}', apellido=f'Apellido {k}',
+                    )
+                elif nombre_tipo == 'familia':
+                    BeneficiarioFamilia.objects.create(
+                        beneficiario=beneficiario, nombre_familia=f'Familia {k}', jefe_familia=f'Jefe {k}',
+                    )
+                else:
+                    BeneficiarioInstitucion.objects.create(
+                        beneficiario=beneficiario, nombre_institucion=f'Institución {k}', tipo_institucion='escuela',
+                    )
+                ActividadBeneficiario.objects.create(actividad=actividad, beneficiario=beneficiario)
+
+                fecha_cambio = timezone.make_aware(datetime.datetime(2024, 2, 1 + k % 28, 10))
+                cambio = EventoCambioColaborador.objects.create(
+                    actividad=actividad, colaborador=colaboradores[k], comunidad=comunidad,
+                    descripcion_cambio=f'Avance {k}', fecha_cambio=fecha_cambio,
+                )
+                EventosEvidenciasCambios.objects.create(
+                    actividad=actividad, cambio=cambio, archivo_nombre=f'evidencia_{k}.jpg',
+                    archivo_tipo='image/jpeg', url_almacenamiento=f'/media/evidencia_{prefijo}_{i}_{j}_{k}.jpg',
+                )
+                ActividadCambio.objects.create(
+                    actividad=actividad, responsable=responsable, descripcion_cambio=f'Cambio {k}',
+                    fecha_cambio=fecha_cambio,
+                )
+    return primera
+
+
+class ConsultasReportesTests(TestCase):
+    """Cada reporte se genera con un número fijo de consultas, sin importar la cantidad de datos"""
+
+    CONSULTAS_POR_REPORTE = {
+        'actividades-por-region-comunidad': 6,
+        'beneficiarios-por-region-comunidad': 1,
+        'actividades-por-region': 1,
+        'actividades-por-comunidad': 1,
+        'actividad-de-personal': 1,
+        'avances-eventos-generales': 7,
+        'comunidades': 5,
+        'reporte-evento-individual': 28,
+        'actividad-usuarios': 2,
+        'reporte-general': 14,
+    }
+
+    def test_todos_los_reportes_tienen_numero_de_consultas(self):
+        self.assertEqual(set(self.CONSULTAS_POR_REPORTE), set(GENERADORES_REPORTE))
+
+    APARTADOS_REPORTE_GENERAL = (
+        'total_eventos,tipos_eventos,total_beneficiarios,tipos_beneficiarios,total_comunidades,'
+        'total_avances,comunidades_mas_beneficiarios,eventos_mas_beneficiarios,evento_mas_avances'
+    )
+
+    def _verificar_consultas(self, evento):
+        parametros_por_reporte = {
+            'reporte-evento-individual': f'evento={evento.id}',
+            'reporte-general': f'apartados={self.APARTADOS_REPORTE_GENERAL}',
+        }
+        for report_type, consultas in self.CONSULTAS_POR_REPORTE.items():
+            filtros = filtros_desde_querydict(QueryDict(parametros_por_reporte.get(report_type, '')))
+            with self.subTest(report_type=report_type), self.assertNumQueries(consultas):
+                resultado = generar_reporte(report_type, filtros)
+            self.assertIn('data', resultado)
+
+    def test_consultas_con_pocos_datos(self):
+        self._verificar_consultas(crear_datos_reportes(2, 'POCOS'))
+
+    def test_consultas_con_muchos_datos(self):
+        self._verificar_consultas(crear_datos_reportes(12, 'MUCHOS'))
+
+
+class CorteSincronizacionTests(TestCase):
+    """El cursor de la sincronización delta no avanza más allá de una transacción abierta"""
+
+    def _con_transaccion_abierta(self, sql):
+        """Abre una transacción en otra conexión, ejecuta sql y retorna (conexión, inicio)"""
+        otra = connection.get_new_connection(connection.get_connection_params())
+        with otra.cursor() as cursor:
+            cursor.execute(sql)
+            cursor.execute('SELECT now()')
+            return otra, cursor.fetchone()[0]
+
+    def _generado_hasta(self):
+        # Sin margen: solo la transacción abierta puede retrasar el corte
+        with mock.patch('webmaga.sync_delta.MARGEN_SEGUNDOS', 0):
+            return datetime.datetime.fromisoformat(cambios_desde()['generado_hasta'])
+
+    def test_corte_antes_de_transaccion_abierta(self):
+        # Una transacción larga (importación, lote de sync_queue) que ya escribió y aún no confirma
+        otra, inicio_transaccion = self._con_transaccion_abierta('SELECT txid_current()')
+        try:
+            self.assertLess(self._generado_hasta(), inicio_transaccion)
+        finally:
+            otra.rollback()
+            otra.close()
+
+    def test_transaccion_de_solo_lectura_no_retiene_el_corte(self):
+        # pg_dump o una sesión "idle in transaction" que solo consultó
+        otra, inicio_transaccion = self._con_transaccion_abierta('SELECT 1')
+        try:
+            self.assertGreaterEqual(self._generado_hasta(), inicio_transaccion)
+        finally:
+            otra.rollback()
+            otra.close()
+
+    def test_retraso_maximo_del_corte(self):
+        otra, _ = self._con_transaccion_abierta('SELECT txid_current()')
+        try:
+            with mock.patch('webmaga.sync_delta.RETRASO_MAXIMO_SEGUNDOS', 0), \
+                    self.assertLogs('webmaga.sync_delta', 'WARNING'):
+                antes = timezone.now()
+                generado_hasta = self._generado_hasta()
+            self.assertGreaterEqual(generado_hasta, antes)
+        finally:
+            otra.rollback()
+            otra.close()
+
+    def test_update_de_asignacion_llega_al_dispositivo(self):
+        tipo = TipoActividad.objects.order_by('nombre').first()
+        admin = Usuario.objects.create(
+            username='delta-admin', email='delta-admin@maga.test', password_hash='x', rol='admin',
+        )
+        actividad = Actividad.objects.create(
+            tipo=tipo, nombre='Evento delta', fecha=datetime.date(2024, 1, 1), responsable=admin,
+        )
+        asignacion = ActividadPersonal.objects.create(actividad=actividad, usuario=admin, rol_en_actividad='responsable')
+        # La asignación se creó hace una hora, el dispositivo sincronizó hace media hora y
+        # ahora cambia el rol (el trigger renueva actualizado_en)
+        hace_una_hora = timezone.now() - datetime.timedelta(hours=1)
+        ActividadPersonal.objects.filter(pk=asignacion.pk).update(creado_en=hace_una_hora, rol_en_actividad='colaborador')
+        desde = (hace_una_hora + datetime.timedelta(minutes=30)).isoformat()
+        cursor = codificar_cursor({'e': {'actividad_personal': [desde, None]}, 't': 0})
+
+        with mock.patch('webmaga.sync_delta.MARGEN_SEGUNDOS', 0):
+            bloque = cambios_desde(cursor)['cambios']['actividad_personal']
+        self.assertEqual(bloque['insertados'], [])
+        self.assertEqual(len(bloque['actualizados']), 1)
+        fila = dict(zip(bloque['columnas'], bloque['actualizados'][0]))
+        self.assertEqual(fila['rol_en_actividad'], 'colaborador')
+
+
+class PermisosSincronizacionTests(TestCase):
+    """Las operaciones subidas por la PWA respetan los mismos permisos que la interfaz web"""
+
+    def setUp(self):
+        tipo = TipoActividad.objects.order_by('nombre').first()
+        puesto = Puesto.objects.create(codigo='SYNC-P', nombre='Técnico de campo')
+        self.personal = Usuario.objects.create(
+            username='sync-personal', email='sync-personal@maga.test', password_hash='x',
+            rol='personal', puesto=puesto,
+        )
+        self.admin = Usuario.objects.create(
+            username='sync-admin', email='sync-admin@maga.test', password_hash='x', rol='admin',
+        )
+        self.propio = Actividad.objects.create(
+            tipo=tipo, nombre='Evento asignado', fecha=datetime.date(2024, 1, 1), responsable=self.admin,
+        )
+        self.ajeno = Actividad.objects.create(
+            tipo=tipo, nombre='Evento ajeno', fecha=datetime.date(2024, 1, 2), responsable=self.admin,
+        )
+        self.asignacion = ActividadPersonal.objects.create(
+            actividad=self.propio, usuario=self.personal, rol_en_actividad='responsable',
+        )
+        self.colaborador = Colaborador.objects.create(nombre='Colaborador externo')
+
+    def _aplicar(self, usuario, **operacion):
+        validadas = [validar_operacion(operacion, usuario)]
+        ids, _ = encolar_operaciones(usuario, 'dispositivo-prueba', validadas)
+        return procesar_pendientes(Q(usuario=usuario))[ids[0]]
+
+    def test_personal_modifica_su_evento(self):
+        resultado = self._aplicar(
+            self.personal, operacion='UPDATE', tabla='actividades', registro_id=str(self.propio.id),
+            datos={'nombre': 'Nombre desde la PWA'}, version_local=self.propio.version,
+        )
+        self.assertEqual(resultado, 'aplicado')
+        self.propio.refresh_from_db()
+        self.assertEqual(self.propio.nombre, 'Nombre desde la PWA')
+
+    def test_personal_no_mueve_su_asignacion_a_otro_evento(self):
+        resultado = self._aplicar(
+            self.personal, operacion='UPDATE', tabla='actividad_personal', registro_id=str(self.asignacion.id),
+            datos={'actividad_id': str(self.ajeno.id)},
+        )
+        self.assertEqual(resultado, 'error')
+        self.asignacion.refresh_from_db()
+        self.assertEqual(self.asignacion.actividad_id, self.propio.id)
+
+    def test_personal_no_se_asigna_a_evento_ajeno(self):
+        resultado = self._aplicar(
+            self.personal, operacion='INSERT', tabla='actividad_personal', registro_id=str(uuid.uuid4()),
+            datos={'actividad_id': str(self.ajeno.id), 'usuario_id': str(self.personal.id), 'rol_en_actividad': 'x'},
+        )
+        self.assertEqual(resultado, 'error')
+        self.assertFalse(ActividadPersonal.objects.filter(actividad=self.ajeno).exists())
+
+    def test_personal_no_elimina_beneficiarios(self):
+        with self.assertRaises(PermissionError):
+            validar_operacion({
+                'operacion': 'DELETE', 'tabla': 'beneficiarios', 'registro_id': str(uuid.uuid4()), 'datos': {},
+            }, self.personal)
+
+    def test_colaboradores_no_se_modifican_desde_la_cola(self):
+        with self.assertRaises(OperacionInvalida):
+            validar_operacion({
+                'operacion': 'UPDATE', 'tabla': 'colaboradores', 'registro_id': str(self.colaborador.id),
+                'datos': {'usuario_id': str(self.personal.id)},
+            }, self.personal)
+
+        # Una fila que llegó a la cola sin pasar por validar_operacion tampoco se aplica
+        item = ColaSincronizacion.objects.create(
+            usuario=self.personal, operacion='UPDATE', tabla='colaboradores',
+            registro_id=self.colaborador.id, datos={'usuario_id': str(self.personal.id)},
+        )
+        self.assertEqual(procesar_pendientes(Q(id=item.id))[item.id], 'error')
+        self.colaborador.refresh_from_db()
+        self.assertIsNone(self.colaborador.usuario_id)
+
+    def test_valores_fuera_de_choices(self):
+        resultado = self._aplicar(
+            self.admin, operacion='UPDATE', tabla='actividades', registro_id=str(self.propio.id),
+            datos={'estado': 'inventado'}, version_local=self.propio.version,
+        )
+        self.assertEqual(resultado, 'error')
+        self.propio.refresh_from_db()
+        self.assertEqual(self.propio.estado, 'planificado')
+
+
+class ConsultasAutenticacionTests(TestCase):
+    """El login hace una búsqueda del usuario y un solo UPDATE, entre con username o con email"""
+
+    def setUp(self):
+        puesto = Puesto.objects.create(codigo='AUTH-P', nombre='Técnico de campo')
+        self.usuario = Usuario.objects.create(
+            username='auth-personal', email='auth-personal@maga.test', password_hash=make_password('clave-segura'),
+            rol='personal', puesto=puesto, intentos_fallidos=2,
+        )
+        # El User de Django ya existe y está al día: no se vuelve a guardar
+        User.objects.create(username='auth-personal', email='auth-personal@maga.test', is_active=True)
+        self.backend = UsuarioMAGABackend()
+
+    def _verificar_login_correcto(self, identificador):
+        # SELECT de usuarios, UPDATE de intentos/último login y SELECT del User de Django
+        with self.assertNumQueries(3):
+            user = self.backend.authenticate(None, username=identificador, password='clave-segura')
+        self.assertIsNotNone(user)
+        self.assertEqual(user.username, 'auth-personal')
+        self.assertEqual(user.usuario_maga_id, self.usuario.id)
+        self.usuario.refresh_from_db()
+        self.assertEqual(self.usuario.intentos_fallidos, 0)
+        self.assertIsNotNone(self.usuario.ultimo_login)
+
+    def test_login_por_username(self):
+        self._verificar_login_correcto('auth-personal')
+
+    def test_login_por_email(self):
+        self._verificar_login_correcto('auth-personal@maga.test')
+
+    def test_contrasena_incorrecta(self):
+        # SELECT de usuarios y UPDATE de intentos fallidos
+        with self.assertNumQueries(2):
+            user = self.backend.authenticate(None, username='auth-personal', password='otra-clave')
+        self.assertIsNone(user)
+        self.usuario.refresh_from_db()
+        self.assertEqual(self.usuario.intentos_fallidos, 3)
+        self.assertIsNone(self.usuario.ultimo_login)
+
+
+class AlmacenReportesTests(TestCase):
+    """Las exportaciones y la caché de reportes se guardan fuera de MEDIA_ROOT"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.almacen = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.almacen, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=self.media_root, REPORT_STORAGE_ROOT=self.almacen, REPORT_CACHE_ENABLED=True)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def test_exportacion_desde_cache_en_almacen_privado(self):
+        admin = Usuario.objects.create(
+            username='export-admin', email='export-admin@maga.test', password_hash='x', rol='admin',
+        )
+        entrada = report_cache.guardar('a' * 64, b'%PDF-1.4', 'reporte.pdf', 'application/pdf')
+        trabajo = report_jobs.completar_desde_cache(report_jobs.encolar_exportacion(admin, 'reporte', 'pdf', {}), entrada)
+
+        ruta = report_jobs.ruta_absoluta_exportacion(trabajo)
+        for archivo in (entrada['ruta'], ruta):
+            self.assertTrue(archivo.startswith(self.almacen + os.sep))
+        self.assertEqual(os.listdir(self.media_root), [])
+        self.assertEqual(ExportacionReporte.objects.get(pk=trabajo.pk).estado, 'completado')
+
+
+class ServirMediaTests(TestCase):
+    """/media/ no entrega carpetas internas y solo las galerías públicas se cachean como public"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=self.media_root, MEDIA_SENDFILE='')
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.nombre = f'{uuid.uuid4()}.jpg'
+        for carpeta in ('galeria_img', 'evidencias', 'blobs/tmp/subidas', 'reportes_exportados', 'reportes_cache'):
+            os.makedirs(os.path.join(self.media_root, carpeta))
+            with open(os.path.join(self.media_root, carpeta, self.nombre), 'wb') as archivo:
+                archivo.write(b'contenido')
+
+    def _servir(self, ruta):
+        return servir_archivo(RequestFactory().get(f'/media/{ruta}'), ruta)
+
+    def test_carpetas_privadas_responden_404(self):
+        for ruta in (
+            f'blobs/tmp/subidas/{self.nombre}', f'reportes_exportados/{self.nombre}',
+            f'reportes_cache/{self.nombre}', f'galeria_img/../reportes_cache/{self.nombre}',
+        ):
+            with self.subTest(ruta=ruta), self.assertRaises(Http404):
+                self._servir(ruta)
+
+    def test_solo_galerias_publicas_son_public(self):
+        publica = self._servir(f'galeria_img/{self.nombre}')
+        privada = self._servir(f'evidencias/{self.nombre}')
+        self.assertTrue(publica['Cache-Control'].startswith('public, '))
+        self.assertTrue(privada['Cache-Control'].startswith('private, '))
+        self.assertIn('immutable', privada['Cache-Control'])
+
+
+class SelloReportesTests(TestCase):
+    """El sello de la caché de reportes cambia con los datos que muestran los reportes"""
+
+    def setUp(self):
+        self.actividad = crear_datos_reportes(1, 'SELLO')
+        self.usuario = self.actividad.responsable
+
+    def assertSelloCambia(self, cambiar, cambia=True):
+        antes = report_cache.sello_version_datos()
+        cambiar()
+        despues = report_cache.sello_version_datos()
+        if cambia:
+            self.assertNotEqual(antes, despues)
+        else:
+            self.assertEqual(antes, despues)
+
+    def test_beneficiario_agregado_al_evento(self):
+        beneficiario = Beneficiario.objects.create(
+            tipo=TipoBeneficiario.objects.get(nombre='individual'), comunidad=self.actividad.comunidad,
+        )
+        self.assertSelloCambia(
+            lambda: ActividadBeneficiario.objects.create(actividad=self.actividad, beneficiario=beneficiario)
+        )
+
+    def test_cambio_y_evidencia(self):
+        cambio = EventoCambioColaborador.objects.filter(actividad=self.actividad).first()
+        self.assertSelloCambia(
+            lambda: EventoCambioColaborador.objects.filter(pk=cambio.pk).update(descripcion_cambio='Avance corregido')
+        )
+        self.assertSelloCambia(lambda: EventosEvidenciasCambios.objects.create(
+            actividad=self.actividad, cambio=cambio, archivo_nombre='nueva.jpg', archivo_tipo='image/jpeg',
+            url_almacenamiento='/media/nueva.jpg',
+        ))
+
+    def test_nombre_de_usuario(self):
+        self.assertSelloCambia(lambda: Usuario.objects.filter(pk=self.usuario.pk).update(nombre='Nombre corregido'))
+
+    def test_login_no_invalida_la_cache(self):
+        self.assertSelloCambia(
+            lambda: Usuario.objects.filter(pk=self.usuario.pk).update(ultimo_login=timezone.now(), intentos_fallidos=0),
+            cambia=False,
+        )
+
+
+class ValidadoresCalendarioTests(TestCase):
+    """El ETag del calendario cambia con los nombres y asignaciones que muestra la respuesta"""
+
+    def setUp(self):
+        self.actividad = crear_datos_reportes(1, 'CAL')
+
+    def _etag(self):
+        return validadores_rango('2024-01-01', '2024-01-31')[0]
+
+    def test_nombre_del_responsable(self):
+        antes = self._etag()
+        Usuario.objects.filter(pk=self.actividad.responsable_id).update(nombre='Nombre corregido')
+        self.assertNotEqual(antes, self._etag())
+
+    def test_cambio_de_asignacion(self):
+        antes = self._etag()
+        # Todas las asignaciones del rango: dentro de la transacción de la prueba el trigger usa
+        # siempre la misma hora (CURRENT_TIMESTAMP), menor que la de las filas recién creadas
+        ActividadPersonal.objects.filter(actividad__fecha__year=2024).update(rol_en_actividad='colaborador')
+        self.assertNotEqual(antes, self._etag())
+
+
+class ListadoEventosTests(TestCase):
+    """La tabla de eventos pide páginas con las columnas que muestra (view=summary)"""
+
+    def test_pagina_resumen_con_busqueda(self):
+        crear_datos_reportes(3, 'LISTA')
+        with self.assertNumQueries(4):
+            eventos, total = listar_eventos(CAMPOS_RESUMEN, limite=2, offset=0)
+        self.assertEqual(total, 6)
+        self.assertEqual(len(eventos), 2)
+        self.assertEqual(list(eventos[0]), list(CAMPOS_RESUMEN))
+
+        eventos, total = listar_eventos(CAMPOS_RESUMEN, limite=2, offset=0, buscar='lista-1-')
+        self.assertEqual(total, 2)
+        self.assertEqual({e['nombre'] for e in eventos}, {'Actividad LISTA-1-0', 'Actividad LISTA-1-1'})
+
+
+class CorreosVencidosTests(TestCase):
+    """Un código de recuperación vencido no se envía ni se reintenta"""
+
+    def _encolar(self, minutos_vigencia):
+        return correo_saliente.encolar_correo(
+            'recuperacion', 'Código', 'Tu código es 123456', 'no-reply@maga.test', ['persona@maga.test'],
+            expira_en=timezone.now() + datetime.timedelta(minutes=minutos_vigencia),
+        )
+
+    def test_correo_vencido_no_se_envia(self):
+        correo = self._encolar(-1)
+        self.assertEqual(correo_saliente.procesar_lote(), {})
+        correo.refresh_from_db()
+        self.assertEqual(correo.estado, 'fallido')
+
+    def test_no_se_reintenta_despues_de_vencer(self):
+        correo = self._encolar(3)
+        correo.intentos = 3  # Cuarto intento: la siguiente espera (4 minutos) pasa del vencimiento
+        correo.save(update_fields=['intentos'])
+        with mock.patch('webmaga.correo_saliente.get_connection', side_effect=None) as conexion:
+            conexion.return_value.open.side_effect = OSError('SMTP no disponible')
+            self.assertEqual(correo_saliente.procesar_lote(), {correo.id: 'error'})
+        correo.refresh_from_db()
+        self.assertEqual(correo.estado, 'fallido')
+        self.assertEqual(CorreoSaliente.objects.filter(estado='pendiente').count(), 0)
+
+
+class CuerpoParte(io.BytesIO):
+    """Cuerpo de la petición que anota si se lee dentro de una transacción y puede ejecutar algo a mitad"""
+
+    def __init__(self, contenido, a_mitad=None):
+        super().__init__(contenido)
+        self.a_mitad = a_mitad
+        self.bloques_atomicos = []
+
+    def read(self, tamano=-1):
+        self.bloques_atomicos.append(len(connection.atomic_blocks))
+        if self.a_mitad and self.tell():
+            self.a_mitad()
+            self.a_mitad = None
+        return super().read(tamano)
+
+
+class SubidaPorPartesTests(TestCase):
+    """Cada parte se recibe con un turno y sin transacción abierta mientras llega el cuerpo"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=self.media_root)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        # Bloques pequeños para que el cuerpo se lea en varias vueltas
+        bloques = mock.patch.object(subidas_por_partes, 'TAMANO_BLOQUE', 4)
+        bloques.start()
+        self.addCleanup(bloques.stop)
+        self.usuario = Usuario.objects.create(
+            username='subida-admin', email='subida-admin@maga.test', password_hash='x', rol='admin',
+        )
+        self.subida = subidas_por_partes.iniciar(self.usuario, 'evento', uuid.uuid4(), 'acta.pdf', 20)
+        self.contenido = os.urandom(20)
+
+    def _enviar(self, cuerpo, inicio, fin):
+        return subidas_por_partes.recibir_parte(
+            self.subida.pk, self.usuario, cuerpo, f'bytes {inicio}-{fin}/20', fin - inicio + 1,
+        )
+
+    def test_parte_se_lee_fuera_de_transaccion(self):
+        cuerpo = CuerpoParte(self.contenido[:12])
+        subida = self._enviar(cuerpo, 0, 11)
+
+        # Solo los atomic() de TestCase: la lectura no ocurre dentro de recibir_parte
+        self.assertEqual(set(cuerpo.bloques_atomicos), {len(connection.atomic_blocks)})
+        subida.refresh_from_db()
+        self.assertEqual((subida.recibido, subida.recibiendo_por, subida.recibiendo_hasta), (12, None, None))
+        with open(subidas_por_partes.ruta_parcial(subida), 'rb') as parcial:
+            self.assertEqual(parcial.read(), self.contenido[:12])
+
+    def test_turno_activo_rechaza_otra_parte(self):
+        def reintento():
+            with self.assertRaises(subidas_por_partes.SubidaInvalida) as error:
+                self._enviar(CuerpoParte(self.contenido[:12]), 0, 11)
+            self.assertEqual(error.exception.status, 409)
+
+        self._enviar(CuerpoParte(self.contenido[:12], a_mitad=reintento), 0, 11)
+        self.assertEqual(SubidaArchivo.objects.get(pk=self.subida.pk).recibido, 12)
+
+    def test_turno_perdido_no_avanza_recibido(self):
+        def turno_vencido_tomado_por_otro():
+            SubidaArchivo.objects.filter(pk=self.subida.pk).update(
+                recibiendo_por=uuid.uuid4(), recibiendo_hasta=timezone.now() + datetime.timedelta(minutes=2),
+            )
+
+        with self.assertRaises(subidas_por_partes.SubidaInvalida) as error:
+            self._enviar(CuerpoParte(self.contenido[:12], a_mitad=turno_vencido_tomado_por_otro), 0, 11)
+        self.assertEqual(error.exception.status, 409)
+        self.assertEqual(SubidaArchivo.objects.get(pk=self.subida.pk).recibido, 0)
@@ -12,6 +12,8 @@ urlpatterns = [
     path('api/auth/recovery/verify-code/', views.api_verificar_codigo_recuperacion, name='api-verificar-codigo-recuperacion'),
     path('api/auth/recovery/reset-password/', views.api_resetear_password, name='api-resetear-password'),
     path('api/auth/offline/register/', views.api_registrar_sesion_offline, name='api-registrar-sesion-offline'),
+    path('api/sync/cambios/', views.api_sync_cambios, name='api-sync-cambios'),
+    path('api/sync/subir/', views.api_sync_subir, name='api-sync-subir'),
     path('api/asistencia-tecnica/enviar/', views.api_enviar_asistencia_tecnica, name='api-enviar-asistencia-tecnica'),
     
     # Vistas HTML
@@ -54,6 +56,9 @@ urlpatterns = [
     path('api/comunidad/<uuid:comunidad_id>/archivos/agregar/', views.api_agregar_archivo_comunidad, name='api-agregar-archivo-comunidad'),
     path('api/comunidad/<uuid:comunidad_id>/archivos/<uuid:archivo_id>/actualizar/', views.api_actualizar_archivo_comunidad, name='api-actualizar-archivo-comunidad'),
     path('api/comunidad/<uuid:comunidad_id>/archivos/<uuid:archivo_id>/eliminar/', views.api_eliminar_archivo_comunidad, name='api-eliminar-archivo-comunidad'),
+    # Subida por partes (reanudable) de archivos de eventos, regiones y comunidades
+    path('api/subidas/', views.api_subida_iniciar, name='api-subida-iniciar'),
+    path('api/subidas/<uuid:subida_id>/', views.api_subida_parte, name='api-subida-parte'),
     path('api/actividades/', views.api_actividades, name='api-actividades'),
     path('api/tipos-actividad/', views.api_tipos_actividad, name='api-tipos-actividad'),
     
@@ -85,6 +90,7 @@ urlpatterns = [
     path('api/beneficiario/<uuid:beneficiario_id>/agregar-proyectos/', views.api_agregar_beneficiario_proyectos, name='api-agregar-beneficiario-proyectos'),
     path('api/beneficiarios/crear/', views.api_crear_beneficiario, name='api-crear-beneficiario'),
     path('api/beneficiarios/buscar-por-dpi/', views.api_buscar_beneficiario_por_dpi, name='api-buscar-beneficiario-por-dpi'),
+    path('api/beneficiarios/verificar-dpis/', views.api_verificar_dpis, name='api-verificar-dpis'),
     path('api/beneficiarios/actualizar/<uuid:beneficiario_id>/', views.api_actualizar_beneficiario, name='api-actualizar-beneficiario'),
     path('api/beneficiarios/actualizar-fecha/<uuid:beneficiario_id>/', views.api_actualizar_fecha_beneficiario, name='api-actualizar-fecha-beneficiario'),
     path('api/proyectos/usuario/', views.api_proyectos_usuario, name='api-proyectos-usuario'),
@@ -130,6 +136,7 @@ urlpatterns = [
     path('api/reminders/', views.api_reminders, name='api-reminders'),
     path('api/reminders/pending/', views.api_reminders_pending, name='api-reminders-pending'),
     path('api/reminders/check-background/', views.api_reminders_check_background, name='api-reminders-check-background'),
+    path('api/reminders/stream/', views.api_reminders_stream, name='api-reminders-stream'),
     path('api/reminders/notifications/', views.api_reminders_notifications, name='api-reminders-notifications'),
     path('api/reminders/<uuid:reminder_id>/marcar-enviado/', views.api_marcar_notificacion_enviada, name='api-marcar-notificacion-enviada'),
     path('api/avances/', views.api_avances, name='api-avances'),
@@ -141,5 +148,11 @@ urlpatterns = [
     path('reportes/dashboard/stats/', views.api_dashboard_stats, name='api-dashboard-stats'),
     path('api/reportes/<str:report_type>/', views.api_generar_reporte, name='api-generar-reporte'),
     path('api/reportes/exportar/<str:report_type>/', views.api_exportar_reporte, name='api-exportar-reporte'),
+    
+    # APIs de Exportación en segundo plano
+    path('api/exportaciones/reporte/<str:report_type>/', views.api_encolar_exportacion_reporte, name='api-encolar-exportacion-reporte'),
+    path('api/exportaciones/beneficiarios/', views.api_encolar_exportacion_beneficiarios, name='api-encolar-exportacion-beneficiarios'),
+    path('api/exportaciones/<uuid:exportacion_id>/', views.api_estado_exportacion, name='api-estado-exportacion'),
+    path('api/exportaciones/<uuid:exportacion_id>/descargar/', views.api_descargar_exportacion, name='api-descargar-exportacion'),
 ]
 
@@ -0,0 +1,75 @@
+"""
+Usuario MAGA de la petición actual
+get_usuario_maga (decoradores y vistas), el context processor usuario_maga y los decoradores de
+permisos consultaban la tabla usuarios cada uno por su cuenta, varias veces en la misma petición.
+
+- Dentro de una petición el usuario se resuelve una sola vez y queda guardado en request.user
+  (UsuarioMagaMiddleware además lo expone como request.usuario_maga, de forma diferida).
+- Entre peticiones, cada proceso guarda los usuarios resueltos durante TTL_SEGUNDOS. Guardar o
+  eliminar un Usuario, Colaborador o Puesto incrementa una versión en la caché compartida, así
+  todos los procesos dejan de usar su copia en la siguiente petición (señales en signals.py).
+- Cada petición recibe su propia copia del usuario: lo que una vista cambie sin guardar no pasa
+  a las demás.
+"""
+import copy
+import threading
+import time
+
+from django.core.cache import cache
+
+from .models import Usuario
+
+CLAVE_VERSION = 'usuarios_maga:version'
+TTL_SEGUNDOS = 30
+ATRIBUTO_PETICION = '_usuario_maga'
+
+_lock = threading.Lock()
+_usuarios = {}  # username -> (guardado_en, version, usuario o None)
+
+
+def _version():
+    return cache.get(CLAVE_VERSION, 0)
+
+
+def invalidar():
+    """Avisar a todos los procesos que los usuarios cambiaron"""
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        cache.add(CLAVE_VERSION, 1, None)
+    with _lock:
+        _usuarios.clear()
+
+
+def _consultar(username):
+    return Usuario.objects.select_related('puesto', 'colaborador').filter(
+        username=username,
+        activo=True
+    ).first()
+
+
+def _buscar(username):
+    version = _version()
+    ahora = time.monotonic()
+    with _lock:
+        guardado = _usuarios.get(username)
+    if guardado and guardado[1] == version and ahora - guardado[0] < TTL_SEGUNDOS:
+        usuario = guardado[2]
+    else:
+        usuario = _consultar(username)
+        with _lock:
+            _usuarios[username] = (ahora, version, usuario)
+    return copy.deepcopy(usuario)
+
+
+def usuario_maga(user):
+    """Usuario MAGA activo del usuario de Django (una sola búsqueda por petición)"""
+    if user is None or not user.is_authenticated:
+        return None
+    try:
+        return getattr(user, ATRIBUTO_PETICION)
+    except AttributeError:
+        pass
+    usuario = _buscar(user.username)
+    setattr(user, ATRIBUTO_PETICION, usuario)
+    return usuario
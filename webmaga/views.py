@@ -1,11 +1,10 @@
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.db import connection
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, require_http_methods
 from django.db.models import Count, Q, Sum, Avg, Max, Min, F, Prefetch, Subquery, OuterRef, IntegerField
 from django.db.models.functions import TruncMonth, TruncYear, Extract
-from django.core.files.storage import FileSystemStorage
-from django.core.mail import send_mail
 from django.conf import settings
 from django.db import transaction, IntegrityError
 from django.utils import timezone
@@ -28,7 +27,8 @@ from .models import (
     EventoCambioColaborador, ActividadArchivo, EventosGaleria, CambioEvidencia, EventosEvidenciasCambios,
     RegionGaleria, RegionArchivo, ComunidadGaleria, ComunidadArchivo, ComunidadAutoridad,
     PasswordResetCode, UsuarioFotoPerfil, SesionOffline,
-    BeneficiarioAtributo, BeneficiarioAtributoTipo, BeneficiarioFoto
+    BeneficiarioAtributo, BeneficiarioAtributoTipo, BeneficiarioFoto,
+    ExportacionReporte, ColaSincronizacion, SubidaArchivo
 )
 from .decorators import (
     solo_administrador,
@@ -50,6 +50,11 @@ from .ratelimit_decorators import (
     api_ratelimit_login_smart,
     api_ratelimit_password_reset,
 )
+from . import almacen_archivos, imagenes_diferidas, subidas_por_partes
+from .correo_saliente import encolar_correo
+from .recordatorios_programador import invalidar as invalidar_recordatorios
+from .response_cache import respuesta_cacheada
+from .schema_registry import tiene_columna
 from .views_utils import (
     aplicar_modificaciones_beneficiarios,
     eliminar_portada_evento,
@@ -62,6 +67,8 @@ from .views_utils import (
     obtener_url_portada_o_evidencia,
     normalizar_dpi,
     buscar_conflicto_dpi,
+    buscar_dpis_existentes,
+    MAX_DPIS_POR_CONSULTA,
 )
 
 logger = logging.getLogger(__name__)
@@ -162,6 +169,10 @@ def _normalizar_ruta_media(url):
 
 def _eliminar_archivo_media(url):
     """Elimina un archivo físico ubicado dentro de MEDIA_ROOT."""
+    if almacen_archivos.es_archivo_del_almacen(url):
+        # Archivo compartido por contenido: lo elimina la recolección cuando no tiene referencias
+        return False
+
     file_path = _normalizar_ruta_media(url)
     if not file_path:
         return False
@@ -318,8 +329,12 @@ def api_enviar_codigo_recuperacion(request):
     </div>
     """
 
+    # El worker de correos lo envía; la respuesta no espera al servidor SMTP
     try:
-        send_mail(asunto, mensaje_texto, remitente, [usuario.email], fail_silently=False, html_message=mensaje_html)
+        encolar_correo(
+            'recuperacion', asunto, mensaje_texto, remitente, [usuario.email],
+            mensaje_html=mensaje_html, expira_en=registro.expira_en,
+        )
     except Exception as exc:
         registro.marcar_usado()
         return JsonResponse({
@@ -493,7 +508,7 @@ def api_resetear_password(request):
     """
 
     try:
-        send_mail(asunto, mensaje_texto, remitente, [usuario.email], fail_silently=True, html_message=mensaje_html)
+        encolar_correo('password_actualizado', asunto, mensaje_texto, remitente, [usuario.email], mensaje_html=mensaje_html)
     except Exception:
         pass
 
@@ -575,6 +590,146 @@ def api_registrar_sesion_offline(request):
         }, status=500)
 
 
+@login_required
+@require_http_methods(["GET"])
+@gzip_page
+def api_sync_cambios(request):
+    """Cambios (insertados, actualizados y eliminados) de todas las entidades offline desde el cursor.
+    
+    Parámetros:
+    - cursor: el devuelto por la sincronización anterior (sin cursor = carga inicial completa)
+    - limite: máximo de filas por respuesta; si hay_mas es true se vuelve a pedir con el nuevo cursor
+    - device_id: dispositivo que sincroniza (actualiza su última sincronización)
+    """
+    try:
+        usuario_maga = get_usuario_maga(request.user)
+        if not usuario_maga:
+            return JsonResponse({'success': False, 'error': 'Usuario MAGA no encontrado.'}, status=404)
+        
+        from .sync_delta import LIMITE_DEFECTO, CursorInvalido, cambios_desde
+        
+        try:
+            limite = int(request.GET.get('limite') or LIMITE_DEFECTO)
+            resultado = cambios_desde(request.GET.get('cursor') or None, limite)
+        except (CursorInvalido, ValueError):
+            return JsonResponse({
+                'success': False,
+                'error': 'Cursor o límite de sincronización inválido'
+            }, status=400)
+        
+        device_id = (request.GET.get('device_id') or '').strip()
+        if device_id:
+            SesionOffline.objects.filter(
+                usuario=usuario_maga, dispositivo_id=device_id[:100]
+            ).update(ultima_sincronizacion=timezone.now())
+        
+        return JsonResponse({'success': True, **resultado}, json_dumps_params={'separators': (',', ':')})
+    except Exception as e:
+        logger.error(f"Error en api_sync_cambios: {str(e)}", exc_info=True)
+        return JsonResponse({
+            'success': False,
+            'error': f'Error al obtener cambios para sincronizar: {str(e)}'
+        }, status=500)
+
+
+@permiso_gestionar_eventos_api
+@require_http_methods(["POST"])
+def api_sync_subir(request):
+    """Recibe las operaciones hechas sin conexión, las encola y las aplica en lotes.
+    
+    Cuerpo JSON:
+    - device_id: dispositivo que envía
+    - operaciones: lista de {operacion: INSERT|UPDATE|DELETE, tabla, registro_id, datos,
+      datos_anteriores, version_local, prioridad}
+    
+    Las operaciones repetidas (mismo contenido) se ignoran. Si el registro cambió en el servidor
+    desde version_local, la operación queda en estado "conflicto" y los campos en conflicto se
+    registran en conflictos_sincronizacion; el resto del lote se aplica igual.
+    """
+    try:
+        usuario_maga = get_usuario_maga(request.user)
+        data = _parse_request_data(request)
+        device_id = (data.get('device_id') or '').strip()[:100]
+        operaciones = data.get('operaciones')
+        
+        from .sync_queue import (
+            MAX_OPERACIONES_POR_ENVIO, OperacionInvalida, encolar_operaciones, procesar_pendientes,
+            validar_operacion,
+        )
+        
+        if not device_id or not isinstance(operaciones, list):
+            return JsonResponse({
+                'success': False,
+                'error': 'Se requieren device_id y la lista de operaciones'
+            }, status=400)
+        if len(operaciones) > MAX_OPERACIONES_POR_ENVIO:
+            return JsonResponse({
+                'success': False,
+                'error': f'Máximo {MAX_OPERACIONES_POR_ENVIO} operaciones por envío'
+            }, status=400)
+        
+        try:
+            validadas = [validar_operacion(op, usuario_maga) for op in operaciones]
+        except OperacionInvalida as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        except PermissionError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=403)
+        
+        encoladas, duplicadas = encolar_operaciones(usuario_maga, device_id, validadas)
+        
+        # Aplicar ahora las operaciones pendientes de este dispositivo (incluidas las de envíos
+        # anteriores que fallaron); las que estén tomadas por el worker se resuelven allí
+        procesar_pendientes(Q(usuario=usuario_maga, dispositivo_id=device_id))
+        
+        estados = {
+            (op.tabla, op.registro_id, op.operacion, op.hash_datos): op
+            for op in ColaSincronizacion.objects.filter(
+                usuario=usuario_maga,
+                dispositivo_id=device_id,
+                hash_datos__in=[op['hash_datos'] for op in validadas]
+            )
+        }
+        resultados = []
+        for op in validadas:
+            item = estados.get((op['tabla'], op['registro_id'], op['operacion'], op['hash_datos']))
+            if item is None:
+                estado = 'duplicada'  # Ya recibida desde otro usuario o dispositivo
+            elif item.sincronizado:
+                estado = 'aplicado'
+            elif item.tiene_conflicto:
+                estado = 'conflicto'
+            elif item.error_mensaje:
+                estado = 'error'
+            else:
+                estado = 'pendiente'
+            resultados.append({
+                'tabla': op['tabla'],
+                'registro_id': str(op['registro_id']),
+                'operacion': op['operacion'],
+                'estado': estado,
+                'version_servidor': item.version_servidor if item else None,
+                'error': item.error_mensaje if item and estado in ('conflicto', 'error') else None,
+            })
+        
+        SesionOffline.objects.filter(
+            usuario=usuario_maga, dispositivo_id=device_id
+        ).update(ultima_sincronizacion=timezone.now())
+        
+        return JsonResponse({
+            'success': True,
+            'recibidas': len(validadas),
+            'encoladas': len(encoladas),
+            'duplicadas': duplicadas,
+            'resultados': resultados,
+        })
+    except Exception as e:
+        logger.error(f"Error en api_sync_subir: {str(e)}", exc_info=True)
+        return JsonResponse({
+            'success': False,
+            'error': f'Error al subir operaciones offline: {str(e)}'
+        }, status=500)
+
+
 @login_required
 @require_http_methods(["POST"])
 def api_enviar_asistencia_tecnica(request):
@@ -699,7 +854,8 @@ Este correo fue enviado desde el sistema MAGA Purulhá."""
     # Verificar configuración de correo antes de enviar
     logger.info(f'Configuración de correo - Host: {settings.EMAIL_HOST}, Port: {settings.EMAIL_PORT}, User: {settings.EMAIL_HOST_USER}')
     
-    if not settings.EMAIL_HOST_USER or not settings.EMAIL_HOST_PASSWORD:
+    usa_smtp = settings.EMAIL_BACKEND == 'django.core.mail.backends.smtp.EmailBackend'
+    if usa_smtp and (not settings.EMAIL_HOST_USER or not settings.EMAIL_HOST_PASSWORD):
         logger.warning('Configuración de correo no encontrada. Usando valores por defecto.')
         return JsonResponse({
             'success': False,
@@ -707,47 +863,17 @@ Este correo fue enviado desde el sistema MAGA Purulhá."""
             'detail': 'EMAIL_HOST_USER o EMAIL_HOST_PASSWORD no están configurados'
         }, status=500)
     
-    # Enviar correo
+    # Registrar el correo en la bandeja de salida (lo envía el worker procesar_correos)
     try:
-        logger.info(f'Intentando enviar correo desde {remitente} a {destinatario}')
-        result = send_mail(
-            asunto,
-            mensaje_texto,
-            remitente,
-            [destinatario],
-            fail_silently=False,
-            html_message=mensaje_html
-        )
-        
-        logger.info(f'Correo de asistencia técnica enviado. Resultado: {result}')
-        
-        if not result:
-            return JsonResponse({
-                'success': False,
-                'error': 'El correo no se pudo enviar. Por favor, intenta nuevamente.',
-                'detail': 'send_mail retornó False'
-            }, status=500)
-        
+        correo = encolar_correo('asistencia', asunto, mensaje_texto, remitente, [destinatario], mensaje_html=mensaje_html)
+        logger.info(f'Correo de asistencia técnica encolado: {correo.id}')
     except Exception as exc:
-        logger.error(f'Error al enviar correo de asistencia técnica: {str(exc)}', exc_info=True)
-        
-        # Mensaje de error más detallado
-        error_type = type(exc).__name__
-        error_message = str(exc)
-        
-        # Mensaje de error para el usuario
-        if 'Authentication' in error_type or '534' in error_message:
-            user_error = 'Error de autenticación. Verifica que la contraseña de aplicación sea correcta.'
-        elif 'Connection' in error_type or 'Connection refused' in error_message:
-            user_error = 'Error de conexión. Verifica tu conexión a internet o la configuración del servidor de correo.'
-        else:
-            user_error = 'No se pudo enviar el correo. Por favor, intenta nuevamente más tarde.'
-        
+        logger.error(f'Error al encolar correo de asistencia técnica: {str(exc)}', exc_info=True)
         return JsonResponse({
             'success': False,
-            'error': user_error,
-            'detail': error_message if settings.DEBUG else None,
-            'error_type': error_type if settings.DEBUG else None
+            'error': 'No se pudo enviar el correo. Por favor, intenta nuevamente más tarde.',
+            'detail': str(exc) if settings.DEBUG else None,
+            'error_type': type(exc).__name__ if settings.DEBUG else None
         }, status=500)
     
     return JsonResponse({
@@ -1030,56 +1156,29 @@ def api_foto_perfil(request):
                     'error': 'Tipo de archivo no permitido. Solo se permiten imágenes (JPEG, PNG, GIF, WEBP)'
                 }, status=400)
             
-            # COMPRIMIR IMAGEN automáticamente si está habilitado
-            if getattr(settings, 'COMPRESS_IMAGES', True):
-                from .image_compression import compress_if_needed, get_compression_settings
-                compression_settings = get_compression_settings('profile')
-                foto = compress_if_needed(foto, **compression_settings)
-                print(f"✅ Imagen procesada (comprimida si era necesario): {foto.size} bytes")
-            
-            # Validar tamaño (5MB máximo) - después de comprimir
+            # Validar tamaño (5MB máximo, o el límite del original si se comprimirá en segundo plano)
             max_size = 5 * 1024 * 1024  # 5MB
+            if imagenes_diferidas.requiere_compresion(foto, 'profile'):
+                max_size = imagenes_diferidas.TAMANO_MAXIMO_ORIGINAL
             if foto.size > max_size:
                 return JsonResponse({
                     'success': False,
-                    'error': 'El archivo es demasiado grande. El tamaño máximo es 5MB'
+                    'error': f'El archivo es demasiado grande. El tamaño máximo es {max_size // (1024 * 1024)}MB'
                 }, status=400)
             
-            # Crear directorio si no existe
-            perfiles_dir = os.path.join(str(settings.MEDIA_ROOT), 'perfiles_img')
-            print(f"📁 Directorio de perfiles: {perfiles_dir}")
-            os.makedirs(perfiles_dir, exist_ok=True)
-            print(f"✅ Directorio creado/verificado: {perfiles_dir}")
-            
-            # Verificar permisos de escritura
-            if not os.access(perfiles_dir, os.W_OK):
-                print(f"❌ No hay permisos de escritura en {perfiles_dir}")
-                return JsonResponse({
-                    'success': False,
-                    'error': f'No se tienen permisos de escritura en {perfiles_dir}'
-                }, status=500)
-            print(f"✅ Permisos de escritura verificados")
-            
             # Guardar archivo
-            # Asegurar que location sea un string
-            perfiles_dir_str = str(perfiles_dir)
-            print(f"🔧 Usando directorio (string): {perfiles_dir_str}")
-            fs = FileSystemStorage(location=perfiles_dir_str)
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S%f')
             file_extension = os.path.splitext(foto.name)[1]
-            filename = f"{timestamp}_{usuario_maga.id}{file_extension}"
-            print(f"💾 Intentando guardar archivo: {filename} en {perfiles_dir}")
+            print(f"💾 Intentando guardar archivo: {foto.name}")
             try:
-                saved_name = fs.save(filename, foto)
+                # Almacén por contenido: una foto repetida reutiliza el archivo existente
+                saved_name = almacen_archivos.guardar(foto, file_extension)
                 print(f"✅ Archivo guardado exitosamente: {saved_name}")
-                print(f"📂 Ruta completa del archivo guardado: {os.path.join(perfiles_dir, saved_name)}")
-                print(f"🔍 Verificando si el archivo existe: {os.path.exists(os.path.join(perfiles_dir, saved_name))}")
             except Exception as save_error:
                 import traceback
                 print(f"❌ Error al guardar archivo: {str(save_error)}")
                 print(f"📋 Traceback:\n{traceback.format_exc()}")
                 raise
-            file_url = f"/media/perfiles_img/{saved_name}"
+            file_url = f"/media/{saved_name}"
             print(f"🔗 URL generada: {file_url}")
             
             # Crear o actualizar registro en BD
@@ -1099,21 +1198,21 @@ def api_foto_perfil(request):
                 # Si ya existe, eliminar archivo anterior
                 old_url = foto_perfil.url_almacenamiento
                 if old_url:
-                    # Usar la función de normalización existente o construir la ruta correctamente
-                    old_path = _normalizar_ruta_media(old_url)
-                    if old_path and os.path.exists(old_path):
-                        try:
-                            os.remove(old_path)
-                        except:
-                            pass
+                    _eliminar_archivo_media(old_url)
+                
+                imagenes_diferidas.eliminar_variantes(foto_perfil.variantes)
                 
                 # Actualizar registro
                 foto_perfil.archivo_nombre = foto.name
                 foto_perfil.archivo_tipo = foto.content_type
                 foto_perfil.archivo_tamanio = foto.size
                 foto_perfil.url_almacenamiento = file_url
+                foto_perfil.variantes = None
                 foto_perfil.save()
             
+            # Comprimir y generar miniaturas en segundo plano (procesar_imagenes)
+            imagenes_diferidas.programar_procesamiento(UsuarioFotoPerfil, foto_perfil.id, file_url, foto, 'profile')
+            
             print(f"✅ Proceso completado exitosamente. URL final: {file_url}")
             return JsonResponse({
                 'success': True,
@@ -1228,10 +1327,12 @@ def api_regiones(request):
     for region in regiones_query:
         # Obtener primera imagen de la galería si existe
         primera_imagen = None
+        primera_imagen_webp = None
         try:
             galeria = RegionGaleria.objects.filter(region=region).order_by('-creado_en').first()
             if galeria:
-                primera_imagen = galeria.url_almacenamiento
+                primera_imagen = imagenes_diferidas.url_variante(galeria, 'thumbnail')
+                primera_imagen_webp = imagenes_diferidas.url_variante(galeria, 'thumbnail_webp')
         except:
             pass
         
@@ -1244,6 +1345,7 @@ def api_regiones(request):
             'poblacion_aprox': region.poblacion_aprox,
             'num_comunidades': region.num_comunidades,
             'imagen_url': primera_imagen or 'https://images.unsplash.com/photo-1506905925346-21bda4d32df4?ixlib=rb-4.0.3&auto=format&fit=crop&w=400&q=80',
+            'imagen_url_webp': primera_imagen_webp,
             'actualizado_en': region.actualizado_en.isoformat() if region.actualizado_en else None,
             'creado_en': region.creado_en.isoformat() if region.creado_en else None
         })
@@ -1256,6 +1358,7 @@ def api_regiones(request):
 
 
 @api_ratelimit_read(rate='30/m')  # 30 peticiones por minuto
+@respuesta_cacheada('regiones_recientes', parametros=('limite',))
 def api_regiones_recientes(request):
     """API: Obtener las últimas regiones actualizadas (OPTIMIZADO con Prefetch)
     Rate limit: 30 peticiones por minuto"""
@@ -1275,11 +1378,13 @@ def api_regiones_recientes(request):
     regiones = []
     for region in regiones_query:
         primera_imagen = None
+        primera_imagen_webp = None
         try:
             # Tomar solo la primera imagen del prefetch
             galeria_list = list(region.galeria.all())
             if galeria_list:
-                primera_imagen = galeria_list[0].url_almacenamiento
+                primera_imagen = imagenes_diferidas.url_variante(galeria_list[0], 'medium')
+                primera_imagen_webp = imagenes_diferidas.url_variante(galeria_list[0], 'medium_webp')
         except:
             pass
         
@@ -1292,6 +1397,7 @@ def api_regiones_recientes(request):
             'poblacion_aprox': region.poblacion_aprox,
             'num_comunidades': region.num_comunidades,
             'imagen_url': primera_imagen or 'https://images.unsplash.com/photo-1506905925346-21bda4d32df4?ixlib=rb-4.0.3&auto=format&fit=crop&w=800&q=80',
+            'imagen_url_webp': primera_imagen_webp,
             'actualizado_en': region.actualizado_en.isoformat() if region.actualizado_en else None
         })
     
@@ -1319,6 +1425,7 @@ def api_region_detalle(request, region_id):
         fotos.append({
             'id': str(img.id),
             'url': img.url_almacenamiento,
+            **imagenes_diferidas.urls_variantes(img),
             'description': img.descripcion or 'Imagen de la región'
         })
     
@@ -1439,6 +1546,7 @@ def _serialize_comunidad_detalle(comunidad, request=None):
         {
             'id': str(img.id),
             'url': img.url_almacenamiento,
+            **imagenes_diferidas.urls_variantes(img),
             'description': img.descripcion or 'Imagen de la comunidad',
         }
         for img in galeria_prefetch
@@ -1716,46 +1824,24 @@ def api_agregar_imagen_region(request, region_id):
                 'error': 'El archivo debe ser una imagen (JPG, PNG, GIF, etc.)'
             }, status=400)
         
-        # COMPRIMIR IMAGEN automáticamente
-        if getattr(settings, 'COMPRESS_IMAGES', True):
-            from .image_compression import compress_if_needed, get_compression_settings
-            compression_settings = get_compression_settings('gallery')
-            imagen = compress_if_needed(imagen, **compression_settings)
-        
         # Obtener descripción (opcional)
         descripcion = request.POST.get('descripcion', '').strip()
         
-        # Crear carpeta si no existe
-        portada_dir = os.path.join(str(settings.MEDIA_ROOT), 'regiones_portada_img')
-        os.makedirs(portada_dir, exist_ok=True)
-        
         print(f"📤 Subiendo portada a región {region_id}")
-        print(f"📁 Directorio: {portada_dir}")
         print(f"✅ Archivo recibido: {imagen.name}, tamaño: {imagen.size}, tipo: {imagen.content_type}")
         
-        # Verificar permisos de escritura
-        if not os.access(portada_dir, os.W_OK):
-            print(f"❌ No hay permisos de escritura en {portada_dir}")
-            return JsonResponse({
-                'success': False,
-                'error': f'No se tienen permisos de escritura en {portada_dir}'
-            }, status=500)
-        
         # Guardar archivo
-        fs = FileSystemStorage(location=portada_dir)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S%f')
         file_extension = os.path.splitext(imagen.name)[1]
-        filename = f"{timestamp}_{region_id}{file_extension}"
-        print(f"💾 Intentando guardar archivo: {filename}")
+        print(f"💾 Intentando guardar archivo: {imagen.name}")
         try:
-            saved_name = fs.save(filename, imagen)
+            saved_name = almacen_archivos.guardar(imagen, file_extension)
             print(f"✅ Archivo guardado exitosamente: {saved_name}")
         except Exception as e:
             import traceback
             print(f"❌ Error al guardar archivo: {str(e)}")
             print(f"📋 Traceback:\n{traceback.format_exc()}")
             raise
-        file_url = f"/media/regiones_portada_img/{saved_name}"
+        file_url = f"/media/{saved_name}"
         
         # Crear registro en la BD usando RegionGaleria
         imagen_galeria = RegionGaleria.objects.create(
@@ -1766,6 +1852,9 @@ def api_agregar_imagen_region(request, region_id):
             creado_por=usuario_maga
         )
         
+        # Comprimir y generar miniaturas en segundo plano (procesar_imagenes)
+        imagenes_diferidas.programar_procesamiento(RegionGaleria, imagen_galeria.id, file_url, imagen, 'gallery')
+        
         # Actualizar timestamp de la región para reflejar el cambio
         region.actualizado_en = timezone.now()
         region.save(update_fields=['actualizado_en'])
@@ -1807,27 +1896,7 @@ def api_eliminar_imagen_region(request, region_id, imagen_id):
             status=404,
         )
 
-    ruta = imagen.url_almacenamiento or ''
-    ruta_media = (settings.MEDIA_URL or '/media/').rstrip('/')
-    if ruta.startswith(ruta_media):
-        relative_path = ruta[len(ruta_media):].lstrip('/')
-    elif ruta.startswith('/'):
-        ruta_sin_slash = ruta.lstrip('/')
-        media_prefix = ruta_media.lstrip('/')
-        if ruta_sin_slash.startswith(media_prefix):
-            relative_path = ruta_sin_slash[len(media_prefix):].lstrip('/')
-        else:
-            relative_path = ruta_sin_slash
-    else:
-        relative_path = ruta
-
-    if relative_path:
-        file_path = os.path.join(str(settings.MEDIA_ROOT), relative_path.replace('/', os.sep))
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except OSError:
-                pass
+    _eliminar_archivo_media(imagen.url_almacenamiento)
 
     imagen.delete()
 
@@ -1871,23 +1940,22 @@ def api_agregar_archivo_region(request, region_id):
     nombre = (request.POST.get('nombre') or '').strip()
     descripcion = (request.POST.get('descripcion') or '').strip()
 
-    # Determinar extensión y nombre visible
     extension = os.path.splitext(archivo.name)[1].lower()
-    if not nombre:
-        nombre = os.path.splitext(archivo.name)[0]
-    archivo_tipo = extension.replace('.', '') if extension else (archivo.content_type or '')
+    relative_path = almacen_archivos.guardar(archivo, extension)
+    _region_archivo, respuesta = _crear_archivo_region(
+        region, usuario_maga, relative_path, archivo.name, archivo.content_type, nombre, descripcion
+    )
+    return JsonResponse(respuesta)
 
-    # Preparar almacenamiento
-    archivos_dir = os.path.join(str(settings.MEDIA_ROOT), 'regiones_archivos')
-    os.makedirs(archivos_dir, exist_ok=True)
 
-    fs = FileSystemStorage(location=archivos_dir)
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S%f')
-    safe_extension = extension or ''
-    filename = f"{timestamp}_{region_id}{safe_extension}"
-    saved_name = fs.save(filename, archivo)
+def _crear_archivo_region(region, usuario_maga, relative_path, archivo_nombre, content_type, nombre, descripcion):
+    """Crea el RegionArchivo de un archivo ya guardado en el almacén; retorna (registro, respuesta)"""
+    # Determinar extensión y nombre visible
+    extension = os.path.splitext(archivo_nombre)[1].lower()
+    if not nombre:
+        nombre = os.path.splitext(archivo_nombre)[0]
+    archivo_tipo = extension.replace('.', '') if extension else (content_type or '')
 
-    relative_path = f"regiones_archivos/{saved_name}"
     media_url = (settings.MEDIA_URL or '/media/').rstrip('/')
     file_url = f"{media_url}/{relative_path}"
     if not file_url.startswith('/'):
@@ -1902,7 +1970,7 @@ def api_agregar_archivo_region(request, region_id):
         creado_por=usuario_maga
     )
 
-    return JsonResponse({
+    return region_archivo, {
         'success': True,
         'message': 'Archivo agregado exitosamente',
         'archivo': {
@@ -1913,7 +1981,7 @@ def api_agregar_archivo_region(request, region_id):
             'url': file_url,
             'date': region_archivo.creado_en.isoformat() if region_archivo.creado_en else None
         }
-    })
+    }
 @require_http_methods(["DELETE"])
 @permiso_admin_o_personal_api
 def api_eliminar_archivo_region(request, region_id, archivo_id):
@@ -1926,30 +1994,7 @@ def api_eliminar_archivo_region(request, region_id, archivo_id):
             'error': 'Archivo no encontrado'
         }, status=404)
 
-    ruta_url = archivo.url_almacenamiento or ''
-    media_url = (settings.MEDIA_URL or '/media/').rstrip('/')
-    relative_path = ''
-
-    if ruta_url.startswith(media_url):
-        relative_path = ruta_url[len(media_url):].lstrip('/')
-    elif ruta_url.startswith('/'):
-        ruta_sin_slash = ruta_url.lstrip('/')
-        media_prefix = media_url.lstrip('/')
-        if ruta_sin_slash.startswith(media_prefix):
-            relative_path = ruta_sin_slash[len(media_prefix):].lstrip('/')
-        else:
-            relative_path = ruta_sin_slash
-    else:
-        relative_path = ruta_url
-
-    if relative_path:
-        file_path = os.path.join(str(settings.MEDIA_ROOT), relative_path.replace('/', os.sep))
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except OSError:
-                # Si no se puede eliminar, continuar con la eliminación lógica
-                pass
+    _eliminar_archivo_media(archivo.url_almacenamiento)
 
     archivo.delete()
 
@@ -1995,9 +2040,11 @@ def api_comunidades(request):
     comunidades = []
     for com in comunidades_query:
         primera_imagen = None
+        primera_imagen_webp = None
         galeria = getattr(com, 'galeria_api', None)
         if galeria:
-            primera_imagen = galeria[0].url_almacenamiento
+            primera_imagen = imagenes_diferidas.url_variante(galeria[0], 'thumbnail')
+            primera_imagen_webp = imagenes_diferidas.url_variante(galeria[0], 'thumbnail_webp')
 
         comunidades.append({
             'id': str(com.id),
@@ -2017,6 +2064,7 @@ def api_comunidades(request):
             'actualizado_en': com.actualizado_en.isoformat() if com.actualizado_en else None,
             'creado_en': com.creado_en.isoformat() if com.creado_en else None,
             'imagen_url': primera_imagen or DEFAULT_COMUNIDAD_IMAGE_SMALL,
+            'imagen_url_webp': primera_imagen_webp,
         })
 
     response = JsonResponse(comunidades, safe=False)
@@ -2428,27 +2476,15 @@ def api_crear_evento(request):
             evidencias_guardadas = request.FILES.getlist('evidences')
             
             if evidencias_guardadas:
-                evidencias_dir = os.path.join(str(settings.MEDIA_ROOT), 'evidencias')
-                os.makedirs(evidencias_dir, exist_ok=True)
-                fs = FileSystemStorage(location=evidencias_dir)
-                
                 for index, file in enumerate(evidencias_guardadas):
-                    # COMPRIMIR IMAGEN automáticamente si es una imagen
                     es_imagen = file.content_type.startswith('image/') if hasattr(file, 'content_type') else False
-                    if es_imagen and getattr(settings, 'COMPRESS_IMAGES', True):
-                        from .image_compression import compress_if_needed, get_compression_settings
-                        compression_settings = get_compression_settings('evidence')
-                        file = compress_if_needed(file, **compression_settings)
                     
-                    # Generar nombre único con microsegundos para evitar duplicados
-                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S%f')
                     # Obtener extensión del archivo
                     file_extension = os.path.splitext(file.name)[1]
-                    filename = f"{timestamp}_{index}{file_extension}"
                     
-                    # Guardar archivo físicamente
-                    saved_name = fs.save(filename, file)
-                    file_url = f"/media/evidencias/{saved_name}"
+                    # Guardar archivo físicamente (almacén por contenido)
+                    saved_name = almacen_archivos.guardar(file, file_extension)
+                    file_url = f"/media/{saved_name}"
                     
                     # Crear registro de evidencia en la BD
                     evidencia = Evidencia.objects.create(
@@ -2461,6 +2497,10 @@ def api_crear_evento(request):
                         creado_por=usuario_maga
                     )
                     
+                    # Comprimir y generar miniaturas en segundo plano (procesar_imagenes)
+                    if es_imagen:
+                        imagenes_diferidas.programar_procesamiento(Evidencia, evidencia.id, file_url, file, 'evidence')
+                    
                     archivos_guardados.append({
                         'id': str(evidencia.id),
                         'nombre': file.name,
@@ -2681,7 +2721,14 @@ def api_obtener_beneficiario(request, beneficiario_id):
 @login_required
 @require_http_methods(["GET"])
 def api_listar_beneficiarios_completo(request):
-    """API: Listar todos los beneficiarios con sus proyectos vinculados para el módulo de beneficiarios"""
+    """API: Listar todos los beneficiarios con sus proyectos vinculados para el módulo de beneficiarios
+    
+    Modos:
+    - sin parámetros: {"success": true, "beneficiarios": [...]} con todos los beneficiarios,
+      enviado por partes (una página de la base de datos a la vez)
+    - ?limite=N[&cursor=...]: una página; incluye siguiente_cursor (null en la última)
+    - ?formato=ndjson: un beneficiario JSON por línea (exportación completa)
+    """
     try:
         usuario_maga = get_usuario_maga(request.user)
         if not usuario_maga:
@@ -2690,116 +2737,46 @@ def api_listar_beneficiarios_completo(request):
                 'error': 'Usuario no autenticado'
             }, status=401)
         
-        # Obtener todos los beneficiarios activos
-        beneficiarios = Beneficiario.objects.filter(activo=True).select_related(
-            'tipo', 'comunidad', 'comunidad__region'
-        ).prefetch_related(
-            'individual', 'familia', 'institucion',
-            Prefetch(
-                'actividades',  # related_name en ActividadBeneficiario es 'actividades'
-                queryset=ActividadBeneficiario.objects.select_related('actividad', 'actividad__tipo').filter(
-                    actividad__eliminado_en__isnull=True
-                ),
-                to_attr='actividades_prefetch'
+        from django.core.serializers.json import DjangoJSONEncoder
+        from .beneficiarios_listado import (
+            CursorInvalido, TAMANO_PAGINA_DEFECTO, iterar_beneficiarios, pagina_beneficiarios,
+        )
+        
+        def a_json(item):
+            return json.dumps(item, cls=DjangoJSONEncoder)
+        
+        if request.GET.get('formato') == 'ndjson':
+            response = StreamingHttpResponse(
+                (a_json(ben) + '\n' for ben in iterar_beneficiarios()),
+                content_type='application/x-ndjson'
             )
-        ).order_by('-creado_en')
+            response['Content-Disposition'] = 'attachment; filename="beneficiarios.ndjson"'
+            return response
         
-        beneficiarios_list = []
-        for ben in beneficiarios:
-            nombre_display, info_adicional, detalles, tipo_envio = obtener_detalle_beneficiario(ben)
-            
-            # Obtener proyectos/actividades vinculadas
-            proyectos = []
-            from django.db import connection
-            from collections import defaultdict
-            
-            # Obtener todos los IDs de actividad_beneficiario para este beneficiario
-            actividad_benef_ids = [str(ab.id) for ab in ben.actividades_prefetch]
-            
-            # Consultar todas las fechas de reinscripción de una vez (optimización)
-            reinscripciones_por_actividad = defaultdict(list)  # Para años
-            fechas_reinscripcion_por_actividad = defaultdict(list)  # Para fechas completas
-            if actividad_benef_ids:
-                with connection.cursor() as cursor:
-                    cursor.execute("""
-                        SELECT 
-                            actividad_beneficiario_id,
-                            fecha_reinscripcion,
-                            EXTRACT(YEAR FROM fecha_reinscripcion)::INTEGER as ano
-                        FROM beneficiario_reinscripciones
-                        WHERE actividad_beneficiario_id = ANY(%s::uuid[])
-                        ORDER BY actividad_beneficiario_id, fecha_reinscripcion DESC
-                    """, [actividad_benef_ids])
-                    
-                    for row in cursor.fetchall():
-                        actividad_benef_id, fecha_reinscripcion, ano = row
-                        reinscripciones_por_actividad[str(actividad_benef_id)].append(ano)
-                        # Guardar la fecha completa como string ISO
-                        if fecha_reinscripcion:
-                            fechas_reinscripcion_por_actividad[str(actividad_benef_id)].append(
-                                fecha_reinscripcion.isoformat() if hasattr(fecha_reinscripcion, 'isoformat') else str(fecha_reinscripcion)
-                            )
-            
-            for ab in ben.actividades_prefetch:
-                # Usar fecha_reinscripcion si existe (más reciente), sino usar creado_en
-                fecha_asociacion = ab.fecha_reinscripcion if ab.fecha_reinscripcion else ab.creado_en
-                
-                # Obtener años de reinscripción desde el diccionario pre-cargado
-                anos_reinscripcion = list(set(reinscripciones_por_actividad.get(str(ab.id), [])))
-                anos_reinscripcion.sort(reverse=True)  # Ordenar descendente
-                tiene_reinscripciones = len(anos_reinscripcion) > 0
-                
-                # Obtener todas las fechas de reinscripción (para comparativas)
-                fechas_reinscripcion = fechas_reinscripcion_por_actividad.get(str(ab.id), [])
-                
-                proyectos.append({
-                    'id': str(ab.actividad.id),
-                    'nombre': ab.actividad.nombre,
-                    'fecha': ab.actividad.fecha.isoformat() if ab.actividad.fecha else None,
-                    'fecha_agregacion': ab.creado_en.isoformat() if ab.creado_en else None,  # Fecha original en que el beneficiario fue añadido al proyecto
-                    'fecha_reinscripcion': ab.fecha_reinscripcion.isoformat() if ab.fecha_reinscripcion else None,  # Fecha de reinscripción/actualización (última)
-                    'fecha_asociacion': fecha_asociacion.isoformat() if fecha_asociacion else None,  # Fecha más reciente (reinscripción o creación)
-                    'tipo': ab.actividad.tipo.nombre if ab.actividad.tipo else None,
-                    'tiene_reinscripciones': tiene_reinscripciones,  # Indica si se ha reinscrito alguna vez
-                    'anos_reinscripcion': anos_reinscripcion,  # Lista de años en que se ha reinscrito
-                    'fechas_reinscripcion': fechas_reinscripcion  # Lista completa de fechas de reinscripción (para comparativas)
-                })
-            
-            # Obtener atributos si es beneficiario individual
-            atributos = []
-            if hasattr(ben, 'individual') and ben.individual:
-                atributos_objs = BeneficiarioAtributo.objects.filter(
-                    beneficiario_individual=ben.individual
-                ).select_related('atributo_tipo').order_by('atributo_tipo__nombre', 'valor')
-                atributos = [{
-                    'id': str(attr.id),
-                    'tipo_id': str(attr.atributo_tipo.id),
-                    'tipo_nombre': attr.atributo_tipo.nombre,
-                    'tipo_codigo': attr.atributo_tipo.codigo,
-                    'valor': attr.valor,
-                    'descripcion': attr.descripcion or ''
-                } for attr in atributos_objs]
-            
-            beneficiarios_list.append({
-                'id': str(ben.id),
-                'nombre': nombre_display,
-                'tipo': tipo_envio,
-                'tipo_display': tipo_envio.title() if tipo_envio else '',
-                'comunidad_id': str(ben.comunidad_id) if ben.comunidad_id else None,
-                'comunidad_nombre': ben.comunidad.nombre if ben.comunidad else None,
-                'region_id': str(ben.comunidad.region_id) if ben.comunidad and ben.comunidad.region_id else None,
-                'region_nombre': ben.comunidad.region.nombre if ben.comunidad and ben.comunidad.region else None,
-                'detalles': detalles,
-                'proyectos': proyectos,
-                'atributos': atributos,
-                'creado_en': ben.creado_en.isoformat() if ben.creado_en else None,
-                'actualizado_en': ben.actualizado_en.isoformat() if ben.actualizado_en else None
+        if 'limite' in request.GET or 'cursor' in request.GET:
+            try:
+                limite = int(request.GET.get('limite', TAMANO_PAGINA_DEFECTO))
+                beneficiarios_list, siguiente_cursor = pagina_beneficiarios(request.GET.get('cursor'), limite)
+            except (CursorInvalido, ValueError):
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Parámetros de paginación inválidos'
+                }, status=400)
+            return JsonResponse({
+                'success': True,
+                'beneficiarios': beneficiarios_list,
+                'siguiente_cursor': siguiente_cursor,
+                'hay_mas': siguiente_cursor is not None
             })
         
-        return JsonResponse({
-            'success': True,
-            'beneficiarios': beneficiarios_list
-        })
+        # Respuesta completa con el mismo formato de siempre, generada página por página
+        def documento_completo():
+            yield '{"success": true, "beneficiarios": ['
+            for i, ben in enumerate(iterar_beneficiarios()):
+                yield (', ' if i else '') + a_json(ben)
+            yield ']}'
+        
+        return StreamingHttpResponse(documento_completo(), content_type='application/json')
     
     except Exception as e:
         import traceback
@@ -3271,43 +3248,30 @@ def api_crear_beneficiario(request):
                         if foto_file.content_type not in allowed_types:
                             raise ValueError('Tipo de archivo no permitido')
                         
-                        # Comprimir si está habilitado
-                        if getattr(settings, 'COMPRESS_IMAGES', True):
-                            from .image_compression import compress_if_needed, get_compression_settings
-                            compression_settings = get_compression_settings('profile')
-                            foto_file = compress_if_needed(foto_file, **compression_settings)
-                        
-                        # Validar tamaño (5MB)
+                        # Validar tamaño (5MB, o el límite del original si se comprimirá en segundo plano)
                         max_size = 5 * 1024 * 1024
+                        if imagenes_diferidas.requiere_compresion(foto_file, 'profile'):
+                            max_size = imagenes_diferidas.TAMANO_MAXIMO_ORIGINAL
                         if foto_file.size > max_size:
                             raise ValueError('El archivo es demasiado grande')
                         
-                        # Crear directorio si no existe
-                        perfiles_dir = os.path.join(settings.MEDIA_ROOT, 'perfiles_img')
-                        os.makedirs(perfiles_dir, exist_ok=True)
-                        
-                        # Generar nombre único
-                        import uuid
+                        # Guardar archivo (almacén por contenido); la URL es relativa a MEDIA_ROOT
                         file_extension = os.path.splitext(foto_file.name)[1]
-                        unique_filename = f"{uuid.uuid4()}{file_extension}"
-                        file_path = os.path.join(perfiles_dir, unique_filename)
-                        
-                        # Guardar archivo
-                        with open(file_path, 'wb+') as destination:
-                            for chunk in foto_file.chunks():
-                                destination.write(chunk)
-                        
-                        # Construir URL relativa
-                        relative_url = os.path.join('perfiles_img', unique_filename).replace('\\', '/')
+                        relative_url = almacen_archivos.guardar(foto_file, file_extension)
                         
                         # Crear registro en BD
-                        BeneficiarioFoto.objects.create(
+                        foto_beneficiario = BeneficiarioFoto.objects.create(
                             beneficiario_individual=beneficiario_individual,
                             archivo_nombre=foto_file.name,
                             archivo_tipo=foto_file.content_type,
                             archivo_tamanio=foto_file.size,
                             url_almacenamiento=relative_url
                         )
+                        
+                        # Comprimir y generar miniaturas en segundo plano (procesar_imagenes)
+                        imagenes_diferidas.programar_procesamiento(
+                            BeneficiarioFoto, foto_beneficiario.id, relative_url, foto_file, 'profile'
+                        )
                     except Exception as e:
                         # Si falla la subida de foto, no es crítico, continuar
                         print(f"Error al subir foto: {e}")
@@ -3521,6 +3485,90 @@ def api_buscar_beneficiario_por_dpi(request):
         }, status=500)
 
 
+# Modelo y campo de DPI por tipo de beneficiario para la verificación masiva
+DPI_POR_TIPO_BENEFICIARIO = {
+    'individual': (BeneficiarioIndividual, 'dpi'),
+    'familia': (BeneficiarioFamilia, 'dpi_jefe_familia'),
+    'institucion': (BeneficiarioInstitucion, 'dpi_representante'),
+}
+
+
+@login_required
+@require_http_methods(["POST"])
+def api_verificar_dpis(request):
+    """API: Verificar en bloque qué DPIs ya están registrados
+    Body: {"dpis": [...], "tipos": ["individual", "familia", "institucion"] (opcional)}
+    Una consulta indexada por tipo, sin importar cuántos DPIs se envíen (máx. MAX_DPIS_POR_CONSULTA)"""
+    try:
+        usuario_maga = get_usuario_maga(request.user)
+        if not usuario_maga:
+            return JsonResponse({
+                'success': False,
+                'error': 'Usuario no autenticado'
+            }, status=401)
+        
+        try:
+            data = json.loads(request.body or '{}')
+        except json.JSONDecodeError:
+            return JsonResponse({
+                'success': False,
+                'error': 'JSON inválido'
+            }, status=400)
+        
+        dpis = data.get('dpis')
+        if not isinstance(dpis, list):
+            return JsonResponse({
+                'success': False,
+                'error': 'Se requiere una lista "dpis"'
+            }, status=400)
+        if len(dpis) > MAX_DPIS_POR_CONSULTA:
+            return JsonResponse({
+                'success': False,
+                'error': f'Se pueden verificar como máximo {MAX_DPIS_POR_CONSULTA} DPIs por petición'
+            }, status=400)
+        
+        tipos = data.get('tipos') or ['individual']
+        tipos_invalidos = [tipo for tipo in tipos if tipo not in DPI_POR_TIPO_BENEFICIARIO]
+        if tipos_invalidos:
+            return JsonResponse({
+                'success': False,
+                'error': f'Tipos no válidos: {", ".join(map(str, tipos_invalidos))}'
+            }, status=400)
+        
+        valores = [str(dpi) for dpi in dpis if dpi]
+        existentes = {}
+        for tipo in tipos:
+            modelo, campo = DPI_POR_TIPO_BENEFICIARIO[tipo]
+            encontrados = buscar_dpis_existentes(
+                modelo.objects.select_related('beneficiario__comunidad'),
+                campo,
+                valores
+            )
+            for dpi, registro in encontrados.items():
+                comunidad = registro.beneficiario.comunidad
+                existentes.setdefault(dpi, {
+                    'tipo': tipo,
+                    'beneficiario_id': str(registro.beneficiario_id),
+                    'nombre': str(registro),
+                    'comunidad_nombre': comunidad.nombre if comunidad else None,
+                })
+        
+        return JsonResponse({
+            'success': True,
+            'total_consultados': len({normalizar_dpi(valor) for valor in valores} - {''}),
+            'total_existentes': len(existentes),
+            'existentes': existentes
+        })
+    
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({
+            'success': False,
+            'error': f'Error al verificar DPIs: {str(e)}'
+        }, status=500)
+
+
 @login_required
 @require_http_methods(["POST"])
 def api_actualizar_fecha_beneficiario(request, beneficiario_id):
@@ -4431,36 +4479,19 @@ def api_foto_beneficiario(request, beneficiario_id):
                     'error': 'Tipo de archivo no permitido. Solo se permiten imágenes (JPEG, PNG, GIF, WEBP)'
                 }, status=400)
             
-            # Comprimir imagen si está habilitado
-            if getattr(settings, 'COMPRESS_IMAGES', True):
-                from .image_compression import compress_if_needed, get_compression_settings
-                compression_settings = get_compression_settings('profile')
-                foto = compress_if_needed(foto, **compression_settings)
-            
-            # Validar tamaño (5MB máximo)
+            # Validar tamaño (5MB máximo, o el límite del original si se comprimirá en segundo plano)
             max_size = 5 * 1024 * 1024  # 5MB
+            if imagenes_diferidas.requiere_compresion(foto, 'profile'):
+                max_size = imagenes_diferidas.TAMANO_MAXIMO_ORIGINAL
             if foto.size > max_size:
                 return JsonResponse({
                     'success': False,
-                    'error': 'El archivo es demasiado grande. El tamaño máximo es 5MB'
+                    'error': f'El archivo es demasiado grande. El tamaño máximo es {max_size // (1024 * 1024)}MB'
                 }, status=400)
             
-            # Crear directorio si no existe
-            perfiles_dir = os.path.join(settings.MEDIA_ROOT, 'perfiles_img')
-            os.makedirs(perfiles_dir, exist_ok=True)
-            
-            # Generar nombre único para el archivo
+            # Guardar archivo (almacén por contenido); la URL es relativa a MEDIA_ROOT
             file_extension = os.path.splitext(foto.name)[1]
-            unique_filename = f"{uuid_module.uuid4()}{file_extension}"
-            file_path = os.path.join(perfiles_dir, unique_filename)
-            
-            # Guardar archivo
-            with open(file_path, 'wb+') as destination:
-                for chunk in foto.chunks():
-                    destination.write(chunk)
-            
-            # Construir URL relativa
-            relative_url = os.path.join('perfiles_img', unique_filename).replace('\\', '/')
+            relative_url = almacen_archivos.guardar(foto, file_extension)
             
             # Verificar que el beneficiario_individual realmente existe en la BD usando SQL directo
             from django.db import connection
@@ -4491,10 +4522,16 @@ def api_foto_beneficiario(request, beneficiario_id):
                     foto_anterior_url = foto_anterior_row[1]
                     if foto_anterior_url:
                         _eliminar_archivo_media(foto_anterior_url)
+                    # El DELETE directo no dispara post_delete: eliminar también sus tamaños derivados
+                    imagenes_diferidas.eliminar_variantes(
+                        BeneficiarioFoto.objects.filter(id=foto_anterior_row[0]).values_list('variantes', flat=True).first()
+                    )
                     cursor.execute(
                         "DELETE FROM beneficiario_fotos WHERE beneficiario_individual_id = %s",
                         [str(beneficiario_individual_id_real)]
                     )
+                    # Ni el DELETE ni el INSERT directos disparan las señales que cuentan referencias
+                    almacen_archivos.restar_referencias(foto_anterior_url)
                 
                 # Crear registro en BD usando SQL directo con el ID correcto
                 foto_id = uuid_module.uuid4()
@@ -4515,6 +4552,10 @@ def api_foto_beneficiario(request, beneficiario_id):
                     foto.size,
                     relative_url
                 ])
+                almacen_archivos.sumar_referencias(relative_url)
+            
+            # Comprimir y generar miniaturas en segundo plano (procesar_imagenes)
+            imagenes_diferidas.programar_procesamiento(BeneficiarioFoto, foto_id, relative_url, foto, 'profile')
             
             foto_url = f"/media/{relative_url}"
             
@@ -4693,6 +4734,18 @@ def api_importar_beneficiarios_excel(request):
             'total_errores': 0
         }
         
+        # DPIs del archivo que ya existen: una sola consulta para todas las filas
+        dpis_archivo = [
+            str(fila[9]).strip()
+            for fila in sheet.iter_rows(min_row=2, max_col=14, values_only=True)
+            if len(fila) > 9 and fila[9]
+        ]
+        individuales_por_dpi = buscar_dpis_existentes(
+            BeneficiarioIndividual.objects.select_related('beneficiario'),
+            'dpi',
+            dpis_archivo
+        )
+        
         # Procesar filas SIN guardar en BD (solo validar y preparar datos)
         # Cerrar workbook después de procesar para liberar memoria
         try:
@@ -4862,11 +4915,7 @@ def api_importar_beneficiarios_excel(request):
                         es_actualizacion = False
                         
                         if dpi_normalizado:
-                            conflicto = buscar_conflicto_dpi(
-                                BeneficiarioIndividual.objects.all(),
-                                'dpi',
-                                dpi_normalizado
-                            )
+                            conflicto = individuales_por_dpi.get(dpi_normalizado)
                             if conflicto:
                                 # DPI encontrado - actualizar beneficiario existente
                                 beneficiario_individual_existente = conflicto
@@ -5628,81 +5677,49 @@ def api_descargar_plantilla_beneficiarios(request):
 @permiso_gestionar_eventos
 @require_http_methods(["GET"])
 def api_listar_eventos(request):
-    """Lista todos los eventos no eliminados"""
+    """Lista los eventos no eliminados
+    
+    Parámetros opcionales:
+    - view=summary: solo las columnas de la tabla de eventos
+    - fields=id,nombre,...: campos a devolver
+    - buscar: texto contenido en el nombre del evento
+    - limite / offset: paginación (la respuesta incluye total, limite, offset y hay_mas)
+    """
     try:
-        eventos = Actividad.objects.filter(
-            eliminado_en__isnull=True
-        ).select_related(
-            'tipo', 'comunidad', 'comunidad__region', 'responsable', 'colaborador', 'portada'
-        ).prefetch_related(
-            'personal__usuario__puesto',
-            'personal__colaborador',
-            'beneficiarios__beneficiario',
-            'comunidades_relacionadas__comunidad__region',
-            'comunidades_relacionadas__region'
-         ).order_by('-creado_en')
+        from .eventos_listado import CAMPOS_EVENTO, CAMPOS_RESUMEN, CampoInvalido, listar_eventos, validar_campos
         
-        eventos_data = []
-        for evento in eventos:
-            # Contar personal y beneficiarios
-            personal_count = evento.personal.count()
-            beneficiarios_count = evento.beneficiarios.count()
-            
-            # Obtener nombres del personal (usar nombre completo o username como fallback)
-            personal_nombres = []
-            for ap in evento.personal.all()[:3]:
-                if ap.usuario:
-                    personal_nombres.append(ap.usuario.nombre if ap.usuario.nombre else ap.usuario.username)
-                elif ap.colaborador:
-                    personal_nombres.append(ap.colaborador.nombre)
-            if personal_count > 3:
-                personal_nombres.append(f'+{personal_count - 3} más')
-            
-            # Convertir creado_en a zona horaria local
-            from django.utils.timezone import localtime, is_aware, make_aware
-            import pytz
-            
-            # Si la fecha no tiene timezone, agregarla (asumiendo UTC)
-            if not is_aware(evento.creado_en):
-                creado_en_aware = make_aware(evento.creado_en, pytz.UTC)
-            else:
-                creado_en_aware = evento.creado_en
-            
-            creado_en_local = localtime(creado_en_aware)
-            
-            comunidades_detalle = obtener_comunidades_evento(evento)
-            if comunidades_detalle:
-                comunidades_resumen = ', '.join([c['comunidad_nombre'] for c in comunidades_detalle if c['comunidad_nombre']])
-                comunidad_principal = comunidades_detalle[0]['comunidad_nombre']
+        try:
+            if request.GET.get('fields'):
+                campos = validar_campos(request.GET['fields'])
+            elif request.GET.get('view') == 'summary':
+                campos = CAMPOS_RESUMEN
             else:
-                comunidades_resumen = evento.comunidad.nombre if evento.comunidad else 'Sin comunidades'
-                comunidad_principal = evento.comunidad.nombre if evento.comunidad else 'Sin comunidad'
-            
-            portada_evento = obtener_portada_evento(evento)
-             
-            eventos_data.append({
-                'id': str(evento.id),
-                'nombre': evento.nombre,
-                'tipo': evento.tipo.nombre if evento.tipo else 'Sin tipo',
-                'comunidad': comunidad_principal,
-                'comunidades': comunidades_detalle,
-                'comunidades_resumen': comunidades_resumen,
-                'fecha': str(evento.fecha),
-                'estado': evento.estado,
-                'descripcion': evento.descripcion[:100] + '...' if len(evento.descripcion) > 100 else evento.descripcion,
-                'personal_count': personal_count,
-                'personal_nombres': ', '.join(personal_nombres) if personal_nombres else 'Sin personal',
-                'beneficiarios_count': beneficiarios_count,
-                'responsable': (evento.responsable.nombre if evento.responsable.nombre else evento.responsable.username) if evento.responsable else 'Sin responsable',
-                'creado_en': creado_en_local.strftime('%d/%m/%Y %H:%M'),
-                'portada': portada_evento
-            })
+                campos = CAMPOS_EVENTO
+            limite = int(request.GET['limite']) if request.GET.get('limite') else None
+            offset = int(request.GET.get('offset') or 0)
+            if (limite is not None and limite < 1) or offset < 0:
+                raise ValueError('Paginación inválida')
+        except (CampoInvalido, ValueError) as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e) if isinstance(e, CampoInvalido) else 'Parámetros de paginación inválidos'
+            }, status=400)
         
-        return JsonResponse({
+        buscar = (request.GET.get('buscar') or '').strip() or None
+        eventos_data, total = listar_eventos(campos, limite, offset, buscar)
+        
+        respuesta = {
             'success': True,
             'eventos': eventos_data,
-            'total': len(eventos_data)
-        })
+            'total': total
+        }
+        if limite is not None:
+            respuesta.update({
+                'limite': limite,
+                'offset': offset,
+                'hay_mas': offset + len(eventos_data) < total
+            })
+        return JsonResponse(respuesta)
         
     except Exception as e:
         return JsonResponse({
@@ -6355,30 +6372,23 @@ def api_actualizar_evento(request, evento_id):
             # Agregar nuevas evidencias
             if request.FILES.getlist('evidencias_nuevas'):
                 archivos = request.FILES.getlist('evidencias_nuevas')
-                evidencias_dir = os.path.join(str(settings.MEDIA_ROOT), 'evidencias')
-                os.makedirs(evidencias_dir, exist_ok=True)
-                fs = FileSystemStorage(location=evidencias_dir)
-                
                 for idx, archivo in enumerate(archivos):
-                    # COMPRIMIR IMAGEN automáticamente si es una imagen
                     es_imagen = archivo.content_type.startswith('image/')
-                    if es_imagen and getattr(settings, 'COMPRESS_IMAGES', True):
-                        from .image_compression import compress_if_needed, get_compression_settings
-                        compression_settings = get_compression_settings('evidence')
-                        archivo = compress_if_needed(archivo, **compression_settings)
                     
-                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S%f')
-                    nombre_unico = f"{timestamp}_{idx}.{archivo.name.split('.')[-1]}"
-                    nombre_guardado = fs.save(nombre_unico, archivo)
-                    url_archivo = f"/media/evidencias/{nombre_guardado}"
+                    nombre_guardado = almacen_archivos.guardar(archivo, os.path.splitext(archivo.name)[1])
+                    url_archivo = f"/media/{nombre_guardado}"
                     
-                    Evidencia.objects.create(
+                    evidencia = Evidencia.objects.create(
                         actividad=evento,
                         archivo_nombre=archivo.name,
                         archivo_tipo=archivo.content_type,
                         url_almacenamiento=url_archivo,
                         es_imagen=es_imagen
                     )
+                    
+                    # Comprimir y generar miniaturas en segundo plano (procesar_imagenes)
+                    if es_imagen:
+                        imagenes_diferidas.programar_procesamiento(Evidencia, evidencia.id, url_archivo, archivo, 'evidence')
                 
                 cambios_realizados.append(f"Agregado {len(archivos)} evidencias")
             
@@ -6539,6 +6549,7 @@ def api_actualizar_evento(request, evento_id):
         }, status=500)
 @permiso_gestionar_eventos
 @require_http_methods(["GET"])
+@respuesta_cacheada('cambios_recientes', parametros=('limite',))
 def api_cambios_recientes(request):
     """Obtiene los cambios recientes de actividades"""
     try:
@@ -6858,7 +6869,7 @@ def api_listar_proyectos_por_tipo(request, tipo_actividad):
                 imagen_url = None
                 if primera_evidencia and primera_evidencia.url_almacenamiento:
                     try:
-                        imagen_url = primera_evidencia.url_almacenamiento
+                        imagen_url = imagenes_diferidas.url_variante(primera_evidencia, 'medium')
                     except:
                         imagen_url = None
                 
@@ -6919,7 +6930,7 @@ def api_listar_proyectos_por_tipo(request, tipo_actividad):
                     primera_evidencia = evento.evidencias.filter(es_imagen=True).first()
                     if primera_evidencia and primera_evidencia.url_almacenamiento:
                         try:
-                            imagen_url = primera_evidencia.url_almacenamiento
+                            imagen_url = imagenes_diferidas.url_variante(primera_evidencia, 'medium')
                         except Exception:
                             imagen_url = None
                 
@@ -6967,6 +6978,7 @@ def api_listar_proyectos_por_tipo(request, tipo_actividad):
             'error': f'Error al listar proyectos: {str(e)}'
         }, status=500)
 @require_http_methods(["GET"])
+@respuesta_cacheada('ultimos_proyectos')
 def api_ultimos_proyectos(request):
     """
     Devuelve los últimos proyectos/eventos creados o actualizados (máximo 3)
@@ -7001,7 +7013,7 @@ def api_ultimos_proyectos(request):
                 imagen_url = None
                 if primera_evidencia and primera_evidencia.url_almacenamiento:
                     try:
-                        imagen_url = primera_evidencia.url_almacenamiento
+                        imagen_url = imagenes_diferidas.url_variante(primera_evidencia, 'medium')
                     except:
                         imagen_url = None
                 
@@ -7077,6 +7089,7 @@ def api_ultimos_proyectos(request):
 
 
 @require_http_methods(["GET"])
+@respuesta_cacheada('ultimos_eventos_inicio')
 def api_ultimos_eventos_inicio(request):
     """
     Devuelve los últimos 6 eventos para mostrar en el inicio
@@ -7103,7 +7116,7 @@ def api_ultimos_eventos_inicio(request):
                 if not imagen_url:
                     primera_evidencia = evento.evidencias.filter(es_imagen=True).first()
                     if primera_evidencia and primera_evidencia.url_almacenamiento:
-                        imagen_url = primera_evidencia.url_almacenamiento
+                        imagen_url = imagenes_diferidas.url_variante(primera_evidencia, 'medium')
 
                 try:
                     if evento.fecha:
@@ -7165,80 +7178,44 @@ def api_ultimos_eventos_inicio(request):
             'success': False,
             'error': f'Error al obtener últimos eventos: {str(e)}'
         }, status=500)
+def _validadores_calendario(request):
+    """ETag y Last-Modified del rango pedido (se calculan una vez por petición)"""
+    if not hasattr(request, '_validadores_calendario'):
+        start = request.GET.get('start')
+        end = request.GET.get('end')
+        validadores = (None, None)
+        if start and end:
+            try:
+                from .calendar_feed import validadores_rango
+                validadores = validadores_rango(start, end)
+            except Exception:
+                # Fechas inválidas u otro error: la vista responde con el error correspondiente
+                pass
+        request._validadores_calendario = validadores
+    return request._validadores_calendario
+
+
 @require_http_methods(["GET"])
+@condition(
+    etag_func=lambda request: _validadores_calendario(request)[0],
+    last_modified_func=lambda request: _validadores_calendario(request)[1],
+)
 def api_calendar_events(request):
-    """Eventos para el calendario entre start y end (YYYY-MM-DD). Muestra todos los eventos sin importar estado."""
+    """Eventos para el calendario entre start y end (YYYY-MM-DD). Muestra todos los eventos sin importar estado.
+    Responde 304 si el rango no cambió desde la última consulta (If-None-Match / If-Modified-Since)."""
     start = request.GET.get('start')
     end = request.GET.get('end')
     if not start or not end:
         return JsonResponse([], safe=False)
     try:
+        from .calendar_feed import eventos_calendario
+        
         # Mostrar todos los eventos sin importar estado (en_progreso, completado, planificado, cancelado)
         # Mostrar TODOS los eventos para TODOS los usuarios, sin filtros por usuario o colaborador
-        # Incluir eventos con fecha en el rango O eventos sin fecha pero creados en el rango
-        from django.db.models import Q
-        actividades = Actividad.objects.filter(
-            eliminado_en__isnull=True
-        ).filter(
-            Q(fecha__gte=start, fecha__lte=end) | 
-            Q(fecha__isnull=True, creado_en__date__gte=start, creado_en__date__lte=end)
-        ).select_related('tipo', 'comunidad', 'comunidad__region', 'responsable')
-
-        # Obtener IDs de actividades para consultas optimizadas
-        actividad_ids = list(actividades.values_list('id', flat=True))
-        
-        # Personal asignado (tabla ActividadPersonal)
-        # Obtener usuarios asignados a través de ActividadPersonal
-        usuarios_asignados_map = {}
-        for ap in ActividadPersonal.objects.filter(actividad_id__in=actividad_ids).select_related('usuario'):
-            key = str(ap.actividad_id)
-            if ap.usuario_id:
-                if key not in usuarios_asignados_map:
-                    usuarios_asignados_map[key] = set()
-                usuarios_asignados_map[key].add(str(ap.usuario_id))
-
-        data = []
-        for a in actividades:
-            # IDs de usuarios asignados a través de ActividadPersonal
-            usuarios_ids = usuarios_asignados_map.get(str(a.id), set()).copy()
-            
-            # Agregar responsable si existe
-            if a.responsable_id:
-                usuarios_ids.add(str(a.responsable_id))
-            
-            # Obtener nombres de responsables/encargados (usuario.nombre o username)
-            responsables_nombres = []
-            if a.responsable:
-                responsables_nombres.append(a.responsable.nombre if a.responsable.nombre else a.responsable.username)
-            
-            # Obtener nombres de personal asignado
-            personal_asignado = ActividadPersonal.objects.filter(actividad_id=a.id).select_related('usuario')
-            for ap in personal_asignado:
-                if ap.usuario:
-                    nombre = ap.usuario.nombre if ap.usuario.nombre else ap.usuario.username
-                    if nombre not in responsables_nombres:
-                        responsables_nombres.append(nombre)
-            
-            responsables_texto = ', '.join(responsables_nombres) if responsables_nombres else None
-
-            # Usar fecha del evento si existe, sino usar fecha de creación como fallback
-            event_date = None
-            if a.fecha:
-                event_date = a.fecha.isoformat()
-            elif a.creado_en:
-                # Si no tiene fecha, usar la fecha de creación
-                event_date = a.creado_en.date().isoformat()
-            
-            data.append({
-                'date': event_date,
-                'name': a.nombre,
-                'description': a.descripcion,
-                'status': a.estado,
-                'responsable': a.responsable.username if a.responsable else None,
-                'owners': responsables_texto,  # Texto con todos los responsables/encargados
-                'usuarios_asignados_ids': list(usuarios_ids),
-            })
-        return JsonResponse(data, safe=False)
+        response = JsonResponse(eventos_calendario(start, end), safe=False)
+        # El navegador guarda la respuesta pero la revalida en cada consulta
+        response['Cache-Control'] = 'private, no-cache'
+        return response
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -7582,18 +7559,8 @@ def api_reminders(request):
         # Por ahora usaremos enviar_notificacion para activar notificaciones y agregaremos un campo para recordar
         # Si no existe el campo recordar en la BD, lo guardaremos como metadata o usaremos enviar_notificacion
         with connection.cursor() as cur:
-            # Verificar si existe columna recordar, si no, usar enviar_notificacion para ambos
-            try:
-                cur.execute("""
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_name='recordatorios' AND column_name='recordar'
-                """)
-                tiene_recordar = cur.fetchone() is not None
-            except:
-                tiene_recordar = False
-            
-            if tiene_recordar:
+            # Si no existe la columna recordar, usar enviar_notificacion para ambos
+            if tiene_columna('recordatorios', 'recordar'):
                 cur.execute(
                     """
                     INSERT INTO recordatorios (actividad_id, created_by, titulo, descripcion, due_at, enviar_notificacion, recordar)
@@ -7624,6 +7591,7 @@ def api_reminders(request):
                     """,
                     [(rid, o) for o in owners]
                 )
+        transaction.on_commit(invalidar_recordatorios)
         return JsonResponse({'id': str(rid)})
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
@@ -7631,13 +7599,163 @@ def api_reminders(request):
 @login_required
 def api_reminders_pending(request):
     """Obtiene recordatorios pendientes para el usuario actual (para notificaciones).
-    Solo devuelve recordatorios donde el usuario está involucrado."""
+    Solo devuelve recordatorios donde el usuario está involucrado.
+    Responde desde el programador en memoria (webmaga/recordatorios_programador.py)."""
+    try:
+        from .recordatorios_programador import destinatario, formatear, programador
+        
+        usuario_maga = get_usuario_maga(request.user)
+        if not usuario_maga:
+            return JsonResponse([], safe=False)
+        
+        # Futuros no enviados y, dentro de los 15 minutos posteriores, los que tienen "recordar"
+        ahora = timezone.now()
+        results = [formatear(fila, ahora) for fila in programador.pendientes(destinatario(usuario_maga), ahora)]
+        return JsonResponse(results, safe=False)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@require_http_methods(["GET"])
+@login_required
+def api_reminders_check_background(request):
+    """Endpoint para que el Service Worker verifique recordatorios en segundo plano.
+    Solo devuelve recordatorios si el usuario tiene sesión activa.
+    Este endpoint puede ser llamado incluso cuando la página está cerrada."""
+    try:
+        from .recordatorios_programador import destinatario, formatear, programador
+        
+        # Verificar que el usuario tiene sesión activa
+        usuario_maga = get_usuario_maga(request.user)
+        if not usuario_maga:
+            return JsonResponse({'reminders': [], 'session_active': False}, safe=False)
+        
+        # SOLO recordatorios que YA PASARON (dentro de los 15 minutos): esto evita que se
+        # envíen notificaciones cuando se crea el recordatorio
+        ahora = timezone.now()
+        results = [
+            formatear(fila, ahora)
+            for fila in programador.pendientes(destinatario(usuario_maga), ahora, incluir_futuros=False)
+        ]
+        
+        response = JsonResponse({
+            'reminders': results,
+            'session_active': True
+        }, safe=False)
+        response['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0'
+        response['Pragma'] = 'no-cache'
+        response['Expires'] = '0'
+        return response
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({'reminders': [], 'session_active': False, 'error': str(e)}, status=500)
+
+
+@require_http_methods(["GET"])
+@login_required
+async def api_reminders_stream(request):
+    """Canal Server-Sent Events de recordatorios para el Service Worker.
+    Envía un evento "reminders" (mismo formato que api_reminders_check_background) al conectar
+    y cada vez que vence un recordatorio del usuario. Ver webmaga/recordatorios_stream.py."""
+    from asgiref.sync import sync_to_async
+    from django.core.handlers.asgi import ASGIRequest
+    from .recordatorios_programador import destinatario, programador, version_actual
+    from .recordatorios_stream import (
+        DURACION_MAXIMA, INTERVALO_RECONEXION_WSGI, INTERVALO_REVISION, recordatorios_vencidos,
+        segundos_hasta,
+    )
+    
+    usuario_maga = await sync_to_async(get_usuario_maga)(await request.auser())
+    if not usuario_maga:
+        return JsonResponse({'reminders': [], 'session_active': False}, status=401)
+    clave = await sync_to_async(destinatario)(usuario_maga)
+    
+    def evento(recordatorios):
+        datos = json.dumps({'reminders': recordatorios, 'session_active': True}, separators=(',', ':'))
+        return f'event: reminders\ndata: {datos}\n\n'
+    
+    if not isinstance(request, ASGIRequest):
+        # Gunicorn síncrono: una sola respuesta; el cliente reconecta al siguiente vencimiento
+        ahora = timezone.now()
+        vencidos = await sync_to_async(recordatorios_vencidos)(clave, ahora)
+        proximo = await sync_to_async(programador.proximo)(clave, ahora)
+        retry = int(segundos_hasta(proximo, ahora, INTERVALO_RECONEXION_WSGI) * 1000) + 1000
+        response = HttpResponse(f'retry: {retry}\n\n' + evento(vencidos), content_type='text/event-stream')
+    else:
+        async def flujo():
+            import asyncio
+            inicio = timezone.now()
+            enviados = set()
+            version = None
+            revisado = None
+            yield f'retry: {INTERVALO_REVISION * 1000}\n\n'
+            while True:
+                ahora = timezone.now()
+                version_nueva = await sync_to_async(version_actual)()
+                if (revisado is None or version_nueva != version
+                        or await sync_to_async(programador.hay_vencidos)(clave, revisado, ahora)):
+                    vencidos = await sync_to_async(recordatorios_vencidos)(clave, ahora)
+                    nuevos = [r for r in vencidos if r['id'] not in enviados]
+                    if nuevos or revisado is None:
+                        yield evento(nuevos)
+                    enviados.update(r['id'] for r in nuevos)
+                    version, revisado = version_nueva, ahora
+                
+                restante = DURACION_MAXIMA - (ahora - inicio).total_seconds()
+                if restante <= 0:
+                    break
+                proximo = await sync_to_async(programador.proximo)(clave, ahora)
+                await asyncio.sleep(max(1.0, segundos_hasta(proximo, ahora, min(INTERVALO_REVISION, restante))))
+                yield ': ping\n\n'
+        
+        response = StreamingHttpResponse(flujo(), content_type='text/event-stream')
+        response['X-Accel-Buffering'] = 'no'  # Que un proxy nginx no acumule el flujo
+    response['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0'
+    return response
+
+
+@require_http_methods(["GET"])
+@login_required
+def api_reminders_notifications(request):
+    """API intermediaria para verificar recordatorios y enviar notificaciones en todas las páginas.
+    Esta API consolida la lógica de verificación de recordatorios para ser usada desde base.html.
+    Devuelve recordatorios que deben mostrar notificaciones (futuros y pasados dentro de la ventana de 15 minutos)."""
+    try:
+        from .recordatorios_programador import destinatario, formatear, programador
+        
+        # Verificar que el usuario tiene sesión activa
+        usuario_maga = get_usuario_maga(request.user)
+        if not usuario_maga:
+            return JsonResponse({'reminders': [], 'session_active': False}, safe=False)
+        
+        ahora = timezone.now()
+        results = [formatear(fila, ahora) for fila in programador.pendientes(destinatario(usuario_maga), ahora)]
+        
+        response = JsonResponse({
+            'reminders': results,
+            'session_active': True
+        }, safe=False)
+        response['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0'
+        response['Pragma'] = 'no-cache'
+        response['Expires'] = '0'
+        return response
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({'reminders': [], 'session_active': False, 'error': str(e)}, status=500)
+
+
+@require_http_methods(["POST"])
+@login_required
+def api_marcar_notificacion_enviada(request, reminder_id):
+    """Marca una notificación como enviada para evitar duplicados"""
     try:
-        from django.utils.timezone import now
-        import pytz
         from django.db import connection
         
-        # Obtener información del usuario actual
+        # Verificar que el recordatorio pertenece al usuario o está involucrado
         user_id = None
         colaborador_usuario_id = None
         try:
@@ -7650,837 +7768,126 @@ def api_reminders_pending(request):
             pass
         
         if not user_id:
-            return JsonResponse([], safe=False)
+            return JsonResponse({'error': 'Usuario no autenticado'}, status=401)
         
-        # Obtener recordatorios pendientes donde el usuario está involucrado
-        guatemala_tz = pytz.timezone('America/Guatemala')
-        ahora_guatemala = now().astimezone(guatemala_tz)
+        from .recordatorios_programador import destinatario, programador
         
-        with connection.cursor() as cur:
-            # Verificar si existe columna recordar
-            cur.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name='recordatorios' AND column_name='recordar'
-            """)
-            tiene_recordar = cur.fetchone() is not None
-            
-            if colaborador_usuario_id:
-                # Buscar recordatorios donde el colaborador del usuario está involucrado
-                # Incluir recordatorios que ya pasaron pero que tienen "recordar" activado (para reenvío)
-                # Solo incluir recordatorios que están dentro de los 15 minutos después de la hora
-                if tiene_recordar:
-                    cur.execute(
-                        """
-                        SELECT DISTINCT r.id::text,
-                               r.titulo,
-                               r.descripcion,
-                               r.due_at,
-                               r.enviar_notificacion,
-                               r.enviado,
-                               COALESCE(r.recordar, FALSE) as recordar,
-                               a.nombre as evento_nombre
-                        FROM recordatorios r
-                        INNER JOIN recordatorio_colaboradores rc ON rc.recordatorio_id = r.id
-                        LEFT JOIN actividades a ON a.id = r.actividad_id
-                        WHERE r.enviar_notificacion = TRUE
-                          AND rc.colaborador_id = %s
-                          AND (
-                            -- Recordatorios futuros que no han sido enviados
-                            (r.due_at >= %s AND (r.enviado = FALSE OR r.enviado IS NULL))
-                            OR
-                            -- Recordatorios pasados con "recordar" activado, dentro de los 15 minutos
-                            (r.due_at < %s 
-                             AND r.due_at >= %s - INTERVAL '15 minutes'
-                             AND COALESCE(r.recordar, FALSE) = TRUE)
-                          )
-                        ORDER BY r.due_at ASC
-                        """,
-                        [colaborador_usuario_id, ahora_guatemala, ahora_guatemala, ahora_guatemala]
-                    )
-                else:
-                    cur.execute(
-                        """
-                        SELECT DISTINCT r.id::text,
-                               r.titulo,
-                               r.descripcion,
-                               r.due_at,
-                               r.enviar_notificacion,
-                               r.enviado,
-                               FALSE as recordar,
-                               a.nombre as evento_nombre
+        # Verificar que el usuario está involucrado en el recordatorio (desde la instantánea
+        # del programador; si el recordatorio ya no está en ella, consultar la BD)
+        involucrado = programador.pertenece(reminder_id, destinatario(usuario_maga))
+        if involucrado is None:
+            with connection.cursor() as cur:
+                if colaborador_usuario_id:
+                    cur.execute("""
+                        SELECT COUNT(*) 
                         FROM recordatorios r
                         INNER JOIN recordatorio_colaboradores rc ON rc.recordatorio_id = r.id
-                        LEFT JOIN actividades a ON a.id = r.actividad_id
-                        WHERE r.enviar_notificacion = TRUE
-                          AND r.due_at >= %s
-                          AND rc.colaborador_id = %s
-                          AND (r.enviado = FALSE OR r.enviado IS NULL)
-                        ORDER BY r.due_at ASC
-                        """,
-                        [ahora_guatemala, colaborador_usuario_id]
-                    )
-            else:
-                # Si no tiene colaborador, solo buscar los que creó
-                if tiene_recordar:
-                    cur.execute(
-                        """
-                        SELECT DISTINCT r.id::text,
-                               r.titulo,
-                               r.descripcion,
-                               r.due_at,
-                               r.enviar_notificacion,
-                               r.enviado,
-                               COALESCE(r.recordar, FALSE) as recordar,
-                               a.nombre as evento_nombre
-                        FROM recordatorios r
-                        LEFT JOIN actividades a ON a.id = r.actividad_id
-                        WHERE r.enviar_notificacion = TRUE
-                          AND r.created_by = %s
-                          AND (
-                            -- Recordatorios futuros que no han sido enviados
-                            (r.due_at >= %s AND (r.enviado = FALSE OR r.enviado IS NULL))
-                            OR
-                            -- Recordatorios pasados con "recordar" activado, dentro de los 15 minutos
-                            (r.due_at < %s 
-                             AND r.due_at >= %s - INTERVAL '15 minutes'
-                             AND COALESCE(r.recordar, FALSE) = TRUE)
-                          )
-                        ORDER BY r.due_at ASC
-                        """,
-                        [user_id, ahora_guatemala, ahora_guatemala, ahora_guatemala]
-                    )
+                        WHERE r.id = %s AND rc.colaborador_id = %s
+                    """, [reminder_id, colaborador_usuario_id])
                 else:
-                    cur.execute(
-                        """
-                        SELECT DISTINCT r.id::text,
-                               r.titulo,
-                               r.descripcion,
-                               r.due_at,
-                               r.enviar_notificacion,
-                               r.enviado,
-                               FALSE as recordar,
-                               a.nombre as evento_nombre
+                    cur.execute("""
+                        SELECT COUNT(*) 
                         FROM recordatorios r
-                        LEFT JOIN actividades a ON a.id = r.actividad_id
-                        WHERE r.enviar_notificacion = TRUE
-                          AND r.due_at >= %s
-                          AND r.created_by = %s
-                          AND (r.enviado = FALSE OR r.enviado IS NULL)
-                        ORDER BY r.due_at ASC
-                        """,
-                        [ahora_guatemala, user_id]
-                    )
-            
-            rows = cur.fetchall()
-        
-        results = []
-        for row in rows:
-            # Extraer datos de la fila según si tiene el campo recordar o no
-            if tiene_recordar:
-                if len(row) >= 8:
-                    rid, titulo, desc, due_at, enviar, enviado, recordar, evento_nombre = row
-                else:
-                    rid, titulo, desc, due_at, enviar, enviado, recordar = row
-                    evento_nombre = None
-            else:
-                if len(row) >= 8:
-                    rid, titulo, desc, due_at, enviar, enviado, recordar, evento_nombre = row[0], row[1], row[2], row[3], row[4], row[5], False, row[7]
-                else:
-                    rid, titulo, desc, due_at, enviar, enviado = row[0], row[1], row[2], row[3], row[4], row[5]
-                    recordar = False
-                    evento_nombre = row[7] if len(row) > 7 else None
-            
-            # Obtener personal involucrado
-            owners_names = []
-            with connection.cursor() as cur2:
-                cur2.execute(
-                    """
-                    SELECT c.nombre
-                    FROM recordatorio_colaboradores rc
-                    JOIN colaboradores c ON c.id = rc.colaborador_id
-                    WHERE rc.recordatorio_id = %s
-                    ORDER BY c.nombre
-                    """,
-                    [rid]
-                )
-                owners_names = [r[0] for r in cur2.fetchall()]
-            owners_text = ', '.join(owners_names) if owners_names else 'Sin personal asignado'
-            
-            # Convertir due_at a zona horaria de Guatemala
-            if due_at:
-                if due_at.tzinfo is None:
-                    due_at_guatemala = guatemala_tz.localize(due_at)
-                else:
-                    due_at_guatemala = due_at.astimezone(guatemala_tz)
-                
-                # Calcular tiempo hasta el recordatorio
-                tiempo_restante = (due_at_guatemala - ahora_guatemala).total_seconds()
-                
-                # Límite de 15 minutos (900 segundos) después de la hora del recordatorio
-                LIMITE_MINUTOS = 15
-                LIMITE_SEGUNDOS = LIMITE_MINUTOS * 60  # 900 segundos
-                
-                # Incluir recordatorios:
-                # 1. Que aún no han llegado (tiempo_restante > 0)
-                # 2. Que ya pasaron pero están dentro de los 15 minutos después de la hora (tiempo_restante < 0 pero abs(tiempo_restante) <= 900)
-                tiempo_absoluto = abs(tiempo_restante)
-                incluir = False
-                
-                if tiempo_restante > 0:
-                    # Aún no ha llegado, incluir
-                    incluir = True
-                elif tiempo_restante < 0:
-                    # Ya pasó, solo incluir si está dentro de los 15 minutos
-                    if tiempo_absoluto <= LIMITE_SEGUNDOS:
-                        incluir = True
-                    else:
-                        # Pasaron más de 15 minutos, no incluir
-                        incluir = False
-                
-                if incluir:
-                    # Formatear fecha y hora
-                    fecha_str = due_at_guatemala.strftime('%d/%m/%Y')
-                    hora_str = due_at_guatemala.strftime('%H:%M')
-                    
-                    results.append({
-                        'id': rid,
-                        'titulo': titulo or 'Recordatorio',
-                        'descripcion': desc or '',
-                        'due_at': due_at_guatemala.isoformat(),
-                        'due_at_timestamp': int(due_at_guatemala.timestamp() * 1000),  # En milisegundos
-                        'tiempo_restante_segundos': int(tiempo_restante),
-                        'recordar': bool(recordar) if recordar is not None else False,
-                        'evento_nombre': evento_nombre or 'Sin evento',
-                        'fecha': fecha_str,
-                        'hora': hora_str,
-                        'owners_text': owners_text,
-                        'enviado': bool(enviado) if enviado is not None else False
-                    })
-        
-        return JsonResponse(results, safe=False)
+                        WHERE r.id = %s AND r.created_by = %s
+                    """, [reminder_id, user_id])
+                involucrado = cur.fetchone()[0] > 0
+        if not involucrado:
+            return JsonResponse({'error': 'No autorizado'}, status=403)
+        
+        # Marcar como enviado (se guarda en lote junto con las demás marcas)
+        programador.marcar_enviado(reminder_id)
+        return JsonResponse({'success': True})
     except Exception as e:
         import traceback
         traceback.print_exc()
         return JsonResponse({'error': str(e)}, status=500)
 
 
-@require_http_methods(["GET"])
+@require_http_methods(["DELETE"])
 @login_required
-def api_reminders_check_background(request):
-    """Endpoint para que el Service Worker verifique recordatorios en segundo plano.
-    Solo devuelve recordatorios si el usuario tiene sesión activa.
-    Este endpoint puede ser llamado incluso cuando la página está cerrada."""
+def api_reminder_detail(request, reminder_id):
+    """Eliminar recordatorio. Solo admin puede eliminar cualquier recordatorio. Usuarios personales solo pueden eliminar los que crearon."""
     try:
-        from django.utils.timezone import now
-        import pytz
-        from django.db import connection
-        
-        # Verificar que el usuario tiene sesión activa
-        if not request.user.is_authenticated:
-            return JsonResponse({'reminders': [], 'session_active': False}, safe=False)
+        # Obtener información del recordatorio
+        with connection.cursor() as cur:
+            cur.execute("SELECT created_by::text FROM recordatorios WHERE id = %s", [reminder_id])
+            row = cur.fetchone()
+            if not row:
+                return JsonResponse({'error': 'Not found'}, status=404)
+            created_by = row[0]
         
         # Obtener información del usuario actual
+        is_admin = False
         user_id = None
-        colaborador_usuario_id = None
         try:
             usuario_maga = get_usuario_maga(request.user)
             if usuario_maga:
                 user_id = str(usuario_maga.id)
-                if hasattr(usuario_maga, 'colaborador') and usuario_maga.colaborador:
-                    colaborador_usuario_id = str(usuario_maga.colaborador.id)
+                is_admin = usuario_maga.rol == 'admin'
         except Exception:
             pass
         
-        if not user_id:
-            return JsonResponse({'reminders': [], 'session_active': False}, safe=False)
+        # Verificar permisos: admin puede eliminar cualquier recordatorio, usuarios personales solo los que crearon
+        is_creator = (created_by == user_id) if user_id else False
         
-        # Obtener recordatorios pendientes (misma lógica que api_reminders_pending)
-        guatemala_tz = pytz.timezone('America/Guatemala')
-        ahora_guatemala = now().astimezone(guatemala_tz)
+        if not (is_admin or is_creator):
+            return JsonResponse({'error': 'Forbidden'}, status=403)
         
-        with connection.cursor() as cur:
-            # Verificar si existe columna recordar
-            cur.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name='recordatorios' AND column_name='recordar'
-            """)
-            tiene_recordar = cur.fetchone() is not None
-            
-            if colaborador_usuario_id:
-                if tiene_recordar:
-                    cur.execute(
-                        """
-                        SELECT DISTINCT r.id::text,
-                               r.titulo,
-                               r.descripcion,
-                               r.due_at,
-                               r.enviar_notificacion,
-                               r.enviado,
-                               COALESCE(r.recordar, FALSE) as recordar,
-                               a.nombre as evento_nombre
-                        FROM recordatorios r
-                        INNER JOIN recordatorio_colaboradores rc ON rc.recordatorio_id = r.id
-                        LEFT JOIN actividades a ON a.id = r.actividad_id
-                        WHERE r.enviar_notificacion = TRUE
-                          AND rc.colaborador_id = %s
-                          AND (
-                            (r.due_at >= %s AND (r.enviado = FALSE OR r.enviado IS NULL))
-                            OR
-                            (r.due_at < %s 
-                             AND r.due_at >= %s - INTERVAL '15 minutes'
-                             AND COALESCE(r.recordar, FALSE) = TRUE)
-                          )
-                        ORDER BY r.due_at ASC
-                        """,
-                        [colaborador_usuario_id, ahora_guatemala, ahora_guatemala, ahora_guatemala]
-                    )
-                else:
-                    cur.execute(
-                        """
-                        SELECT DISTINCT r.id::text,
-                               r.titulo,
-                               r.descripcion,
-                               r.due_at,
-                               r.enviar_notificacion,
-                               r.enviado,
-                               FALSE as recordar,
-                               a.nombre as evento_nombre
-                        FROM recordatorios r
-                        INNER JOIN recordatorio_colaboradores rc ON rc.recordatorio_id = r.id
-                        LEFT JOIN actividades a ON a.id = r.actividad_id
-                        WHERE r.enviar_notificacion = TRUE
-                          AND r.due_at >= %s
-                          AND rc.colaborador_id = %s
-                          AND (r.enviado = FALSE OR r.enviado IS NULL)
-                        ORDER BY r.due_at ASC
-                        """,
-                        [ahora_guatemala, colaborador_usuario_id]
-                    )
-            else:
-                if tiene_recordar:
-                    cur.execute(
-                        """
-                        SELECT DISTINCT r.id::text,
-                               r.titulo,
-                               r.descripcion,
-                               r.due_at,
-                               r.enviar_notificacion,
-                               r.enviado,
-                               COALESCE(r.recordar, FALSE) as recordar,
-                               a.nombre as evento_nombre
-                        FROM recordatorios r
-                        LEFT JOIN actividades a ON a.id = r.actividad_id
-                        WHERE r.enviar_notificacion = TRUE
-                          AND r.created_by = %s
-                          AND (
-                            (r.due_at >= %s AND (r.enviado = FALSE OR r.enviado IS NULL))
-                            OR
-                            (r.due_at < %s 
-                             AND r.due_at >= %s - INTERVAL '15 minutes'
-                             AND COALESCE(r.recordar, FALSE) = TRUE)
-                          )
-                        ORDER BY r.due_at ASC
-                        """,
-                        [user_id, ahora_guatemala, ahora_guatemala, ahora_guatemala]
-                    )
-                else:
-                    cur.execute(
-                        """
-                        SELECT DISTINCT r.id::text,
-                               r.titulo,
-                               r.descripcion,
-                               r.due_at,
-                               r.enviar_notificacion,
-                               r.enviado,
-                               FALSE as recordar,
-                               a.nombre as evento_nombre
-                        FROM recordatorios r
-                        LEFT JOIN actividades a ON a.id = r.actividad_id
-                        WHERE r.enviar_notificacion = TRUE
-                          AND r.due_at >= %s
-                          AND r.created_by = %s
-                          AND (r.enviado = FALSE OR r.enviado IS NULL)
-                        ORDER BY r.due_at ASC
-                        """,
-                        [ahora_guatemala, user_id]
-                    )
-            
-            rows = cur.fetchall()
-        
-        results = []
-        for row in rows:
-            if tiene_recordar:
-                if len(row) >= 8:
-                    rid, titulo, desc, due_at, enviar, enviado, recordar, evento_nombre = row
-                else:
-                    rid, titulo, desc, due_at, enviar, enviado, recordar = row
-                    evento_nombre = None
-            else:
-                if len(row) >= 8:
-                    rid, titulo, desc, due_at, enviar, enviado, recordar, evento_nombre = row[0], row[1], row[2], row[3], row[4], row[5], False, row[7]
-                else:
-                    rid, titulo, desc, due_at, enviar, enviado = row[0], row[1], row[2], row[3], row[4], row[5]
-                    recordar = False
-                    evento_nombre = row[7] if len(row) > 7 else None
-            
-            # Obtener personal involucrado
-            owners_names = []
-            with connection.cursor() as cur2:
-                cur2.execute(
-                    """
-                    SELECT c.nombre
-                    FROM recordatorio_colaboradores rc
-                    JOIN colaboradores c ON c.id = rc.colaborador_id
-                    WHERE rc.recordatorio_id = %s
-                    ORDER BY c.nombre
-                    """,
-                    [rid]
-                )
-                owners_names = [r[0] for r in cur2.fetchall()]
-            owners_text = ', '.join(owners_names) if owners_names else 'Sin personal asignado'
-            
-            # Convertir due_at a zona horaria de Guatemala
-            if due_at:
-                if due_at.tzinfo is None:
-                    due_at_guatemala = guatemala_tz.localize(due_at)
-                else:
-                    due_at_guatemala = due_at.astimezone(guatemala_tz)
-                
-                # Calcular tiempo hasta el recordatorio
-                tiempo_restante = (due_at_guatemala - ahora_guatemala).total_seconds()
-                
-                # Límite de 15 minutos (900 segundos) después de la hora del recordatorio
-                LIMITE_MINUTOS = 15
-                LIMITE_SEGUNDOS = LIMITE_MINUTOS * 60
-                
-                tiempo_absoluto = abs(tiempo_restante)
-                incluir = False
-                
-                # SOLO incluir recordatorios que YA PASARON (no futuros)
-                # Esto evita que se envíen notificaciones cuando se crea el recordatorio
-                if tiempo_restante <= 0:
-                    # Ya pasó, solo incluir si está dentro de los 15 minutos
-                    if tiempo_absoluto <= LIMITE_SEGUNDOS:
-                        incluir = True
-                # NO incluir recordatorios futuros - esperar a que llegue la hora
-                
-                if incluir:
-                    # Formatear fecha y hora
-                    fecha_str = due_at_guatemala.strftime('%d/%m/%Y')
-                    hora_str = due_at_guatemala.strftime('%H:%M')
-                    
-                    results.append({
-                        'id': rid,
-                        'titulo': titulo or 'Recordatorio',
-                        'descripcion': desc or '',
-                        'due_at': due_at_guatemala.isoformat(),
-                        'due_at_timestamp': int(due_at_guatemala.timestamp() * 1000),
-                        'tiempo_restante_segundos': int(tiempo_restante),
-                        'recordar': bool(recordar) if recordar is not None else False,
-                        'evento_nombre': evento_nombre or 'Sin evento',
-                        'fecha': fecha_str,
-                        'hora': hora_str,
-                        'owners_text': owners_text,
-                        'enviado': bool(enviado) if enviado is not None else False
-                    })
+        # Eliminar el recordatorio (CASCADE eliminará también los colaboradores)
+        with connection.cursor() as cur2:
+            cur2.execute("DELETE FROM recordatorios WHERE id = %s", [reminder_id])
         
-        response = JsonResponse({
-            'reminders': results,
-            'session_active': True
-        }, safe=False)
-        response['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0'
-        response['Pragma'] = 'no-cache'
-        response['Expires'] = '0'
-        return response
+        transaction.on_commit(invalidar_recordatorios)
+        return JsonResponse({'deleted': True})
     except Exception as e:
         import traceback
         traceback.print_exc()
-        return JsonResponse({'reminders': [], 'session_active': False, 'error': str(e)}, status=500)
+        return JsonResponse({'error': str(e)}, status=400)
 
 
 @require_http_methods(["GET"])
 @login_required
-def api_reminders_notifications(request):
-    """API intermediaria para verificar recordatorios y enviar notificaciones en todas las páginas.
-    Esta API consolida la lógica de verificación de recordatorios para ser usada desde base.html.
-    Devuelve recordatorios que deben mostrar notificaciones (futuros y pasados dentro de la ventana de 15 minutos)."""
+def api_events_list(request):
+    """Lista simple de eventos (id, name) para el formulario de recordatorios."""
     try:
-        from django.utils.timezone import now
-        import pytz
-        from django.db import connection
-        
-        # Verificar que el usuario tiene sesión activa
-        if not request.user.is_authenticated:
-            return JsonResponse({'reminders': [], 'session_active': False}, safe=False)
-        
         # Obtener información del usuario actual
-        user_id = None
+        is_admin = False
         colaborador_usuario_id = None
         try:
             usuario_maga = get_usuario_maga(request.user)
             if usuario_maga:
-                user_id = str(usuario_maga.id)
+                is_admin = usuario_maga.rol == 'admin'
                 if hasattr(usuario_maga, 'colaborador') and usuario_maga.colaborador:
                     colaborador_usuario_id = str(usuario_maga.colaborador.id)
         except Exception:
             pass
         
-        if not user_id:
-            return JsonResponse({'reminders': [], 'session_active': False}, safe=False)
-        
-        # Obtener recordatorios pendientes (similar a api_reminders_pending pero optimizado para notificaciones)
-        guatemala_tz = pytz.timezone('America/Guatemala')
-        ahora_guatemala = now().astimezone(guatemala_tz)
-        
-        with connection.cursor() as cur:
-            # Verificar si existe columna recordar
-            cur.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name='recordatorios' AND column_name='recordar'
-            """)
-            tiene_recordar = cur.fetchone() is not None
-            
+        # Si es admin, mostrar todos los eventos
+        if is_admin:
+            qs = Actividad.objects.filter(eliminado_en__isnull=True).order_by('-creado_en')[:300]
+        else:
+            # Si no es admin, solo mostrar eventos donde el colaborador del usuario está asignado
             if colaborador_usuario_id:
-                if tiene_recordar:
-                    cur.execute(
-                        """
-                        SELECT DISTINCT r.id::text,
-                               r.titulo,
-                               r.descripcion,
-                               r.due_at,
-                               r.enviar_notificacion,
-                               r.enviado,
-                               COALESCE(r.recordar, FALSE) as recordar,
-                               a.nombre as evento_nombre
-                        FROM recordatorios r
-                        INNER JOIN recordatorio_colaboradores rc ON rc.recordatorio_id = r.id
-                        LEFT JOIN actividades a ON a.id = r.actividad_id
-                        WHERE r.enviar_notificacion = TRUE
-                          AND rc.colaborador_id = %s
-                          AND (
-                            -- Recordatorios futuros que no han sido enviados
-                            (r.due_at >= %s AND (r.enviado = FALSE OR r.enviado IS NULL))
-                            OR
-                            -- Recordatorios pasados con "recordar" activado, dentro de los 15 minutos
-                            (r.due_at < %s 
-                             AND r.due_at >= %s - INTERVAL '15 minutes'
-                             AND COALESCE(r.recordar, FALSE) = TRUE)
-                          )
-                        ORDER BY r.due_at ASC
-                        """,
-                        [colaborador_usuario_id, ahora_guatemala, ahora_guatemala, ahora_guatemala]
-                    )
-                else:
-                    cur.execute(
-                        """
-                        SELECT DISTINCT r.id::text,
-                               r.titulo,
-                               r.descripcion,
-                               r.due_at,
-                               r.enviar_notificacion,
-                               r.enviado,
-                               FALSE as recordar,
-                               a.nombre as evento_nombre
-                        FROM recordatorios r
-                        INNER JOIN recordatorio_colaboradores rc ON rc.recordatorio_id = r.id
-                        LEFT JOIN actividades a ON a.id = r.actividad_id
-                        WHERE r.enviar_notificacion = TRUE
-                          AND r.due_at >= %s
-                          AND rc.colaborador_id = %s
-                          AND (r.enviado = FALSE OR r.enviado IS NULL)
-                        ORDER BY r.due_at ASC
-                        """,
-                        [ahora_guatemala, colaborador_usuario_id]
-                    )
-            else:
-                if tiene_recordar:
-                    cur.execute(
-                        """
-                        SELECT DISTINCT r.id::text,
-                               r.titulo,
-                               r.descripcion,
-                               r.due_at,
-                               r.enviar_notificacion,
-                               r.enviado,
-                               COALESCE(r.recordar, FALSE) as recordar,
-                               a.nombre as evento_nombre
-                        FROM recordatorios r
-                        LEFT JOIN actividades a ON a.id = r.actividad_id
-                        WHERE r.enviar_notificacion = TRUE
-                          AND r.created_by = %s
-                          AND (
-                            -- Recordatorios futuros que no han sido enviados
-                            (r.due_at >= %s AND (r.enviado = FALSE OR r.enviado IS NULL))
-                            OR
-                            -- Recordatorios pasados con "recordar" activado, dentro de los 15 minutos
-                            (r.due_at < %s 
-                             AND r.due_at >= %s - INTERVAL '15 minutes'
-                             AND COALESCE(r.recordar, FALSE) = TRUE)
-                          )
-                        ORDER BY r.due_at ASC
-                        """,
-                        [user_id, ahora_guatemala, ahora_guatemala, ahora_guatemala]
-                    )
-                else:
-                    cur.execute(
-                        """
-                        SELECT DISTINCT r.id::text,
-                               r.titulo,
-                               r.descripcion,
-                               r.due_at,
-                               r.enviar_notificacion,
-                               r.enviado,
-                               FALSE as recordar,
-                               a.nombre as evento_nombre
-                        FROM recordatorios r
-                        LEFT JOIN actividades a ON a.id = r.actividad_id
-                        WHERE r.enviar_notificacion = TRUE
-                          AND r.due_at >= %s
-                          AND r.created_by = %s
-                          AND (r.enviado = FALSE OR r.enviado IS NULL)
-                        ORDER BY r.due_at ASC
-                        """,
-                        [ahora_guatemala, user_id]
-                    )
-            
-            rows = cur.fetchall()
-        
-        results = []
-        for row in rows:
-            if tiene_recordar:
-                if len(row) >= 8:
-                    rid, titulo, desc, due_at, enviar, enviado, recordar, evento_nombre = row
-                else:
-                    rid, titulo, desc, due_at, enviar, enviado, recordar = row
-                    evento_nombre = None
+                qs = Actividad.objects.filter(
+                    eliminado_en__isnull=True,
+                    personal__colaborador_id=colaborador_usuario_id
+                ).distinct().order_by('-creado_en')[:300]
             else:
-                if len(row) >= 8:
-                    rid, titulo, desc, due_at, enviar, enviado, recordar, evento_nombre = row[0], row[1], row[2], row[3], row[4], row[5], False, row[7]
-                else:
-                    rid, titulo, desc, due_at, enviar, enviado = row[0], row[1], row[2], row[3], row[4], row[5]
-                    recordar = False
-                    evento_nombre = row[7] if len(row) > 7 else None
-            
-            # Obtener personal involucrado
-            owners_names = []
-            with connection.cursor() as cur2:
-                cur2.execute(
-                    """
-                    SELECT c.nombre
-                    FROM recordatorio_colaboradores rc
-                    JOIN colaboradores c ON c.id = rc.colaborador_id
-                    WHERE rc.recordatorio_id = %s
-                    ORDER BY c.nombre
-                    """,
-                    [rid]
-                )
-                owners_names = [r[0] for r in cur2.fetchall()]
-            owners_text = ', '.join(owners_names) if owners_names else 'Sin personal asignado'
-            
-            # Convertir due_at a zona horaria de Guatemala
-            if due_at:
-                if due_at.tzinfo is None:
-                    due_at_guatemala = guatemala_tz.localize(due_at)
-                else:
-                    due_at_guatemala = due_at.astimezone(guatemala_tz)
-                
-                # Calcular tiempo hasta el recordatorio
-                tiempo_restante = (due_at_guatemala - ahora_guatemala).total_seconds()
-                
-                # Límite de 15 minutos (900 segundos) después de la hora del recordatorio
-                LIMITE_MINUTOS = 15
-                LIMITE_SEGUNDOS = LIMITE_MINUTOS * 60
-                
-                tiempo_absoluto = abs(tiempo_restante)
-                incluir = False
-                
-                # Incluir recordatorios futuros (para programar notificaciones)
-                # Y recordatorios pasados dentro de los 15 minutos (para reenvío con "recordar")
-                if tiempo_restante > 0:
-                    # Futuro: incluir todos los que aún no han pasado
-                    incluir = True
-                elif tiempo_restante <= 0:
-                    # Ya pasó, solo incluir si está dentro de los 15 minutos
-                    if tiempo_absoluto <= LIMITE_SEGUNDOS:
-                        incluir = True
-                
-                if incluir:
-                    # Formatear fecha y hora
-                    fecha_str = due_at_guatemala.strftime('%d/%m/%Y')
-                    hora_str = due_at_guatemala.strftime('%H:%M')
-                    
-                    results.append({
-                        'id': rid,
-                        'titulo': titulo or 'Recordatorio',
-                        'descripcion': desc or '',
-                        'due_at': due_at_guatemala.isoformat(),
-                        'due_at_timestamp': int(due_at_guatemala.timestamp() * 1000),
-                        'tiempo_restante_segundos': int(tiempo_restante),
-                        'recordar': bool(recordar) if recordar is not None else False,
-                        'evento_nombre': evento_nombre or 'Sin evento',
-                        'fecha': fecha_str,
-                        'hora': hora_str,
-                        'owners_text': owners_text,
-                        'enviado': bool(enviado) if enviado is not None else False
-                    })
+                # Si no tiene colaborador vinculado, no mostrar eventos
+                qs = Actividad.objects.none()
         
-        response = JsonResponse({
-            'reminders': results,
-            'session_active': True
-        }, safe=False)
-        response['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0'
-        response['Pragma'] = 'no-cache'
-        response['Expires'] = '0'
-        return response
+        data = [{'id': str(a.id), 'name': a.nombre} for a in qs]
+        return JsonResponse(data, safe=False)
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return JsonResponse({'reminders': [], 'session_active': False, 'error': str(e)}, status=500)
+        return JsonResponse([], safe=False)
 
 
-@require_http_methods(["POST"])
+@require_http_methods(["GET"])
 @login_required
-def api_marcar_notificacion_enviada(request, reminder_id):
-    """Marca una notificación como enviada para evitar duplicados"""
+def api_collaborators(request):
+    """Lista de colaboradores activos para el formulario (id, nombre, puesto). Filtra por evento si se proporciona evento_id."""
     try:
-        from django.db import connection
-        
-        # Verificar que el recordatorio pertenece al usuario o está involucrado
-        user_id = None
-        colaborador_usuario_id = None
-        try:
-            usuario_maga = get_usuario_maga(request.user)
-            if usuario_maga:
-                user_id = str(usuario_maga.id)
-                if hasattr(usuario_maga, 'colaborador') and usuario_maga.colaborador:
-                    colaborador_usuario_id = str(usuario_maga.colaborador.id)
-        except Exception:
-            pass
-        
-        if not user_id:
-            return JsonResponse({'error': 'Usuario no autenticado'}, status=401)
-        
-        # Verificar que el usuario está involucrado en el recordatorio
-        with connection.cursor() as cur:
-            if colaborador_usuario_id:
-                cur.execute("""
-                    SELECT COUNT(*) 
-                    FROM recordatorios r
-                    INNER JOIN recordatorio_colaboradores rc ON rc.recordatorio_id = r.id
-                    WHERE r.id = %s AND rc.colaborador_id = %s
-                """, [reminder_id, colaborador_usuario_id])
-            else:
-                cur.execute("""
-                    SELECT COUNT(*) 
-                    FROM recordatorios r
-                    WHERE r.id = %s AND r.created_by = %s
-                """, [reminder_id, user_id])
-            
-            count = cur.fetchone()[0]
-            if count == 0:
-                return JsonResponse({'error': 'No autorizado'}, status=403)
-            
-            # Marcar como enviado
-            cur.execute("""
-                UPDATE recordatorios 
-                SET enviado = TRUE 
-                WHERE id = %s
-            """, [reminder_id])
-        
-        return JsonResponse({'success': True})
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return JsonResponse({'error': str(e)}, status=500)
-
-
-@require_http_methods(["DELETE"])
-@login_required
-def api_reminder_detail(request, reminder_id):
-    """Eliminar recordatorio. Solo admin puede eliminar cualquier recordatorio. Usuarios personales solo pueden eliminar los que crearon."""
-    try:
-        # Obtener información del recordatorio
-        with connection.cursor() as cur:
-            cur.execute("SELECT created_by::text FROM recordatorios WHERE id = %s", [reminder_id])
-            row = cur.fetchone()
-            if not row:
-                return JsonResponse({'error': 'Not found'}, status=404)
-            created_by = row[0]
-        
-        # Obtener información del usuario actual
-        is_admin = False
-        user_id = None
-        try:
-            usuario_maga = get_usuario_maga(request.user)
-            if usuario_maga:
-                user_id = str(usuario_maga.id)
-                is_admin = usuario_maga.rol == 'admin'
-        except Exception:
-            pass
-        
-        # Verificar permisos: admin puede eliminar cualquier recordatorio, usuarios personales solo los que crearon
-        is_creator = (created_by == user_id) if user_id else False
-        
-        if not (is_admin or is_creator):
-            return JsonResponse({'error': 'Forbidden'}, status=403)
-        
-        # Eliminar el recordatorio (CASCADE eliminará también los colaboradores)
-        with connection.cursor() as cur2:
-            cur2.execute("DELETE FROM recordatorios WHERE id = %s", [reminder_id])
-        
-        return JsonResponse({'deleted': True})
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return JsonResponse({'error': str(e)}, status=400)
-
-
-@require_http_methods(["GET"])
-@login_required
-def api_events_list(request):
-    """Lista simple de eventos (id, name) para el formulario de recordatorios."""
-    try:
-        # Obtener información del usuario actual
-        is_admin = False
-        colaborador_usuario_id = None
-        try:
-            usuario_maga = get_usuario_maga(request.user)
-            if usuario_maga:
-                is_admin = usuario_maga.rol == 'admin'
-                if hasattr(usuario_maga, 'colaborador') and usuario_maga.colaborador:
-                    colaborador_usuario_id = str(usuario_maga.colaborador.id)
-        except Exception:
-            pass
-        
-        # Si es admin, mostrar todos los eventos
-        if is_admin:
-            qs = Actividad.objects.filter(eliminado_en__isnull=True).order_by('-creado_en')[:300]
-        else:
-            # Si no es admin, solo mostrar eventos donde el colaborador del usuario está asignado
-            if colaborador_usuario_id:
-                qs = Actividad.objects.filter(
-                    eliminado_en__isnull=True,
-                    personal__colaborador_id=colaborador_usuario_id
-                ).distinct().order_by('-creado_en')[:300]
-            else:
-                # Si no tiene colaborador vinculado, no mostrar eventos
-                qs = Actividad.objects.none()
-        
-        data = [{'id': str(a.id), 'name': a.nombre} for a in qs]
-        return JsonResponse(data, safe=False)
-    except Exception as e:
-        return JsonResponse([], safe=False)
-
-
-@require_http_methods(["GET"])
-@login_required
-def api_collaborators(request):
-    """Lista de colaboradores activos para el formulario (id, nombre, puesto). Filtra por evento si se proporciona evento_id."""
-    try:
-        evento_id = request.GET.get('evento_id') or request.GET.get('event_id')
+        evento_id = request.GET.get('evento_id') or request.GET.get('event_id')
         
         with connection.cursor() as cur:
             if evento_id:
@@ -8549,23 +7956,8 @@ def api_obtener_detalle_proyecto(request, evento_id):
         import pytz
         
         # Verificar si las columnas comunidad_id y region_id existen en eventos_cambios_colaboradores
-        from django.db import connection
-        try:
-            with connection.cursor() as cursor:
-                cursor.execute("""
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_name = 'eventos_cambios_colaboradores' 
-                    AND column_name IN ('comunidad_id', 'region_id');
-                """)
-                existing_columns = {row[0] for row in cursor.fetchall()}
-                has_cambios_colaboradores_comunidad = 'comunidad_id' in existing_columns
-                has_cambios_colaboradores_region = 'region_id' in existing_columns
-        except Exception as e:
-            # Si hay un error al verificar, asumir que las columnas no existen
-            print(f'⚠️ Error al verificar columnas en eventos_cambios_colaboradores: {e}')
-            has_cambios_colaboradores_comunidad = False
-            has_cambios_colaboradores_region = False
+        has_cambios_colaboradores_comunidad = tiene_columna('eventos_cambios_colaboradores', 'comunidad_id')
+        has_cambios_colaboradores_region = tiene_columna('eventos_cambios_colaboradores', 'region_id')
 
         # Construir prefetch_related dinámicamente según las columnas disponibles
         # OPTIMIZACIÓN: NO cargar beneficiarios aquí - solo se necesita el conteo para la tarjeta de datos
@@ -8677,6 +8069,7 @@ def api_obtener_detalle_proyecto(request, evento_id):
                 'id': str(imagen.id),
                 'nombre': imagen.archivo_nombre,
                 'url': imagen.url_almacenamiento,
+                **imagenes_diferidas.urls_variantes(imagen),
                 'tipo': imagen.archivo_tipo or '',
                 'es_imagen': True,
                 'descripcion': imagen.descripcion or '',
@@ -8846,46 +8239,24 @@ def api_agregar_imagen_galeria(request, evento_id):
                 'error': 'El archivo debe ser una imagen (JPG, PNG, GIF, etc.)'
             }, status=400)
         
-        # COMPRIMIR IMAGEN automáticamente
-        if getattr(settings, 'COMPRESS_IMAGES', True):
-            from .image_compression import compress_if_needed, get_compression_settings
-            compression_settings = get_compression_settings('gallery')
-            imagen = compress_if_needed(imagen, **compression_settings)
-        
         # Obtener descripción (opcional)
         descripcion = request.POST.get('descripcion', '').strip()
         
-        # Crear carpeta si no existe
-        galeria_dir = os.path.join(str(settings.MEDIA_ROOT), 'galeria_img')
-        os.makedirs(galeria_dir, exist_ok=True)
-        
         print(f"📤 Subiendo imagen a evento {evento_id}")
-        print(f"📁 Directorio: {galeria_dir}")
         print(f"✅ Archivo recibido: {imagen.name}, tamaño: {imagen.size}, tipo: {imagen.content_type}")
         
-        # Verificar permisos de escritura
-        if not os.access(galeria_dir, os.W_OK):
-            print(f"❌ No hay permisos de escritura en {galeria_dir}")
-            return JsonResponse({
-                'success': False,
-                'error': f'No se tienen permisos de escritura en {galeria_dir}'
-            }, status=500)
-        
         # Guardar archivo
-        fs = FileSystemStorage(location=galeria_dir)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S%f')
         file_extension = os.path.splitext(imagen.name)[1]
-        filename = f"{timestamp}_{evento_id}{file_extension}"
-        print(f"💾 Intentando guardar archivo: {filename}")
+        print(f"💾 Intentando guardar archivo: {imagen.name}")
         try:
-            saved_name = fs.save(filename, imagen)
+            saved_name = almacen_archivos.guardar(imagen, file_extension)
             print(f"✅ Archivo guardado exitosamente: {saved_name}")
         except Exception as e:
             import traceback
             print(f"❌ Error al guardar archivo: {str(e)}")
             print(f"📋 Traceback:\n{traceback.format_exc()}")
             raise
-        file_url = f"/media/galeria_img/{saved_name}"
+        file_url = f"/media/{saved_name}"
         
         # Crear registro en la BD usando EventosGaleria
         imagen_galeria = EventosGaleria.objects.create(
@@ -8898,6 +8269,9 @@ def api_agregar_imagen_galeria(request, evento_id):
             creado_por=usuario_maga
         )
         
+        # Comprimir y generar miniaturas en segundo plano (procesar_imagenes)
+        imagenes_diferidas.programar_procesamiento(EventosGaleria, imagen_galeria.id, file_url, imagen, 'gallery')
+        
         # Actualizar actualizado_en del evento para que aparezca en "Últimos Proyectos"
         evento.actualizado_en = timezone.now()
         evento.save(update_fields=['actualizado_en'])
@@ -8980,6 +8354,40 @@ def api_eliminar_imagen_galeria(request, evento_id, imagen_id):
             'success': False,
             'error': f'Error al eliminar imagen: {str(e)}'
         }, status=500)
+def _crear_archivo_evento(evento, usuario_maga, relative_path, archivo_nombre, content_type, tamanio, descripcion):
+    """Crea el ActividadArchivo de un archivo ya guardado en el almacén; retorna (registro, respuesta)"""
+    file_url = f"/media/{relative_path}"
+    
+    # Crear registro en la tabla actividad_archivos
+    archivo_registro = ActividadArchivo.objects.create(
+        actividad=evento,
+        nombre_archivo=archivo_nombre,
+        archivo_tipo=content_type or 'application/octet-stream',
+        archivo_tamanio=tamanio,
+        url_almacenamiento=file_url,
+        descripcion=descripcion,
+        creado_por=usuario_maga
+    )
+    
+    # Actualizar actualizado_en del evento para que aparezca en "Últimos Proyectos"
+    evento.actualizado_en = timezone.now()
+    evento.save(update_fields=['actualizado_en'])
+    
+    return archivo_registro, {
+        'success': True,
+        'message': 'Archivo agregado exitosamente',
+        'archivo': {
+            'id': str(archivo_registro.id),
+            'nombre': archivo_nombre,
+            'url': file_url,
+            'tipo': content_type or 'application/octet-stream',
+            'tamanio': tamanio,
+            'descripcion': descripcion,
+            'es_evidencia': False
+        }
+    }
+
+
 @permiso_gestionar_eventos
 @require_http_methods(["POST"])
 def api_agregar_archivo(request, evento_id):
@@ -9005,46 +8413,13 @@ def api_agregar_archivo(request, evento_id):
         # Obtener descripción (opcional)
         descripcion = request.POST.get('descripcion', '').strip()
         
-        # Crear carpeta si no existe
-        archivos_dir = os.path.join(str(settings.MEDIA_ROOT), 'archivos_eventos')
-        os.makedirs(archivos_dir, exist_ok=True)
-        
         # Guardar archivo
-        fs = FileSystemStorage(location=archivos_dir)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S%f')
         file_extension = os.path.splitext(archivo.name)[1]
-        filename = f"{timestamp}_{evento_id}{file_extension}"
-        saved_name = fs.save(filename, archivo)
-        file_url = f"/media/archivos_eventos/{saved_name}"
-        
-        # Crear registro en la tabla actividad_archivos
-        archivo_registro = ActividadArchivo.objects.create(
-            actividad=evento,
-            nombre_archivo=archivo.name,
-            archivo_tipo=archivo.content_type or 'application/octet-stream',
-            archivo_tamanio=archivo.size,
-            url_almacenamiento=file_url,
-            descripcion=descripcion,
-            creado_por=usuario_maga
+        saved_name = almacen_archivos.guardar(archivo, file_extension)
+        _archivo_registro, respuesta = _crear_archivo_evento(
+            evento, usuario_maga, saved_name, archivo.name, archivo.content_type, archivo.size, descripcion
         )
-        
-        # Actualizar actualizado_en del evento para que aparezca en "Últimos Proyectos"
-        evento.actualizado_en = timezone.now()
-        evento.save(update_fields=['actualizado_en'])
-        
-        return JsonResponse({
-            'success': True,
-            'message': 'Archivo agregado exitosamente',
-            'archivo': {
-                'id': str(archivo_registro.id),
-                'nombre': archivo.name,
-                'url': file_url,
-                'tipo': archivo.content_type or 'application/octet-stream',
-                'tamanio': archivo.size,
-                'descripcion': descripcion,
-                'es_evidencia': False
-            }
-        })
+        return JsonResponse(respuesta)
         
     except Actividad.DoesNotExist:
         return JsonResponse({
@@ -9588,10 +8963,6 @@ def api_crear_cambio(request, evento_id):
                 raise ValueError('No se pudieron crear los cambios de colaboradores')
             
             if archivos_recibidos and archivos_keys_list:
-                evidencias_dir = os.path.join(str(settings.MEDIA_ROOT), 'evidencias_cambios_eventos')
-                os.makedirs(evidencias_dir, exist_ok=True)
-                
-                fs = FileSystemStorage(location=evidencias_dir)
                 print(f'📎 Archivos recibidos en request.FILES: {list(request.FILES.keys())}')
                 print(f'📎 Total de cambios creados: {len(cambios_creados)}')
                 
@@ -9604,13 +8975,7 @@ def api_crear_cambio(request, evento_id):
                         archivo = request.FILES[key]
                         print(f'📎 Procesando archivo {key}: {archivo.name} ({archivo.size} bytes, tipo: {archivo.content_type})')
                         
-                        # COMPRIMIR IMAGEN automáticamente si es una imagen
                         es_imagen = archivo.content_type.startswith('image/') if hasattr(archivo, 'content_type') else False
-                        if es_imagen and getattr(settings, 'COMPRESS_IMAGES', True):
-                            from .image_compression import compress_if_needed, get_compression_settings
-                            compression_settings = get_compression_settings('evidence')
-                            archivo = compress_if_needed(archivo, **compression_settings)
-                            print(f'✅ Imagen comprimida: {archivo.size} bytes')
                         
                         # Obtener descripción de la evidencia
                         # Primero intentar con el índice
@@ -9625,13 +8990,10 @@ def api_crear_cambio(request, evento_id):
                         
                         print(f'📎 Descripción de evidencia obtenida: "{descripcion_evidencia}"')
                         
-                        # Guardar el archivo físico UNA VEZ (usando el ID del primer cambio para el nombre)
-                        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S%f')
+                        # Guardar el archivo físico UNA VEZ (almacén por contenido)
                         file_extension = os.path.splitext(archivo.name)[1]
-                        # Usar el ID del primer cambio para el nombre base del archivo
-                        filename = f"{timestamp}_{cambios_creados[0].id}_{index}{file_extension}"
-                        saved_name = fs.save(filename, archivo)
-                        file_url = f"/media/evidencias_cambios_eventos/{saved_name}"
+                        saved_name = almacen_archivos.guardar(archivo, file_extension)
+                        file_url = f"/media/{saved_name}"
                         print(f'📎 Archivo guardado: {saved_name} -> {file_url}')
                         
                         # Crear SOLO UNA evidencia asociada al primer cambio del grupo
@@ -9672,6 +9034,12 @@ def api_crear_cambio(request, evento_id):
                                 if not evidencia.id:
                                     raise ValueError('La evidencia se creó pero no tiene ID')
                                 
+                                # COMPRIMIR IMAGEN en segundo plano (procesar_imagenes)
+                                if es_imagen:
+                                    imagenes_diferidas.programar_procesamiento(
+                                        EventosEvidenciasCambios, evidencia.id, file_url, archivo, 'evidence'
+                                    )
+                                
                                 primera_evidencia_id = evidencia.id
                                 evidencias_creadas_count = 1
                                 print(f'✅ Evidencia única creada exitosamente para el grupo: {evidencia.id} - {evidencia.archivo_nombre}')
@@ -10108,10 +9476,6 @@ def api_actualizar_cambio(request, evento_id, cambio_id):
                         
                         if archivos_keys_list:
                             print(f'📎 Procesando {len(archivos_keys_list)} nueva(s) evidencia(s) al actualizar cambio')
-                            evidencias_dir = os.path.join(str(settings.MEDIA_ROOT), 'evidencias_cambios_eventos')
-                            os.makedirs(evidencias_dir, exist_ok=True)
-                            fs = FileSystemStorage(location=evidencias_dir)
-                            
                             # Obtener todos los cambios del grupo actualizados para asociar evidencias
                             cambios_para_evidencias = EventoCambioColaborador.objects.filter(
                                 actividad=evento,
@@ -10139,11 +9503,9 @@ def api_actualizar_cambio(request, evento_id, cambio_id):
                                         continue
                                     
                                     # Guardar el archivo físico (solo una vez)
-                                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S%f')
                                     file_extension = os.path.splitext(archivo.name)[1]
-                                    filename = f"{timestamp}_{primer_cambio.id}_{index}{file_extension}"
-                                    saved_name = fs.save(filename, archivo)
-                                    file_url = f"/media/evidencias_cambios_eventos/{saved_name}"
+                                    saved_name = almacen_archivos.guardar(archivo, file_extension)
+                                    file_url = f"/media/{saved_name}"
                                     
                                     # Crear SOLO UNA evidencia asociada al primer cambio del grupo
                                     # Esto evita duplicados cuando hay múltiples colaboradores/comunidades
@@ -10180,10 +9542,6 @@ def api_actualizar_cambio(request, evento_id, cambio_id):
                     
                     if archivos_keys_list:
                         print(f'📎 Procesando {len(archivos_keys_list)} nueva(s) evidencia(s) al actualizar cambio (sin recrear)')
-                        evidencias_dir = os.path.join(str(settings.MEDIA_ROOT), 'evidencias_cambios_eventos')
-                        os.makedirs(evidencias_dir, exist_ok=True)
-                        fs = FileSystemStorage(location=evidencias_dir)
-                        
                         # Obtener todos los cambios del grupo para asociar evidencias a cada colaborador
                         cambios_para_evidencias = EventoCambioColaborador.objects.filter(
                             actividad=evento,
@@ -10204,7 +9562,6 @@ def api_actualizar_cambio(request, evento_id, cambio_id):
                                     descripcion_evidencia = request.POST.get('descripcion_evidencia', '').strip()
                                 
                                 # Guardar el archivo físico (solo una vez)
-                                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S%f')
                                 file_extension = os.path.splitext(archivo.name)[1]
                                 # Obtener el primer cambio del grupo para asociar la evidencia
                                 primer_cambio = cambios_para_evidencias.order_by('creado_en').first()
@@ -10213,10 +9570,8 @@ def api_actualizar_cambio(request, evento_id, cambio_id):
                                     print(f'⚠️ No se encontró un cambio principal para el grupo {grupo_uuid} para asociar la evidencia.')
                                     continue
                                 
-                                cambio_id_archivo = primer_cambio.id
-                                filename = f"{timestamp}_{cambio_id_archivo}_{index}{file_extension}"
-                                saved_name = fs.save(filename, archivo)
-                                file_url = f"/media/evidencias_cambios_eventos/{saved_name}"
+                                saved_name = almacen_archivos.guardar(archivo, file_extension)
+                                file_url = f"/media/{saved_name}"
                                 
                                 # Crear SOLO UNA evidencia asociada al primer cambio del grupo
                                 # Esto evita duplicados cuando hay múltiples colaboradores/comunidades
@@ -10466,17 +9821,10 @@ def api_agregar_evidencia_cambio(request, evento_id, cambio_id):
         
         descripcion = request.POST.get('descripcion', '').strip()
         
-        # Crear carpeta si no existe
-        evidencias_dir = os.path.join(settings.MEDIA_ROOT, 'evidencias_cambios_eventos')
-        os.makedirs(evidencias_dir, exist_ok=True)
-        
         # Guardar archivo
-        fs = FileSystemStorage(location=evidencias_dir)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S%f')
         file_extension = os.path.splitext(archivo.name)[1]
-        filename = f"{timestamp}_{cambio_id}{file_extension}"
-        saved_name = fs.save(filename, archivo)
-        file_url = f"/media/evidencias_cambios_eventos/{saved_name}"
+        saved_name = almacen_archivos.guardar(archivo, file_extension)
+        file_url = f"/media/{saved_name}"
         
         # Crear registro en la BD usando la nueva tabla eventos_evidencias_cambios
         evidencia = EventosEvidenciasCambios.objects.create(
@@ -11460,2542 +10808,39 @@ def api_eliminar_colaborador(request, colaborador_id):
             'error': 'Colaborador no encontrado'
         }, status=404)
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return JsonResponse({
-            'success': False,
-            'error': f'Error al eliminar colaborador: {str(e)}'
-        }, status=500)
-def api_dashboard_stats(request):
-    """API para obtener estadísticas del dashboard ejecutivo"""
-    try:
-        from datetime import datetime, timedelta
-        from django.utils import timezone as tz
-        
-        # Obtener fecha actual y mes actual
-        ahora = tz.now()
-        inicio_mes = ahora.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        # Filtro base para actividades no eliminadas
-        actividades_base = Actividad.objects.filter(eliminado_en__isnull=True)
-        
-        # Total de actividades
-        total_actividades = actividades_base.count()
-        
-        # Comunidades alcanzadas (distintas)
-        comunidades_alcanzadas = actividades_base.values('comunidad_id').distinct().count()
-        
-        # Total de comunidades del municipio (activas)
-        total_comunidades_municipio = Comunidad.objects.filter(activo=True).count()
-        
-        # Trabajadores activos (solo colaboradores activos)
-        trabajadores_activos = Colaborador.objects.filter(activo=True).count()
-        
-        # Beneficiarios alcanzados (distintos)
-        beneficiarios_alcanzados = ActividadBeneficiario.objects.values('beneficiario_id').distinct().count()
-        
-        # Actividades completadas este mes
-        actividades_completadas_mes = actividades_base.filter(
-            estado='completado',
-            fecha__gte=inicio_mes
-        ).count()
-        
-        # Actividades pendientes (planificadas o en progreso)
-        actividades_pendientes = actividades_base.filter(
-            estado__in=['planificado', 'en_progreso']
-        ).count()
-        
-        # Actividades por mes (últimos 12 meses)
-        actividades_por_mes = actividades_base.filter(
-            fecha__gte=ahora - timedelta(days=365)
-        ).annotate(
-            mes=TruncMonth('fecha')
-        ).values('mes').annotate(
-            total=Count('id')
-        ).order_by('mes')
-        
-        actividades_por_mes_list = []
-        for item in actividades_por_mes:
-            if item['mes']:
-                fecha = item['mes']
-                actividades_por_mes_list.append({
-                    'mes': fecha.strftime('%Y-%m'),
-                    'total': item['total']
-                })
-        
-        # Distribución por tipo
-        distribucion_por_tipo = {}
-        tipos_actividad = TipoActividad.objects.filter(activo=True)
-        for tipo in tipos_actividad:
-            count = actividades_base.filter(tipo_id=tipo.id).count()
-            if count > 0:
-                distribucion_por_tipo[tipo.nombre] = count
-        
-        # Actividades por región (Top 5)
-        actividades_por_region = actividades_base.select_related('comunidad__region').values(
-            'comunidad__region__nombre'
-        ).annotate(
-            total=Count('id')
-        ).order_by('-total')[:5]
-        
-        actividades_por_region_list = [
-            {
-                'region': item['comunidad__region__nombre'] or 'Sin región',
-                'total': item['total']
-            }
-            for item in actividades_por_region
-        ]
-        
-        # Estado de actividades
-        estado_actividades = {}
-        estados = ['planificado', 'en_progreso', 'completado', 'cancelado']
-        for estado in estados:
-            estado_actividades[estado] = actividades_base.filter(estado=estado).count()
-        
-        # Top 5 comunidades más activas
-        top_comunidades = actividades_base.select_related('comunidad__region').values(
-            'comunidad__nombre',
-            'comunidad__region__nombre'
-        ).annotate(
-            total_actividades=Count('id'),
-            ultima_actividad=Max('fecha')
-        ).order_by('-total_actividades')[:5]
-        
-        top_comunidades_list = [
-            {
-                'comunidad': item['comunidad__nombre'] or 'Sin comunidad',
-                'region': item['comunidad__region__nombre'] or 'Sin región',
-                'total_actividades': item['total_actividades'],
-                'ultima_actividad': item['ultima_actividad'].strftime('%Y-%m-%d') if item['ultima_actividad'] else '-'
-            }
-            for item in top_comunidades
-        ]
-        
-        # Top 5 responsables más productivos
-        top_responsables = actividades_base.select_related('responsable__puesto').filter(
-            responsable__isnull=False
-        ).values(
-            'responsable__username',
-            'responsable__puesto__nombre'
-        ).annotate(
-            completadas=Count('id', filter=Q(estado='completado')),
-            en_progreso=Count('id', filter=Q(estado='en_progreso'))
-        ).order_by('-completadas')[:5]
-        
-        top_responsables_list = [
-            {
-                'responsable': item['responsable__username'] or 'Sin responsable',
-                'puesto': item['responsable__puesto__nombre'] or '-',
-                'completadas': item['completadas'],
-                'en_progreso': item['en_progreso']
-            }
-            for item in top_responsables
-        ]
-        
-        # Actividades trabajadas recientemente (últimos 7 días con cambios/avances)
-        # Obtener actividades que han tenido cambios recientes (avances)
-        fecha_limite = ahora - timedelta(days=7)
-        
-        # Actividades con cambios de usuarios recientes
-        actividades_con_cambios_usuarios = ActividadCambio.objects.filter(
-            fecha_cambio__gte=fecha_limite
-        ).values_list('actividad_id', flat=True).distinct()
-        
-        # Actividades con cambios de colaboradores recientes
-        actividades_con_cambios_colaboradores = EventoCambioColaborador.objects.filter(
-            fecha_cambio__gte=fecha_limite
-        ).values_list('actividad_id', flat=True).distinct()
-        
-        # Combinar ambas listas
-        actividad_ids_recientes = set(list(actividades_con_cambios_usuarios) + list(actividades_con_cambios_colaboradores))
-        
-        # Obtener las actividades con sus datos más recientes
-        actividades_recientes = actividades_base.filter(
-            id__in=actividad_ids_recientes
-        ).select_related('comunidad').distinct()
-        
-        # Ordenar por la fecha del cambio más reciente
-        actividades_recientes_list = []
-        for act in actividades_recientes[:10]:
-            # Obtener la fecha del cambio más reciente
-            ultimo_cambio_usuario = ActividadCambio.objects.filter(
-                actividad_id=act.id
-            ).order_by('-fecha_cambio').first()
-            
-            ultimo_cambio_colaborador = EventoCambioColaborador.objects.filter(
-                actividad_id=act.id
-            ).order_by('-fecha_cambio').first()
-            
-            fecha_cambio_reciente = None
-            if ultimo_cambio_usuario and ultimo_cambio_colaborador:
-                fecha_cambio_reciente = max(ultimo_cambio_usuario.fecha_cambio, ultimo_cambio_colaborador.fecha_cambio)
-            elif ultimo_cambio_usuario:
-                fecha_cambio_reciente = ultimo_cambio_usuario.fecha_cambio
-            elif ultimo_cambio_colaborador:
-                fecha_cambio_reciente = ultimo_cambio_colaborador.fecha_cambio
-            
-            actividades_recientes_list.append({
-                'nombre': act.nombre,
-                'fecha': act.fecha.strftime('%Y-%m-%d') if act.fecha else '-',
-                'comunidad': act.comunidad.nombre if act.comunidad else 'Sin comunidad',
-                'estado': act.estado,
-                'fecha_ultimo_cambio': fecha_cambio_reciente.strftime('%Y-%m-%d %H:%M') if fecha_cambio_reciente else '-'
-            })
-        
-        # Ordenar por fecha de último cambio (más reciente primero)
-        actividades_recientes_list.sort(key=lambda x: x['fecha_ultimo_cambio'], reverse=True)
-        
-        # Limitar a 10
-        actividades_recientes_list = actividades_recientes_list[:10]
-        
-        return JsonResponse({
-            'total_actividades': total_actividades,
-            'comunidades_alcanzadas': comunidades_alcanzadas,
-            'total_comunidades_municipio': total_comunidades_municipio,
-            'trabajadores_activos': trabajadores_activos,
-            'beneficiarios_alcanzados': beneficiarios_alcanzados,
-            'actividades_completadas_mes': actividades_completadas_mes,
-            'actividades_pendientes': actividades_pendientes,
-            'actividades_por_mes': actividades_por_mes_list,
-            'distribucion_por_tipo': distribucion_por_tipo,
-            'actividades_por_region': actividades_por_region_list,
-            'estado_actividades': estado_actividades,
-            'top_comunidades': top_comunidades_list,
-            'top_responsables': top_responsables_list,
-            'actividades_trabajadas_recientemente': actividades_recientes_list
-        })
-        
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return JsonResponse({
-            'error': f'Error al obtener estadísticas: {str(e)}'
-        }, status=500)
-@solo_administrador
-def api_generar_reporte(request, report_type):
-    """API para generar reporte según tipo"""
-    try:
-        from datetime import datetime
-        
-        # Obtener filtros de la request
-        fecha_inicio = request.GET.get('fecha_inicio')
-        fecha_fin = request.GET.get('fecha_fin')
-        region_ids = request.GET.get('region', '').split(',') if request.GET.get('region') else []
-        comunidad_ids = request.GET.get('comunidad', '').split(',') if request.GET.get('comunidad') else []
-        estados = request.GET.get('estado', '').split(',') if request.GET.get('estado') else []
-        # Obtener parámetro de tipo de actividad - Si no se envía, debe ser None o cadena vacía
-        tipo_actividad_param = request.GET.get('tipo_actividad', None)
-        # Si el parámetro no existe o está vacío, tipo_actividad debe ser lista vacía
-        if tipo_actividad_param is None or tipo_actividad_param == '' or tipo_actividad_param.strip() == '':
-            tipo_actividad = []
-        else:
-            # Procesar el parámetro y filtrar valores vacíos
-            tipo_actividad = [t.strip() for t in tipo_actividad_param.split(',') if t and t.strip() and t.strip() != '']
-        responsable_id = request.GET.get('responsable')
-        tipo_beneficiario_param = request.GET.get('tipo_beneficiario', '')
-        tipo_beneficiario = [t.strip() for t in tipo_beneficiario_param.split(',') if t.strip()] if tipo_beneficiario_param else []
-        
-        # Nuevos filtros para reportes unificados
-        agrupar_por = request.GET.get('agrupar_por', 'region')  # 'region' o 'comunidad'
-        comunidades_filtro_param = request.GET.get('comunidades', '')
-        comunidades_filtro = [c.strip() for c in comunidades_filtro_param.split(',') if c.strip()] if comunidades_filtro_param else []
-        evento_filtro_param = request.GET.get('evento', '')
-        evento_filtro = [e.strip() for e in evento_filtro_param.split(',') if e.strip()] if evento_filtro_param else []
-        
-        # Limpiar listas vacías
-        region_ids = [r.strip() for r in region_ids if r.strip()]
-        comunidad_ids = [c.strip() for c in comunidad_ids if c.strip()]
-        estados = [e.strip() for e in estados if e.strip()]
-        
-        # Construir query base - TODAS las actividades no eliminadas
-        actividades_query = Actividad.objects.filter(eliminado_en__isnull=True)
-        
-        # Aplicar filtros básicos de fecha
-        # Si no se proporcionan fechas (período "todo_el_tiempo"), NO aplicar filtros de fecha
-        # Esto permitirá mostrar todas las actividades, incluyendo futuras
-        if fecha_inicio and fecha_inicio.strip():
-            actividades_query = actividades_query.filter(fecha__gte=fecha_inicio)
-        if fecha_fin and fecha_fin.strip():
-            actividades_query = actividades_query.filter(fecha__lte=fecha_fin)
-        
-        # NOTA: Los filtros de region_ids y comunidad_ids se aplican SOLO para reportes genéricos
-        # Para el reporte 'actividades-por-region-comunidad', estos filtros NO se aplican aquí
-        # porque se manejan más adelante considerando relaciones M2M
-        if report_type != 'actividades-por-region-comunidad':
-            if region_ids:
-                actividades_query = actividades_query.filter(comunidad__region_id__in=region_ids)
-            if comunidad_ids:
-                actividades_query = actividades_query.filter(comunidad_id__in=comunidad_ids)
-        
-        if comunidades_filtro:
-            # Este filtro se aplica más adelante en la lógica específica del reporte
-            pass
-        
-        if estados:
-            actividades_query = actividades_query.filter(estado__in=estados)
-        
-        # IMPORTANTE: Solo filtrar por tipo de actividad si hay tipos seleccionados válidos
-        # Si no hay filtro o está vacío, mostrar TODOS los tipos (Capacitación, Entrega, Proyecto de Ayuda)
-        # VERIFICACIÓN EXPLÍCITA: Asegurarse de que tipo_actividad tenga valores válidos antes de filtrar
-        if tipo_actividad and isinstance(tipo_actividad, list) and len(tipo_actividad) > 0:
-            # Verificar que todos los valores sean strings no vacíos
-            tipos_validos = [t for t in tipo_actividad if isinstance(t, str) and t.strip() != '']
-            if tipos_validos and len(tipos_validos) > 0:
-                # Filtrar por los tipos seleccionados
-                tipos = TipoActividad.objects.filter(nombre__in=tipos_validos, activo=True)
-                if tipos.exists():
-                    tipo_ids = [t.id for t in tipos]
-                    actividades_query = actividades_query.filter(tipo_id__in=tipo_ids)
-        # Si tipo_actividad está vacío o no tiene valores válidos, NO aplicar filtro (mostrar TODOS los tipos)
-        
-        if responsable_id:
-            actividades_query = actividades_query.filter(responsable_id=responsable_id)
-        if evento_filtro and len(evento_filtro) > 0:
-            actividades_query = actividades_query.filter(id__in=evento_filtro)
-        
-        # Generar reporte según tipo
-        data = []
-        
-        # NUEVO: Actividades por Región o Comunidad (unificado)
-        if report_type == 'actividades-por-region-comunidad':
-            # IMPORTANTE: Para este reporte, NO aplicar filtros de region_ids/comunidad_ids aquí
-            # porque se manejan más adelante considerando relaciones M2M
-            # Asegurarse de que actividades_query tenga TODAS las actividades (excepto eliminadas)
-            # que cumplan los filtros de fecha, estado, tipo (si hay selección), etc.
-            
-            if agrupar_por == 'comunidad':
-                # Agrupar por comunidad
-                # Obtener TODAS las actividades que cumplan los filtros (fecha, estado, tipo, etc.)
-                # Sin filtro de eliminadas (ya está en actividades_query)
-                
-                # Obtener todas las actividades que cumplen los filtros
-                actividades_filtradas = actividades_query
-                
-                # Si hay filtro de comunidades, filtrar actividades que tengan esa comunidad (directa o M2M)
-                if comunidades_filtro and comunidades_filtro[0]:
-                    # Actividades con comunidad directa en el filtro
-                    actividad_ids_directas = set(actividades_filtradas.filter(
-                        comunidad_id__in=comunidades_filtro
-                    ).values_list('id', flat=True))
-                    
-                    # Actividades con comunidades M2M en el filtro
-                    actividad_ids_m2m = set(ActividadComunidad.objects.filter(
-                        comunidad_id__in=comunidades_filtro,
-                        actividad_id__in=actividades_filtradas.values_list('id', flat=True)
-                    ).values_list('actividad_id', flat=True).distinct())
-                    
-                    # Combinar IDs (una actividad puede estar en ambas)
-                    actividad_ids_combinadas = actividad_ids_directas | actividad_ids_m2m
-                    actividades_filtradas = actividades_filtradas.filter(id__in=actividad_ids_combinadas)
-                
-                # Obtener IDs de todas las actividades filtradas
-                actividad_ids_filtradas = list(actividades_filtradas.values_list('id', flat=True))
-                
-                # Obtener todas las comunidades únicas que tienen actividades
-                # 1. Comunidades de actividades con comunidad directa
-                comunidades_directas = actividades_filtradas.filter(
-                    comunidad_id__isnull=False
-                ).values(
-                    'comunidad__id',
-                    'comunidad__nombre',
-                    'comunidad__region__nombre'
-                ).distinct()
-                
-                # 2. Comunidades de actividades M2M
-                comunidades_m2m = ActividadComunidad.objects.filter(
-                    actividad_id__in=actividad_ids_filtradas
-                ).select_related('comunidad', 'comunidad__region').values(
-                    'comunidad__id',
-                    'comunidad__nombre',
-                    'comunidad__region__nombre'
-                ).distinct()
-                
-                # Combinar y obtener comunidades únicas
-                comunidades_dict = {}
-                for com in comunidades_directas:
-                    com_id = com['comunidad__id']
-                    if com_id:
-                        comunidades_dict[com_id] = {
-                            'id': com_id,
-                            'nombre': com['comunidad__nombre'],
-                            'region': com['comunidad__region__nombre'] or 'Sin región'
-                        }
-                
-                for com in comunidades_m2m:
-                    com_id = com['comunidad__id']
-                    if com_id:
-                        comunidades_dict[com_id] = {
-                            'id': com_id,
-                            'nombre': com['comunidad__nombre'],
-                            'region': com['comunidad__region__nombre'] or 'Sin región'
-                        }
-                
-                # OPTIMIZACIÓN: Precalcular todos los datos necesarios antes del loop
-                # Precalcular conteos de beneficiarios por actividad
-                beneficiarios_counts = dict(
-                    ActividadBeneficiario.objects.filter(
-                        actividad_id__in=actividad_ids_filtradas
-                    ).values('actividad_id').annotate(
-                        total=Count('beneficiario_id', distinct=True)
-                    ).values_list('actividad_id', 'total')
-                )
-                
-                # Precargar todas las comunidades M2M de una vez
-                comunidades_m2m_map = {}
-                for ac in ActividadComunidad.objects.filter(
-                    actividad_id__in=actividad_ids_filtradas
-                ).select_related('comunidad').values('actividad_id', 'comunidad__nombre'):
-                    act_id = ac['actividad_id']
-                    if act_id not in comunidades_m2m_map:
-                        comunidades_m2m_map[act_id] = []
-                    comunidades_m2m_map[act_id].append(ac['comunidad__nombre'])
-                
-                # PRIMERO: Recolectar TODAS las actividades únicas con todas sus comunidades
-                # Esto evita que una actividad aparezca múltiples veces en los detalles
-                todas_actividades_unicas = {}
-                todas_actividades_ids = set(actividad_ids_filtradas)
-                
-                for act in actividades_filtradas.filter(id__in=todas_actividades_ids).select_related(
-                    'comunidad', 'comunidad__region', 'responsable', 'colaborador', 'tipo'
-                ).distinct():
-                    if act.id in todas_actividades_unicas:
-                        continue
-                    
-                    # Obtener todas las comunidades de esta actividad (directa + M2M) - usando datos precargados
-                    comunidades_actividad = []
-                    if act.comunidad:
-                        comunidades_actividad.append(act.comunidad.nombre)
-                    # Usar datos precargados en lugar de consultar
-                    if act.id in comunidades_m2m_map:
-                        comunidades_actividad.extend(comunidades_m2m_map[act.id])
-                    comunidades_actividad = sorted(list(set(comunidades_actividad)))  # Eliminar duplicados y ordenar
-                    
-                    # Usar conteo precalculado en lugar de consultar
-                    ben_count = beneficiarios_counts.get(act.id, 0)
-                    
-                    todas_actividades_unicas[act.id] = {
-                        'nombre': act.nombre,
-                        'fecha': act.fecha.strftime('%Y-%m-%d') if act.fecha else '-',
-                        'estado': act.estado,
-                        'tipo_actividad': act.tipo.nombre if act.tipo else '-',
-                        'comunidad': ', '.join(comunidades_actividad) if comunidades_actividad else '-',
-                        'responsable': act.responsable.username if act.responsable else '-',
-                        'colaborador': act.colaborador.nombre if act.colaborador else '-',
-                        'total_beneficiarios': ben_count
-                    }
-                
-                # Convertir a lista ordenada por fecha (más reciente primero)
-                todas_actividades_lista = list(todas_actividades_unicas.values())
-                todas_actividades_lista.sort(key=lambda x: x['fecha'], reverse=True)
-                
-                # SEGUNDO: Procesar cada comunidad para los totales/resumen
-                for comunidad_info in comunidades_dict.values():
-                    comunidad_id = comunidad_info['id']
-                    
-                    # Obtener actividades para esta comunidad (directa O M2M) - solo para cálculos
-                    actividades_directas_com = actividades_filtradas.filter(comunidad_id=comunidad_id)
-                    actividades_m2m_ids_com = ActividadComunidad.objects.filter(
-                        actividad_id__in=actividad_ids_filtradas,
-                        comunidad_id=comunidad_id
-                    ).values_list('actividad_id', flat=True).distinct()
-                    
-                    # Combinar actividades (una actividad puede estar en ambas)
-                    actividades_comunidad_ids = set(
-                        list(actividades_directas_com.values_list('id', flat=True)) +
-                        list(actividades_m2m_ids_com)
-                    )
-                    
-                    # OPTIMIZACIÓN: Calcular todos los conteos de beneficiarios de una vez usando annotate
-                    beneficiarios_stats = ActividadBeneficiario.objects.filter(
-                        actividad_id__in=actividades_comunidad_ids
-                    ).values('beneficiario_id', 'beneficiario__tipo__nombre', 'beneficiario__comunidad_id').distinct()
-                    
-                    total_benef = beneficiarios_stats.count()
-                    benef_ind = beneficiarios_stats.filter(beneficiario__tipo__nombre='individual').count()
-                    benef_fam = beneficiarios_stats.filter(beneficiario__tipo__nombre='familia').count()
-                    benef_inst = beneficiarios_stats.filter(beneficiario__tipo__nombre='institución').count()
-                    
-                    # CALCULAR BENEFICIARIOS EXCLUSIVOS: Solo beneficiarios individuales cuya comunidad_id coincide con esta comunidad
-                    beneficiarios_exclusivos = beneficiarios_stats.filter(
-                        beneficiario__tipo__nombre='individual',
-                        beneficiario__comunidad_id=comunidad_id
-                    ).count()
-                    
-                    # Obtener responsables y colaboradores únicos de esta comunidad
-                    actividades_comunidad = actividades_filtradas.filter(id__in=actividades_comunidad_ids)
-                    responsables = actividades_comunidad.filter(responsable__isnull=False).values_list(
-                        'responsable__username', flat=True
-                    ).distinct()
-                    
-                    colaboradores = actividades_comunidad.filter(colaborador__isnull=False).values_list(
-                        'colaborador__nombre', flat=True
-                    ).distinct()
-                    
-                    # Agregar datos de la comunidad (sin actividades en detalle, se agregarán al final)
-                    data.append({
-                        'nombre': comunidad_info['nombre'],
-                        'region': comunidad_info['region'],
-                        'total_actividades': len(actividades_comunidad_ids),
-                        'total_beneficiarios': total_benef,
-                        'beneficiarios_individuales': benef_ind,
-                        'beneficiarios_familias': benef_fam,
-                        'beneficiarios_instituciones': benef_inst,
-                        'beneficiarios_exclusivos': beneficiarios_exclusivos,
-                        'responsables': ', '.join(responsables) if responsables else '-',
-                        'colaboradores': ', '.join(colaboradores) if colaboradores else '-',
-                        'actividades': []  # Las actividades se mostrarán una sola vez al final
-                    })
-                
-                # Agregar TODAS las actividades únicas UNA SOLA VEZ
-                # Crear una entrada consolidada con todas las actividades únicas
-                # Esta entrada se mostrará después de todas las comunidades
-                if todas_actividades_lista:
-                    # Calcular totales consolidados de todas las actividades
-                    todas_actividades_ids_unicos = set(actividad_ids_filtradas)
-                    todos_beneficiarios_query = ActividadBeneficiario.objects.filter(
-                        actividad_id__in=todas_actividades_ids_unicos
-                    ).select_related('beneficiario__tipo', 'beneficiario__comunidad')
-                    
-                    total_benef_todos = todos_beneficiarios_query.values('beneficiario_id').distinct().count()
-                    benef_ind_todos = todos_beneficiarios_query.filter(beneficiario__tipo__nombre='individual').values('beneficiario_id').distinct().count()
-                    benef_fam_todos = todos_beneficiarios_query.filter(beneficiario__tipo__nombre='familia').values('beneficiario_id').distinct().count()
-                    benef_inst_todos = todos_beneficiarios_query.filter(beneficiario__tipo__nombre='institución').values('beneficiario_id').distinct().count()
-                    
-                    # Beneficiarios exclusivos para "Todas las Actividades" = suma de todos los exclusivos únicos de cada comunidad
-                    # Obtener todas las comunidades únicas que tienen actividades
-                    todas_comunidades_ids = set()
-                    if comunidades_dict:
-                        for com_info in comunidades_dict.values():
-                            todas_comunidades_ids.add(com_info['id'])
-                    
-                    # Calcular beneficiarios exclusivos: solo beneficiarios individuales que tienen comunidad_id
-                    # en alguna de las comunidades que tienen actividades
-                    if todas_comunidades_ids:
-                        beneficiarios_exclusivos_todos = todos_beneficiarios_query.filter(
-                            beneficiario__tipo__nombre='individual',
-                            beneficiario__comunidad_id__in=todas_comunidades_ids
-                        ).values('beneficiario_id').distinct().count()
-                    else:
-                        beneficiarios_exclusivos_todos = 0
-                    
-                    todas_actividades_objs = actividades_filtradas.filter(id__in=todas_actividades_ids_unicos)
-                    # ARREGLAR: Eliminar duplicados de responsables usando set y luego convertir a lista ordenada
-                    todos_responsables_set = set(todas_actividades_objs.filter(
-                        responsable__isnull=False
-                    ).values_list('responsable__username', flat=True).distinct())
-                    todos_responsables_list = sorted(list(todos_responsables_set))
-                    
-                    todos_colaboradores_set = set(todas_actividades_objs.filter(
-                        colaborador__isnull=False
-                    ).values_list('colaborador__nombre', flat=True).distinct())
-                    todos_colaboradores_list = sorted(list(todos_colaboradores_set))
-                    
-                    # Agregar entrada consolidada con TODAS las actividades únicas
-                    data.append({
-                        'nombre': 'Todas las Actividades',
-                        'region': 'Todas las Regiones',
-                        'total_actividades': len(todas_actividades_lista),
-                        'total_beneficiarios': total_benef_todos,
-                        'beneficiarios_individuales': benef_ind_todos,
-                        'beneficiarios_familias': benef_fam_todos,
-                        'beneficiarios_instituciones': benef_inst_todos,
-                        'beneficiarios_exclusivos': beneficiarios_exclusivos_todos,
-                        'responsables': ', '.join(todos_responsables_list) if todos_responsables_list else '-',
-                        'colaboradores': ', '.join(todos_colaboradores_list) if todos_colaboradores_list else '-',
-                        'actividades': todas_actividades_lista  # Todas las actividades únicas, sin duplicados
-                    })
-                
-                # Procesar actividades sin comunidad (solo si NO hay filtro de comunidades)
-                if not (comunidades_filtro and comunidades_filtro[0]):
-                    # Actividades sin comunidad directa Y sin comunidades M2M
-                    actividades_con_comunidad_ids = set(
-                        list(actividades_filtradas.filter(comunidad_id__isnull=False).values_list('id', flat=True)) +
-                        list(ActividadComunidad.objects.filter(
-                            actividad_id__in=actividad_ids_filtradas
-                        ).values_list('actividad_id', flat=True).distinct())
-                    )
-                    actividades_sin_comunidad_ids = set(actividad_ids_filtradas) - actividades_con_comunidad_ids
-                    
-                    if actividades_sin_comunidad_ids:
-                        actividades_sin_comunidad = actividades_filtradas.filter(id__in=actividades_sin_comunidad_ids)
-                        
-                        beneficiarios_sin_comunidad = ActividadBeneficiario.objects.filter(
-                            actividad_id__in=actividades_sin_comunidad.values_list('id', flat=True)
-                        ).select_related('beneficiario__tipo')
-                        
-                        total_benef_sc = beneficiarios_sin_comunidad.values('beneficiario_id').distinct().count()
-                        benef_ind_sc = beneficiarios_sin_comunidad.filter(beneficiario__tipo__nombre='individual').values('beneficiario_id').distinct().count()
-                        benef_fam_sc = beneficiarios_sin_comunidad.filter(beneficiario__tipo__nombre='familia').values('beneficiario_id').distinct().count()
-                        benef_inst_sc = beneficiarios_sin_comunidad.filter(beneficiario__tipo__nombre='institución').values('beneficiario_id').distinct().count()
-                        
-                        responsables_sc = actividades_sin_comunidad.filter(responsable__isnull=False).values_list(
-                            'responsable__username', flat=True
-                        ).distinct()
-                        
-                        colaboradores_sc = actividades_sin_comunidad.filter(colaborador__isnull=False).values_list(
-                            'colaborador__nombre', flat=True
-                        ).distinct()
-                        
-                        # Beneficiarios exclusivos para actividades sin comunidad = 0 (no tienen comunidad asignada)
-                        beneficiarios_exclusivos_sc = 0
-                        
-                        # Las actividades sin comunidad ya están incluidas en todas_actividades_lista
-                        # Solo agregar entrada de resumen para "Sin comunidad asignada" (sin actividades en detalle)
-                        # Las actividades detalladas ya están en la sección "Todas las Actividades"
-                        data.append({
-                            'nombre': 'Sin comunidad asignada',
-                            'region': 'Sin región',
-                            'total_actividades': len(actividades_sin_comunidad_ids),
-                            'total_beneficiarios': total_benef_sc,
-                            'beneficiarios_individuales': benef_ind_sc,
-                            'beneficiarios_familias': benef_fam_sc,
-                            'beneficiarios_instituciones': benef_inst_sc,
-                            'beneficiarios_exclusivos': beneficiarios_exclusivos_sc,
-                            'responsables': ', '.join(responsables_sc) if responsables_sc else '-',
-                            'colaboradores': ', '.join(colaboradores_sc) if colaboradores_sc else '-',
-                            'actividades': []  # Vacío porque ya están en "Todas las Actividades"
-                        })
-            else:
-                # Agrupar por región
-                # Obtener TODAS las actividades que cumplen los filtros
-                actividades_filtradas = actividades_query
-                
-                # Si hay filtro de comunidades, filtrar actividades que tengan esa comunidad (directa o M2M)
-                if comunidades_filtro and comunidades_filtro[0]:
-                    # Actividades con comunidad directa en el filtro
-                    actividad_ids_directas = set(actividades_filtradas.filter(
-                        comunidad_id__in=comunidades_filtro
-                    ).values_list('id', flat=True))
-                    
-                    # Actividades con comunidades M2M en el filtro
-                    actividad_ids_m2m = set(ActividadComunidad.objects.filter(
-                        comunidad_id__in=comunidades_filtro,
-                        actividad_id__in=actividades_filtradas.values_list('id', flat=True)
-                    ).values_list('actividad_id', flat=True).distinct())
-                    
-                    # Combinar IDs
-                    actividad_ids_combinadas = actividad_ids_directas | actividad_ids_m2m
-                    actividades_filtradas = actividades_filtradas.filter(id__in=actividad_ids_combinadas)
-                
-                # Obtener IDs de todas las actividades filtradas
-                actividad_ids_filtradas = list(actividades_filtradas.values_list('id', flat=True))
-                
-                # Obtener todas las regiones únicas que tienen actividades
-                # 1. Regiones de actividades con comunidad directa
-                regiones_directas = actividades_filtradas.filter(
-                    comunidad__region_id__isnull=False
-                ).values(
-                    'comunidad__region__id',
-                    'comunidad__region__nombre'
-                ).distinct()
-                
-                # 2. Regiones de actividades M2M (a través de actividad_comunidades)
-                regiones_m2m = ActividadComunidad.objects.filter(
-                    actividad_id__in=actividad_ids_filtradas,
-                    region_id__isnull=False
-                ).select_related('region').values(
-                    'region__id',
-                    'region__nombre'
-                ).distinct()
-                
-                # 3. Regiones de comunidades relacionadas en M2M (si no tienen region_id en actividad_comunidades)
-                comunidades_m2m = ActividadComunidad.objects.filter(
-                    actividad_id__in=actividad_ids_filtradas
-                ).select_related('comunidad', 'comunidad__region').filter(
-                    comunidad__region_id__isnull=False
-                ).values(
-                    'comunidad__region__id',
-                    'comunidad__region__nombre'
-                ).distinct()
-                
-                # Combinar y obtener regiones únicas
-                regiones_dict = {}
-                for reg in regiones_directas:
-                    reg_id = reg['comunidad__region__id']
-                    if reg_id:
-                        regiones_dict[reg_id] = {
-                            'id': reg_id,
-                            'nombre': reg['comunidad__region__nombre']
-                        }
-                
-                for reg in regiones_m2m:
-                    reg_id = reg['region__id']
-                    if reg_id:
-                        regiones_dict[reg_id] = {
-                            'id': reg_id,
-                            'nombre': reg['region__nombre']
-                        }
-                
-                for reg in comunidades_m2m:
-                    reg_id = reg['comunidad__region__id']
-                    if reg_id:
-                        regiones_dict[reg_id] = {
-                            'id': reg_id,
-                            'nombre': reg['comunidad__region__nombre']
-                        }
-                
-                # OPTIMIZACIÓN: Precalcular todos los datos necesarios antes del loop
-                # Precalcular conteos de beneficiarios por actividad
-                beneficiarios_counts_reg = dict(
-                    ActividadBeneficiario.objects.filter(
-                        actividad_id__in=actividad_ids_filtradas
-                    ).values('actividad_id').annotate(
-                        total=Count('beneficiario_id', distinct=True)
-                    ).values_list('actividad_id', 'total')
-                )
-                
-                # Precargar todas las comunidades M2M de una vez
-                comunidades_m2m_map_reg = {}
-                for ac in ActividadComunidad.objects.filter(
-                    actividad_id__in=actividad_ids_filtradas
-                ).select_related('comunidad').values('actividad_id', 'comunidad__nombre'):
-                    act_id = ac['actividad_id']
-                    if act_id not in comunidades_m2m_map_reg:
-                        comunidades_m2m_map_reg[act_id] = []
-                    comunidades_m2m_map_reg[act_id].append(ac['comunidad__nombre'])
-                
-                # PRIMERO: Recolectar TODAS las actividades únicas con todas sus comunidades
-                # Esto evita que una actividad aparezca múltiples veces en los detalles
-                todas_actividades_unicas_reg = {}
-                todas_actividades_ids_reg = set(actividad_ids_filtradas)
-                
-                for act in actividades_filtradas.filter(id__in=todas_actividades_ids_reg).select_related(
-                    'comunidad', 'comunidad__region', 'responsable', 'colaborador', 'tipo'
-                ).distinct():
-                    if act.id in todas_actividades_unicas_reg:
-                        continue
-                    
-                    # Obtener todas las comunidades de esta actividad (directa + M2M) - usando datos precargados
-                    comunidades_actividad = []
-                    if act.comunidad:
-                        comunidades_actividad.append(act.comunidad.nombre)
-                    # Usar datos precargados en lugar de consultar
-                    if act.id in comunidades_m2m_map_reg:
-                        comunidades_actividad.extend(comunidades_m2m_map_reg[act.id])
-                    comunidades_actividad = sorted(list(set(comunidades_actividad)))  # Eliminar duplicados y ordenar
-                    
-                    # Usar conteo precalculado en lugar de consultar
-                    ben_count = beneficiarios_counts_reg.get(act.id, 0)
-                    
-                    todas_actividades_unicas_reg[act.id] = {
-                        'nombre': act.nombre,
-                        'fecha': act.fecha.strftime('%Y-%m-%d') if act.fecha else '-',
-                        'estado': act.estado,
-                        'tipo_actividad': act.tipo.nombre if act.tipo else '-',
-                        'comunidad': ', '.join(comunidades_actividad) if comunidades_actividad else '-',
-                        'responsable': act.responsable.username if act.responsable else '-',
-                        'colaborador': act.colaborador.nombre if act.colaborador else '-',
-                        'total_beneficiarios': ben_count
-                    }
-                
-                # Convertir a lista ordenada por fecha (más reciente primero)
-                todas_actividades_lista_reg = list(todas_actividades_unicas_reg.values())
-                todas_actividades_lista_reg.sort(key=lambda x: x['fecha'], reverse=True)
-                
-                # SEGUNDO: Procesar cada región para los totales/resumen
-                for region_info in regiones_dict.values():
-                    region_id = region_info['id']
-                    
-                    # Obtener actividades para esta región (directa O M2M) - solo para cálculos
-                    actividades_directas_reg = actividades_filtradas.filter(comunidad__region_id=region_id)
-                    actividad_ids_directas_reg = set(actividades_directas_reg.values_list('id', flat=True))
-                    
-                    # Actividades M2M en esta región
-                    actividad_ids_m2m_reg = set(ActividadComunidad.objects.filter(
-                        actividad_id__in=actividad_ids_filtradas
-                    ).filter(
-                        Q(region_id=region_id) | Q(comunidad__region_id=region_id)
-                    ).values_list('actividad_id', flat=True).distinct())
-                    
-                    # Combinar actividades
-                    actividad_ids_region = actividad_ids_directas_reg | actividad_ids_m2m_reg
-                    actividades_region = actividades_filtradas.filter(id__in=actividad_ids_region)
-                    
-                    # OPTIMIZACIÓN: Calcular todos los conteos de beneficiarios de una vez
-                    beneficiarios_stats_reg = ActividadBeneficiario.objects.filter(
-                        actividad_id__in=actividad_ids_region
-                    ).values('beneficiario_id', 'beneficiario__tipo__nombre', 'beneficiario__comunidad__region_id').distinct()
-                    
-                    total_benef = beneficiarios_stats_reg.count()
-                    benef_ind = beneficiarios_stats_reg.filter(beneficiario__tipo__nombre='individual').count()
-                    benef_fam = beneficiarios_stats_reg.filter(beneficiario__tipo__nombre='familia').count()
-                    benef_inst = beneficiarios_stats_reg.filter(beneficiario__tipo__nombre='institución').count()
-                    
-                    # CALCULAR BENEFICIARIOS EXCLUSIVOS: Solo beneficiarios individuales cuya comunidad.region_id coincide con esta región
-                    beneficiarios_exclusivos = beneficiarios_stats_reg.filter(
-                        beneficiario__tipo__nombre='individual',
-                        beneficiario__comunidad__region_id=region_id
-                    ).count()
-                    
-                    # Obtener responsables y colaboradores únicos de esta región
-                    responsables = actividades_region.filter(responsable__isnull=False).values_list(
-                        'responsable__username', flat=True
-                    ).distinct()
-                    
-                    colaboradores = actividades_region.filter(colaborador__isnull=False).values_list(
-                        'colaborador__nombre', flat=True
-                    ).distinct()
-                    
-                    # Agregar datos de la región (sin actividades en detalle, se agregarán al final)
-                    data.append({
-                        'nombre': region_info['nombre'],
-                        'region': region_info['nombre'],
-                        'total_actividades': len(actividad_ids_region),
-                        'total_beneficiarios': total_benef,
-                        'beneficiarios_individuales': benef_ind,
-                        'beneficiarios_familias': benef_fam,
-                        'beneficiarios_instituciones': benef_inst,
-                        'beneficiarios_exclusivos': beneficiarios_exclusivos,
-                        'responsables': ', '.join(responsables) if responsables else '-',
-                        'colaboradores': ', '.join(colaboradores) if colaboradores else '-',
-                        'actividades': []  # Las actividades se mostrarán una sola vez al final
-                    })
-                
-                # Agregar TODAS las actividades únicas UNA SOLA VEZ
-                if todas_actividades_lista_reg:
-                    # Calcular totales consolidados de todas las actividades
-                    todas_actividades_ids_unicos_reg = set(actividad_ids_filtradas)
-                    todos_beneficiarios_query_reg = ActividadBeneficiario.objects.filter(
-                        actividad_id__in=todas_actividades_ids_unicos_reg
-                    ).select_related('beneficiario__tipo', 'beneficiario__comunidad', 'beneficiario__comunidad__region')
-                    
-                    total_benef_todos_reg = todos_beneficiarios_query_reg.values('beneficiario_id').distinct().count()
-                    benef_ind_todos_reg = todos_beneficiarios_query_reg.filter(beneficiario__tipo__nombre='individual').values('beneficiario_id').distinct().count()
-                    benef_fam_todos_reg = todos_beneficiarios_query_reg.filter(beneficiario__tipo__nombre='familia').values('beneficiario_id').distinct().count()
-                    benef_inst_todos_reg = todos_beneficiarios_query_reg.filter(beneficiario__tipo__nombre='institución').values('beneficiario_id').distinct().count()
-                    
-                    # Beneficiarios exclusivos para "Todas las Actividades" = beneficiarios individuales que tienen
-                    # comunidad en alguna de las regiones que tienen actividades
-                    todas_regiones_ids = set()
-                    if regiones_dict:
-                        for reg_info in regiones_dict.values():
-                            todas_regiones_ids.add(reg_info['id'])
-                    
-                    if todas_regiones_ids:
-                        beneficiarios_exclusivos_todos_reg = todos_beneficiarios_query_reg.filter(
-                            beneficiario__tipo__nombre='individual',
-                            beneficiario__comunidad__region_id__in=todas_regiones_ids
-                        ).values('beneficiario_id').distinct().count()
-                    else:
-                        beneficiarios_exclusivos_todos_reg = 0
-                    
-                    todas_actividades_objs_reg = actividades_filtradas.filter(id__in=todas_actividades_ids_unicos_reg)
-                    # ARREGLAR: Eliminar duplicados de responsables usando set y ordenar
-                    todos_responsables_reg_set = set(todas_actividades_objs_reg.filter(
-                        responsable__isnull=False
-                    ).values_list('responsable__username', flat=True).distinct())
-                    todos_responsables_reg_list = sorted(list(todos_responsables_reg_set))
-                    
-                    todos_colaboradores_reg_set = set(todas_actividades_objs_reg.filter(
-                        colaborador__isnull=False
-                    ).values_list('colaborador__nombre', flat=True).distinct())
-                    todos_colaboradores_reg_list = sorted(list(todos_colaboradores_reg_set))
-                    
-                    # Agregar entrada consolidada con TODAS las actividades únicas
-                    data.append({
-                        'nombre': 'Todas las Actividades',
-                        'region': 'Todas las Regiones',
-                        'total_actividades': len(todas_actividades_lista_reg),
-                        'total_beneficiarios': total_benef_todos_reg,
-                        'beneficiarios_individuales': benef_ind_todos_reg,
-                        'beneficiarios_familias': benef_fam_todos_reg,
-                        'beneficiarios_instituciones': benef_inst_todos_reg,
-                        'beneficiarios_exclusivos': beneficiarios_exclusivos_todos_reg,
-                        'responsables': ', '.join(todos_responsables_reg_list) if todos_responsables_reg_list else '-',
-                        'colaboradores': ', '.join(todos_colaboradores_reg_list) if todos_colaboradores_reg_list else '-',
-                        'actividades': todas_actividades_lista_reg  # Todas las actividades únicas, sin duplicados
-                    })
-                
-                # Procesar actividades sin región (solo si NO hay filtro de comunidades)
-                if not (comunidades_filtro and comunidades_filtro[0]):
-                    # Actividades sin región directa Y sin regiones M2M
-                    actividades_con_region_ids = set(
-                        list(actividades_filtradas.filter(comunidad__region_id__isnull=False).values_list('id', flat=True)) +
-                        list(ActividadComunidad.objects.filter(
-                            actividad_id__in=actividad_ids_filtradas
-                        ).filter(
-                            Q(region_id__isnull=False) | Q(comunidad__region_id__isnull=False)
-                        ).values_list('actividad_id', flat=True).distinct())
-                    )
-                    actividades_sin_region_ids = set(actividad_ids_filtradas) - actividades_con_region_ids
-                    
-                    if actividades_sin_region_ids:
-                        actividades_sin_region = actividades_filtradas.filter(id__in=actividades_sin_region_ids)
-                        
-                        beneficiarios_sin_region = ActividadBeneficiario.objects.filter(
-                            actividad_id__in=actividades_sin_region.values_list('id', flat=True)
-                        ).select_related('beneficiario__tipo')
-                        
-                        total_benef_sr = beneficiarios_sin_region.values('beneficiario_id').distinct().count()
-                        benef_ind_sr = beneficiarios_sin_region.filter(beneficiario__tipo__nombre='individual').values('beneficiario_id').distinct().count()
-                        benef_fam_sr = beneficiarios_sin_region.filter(beneficiario__tipo__nombre='familia').values('beneficiario_id').distinct().count()
-                        benef_inst_sr = beneficiarios_sin_region.filter(beneficiario__tipo__nombre='institución').values('beneficiario_id').distinct().count()
-                        
-                        responsables_sr = actividades_sin_region.filter(responsable__isnull=False).values_list(
-                            'responsable__username', flat=True
-                        ).distinct()
-                        
-                        colaboradores_sr = actividades_sin_region.filter(colaborador__isnull=False).values_list(
-                            'colaborador__nombre', flat=True
-                        ).distinct()
-                        
-                        # Beneficiarios exclusivos para actividades sin región = 0 (no tienen región asignada)
-                        beneficiarios_exclusivos_sr = 0
-                        
-                        # Las actividades sin región ya están incluidas en todas_actividades_lista_reg
-                        # Solo agregar entrada de resumen para "Sin región asignada" (sin actividades en detalle)
-                        # Las actividades detalladas ya están en la sección "Todas las Actividades"
-                        data.append({
-                            'nombre': 'Sin región asignada',
-                            'region': 'Sin región',
-                            'total_actividades': len(actividades_sin_region_ids),
-                            'total_beneficiarios': total_benef_sr,
-                            'beneficiarios_individuales': benef_ind_sr,
-                            'beneficiarios_familias': benef_fam_sr,
-                            'beneficiarios_instituciones': benef_inst_sr,
-                            'beneficiarios_exclusivos': beneficiarios_exclusivos_sr,
-                            'responsables': ', '.join(responsables_sr) if responsables_sr else '-',
-                            'colaboradores': ', '.join(colaboradores_sr) if colaboradores_sr else '-',
-                            'actividades': []  # Vacío porque ya están en "Todas las Actividades"
-                        })
-        
-        # NUEVO: Beneficiarios por Región o Comunidad (unificado)
-        elif report_type == 'beneficiarios-por-region-comunidad':
-            # IMPORTANTE: Para este reporte, NO filtrar por fechas (buscar globalmente)
-            # Construir query base de actividades SIN filtros de fecha
-            actividades_base = Actividad.objects.filter(eliminado_en__isnull=True)
-            
-            # NO aplicar filtro de estados para este reporte (mostrar todos los estados)
-            
-            # IMPORTANTE: Solo filtrar por tipo de actividad si hay tipos seleccionados válidos
-            if tipo_actividad and isinstance(tipo_actividad, list) and len(tipo_actividad) > 0:
-                tipos_validos = [t for t in tipo_actividad if isinstance(t, str) and t.strip() != '']
-                if tipos_validos and len(tipos_validos) > 0:
-                    tipos = TipoActividad.objects.filter(nombre__in=tipos_validos, activo=True)
-                    if tipos.exists():
-                        tipo_ids = [t.id for t in tipos]
-                        actividades_base = actividades_base.filter(tipo_id__in=tipo_ids)
-            
-            # Aplicar filtro de eventos si está presente
-            if evento_filtro and len(evento_filtro) > 0:
-                actividades_base = actividades_base.filter(id__in=evento_filtro)
-            
-            # Obtener todas las actividades que cumplen los filtros (sin fechas)
-            actividad_ids = list(actividades_base.values_list('id', flat=True))
-            
-            # Si hay filtro de comunidades, filtrar actividades que tengan esa comunidad (directa o M2M)
-            if comunidades_filtro and comunidades_filtro[0]:
-                # Actividades con comunidad directa en el filtro
-                actividad_ids_directas = set(actividades_base.filter(
-                    comunidad_id__in=comunidades_filtro
-                ).values_list('id', flat=True))
-                
-                # Actividades con comunidades M2M en el filtro
-                actividad_ids_m2m = set(ActividadComunidad.objects.filter(
-                    comunidad_id__in=comunidades_filtro,
-                    actividad_id__in=actividad_ids
-                ).values_list('actividad_id', flat=True).distinct())
-                
-                # Combinar IDs (una actividad puede estar en ambas)
-                actividad_ids = list(actividad_ids_directas | actividad_ids_m2m)
-            
-            # Obtener beneficiarios de las actividades filtradas
-            beneficiarios_query = ActividadBeneficiario.objects.filter(
-                actividad_id__in=actividad_ids
-            ).select_related('beneficiario', 'beneficiario__tipo', 'beneficiario__comunidad', 
-                            'beneficiario__comunidad__region', 'actividad')
-            
-            # Aplicar filtro de comunidad del beneficiario si está presente
-            if comunidades_filtro and comunidades_filtro[0]:
-                beneficiarios_query = beneficiarios_query.filter(
-                    beneficiario__comunidad_id__in=comunidades_filtro
-                )
-            
-            # Aplicar filtro de tipo de beneficiario si está presente
-            if tipo_beneficiario and len(tipo_beneficiario) > 0:
-                # Obtener todos los tipos de beneficiario disponibles en la BD con sus nombres e IDs
-                tipos_bd = TipoBeneficiario.objects.all()
-                tipos_bd_dict = {tipo.nombre.lower(): tipo.id for tipo in tipos_bd}
-                
-                # Mapear valores del frontend a IDs de tipos en la base de datos
-                # La base de datos tiene: 'individual', 'familia', 'institución' (con tilde)
-                # El frontend puede enviar: 'individual', 'familia', 'institución', 'otro'
-                tipo_ids_validos = []
-                for t in tipo_beneficiario:
-                    t_clean = t.strip()
-                    t_lower = t_clean.lower()
-                    
-                    # Buscar el tipo en la BD usando el nombre (case-insensitive)
-                    tipo_id = tipos_bd_dict.get(t_lower)
-                    
-                    # Si no se encontró, intentar mapeo manual
-                    if not tipo_id:
-                        # Mapear variantes comunes
-                        if t_lower == 'individual':
-                            tipo_id = tipos_bd_dict.get('individual')
-                        elif t_lower == 'familia':
-                            tipo_id = tipos_bd_dict.get('familia')
-                        elif t_lower in ['institucion', 'institución']:
-                            # Buscar 'institución' (con tilde) en la BD
-                            tipo_id = tipos_bd_dict.get('institución')
-                        # Ignorar "otro" ya que no existe en la BD
-                    
-                    # Agregar el ID si se encontró
-                    if tipo_id:
-                        tipo_ids_validos.append(tipo_id)
-                
-                # Eliminar duplicados
-                tipo_ids_validos = list(set(tipo_ids_validos))
-                
-                if tipo_ids_validos:
-                    # Filtrar beneficiarios por los IDs de tipos válidos
-                    beneficiarios_query = beneficiarios_query.filter(
-                        beneficiario__tipo_id__in=tipo_ids_validos
-                    )
-            
-            # Agrupar beneficiarios por comunidad
-            # Primero, obtener todos los beneficiarios únicos con sus datos
-            beneficiarios_dict = {}
-            
-            for ab in beneficiarios_query:
-                benef = ab.beneficiario
-                benef_id = str(benef.id)
-                comunidad_id = str(benef.comunidad.id) if benef.comunidad else 'sin_comunidad'
-                
-                if benef_id not in beneficiarios_dict:
-                    # Obtener datos del beneficiario según tipo
-                    # Usar hasattr directamente para detectar el tipo específico
-                    nombre = ''
-                    dpi = ''
-                    telefono = ''
-                    email = ''
-                    tipo_nombre = benef.tipo.nombre if benef.tipo else ''
-                    
-                    # Obtener datos según el tipo específico del beneficiario
-                    if hasattr(benef, 'individual'):
-                        ind = benef.individual
-                        nombre = f"{ind.nombre} {ind.apellido}".strip()
-                        dpi = ind.dpi or ''
-                        telefono = ind.telefono or ''
-                    elif hasattr(benef, 'familia'):
-                        fam = benef.familia
-                        nombre = fam.nombre_familia
-                        dpi = fam.dpi_jefe_familia or ''
-                        telefono = fam.telefono or ''
-                    elif hasattr(benef, 'institucion'):
-                        inst = benef.institucion
-                        nombre = inst.nombre_institucion
-                        dpi = inst.dpi_representante or ''
-                        telefono = inst.telefono or ''
-                        email = inst.email or ''
-                    else:
-                        # Si no tiene ningún tipo específico, usar valores por defecto
-                        nombre = 'Sin nombre'
-                        dpi = ''
-                        telefono = ''
-                        email = ''
-                    
-                    # Formatear tipo para mostrar (usar get_nombre_display si está disponible)
-                    tipo_display = '-'
-                    if benef.tipo:
-                        try:
-                            tipo_display = benef.tipo.get_nombre_display()
-                        except:
-                            # Si no tiene get_nombre_display, capitalizar manualmente
-                            if tipo_nombre == 'individual':
-                                tipo_display = 'Individual'
-                            elif tipo_nombre == 'familia':
-                                tipo_display = 'Familia'
-                            elif tipo_nombre == 'institución':
-                                tipo_display = 'Institución'
-                            else:
-                                tipo_display = tipo_nombre.capitalize() if tipo_nombre else '-'
-                    
-                    beneficiarios_dict[benef_id] = {
-                        'nombre': nombre or 'Sin nombre',
-                        'tipo': tipo_display,
-                        'comunidad_id': comunidad_id,
-                        'comunidad': benef.comunidad.nombre if benef.comunidad else 'Sin comunidad',
-                        'region': benef.comunidad.region.nombre if benef.comunidad and benef.comunidad.region else 'Sin región',
-                        'dpi': dpi,
-                        'documento': dpi,
-                        'telefono': telefono,
-                        'email': email,
-                        'eventos': []
-                    }
-                
-                # Agregar evento si existe
-                if ab.actividad:
-                    evento_nombre = ab.actividad.nombre
-                    if evento_nombre and evento_nombre not in beneficiarios_dict[benef_id]['eventos']:
-                        beneficiarios_dict[benef_id]['eventos'].append(evento_nombre)
-            
-            # Agrupar beneficiarios por comunidad
-            comunidades_dict = {}
-            for benef_data in beneficiarios_dict.values():
-                comunidad_key = benef_data['comunidad_id']
-                if comunidad_key not in comunidades_dict:
-                    comunidades_dict[comunidad_key] = {
-                        'comunidad': benef_data['comunidad'],
-                        'region': benef_data['region'],
-                        'beneficiarios': []
-                    }
-                
-                # Formatear eventos
-                benef_data['evento'] = ', '.join(benef_data['eventos']) if benef_data['eventos'] else '-'
-                del benef_data['eventos']  # Remover la lista temporal
-                del benef_data['comunidad_id']  # Remover el ID temporal
-                comunidades_dict[comunidad_key]['beneficiarios'].append(benef_data)
-            
-            # Convertir a formato de lista agrupada por comunidad
-            data = []
-            for comunidad_data in comunidades_dict.values():
-                # Agregar información de la comunidad y sus beneficiarios
-                for beneficiario in comunidad_data['beneficiarios']:
-                    data.append({
-                        'comunidad': comunidad_data['comunidad'],
-                        'region': comunidad_data['region'],
-                        'nombre': beneficiario['nombre'],
-                        'tipo': beneficiario['tipo'],
-                        'dpi': beneficiario['dpi'],
-                        'documento': beneficiario['documento'],
-                        'telefono': beneficiario['telefono'],
-                        'email': beneficiario['email'],
-                        'evento': beneficiario['evento']
-                    })
-        
-        elif report_type == 'actividades-por-region':
-            resultado = actividades_query.select_related('comunidad__region').values(
-                'comunidad__region__nombre'
-            ).annotate(
-                total=Count('id')
-            ).order_by('-total')
-            
-            data = [
-                {
-                    'region': item['comunidad__region__nombre'] or 'Sin región',
-                    'total_actividades': item['total']
-                }
-                for item in resultado
-            ]
-        
-        elif report_type == 'actividades-por-comunidad':
-            resultado = actividades_query.select_related('comunidad', 'comunidad__region').values(
-                'comunidad__nombre',
-                'comunidad__region__nombre'
-            ).annotate(
-                total=Count('id')
-            ).order_by('-total')
-            
-            data = [
-                {
-                    'comunidad': item['comunidad__nombre'] or 'Sin comunidad',
-                    'region': item['comunidad__region__nombre'] or 'Sin región',
-                    'total_actividades': item['total']
-                }
-                for item in resultado
-            ]
-        elif report_type == 'actividad-de-personal':
-            # Obtener filtros específicos
-            colaboradores_filtro = request.GET.get('colaboradores', '').split(',') if request.GET.get('colaboradores') else []
-            colaboradores_filtro = [c for c in colaboradores_filtro if c]  # Limpiar valores vacíos
-            eventos_filtro = request.GET.get('eventos', '').split(',') if request.GET.get('eventos') else []
-            eventos_filtro = [e for e in eventos_filtro if e]  # Limpiar valores vacíos
-            
-            # Obtener período para calcular fechas correctamente
-            periodo = request.GET.get('periodo', 'todo')
-            from django.utils import timezone
-            from datetime import timedelta, datetime, time
-            
-            # Calcular fechas según período (para DateTimeField, usar datetime completo)
-            if periodo == 'ultimo_mes':
-                fecha_inicio_dt = timezone.now() - timedelta(days=30)
-                fecha_fin_dt = timezone.now()  # Incluye todo el día actual
-            elif periodo == 'ultima_semana':
-                fecha_inicio_dt = timezone.now() - timedelta(days=7)
-                fecha_fin_dt = timezone.now()  # Incluye todo el día actual
-            elif periodo == 'rango' and fecha_inicio and fecha_fin:
-                try:
-                    fecha_inicio_dt = datetime.strptime(fecha_inicio, '%Y-%m-%d')
-                    # Para fecha_fin, usar el final del día (23:59:59.999999)
-                    fecha_fin_dt = datetime.combine(datetime.strptime(fecha_fin, '%Y-%m-%d').date(), time.max)
-                    # Convertir a timezone-aware si es necesario
-                    if timezone.is_naive(fecha_inicio_dt):
-                        fecha_inicio_dt = timezone.make_aware(fecha_inicio_dt)
-                    if timezone.is_naive(fecha_fin_dt):
-                        fecha_fin_dt = timezone.make_aware(fecha_fin_dt)
-                except:
-                    fecha_inicio_dt = None
-                    fecha_fin_dt = None
-            else:
-                fecha_inicio_dt = None
-                fecha_fin_dt = None
-            
-            # Si hay filtro de colaboradores, obtener esos colaboradores primero
-            colaboradores_seleccionados = {}
-            if colaboradores_filtro:
-                colaboradores_objs = Colaborador.objects.filter(
-                    id__in=colaboradores_filtro,
-                    activo=True
-                ).select_related('puesto')
-                
-                for col in colaboradores_objs:
-                    col_id = str(col.id)
-                    colaboradores_seleccionados[col_id] = {
-                        'colaborador_id': col_id,
-                        'nombre': col.nombre,
-                        'puesto': col.puesto.nombre if col.puesto else '-',
-                        'telefono': col.telefono or '-',
-                        'total_eventos': set(),
-                        'total_avances': 0,
-                        'eventos': {},
-                        'tiene_avances': False
-                    }
-            
-            # Construir query base para cambios de colaboradores - OPTIMIZADO con prefetch
-            cambios_query = EventoCambioColaborador.objects.filter(
-                colaborador__isnull=False,
-                colaborador__activo=True
-            ).select_related(
-                'colaborador', 'colaborador__puesto', 'actividad', 
-                'actividad__comunidad', 'actividad__comunidad__region', 'actividad__tipo',
-                'actividad__comunidad__tipo'
-            ).prefetch_related('evidencias')  # Precargar evidencias para evitar consultas N+1
-            
-            # Aplicar filtros de fecha (usar datetime para DateTimeField)
-            if fecha_inicio_dt:
-                cambios_query = cambios_query.filter(fecha_cambio__gte=fecha_inicio_dt)
-            if fecha_fin_dt:
-                cambios_query = cambios_query.filter(fecha_cambio__lte=fecha_fin_dt)
-            # Si no hay filtros de fecha, se muestran todos los cambios (período "todo el tiempo")
-            
-            # Aplicar filtros de actividades
-            if comunidades_filtro and comunidades_filtro[0]:
-                cambios_query = cambios_query.filter(actividad__comunidad_id__in=comunidades_filtro)
-            if eventos_filtro and eventos_filtro[0]:
-                cambios_query = cambios_query.filter(actividad_id__in=eventos_filtro)
-            if estados and estados[0]:
-                cambios_query = cambios_query.filter(actividad__estado__in=estados)
-            if tipo_actividad and tipo_actividad[0]:
-                tipos = TipoActividad.objects.filter(nombre__in=tipo_actividad, activo=True)
-                cambios_query = cambios_query.filter(actividad__tipo_id__in=[t.id for t in tipos])
-            if colaboradores_filtro:
-                cambios_query = cambios_query.filter(colaborador_id__in=colaboradores_filtro)
-            
-            # Agrupar por colaborador
-            # IMPORTANTE: Si hay filtro de colaboradores, SOLO trabajar con esos colaboradores
-            if colaboradores_filtro:
-                # Inicializar el diccionario SOLO con los colaboradores filtrados
-                colaboradores_dict = colaboradores_seleccionados.copy()
-            else:
-                # Si NO hay filtro de colaboradores, inicializar vacío
-                colaboradores_dict = {}
-            
-            # Procesar TODOS los cambios una sola vez (la query ya está filtrada por colaboradores_filtro si hay filtro)
-            for cambio in cambios_query:
-                colaborador = cambio.colaborador
-                actividad = cambio.actividad
-                
-                if not colaborador or not actividad:
-                    continue
-                
-                col_id = str(colaborador.id)
-                
-                # Si hay filtro de colaboradores, verificar que esté en el filtro
-                if colaboradores_filtro and col_id not in colaboradores_filtro:
-                    continue
-                
-                # Si el colaborador no está en el diccionario, crearlo (solo si no hay filtro)
-                if col_id not in colaboradores_dict:
-                    if not colaboradores_filtro:
-                        # Solo crear si NO hay filtro (si hay filtro, todos deberían estar ya inicializados)
-                        colaboradores_dict[col_id] = {
-                            'colaborador_id': col_id,
-                            'nombre': colaborador.nombre,
-                            'puesto': colaborador.puesto.nombre if colaborador.puesto else '-',
-                            'telefono': colaborador.telefono or '-',
-                            'total_eventos': set(),
-                            'total_avances': 0,
-                            'eventos': {},
-                            'tiene_avances': False
-                        }
-                    else:
-                        # Si hay filtro y el colaborador no está en el diccionario, saltarlo
-                        continue
-                
-                # Marcar que tiene avances
-                colaboradores_dict[col_id]['tiene_avances'] = True
-                
-                # Agregar evento
-                actividad_id = str(actividad.id)
-                if actividad_id not in colaboradores_dict[col_id]['eventos']:
-                    colaboradores_dict[col_id]['eventos'][actividad_id] = {
-                        'evento_id': actividad_id,
-                        'nombre': actividad.nombre,
-                        'estado': actividad.estado,
-                        'tipo': actividad.tipo.nombre if actividad.tipo else '-',
-                        'comunidad': actividad.comunidad.nombre if actividad.comunidad else '-',
-                        'tipo_comunidad': actividad.comunidad.tipo.nombre if actividad.comunidad and actividad.comunidad.tipo else '-',
-                        'avances': [],
-                        'total_avances': 0,
-                        'fecha_primer_avance': None,
-                        'fecha_ultimo_avance': None
-                    }
-                    colaboradores_dict[col_id]['total_eventos'].add(actividad_id)
-                
-                # Agregar avance
-                fecha_cambio = cambio.fecha_cambio
-                colaboradores_dict[col_id]['eventos'][actividad_id]['avances'].append({
-                    'fecha': fecha_cambio.isoformat() if fecha_cambio else None,
-                    'descripcion': cambio.descripcion_cambio
-                })
-                colaboradores_dict[col_id]['eventos'][actividad_id]['total_avances'] += 1
-                colaboradores_dict[col_id]['total_avances'] += 1
-                
-                # Actualizar fechas
-                if fecha_cambio:
-                    if not colaboradores_dict[col_id]['eventos'][actividad_id]['fecha_primer_avance']:
-                        colaboradores_dict[col_id]['eventos'][actividad_id]['fecha_primer_avance'] = fecha_cambio
-                    elif fecha_cambio < colaboradores_dict[col_id]['eventos'][actividad_id]['fecha_primer_avance']:
-                        colaboradores_dict[col_id]['eventos'][actividad_id]['fecha_primer_avance'] = fecha_cambio
-                    
-                    if not colaboradores_dict[col_id]['eventos'][actividad_id]['fecha_ultimo_avance']:
-                        colaboradores_dict[col_id]['eventos'][actividad_id]['fecha_ultimo_avance'] = fecha_cambio
-                    elif fecha_cambio > colaboradores_dict[col_id]['eventos'][actividad_id]['fecha_ultimo_avance']:
-                        colaboradores_dict[col_id]['eventos'][actividad_id]['fecha_ultimo_avance'] = fecha_cambio
-            
-            # Formatear datos para respuesta
-            data = []
-            
-            # Si hay filtro de colaboradores, asegurarse de que SOLO los colaboradores filtrados estén en el resultado
-            if colaboradores_filtro:
-                # Asegurarse de que todos los colaboradores filtrados estén en el diccionario
-                # (ya deberían estar porque los inicializamos al principio, pero por seguridad verificamos)
-                for col_id in colaboradores_filtro:
-                    if col_id not in colaboradores_dict:
-                        # Este colaborador fue seleccionado pero no tiene cambios que coincidan con los filtros
-                        # Buscar el colaborador en la base de datos
-                        try:
-                            col = Colaborador.objects.get(id=col_id, activo=True)
-                            colaboradores_dict[col_id] = {
-                                'colaborador_id': col_id,
-                                'nombre': col.nombre,
-                                'puesto': col.puesto.nombre if col.puesto else '-',
-                                'telefono': col.telefono or '-',
-                                'total_eventos': set(),
-                                'total_avances': 0,
-                                'eventos': {},
-                                'tiene_avances': False
-                            }
-                        except Colaborador.DoesNotExist:
-                            # Colaborador no existe, saltarlo
-                            continue
-                
-                # FILTRAR ESTRICTAMENTE: Solo procesar colaboradores que están en el filtro
-                colaboradores_dict_filtrado = {}
-                for col_id in colaboradores_filtro:
-                    if col_id in colaboradores_dict:
-                        colaboradores_dict_filtrado[col_id] = colaboradores_dict[col_id]
-                
-                colaboradores_dict = colaboradores_dict_filtrado
-            
-            # Procesar solo los colaboradores que están en el diccionario (ya filtrados si hay filtro)
-            for col_data in colaboradores_dict.values():
-                eventos_list = []
-                
-                # Si tiene avances, procesar eventos normalmente
-                if col_data.get('tiene_avances', False):
-                    for evento_data in col_data['eventos'].values():
-                        eventos_list.append({
-                            'nombre': evento_data['nombre'],
-                            'estado': evento_data['estado'],
-                            'tipo': evento_data['tipo'],
-                            'comunidad': evento_data['comunidad'],
-                            'tipo_comunidad': evento_data['tipo_comunidad'],
-                            'total_avances': evento_data['total_avances'],
-                            'fecha_primer_avance': evento_data['fecha_primer_avance'].strftime('%d/%m/%Y') if evento_data['fecha_primer_avance'] else '-',
-                            'fecha_ultimo_avance': evento_data['fecha_ultimo_avance'].strftime('%d/%m/%Y') if evento_data['fecha_ultimo_avance'] else '-'
-                        })
-                # Si no tiene avances, no agregar eventos a la lista
-                
-                data.append({
-                    'colaborador_id': col_data['colaborador_id'],
-                    'nombre': col_data['nombre'],
-                    'puesto': col_data['puesto'],
-                    'telefono': col_data['telefono'],
-                    'total_eventos': len(col_data['total_eventos']),
-                    'total_avances': col_data['total_avances'],
-                    'eventos': eventos_list,
-                    'sin_avances': not col_data.get('tiene_avances', False)
-                })
-            
-            # Ordenar por total de avances descendente (los sin avances van al final)
-            data.sort(key=lambda x: (x['total_avances'], x['nombre']), reverse=True)
-        elif report_type == 'avances-eventos-generales':
-            # Obtener filtros específicos
-            comunidades_filtro = request.GET.get('comunidades', '').split(',') if request.GET.get('comunidades') else []
-            comunidades_filtro = [c for c in comunidades_filtro if c]
-            eventos_filtro = request.GET.get('eventos', '').split(',') if request.GET.get('eventos') else []
-            eventos_filtro = [e for e in eventos_filtro if e]
-            colaboradores_filtro = request.GET.get('colaboradores', '').split(',') if request.GET.get('colaboradores') else []
-            colaboradores_filtro = [c for c in colaboradores_filtro if c]
-            mostrar_evidencias = request.GET.get('mostrar_evidencias', 'true').lower() == 'true'
-            
-            # Obtener período para calcular fechas correctamente
-            periodo = request.GET.get('periodo', 'todo')
-            from django.utils import timezone
-            from datetime import timedelta, datetime, time
-            
-            # Calcular fechas según período (para DateTimeField, usar datetime completo)
-            if periodo == 'ultimo_mes':
-                fecha_inicio_dt = timezone.now() - timedelta(days=30)
-                fecha_fin_dt = timezone.now()  # Incluye todo el día actual
-            elif periodo == 'ultima_semana':
-                fecha_inicio_dt = timezone.now() - timedelta(days=7)
-                fecha_fin_dt = timezone.now()  # Incluye todo el día actual
-            elif periodo == 'rango' and fecha_inicio and fecha_fin:
-                try:
-                    fecha_inicio_dt = datetime.strptime(fecha_inicio, '%Y-%m-%d')
-                    # Para fecha_fin, usar el final del día (23:59:59.999999)
-                    fecha_fin_dt = datetime.combine(datetime.strptime(fecha_fin, '%Y-%m-%d').date(), time.max)
-                    # Convertir a timezone-aware si es necesario
-                    if timezone.is_naive(fecha_inicio_dt):
-                        fecha_inicio_dt = timezone.make_aware(fecha_inicio_dt)
-                    if timezone.is_naive(fecha_fin_dt):
-                        fecha_fin_dt = timezone.make_aware(fecha_fin_dt)
-                except:
-                    fecha_inicio_dt = None
-                    fecha_fin_dt = None
-            else:
-                fecha_inicio_dt = None
-                fecha_fin_dt = None
-            
-            # Construir query base para cambios de colaboradores
-            cambios_query = EventoCambioColaborador.objects.filter(
-                colaborador__isnull=False,
-                colaborador__activo=True,
-                actividad__eliminado_en__isnull=True
-            ).select_related(
-                'colaborador', 'colaborador__puesto', 'actividad', 
-                'actividad__tipo', 'actividad__comunidad', 'actividad__comunidad__region'
-            ).prefetch_related(
-                'actividad__comunidades_relacionadas__comunidad',
-                'actividad__comunidades_relacionadas__comunidad__region',
-                'actividad__comunidades_relacionadas__region'
-            )
-            
-            # Aplicar filtros de fecha (usar datetime para DateTimeField)
-            if fecha_inicio_dt:
-                cambios_query = cambios_query.filter(fecha_cambio__gte=fecha_inicio_dt)
-            if fecha_fin_dt:
-                cambios_query = cambios_query.filter(fecha_cambio__lte=fecha_fin_dt)
-            
-            # Aplicar filtros de actividades
-            if comunidades_filtro:
-                cambios_query = cambios_query.filter(
-                    Q(actividad__comunidad_id__in=comunidades_filtro) |
-                    Q(actividad__comunidades_relacionadas__comunidad_id__in=comunidades_filtro)
-                ).distinct()
-            if eventos_filtro:
-                cambios_query = cambios_query.filter(actividad_id__in=eventos_filtro)
-            if tipo_actividad and tipo_actividad[0]:
-                tipos = TipoActividad.objects.filter(nombre__in=tipo_actividad, activo=True)
-                cambios_query = cambios_query.filter(actividad__tipo_id__in=[t.id for t in tipos])
-            if colaboradores_filtro:
-                cambios_query = cambios_query.filter(colaborador_id__in=colaboradores_filtro)
-            
-            # Nota: Las evidencias se obtendrán manualmente agrupadas por grupo_id
-            # No usar prefetch_related aquí ya que agrupamos por grupo_id
-            
-            # Procesar cambios agrupados por grupo_id para evitar duplicados
-            # Agrupar cambios por grupo_id (un avance puede tener múltiples colaboradores)
-            cambios_por_grupo = {}
-            for cambio in cambios_query:
-                actividad = cambio.actividad
-                colaborador = cambio.colaborador
-                
-                if not actividad or not colaborador:
-                    continue
-                
-                grupo_id = str(cambio.grupo_id)
-                
-                # Si es el primer cambio de este grupo, inicializar
-                if grupo_id not in cambios_por_grupo:
-                    # Obtener comunidades del evento
-                    comunidades_nombres = []
-                    regiones_nombres = []
-                    
-                    if actividad.comunidad:
-                        comunidades_nombres.append(actividad.comunidad.nombre)
-                        if actividad.comunidad.region:
-                            regiones_nombres.append(actividad.comunidad.region.nombre)
-                    
-                    # También obtener de relaciones de comunidades
-                    if hasattr(actividad, 'comunidades_relacionadas'):
-                        for relacion in actividad.comunidades_relacionadas.all():
-                            if relacion.comunidad and relacion.comunidad.nombre not in comunidades_nombres:
-                                comunidades_nombres.append(relacion.comunidad.nombre)
-                            # Obtener región de la relación o de la comunidad
-                            if relacion.region and relacion.region.nombre not in regiones_nombres:
-                                regiones_nombres.append(relacion.region.nombre)
-                            elif relacion.comunidad and relacion.comunidad.region and relacion.comunidad.region.nombre not in regiones_nombres:
-                                regiones_nombres.append(relacion.comunidad.region.nombre)
-                    
-                    # Obtener todas las evidencias del grupo (pueden estar en cualquier cambio del grupo)
-                    evidencias_data = []
-                    if mostrar_evidencias:
-                        # Obtener todos los cambios del mismo grupo
-                        cambios_grupo_ids = EventoCambioColaborador.objects.filter(
-                            grupo_id=cambio.grupo_id
-                        ).values_list('id', flat=True)
-                        
-                        # Obtener todas las evidencias de todos los cambios del mismo grupo
-                        evidencias_qs = EventosEvidenciasCambios.objects.filter(
-                            cambio_id__in=cambios_grupo_ids
-                        ).select_related('cambio')
-                        
-                        # Usar un diccionario para evitar evidencias duplicadas basado en URL (archivo único)
-                        # La misma evidencia puede estar asociada a múltiples cambios del mismo grupo
-                        evidencias_unicas = {}  # key: url_almacenamiento, value: evidencia_data
-                        
-                        for evidencia in evidencias_qs:
-                            url_almacenamiento = evidencia.url_almacenamiento
-                            # Solo agregar si no existe ya una evidencia con la misma URL
-                            if url_almacenamiento not in evidencias_unicas:
-                                evidencias_unicas[url_almacenamiento] = {
-                                    'id': str(evidencia.id),
-                                    'nombre': evidencia.archivo_nombre,
-                                    'url': url_almacenamiento,
-                                    'tipo': evidencia.archivo_tipo or '',
-                                    'es_imagen': evidencia.archivo_tipo and evidencia.archivo_tipo.startswith('image/'),
-                                    'descripcion': evidencia.descripcion or ''  # Descripción de la evidencia (no del avance)
-                                }
-                        
-                        # Convertir el diccionario a lista
-                        evidencias_data = list(evidencias_unicas.values())
-                    
-                    # Formatear fecha
-                    fecha_display = ''
-                    if cambio.fecha_cambio:
-                        from django.utils.timezone import localtime
-                        import pytz
-                        guatemala_tz = pytz.timezone('America/Guatemala')
-                        if timezone.is_aware(cambio.fecha_cambio):
-                            fecha_local = cambio.fecha_cambio.astimezone(guatemala_tz)
-                        else:
-                            fecha_local = timezone.make_aware(cambio.fecha_cambio, guatemala_tz)
-                        fecha_display = fecha_local.strftime('%d/%m/%Y %H:%M')
-                    
-                    # Obtener todos los colaboradores del grupo
-                    colaboradores_grupo = EventoCambioColaborador.objects.filter(
-                        grupo_id=cambio.grupo_id
-                    ).select_related('colaborador').values('colaborador__id', 'colaborador__nombre')
-                    
-                    colaboradores_nombres = [c['colaborador__nombre'] for c in colaboradores_grupo if c['colaborador__nombre']]
-                    
-                    # Obtener la comunidad específica del avance (desde cambio.comunidad)
-                    comunidad_avance_nombre = None
-                    comunidad_avance_id = None
-                    if cambio.comunidad:
-                        comunidad_avance_nombre = cambio.comunidad.nombre
-                        comunidad_avance_id = str(cambio.comunidad.id)
-                    
-                    cambios_por_grupo[grupo_id] = {
-                        'evento_id': str(actividad.id),
-                        'evento': {
-                            'id': str(actividad.id),
-                            'nombre': actividad.nombre,
-                            'estado': actividad.estado,
-                            'tipo': actividad.tipo.nombre if actividad.tipo else '-'
-                        },
-                        'comunidad': ', '.join(comunidades_nombres) if comunidades_nombres else '-',
-                        'region': ', '.join(regiones_nombres) if regiones_nombres else None,  # Región/ubicación del avance
-                        'comunidad_avance': comunidad_avance_nombre,  # Comunidad específica donde se realizó el avance
-                        'comunidad_avance_id': comunidad_avance_id,  # ID de la comunidad específica del avance
-                        'colaboradores_ids': [str(c['colaborador__id']) for c in colaboradores_grupo if c['colaborador__id']],
-                        'colaboradores_nombres': colaboradores_nombres,
-                        'colaborador_nombre': ', '.join(colaboradores_nombres) if colaboradores_nombres else 'Sin nombre',  # Todos los colaboradores
-                        'descripcion_cambio': cambio.descripcion_cambio,  # Descripción del avance (no de la evidencia)
-                        'fecha_cambio': cambio.fecha_cambio.isoformat() if cambio.fecha_cambio else None,
-                        'fecha_display': fecha_display,
-                        'evidencias': evidencias_data
-                    }
-            
-            # Convertir el diccionario agrupado a lista
-            data = list(cambios_por_grupo.values())
-            
-            # El frontend espera data directamente (no en un campo 'data')
-            return JsonResponse({
-                'data': data,
-                'total': len(data)
-            })
-        
-        elif report_type == 'comunidades':
-            # Obtener filtros específicos para reporte de comunidades
-            comunidades_filtro = request.GET.get('comunidades', '').split(',') if request.GET.get('comunidades') else []
-            comunidades_filtro = [c.strip() for c in comunidades_filtro if c.strip()]
-            
-            evento_filtro_param = request.GET.get('evento', '')
-            if evento_filtro_param:
-                evento_filtro = [e.strip() for e in evento_filtro_param.split(',') if e.strip()]
-            else:
-                evento_filtro = []
-            
-            # Obtener período para calcular fechas correctamente
-            periodo = request.GET.get('periodo', 'todo')
-            from django.utils import timezone
-            from datetime import timedelta, datetime, time
-            
-            # Calcular fechas según período
-            if periodo == 'ultimo_mes':
-                fecha_inicio_dt = timezone.now() - timedelta(days=30)
-                fecha_fin_dt = timezone.now()
-            elif periodo == 'ultima_semana':
-                fecha_inicio_dt = timezone.now() - timedelta(days=7)
-                fecha_fin_dt = timezone.now()
-            elif periodo == 'rango' and fecha_inicio and fecha_fin:
-                try:
-                    fecha_inicio_dt = datetime.strptime(fecha_inicio, '%Y-%m-%d')
-                    fecha_fin_dt = datetime.combine(datetime.strptime(fecha_fin, '%Y-%m-%d').date(), time.max)
-                    if timezone.is_naive(fecha_inicio_dt):
-                        fecha_inicio_dt = timezone.make_aware(fecha_inicio_dt)
-                    if timezone.is_naive(fecha_fin_dt):
-                        fecha_fin_dt = timezone.make_aware(fecha_fin_dt)
-                except:
-                    fecha_inicio_dt = None
-                    fecha_fin_dt = None
-            else:
-                fecha_inicio_dt = None
-                fecha_fin_dt = None
-            
-            # Construir query base de actividades
-            actividades_query = Actividad.objects.filter(eliminado_en__isnull=True)
-            
-            # Aplicar filtros de fecha
-            if fecha_inicio_dt:
-                actividades_query = actividades_query.filter(fecha__gte=fecha_inicio_dt.date())
-            if fecha_fin_dt:
-                actividades_query = actividades_query.filter(fecha__lte=fecha_fin_dt.date())
-            
-            # Aplicar filtro de tipo de actividad
-            if tipo_actividad and isinstance(tipo_actividad, list) and len(tipo_actividad) > 0:
-                tipos_validos = [t for t in tipo_actividad if isinstance(t, str) and t.strip() != '']
-                if tipos_validos:
-                    tipos = TipoActividad.objects.filter(nombre__in=tipos_validos, activo=True)
-                    if tipos.exists():
-                        tipo_ids = [t.id for t in tipos]
-                        actividades_query = actividades_query.filter(tipo_id__in=tipo_ids)
-            
-            # Aplicar filtro de evento si está presente
-            if evento_filtro and len(evento_filtro) > 0:
-                actividades_query = actividades_query.filter(id__in=evento_filtro)
-            
-            # Obtener IDs de actividades filtradas
-            actividad_ids = list(actividades_query.values_list('id', flat=True))
-            
-            # Si hay filtro de comunidades, filtrar actividades que tengan esa comunidad (directa o M2M)
-            if comunidades_filtro:
-                # Actividades con comunidad directa en el filtro
-                actividad_ids_directas = set(actividades_query.filter(
-                    comunidad_id__in=comunidades_filtro
-                ).values_list('id', flat=True))
-                
-                # Actividades con comunidades M2M en el filtro
-                actividad_ids_m2m = set(ActividadComunidad.objects.filter(
-                    comunidad_id__in=comunidades_filtro,
-                    actividad_id__in=actividad_ids
-                ).values_list('actividad_id', flat=True).distinct())
-                
-                # Combinar IDs
-                actividad_ids = list(actividad_ids_directas | actividad_ids_m2m)
-            
-            # Obtener comunidades a procesar
-            if comunidades_filtro:
-                comunidades_a_procesar = Comunidad.objects.filter(
-                    id__in=comunidades_filtro,
-                    activo=True
-                ).select_related('tipo', 'region')
-            else:
-                # Si no hay filtro de comunidades, obtener todas las comunidades que tienen actividades
-                comunidades_ids_directas = set(actividades_query.filter(
-                    comunidad_id__isnull=False
-                ).values_list('comunidad_id', flat=True).distinct())
-                
-                comunidades_ids_m2m = set(ActividadComunidad.objects.filter(
-                    actividad_id__in=actividad_ids
-                ).values_list('comunidad_id', flat=True).distinct())
-                
-                todas_comunidades_ids = list(comunidades_ids_directas | comunidades_ids_m2m)
-                comunidades_a_procesar = Comunidad.objects.filter(
-                    id__in=todas_comunidades_ids,
-                    activo=True
-                ).select_related('tipo', 'region')
-            
-            # Procesar cada comunidad
-            comunidades_data = []
-            for comunidad in comunidades_a_procesar:
-                # Obtener actividades de esta comunidad (directa o M2M)
-                actividad_ids_comunidad_directa = set(actividades_query.filter(
-                    comunidad_id=comunidad.id
-                ).values_list('id', flat=True))
-                
-                actividad_ids_comunidad_m2m = set(ActividadComunidad.objects.filter(
-                    comunidad_id=comunidad.id,
-                    actividad_id__in=actividad_ids
-                ).values_list('actividad_id', flat=True).distinct())
-                
-                actividad_ids_comunidad = list(actividad_ids_comunidad_directa | actividad_ids_comunidad_m2m)
-                
-                # Obtener actividades de esta comunidad
-                actividades_comunidad = Actividad.objects.filter(
-                    id__in=actividad_ids_comunidad
-                ).select_related('tipo', 'comunidad', 'comunidad__region')
-                
-                # Obtener beneficiarios de esta comunidad que están en estas actividades
-                beneficiarios_comunidad = Beneficiario.objects.filter(
-                    comunidad_id=comunidad.id,
-                    activo=True
-                ).select_related('tipo')
-                
-                # Filtrar beneficiarios que están en las actividades
-                beneficiarios_en_actividades = ActividadBeneficiario.objects.filter(
-                    actividad_id__in=actividad_ids_comunidad,
-                    beneficiario_id__in=[b.id for b in beneficiarios_comunidad]
-                ).values_list('beneficiario_id', flat=True).distinct()
-                
-                beneficiarios_filtrados = beneficiarios_comunidad.filter(
-                    id__in=beneficiarios_en_actividades
-                )
-                
-                # Procesar proyectos/eventos
-                proyectos_data = []
-                for actividad in actividades_comunidad:
-                    proyectos_data.append({
-                        'nombre': actividad.nombre,
-                        'tipo': actividad.tipo.nombre if actividad.tipo else '-',
-                        'estado': actividad.estado,
-                        'fecha': actividad.fecha.strftime('%Y-%m-%d') if actividad.fecha else '-'
-                    })
-                
-                # Procesar beneficiarios
-                beneficiarios_data = []
-                for beneficiario in beneficiarios_filtrados:
-                    # Obtener eventos en los que participa este beneficiario
-                    eventos_beneficiario = ActividadBeneficiario.objects.filter(
-                        beneficiario_id=beneficiario.id,
-                        actividad_id__in=actividad_ids_comunidad
-                    ).select_related('actividad').values_list('actividad__nombre', flat=True).distinct()
-                    
-                    # Obtener nombre del beneficiario según tipo
-                    nombre_beneficiario = ''
-                    if hasattr(beneficiario, 'individual'):
-                        nombre_beneficiario = f"{beneficiario.individual.nombre} {beneficiario.individual.apellido}".strip()
-                    elif hasattr(beneficiario, 'familia'):
-                        nombre_beneficiario = beneficiario.familia.nombre_familia
-                    elif hasattr(beneficiario, 'institucion'):
-                        nombre_beneficiario = beneficiario.institucion.nombre_institucion
-                    
-                    tipo_beneficiario = beneficiario.tipo.nombre if beneficiario.tipo else '-'
-                    
-                    beneficiarios_data.append({
-                        'nombre': nombre_beneficiario or 'Sin nombre',
-                        'tipo': tipo_beneficiario.capitalize() if tipo_beneficiario else '-',
-                        'eventos': list(eventos_beneficiario)
-                    })
-                
-                comunidades_data.append({
-                    'nombre': comunidad.nombre,
-                    'cocode': comunidad.cocode or '-',
-                    'region': comunidad.region.nombre if comunidad.region else '-',
-                    'tipo': comunidad.tipo.nombre if comunidad.tipo else '-',
-                    'numero_beneficiarios': len(beneficiarios_data),
-                    'numero_proyectos': len(proyectos_data),
-                    'proyectos': proyectos_data,
-                    'beneficiarios': beneficiarios_data
-                })
-            
-            # El frontend espera un objeto con 'comunidades'
-            return JsonResponse({
-                'data': {
-                    'comunidades': comunidades_data
-                },
-                'total': len(comunidades_data)
-            })
-        
-        elif report_type == 'reporte-evento-individual':
-            # Obtener el evento específico
-            evento_id = request.GET.get('evento')
-            if not evento_id:
-                return JsonResponse({
-                    'error': 'Debe seleccionar un evento'
-                }, status=400)
-            
-            try:
-                # Verificar si las columnas comunidad_id y region_id existen en eventos_cambios_colaboradores
-                from django.db import connection
-                try:
-                    with connection.cursor() as cursor:
-                        cursor.execute("""
-                            SELECT column_name 
-                            FROM information_schema.columns 
-                            WHERE table_name = 'eventos_cambios_colaboradores' 
-                            AND column_name IN ('comunidad_id', 'region_id');
-                        """)
-                        existing_columns = {row[0] for row in cursor.fetchall()}
-                        has_cambios_colaboradores_comunidad = 'comunidad_id' in existing_columns
-                        has_cambios_colaboradores_region = 'region_id' in existing_columns
-                except Exception as e:
-                    # Si hay un error al verificar, asumir que las columnas no existen
-                    print(f'⚠️ Error al verificar columnas en eventos_cambios_colaboradores: {e}')
-                    has_cambios_colaboradores_comunidad = False
-                    has_cambios_colaboradores_region = False
-
-                # Construir prefetch_related dinámicamente según las columnas disponibles
-                prefetch_fields = [
-                    'personal__usuario__puesto',
-                    'personal__colaborador__puesto',
-                    'beneficiarios__beneficiario__individual',
-                    'beneficiarios__beneficiario__familia',
-                    'beneficiarios__beneficiario__institucion',
-                    'beneficiarios__beneficiario__tipo',
-                    'evidencias',
-                    'archivos',
-                    'galeria_imagenes',
-                    'cambios__responsable',
-                    'comunidades_relacionadas__comunidad__region',
-                    'comunidades_relacionadas__region'
-                ]
-                
-                # Solo agregar prefetch de cambios_colaboradores si las columnas existen
-                # Si no existen, omitir el prefetch y dejar que obtener_cambios_evento maneje la carga
-                if has_cambios_colaboradores_comunidad or has_cambios_colaboradores_region:
-                    cambios_colaboradores_queryset = EventoCambioColaborador.objects.select_related('colaborador').prefetch_related('evidencias')
-                    if has_cambios_colaboradores_comunidad:
-                        cambios_colaboradores_queryset = cambios_colaboradores_queryset.select_related('comunidad')
-                    if has_cambios_colaboradores_region:
-                        cambios_colaboradores_queryset = cambios_colaboradores_queryset.select_related('region')
-                    prefetch_fields.append(
-                        Prefetch('cambios_colaboradores', queryset=cambios_colaboradores_queryset)
-                    )
-                # Si las columnas no existen, no hacer prefetch para evitar errores
-                # La función obtener_cambios_evento manejará la carga de manera segura
-                
-                evento = Actividad.objects.select_related(
-                    'tipo', 'comunidad', 'comunidad__region', 'responsable', 'colaborador', 'portada'
-                ).prefetch_related(*prefetch_fields).get(id=evento_id, eliminado_en__isnull=True)
-                
-                # Personal asignado
-                personal_data = []
-                for ap in evento.personal.all():
-                    if ap.usuario:
-                        personal_data.append({
-                            'id': str(ap.usuario.id),
-                            'username': ap.usuario.username,
-                            'nombre': ap.usuario.nombre or ap.usuario.username,
-                            'rol': ap.rol_en_actividad,
-                            'rol_display': ap.usuario.get_rol_display() if hasattr(ap.usuario, 'get_rol_display') else ap.usuario.rol,
-                            'puesto': ap.usuario.puesto.nombre if ap.usuario.puesto else 'Sin puesto',
-                            'tipo': 'usuario'
-                        })
-                    elif ap.colaborador:
-                        personal_data.append({
-                            'id': str(ap.colaborador.id),
-                            'username': ap.colaborador.correo or '',
-                            'nombre': ap.colaborador.nombre,
-                            'rol': ap.rol_en_actividad,
-                            'rol_display': 'Personal Fijo' if ap.colaborador.es_personal_fijo else 'Colaborador Externo',
-                            'puesto': ap.colaborador.puesto.nombre if ap.colaborador.puesto else 'Sin puesto',
-                            'tipo': 'colaborador'
-                        })
-                
-                # Beneficiarios
-                beneficiarios_data = []
-                for ab in evento.beneficiarios.all():
-                    benef = ab.beneficiario
-                    nombre_display, info_adicional, detalles, tipo_envio = obtener_detalle_beneficiario(benef)
-                    if benef.tipo and hasattr(benef.tipo, 'get_nombre_display'):
-                        tipo_display = benef.tipo.get_nombre_display()
-                    else:
-                        tipo_display = tipo_envio.title() if tipo_envio else ''
-                    beneficiarios_data.append({
-                        'id': str(benef.id),
-                        'tipo': tipo_envio,
-                        'nombre': nombre_display,
-                        'info_adicional': info_adicional,
-                        'tipo_display': tipo_display,
-                        'detalles': detalles
-                    })
-                
-                # Galería de imágenes (desde eventos_galeria)
-                evidencias_data = []
-                for imagen in evento.galeria_imagenes.all():
-                    evidencias_data.append({
-                        'id': str(imagen.id),
-                        'nombre': imagen.archivo_nombre,
-                        'url': imagen.url_almacenamiento,
-                        'tipo': imagen.archivo_tipo or '',
-                        'es_imagen': True,
-                        'descripcion': imagen.descripcion or ''
-                    })
-                
-                # Archivos del proyecto (evidencias en /media/evidencias + archivos de actividad_archivos)
-                archivos_data = []
-                for evidencia in evento.evidencias.all():
-                    url = evidencia.url_almacenamiento or ''
-                    url_lower = url.lower()
-                    if '/media/evidencias/' not in url_lower:
-                        continue
-                    archivos_data.append({
-                        'id': str(evidencia.id),
-                        'nombre': evidencia.archivo_nombre,
-                        'url': url,
-                        'tipo': evidencia.archivo_tipo or 'application/octet-stream',
-                        'tamanio': evidencia.archivo_tamanio,
-                        'descripcion': evidencia.descripcion or '',
-                        'es_evidencia': True,
-                        'es_imagen': evidencia.es_imagen,
-                        'es_galeria': False,
-                        'creado_en': evidencia.creado_en.isoformat() if evidencia.creado_en else None
-                    })
-                # Archivos de actividad_archivos
-                for archivo in evento.archivos.all():
-                    archivos_data.append({
-                        'id': str(archivo.id),
-                        'nombre': archivo.nombre_archivo,
-                        'url': archivo.url_almacenamiento,
-                        'tipo': archivo.archivo_tipo or 'application/octet-stream',
-                        'tamanio': archivo.archivo_tamanio,
-                        'descripcion': archivo.descripcion or '',
-                        'es_evidencia': False,
-                        'es_imagen': False,
-                        'es_galeria': False,
-                        'creado_en': archivo.creado_en.isoformat() if archivo.creado_en else None
-                    })
-                
-                # Ubicación
-                ubicacion = 'Sin ubicación'
-                if evento.comunidad:
-                    if evento.comunidad.region:
-                        ubicacion = f"{evento.comunidad.nombre}, {evento.comunidad.region.nombre}"
-                    else:
-                        ubicacion = evento.comunidad.nombre
-                
-                # Convertir fechas
-                try:
-                    if evento.fecha:
-                        fecha_str = evento.fecha.strftime('%Y-%m-%d')
-                        fecha_display = evento.fecha.strftime('%d/%m/%Y')
-                    else:
-                        fecha_str = ''
-                        fecha_display = ''
-                except:
-                    fecha_str = ''
-                    fecha_display = ''
-                
-                # Obtener cambios (siempre, incluso si está vacío)
-                cambios_data = obtener_cambios_evento(evento)
-                
-                # Construir objeto de evento
-                evento_data = {
-                    'id': str(evento.id),
-                    'nombre': evento.nombre or 'Sin nombre',
-                    'tipo': evento.tipo.nombre if evento.tipo else 'Sin tipo',
-                    'descripcion': evento.descripcion or '',
-                    'ubicacion': ubicacion,
-                    'comunidad': evento.comunidad.nombre if evento.comunidad else 'Sin comunidad',
-                    'region': evento.comunidad.region.nombre if evento.comunidad and evento.comunidad.region else None,
-                    'fecha': fecha_str,
-                    'fecha_display': fecha_display,
-                    'estado': evento.estado,
-                    'responsable': (evento.responsable.nombre if evento.responsable and evento.responsable.nombre else evento.responsable.username) if evento.responsable else 'Sin responsable',
-                    'personal': personal_data,
-                    'beneficiarios': beneficiarios_data,
-                    'evidencias': evidencias_data,
-                    'archivos': archivos_data,
-                    'portada': obtener_portada_evento(evento),
-                    'cambios': cambios_data  # Siempre incluir, incluso si está vacío
-                }
-                
-                # El frontend espera data.evento (no data.data)
-                return JsonResponse({
-                    'data': {
-                        'evento': evento_data
-                    },
-                    'total': 1
-                })
-                
-            except Actividad.DoesNotExist:
-                return JsonResponse({
-                    'error': 'Evento no encontrado'
-                }, status=404)
-        elif report_type == 'actividad-usuarios':
-            # Obtener filtros específicos para reporte de actividad de usuarios
-            periodo = request.GET.get('periodo', 'todo')
-            fecha_inicio_param = request.GET.get('fecha_inicio')
-            fecha_fin_param = request.GET.get('fecha_fin')
-            
-            comunidades_filtro = request.GET.get('comunidades', '').split(',') if request.GET.get('comunidades') else []
-            comunidades_filtro = [c.strip() for c in comunidades_filtro if c.strip()]
-            
-            evento_filtro_param = request.GET.get('evento', '')
-            evento_filtro = evento_filtro_param.strip() if evento_filtro_param else None
-            
-            tipo_actividad_param = request.GET.get('tipo_actividad', '')
-            tipo_actividad = [t.strip() for t in tipo_actividad_param.split(',') if t.strip()] if tipo_actividad_param else []
-            
-            usuarios_filtro = request.GET.get('usuarios', '').split(',') if request.GET.get('usuarios') else []
-            usuarios_filtro = [u.strip() for u in usuarios_filtro if u.strip()]
-            
-            # Calcular fechas según período
-            from django.utils import timezone
-            from datetime import timedelta, datetime, time
-            
-            fecha_inicio_dt = None
-            fecha_fin_dt = None
-            
-            if periodo == 'ultimo_mes':
-                fecha_inicio_dt = timezone.now() - timedelta(days=30)
-                fecha_fin_dt = timezone.now()
-            elif periodo == 'ultima_semana':
-                fecha_inicio_dt = timezone.now() - timedelta(days=7)
-                fecha_fin_dt = timezone.now()
-            elif periodo == 'rango' and fecha_inicio_param and fecha_fin_param:
-                try:
-                    fecha_inicio_dt = datetime.strptime(fecha_inicio_param, '%Y-%m-%d')
-                    fecha_fin_dt = datetime.combine(datetime.strptime(fecha_fin_param, '%Y-%m-%d').date(), time.max)
-                    if timezone.is_naive(fecha_inicio_dt):
-                        fecha_inicio_dt = timezone.make_aware(fecha_inicio_dt)
-                    if timezone.is_naive(fecha_fin_dt):
-                        fecha_fin_dt = timezone.make_aware(fecha_fin_dt)
-                except:
-                    fecha_inicio_dt = None
-                    fecha_fin_dt = None
-            
-            # Obtener actividades base según filtros
-            actividades_base = Actividad.objects.filter(eliminado_en__isnull=True)
-            
-            # Aplicar filtro de tipo de actividad
-            if tipo_actividad and len(tipo_actividad) > 0:
-                tipos = TipoActividad.objects.filter(nombre__in=tipo_actividad, activo=True)
-                if tipos.exists():
-                    tipo_ids = [t.id for t in tipos]
-                    actividades_base = actividades_base.filter(tipo_id__in=tipo_ids)
-            
-            # Aplicar filtro de evento
-            if evento_filtro:
-                actividades_base = actividades_base.filter(id=evento_filtro)
-            
-            # Aplicar filtro de comunidades (directa o M2M)
-            if comunidades_filtro:
-                actividad_ids_directas = set(actividades_base.filter(
-                    comunidad_id__in=comunidades_filtro
-                ).values_list('id', flat=True))
-                
-                actividad_ids_m2m = set(ActividadComunidad.objects.filter(
-                    comunidad_id__in=comunidades_filtro,
-                    actividad_id__in=actividades_base.values_list('id', flat=True)
-                ).values_list('actividad_id', flat=True).distinct())
-                
-                actividad_ids = list(actividad_ids_directas | actividad_ids_m2m)
-                actividades_base = actividades_base.filter(id__in=actividad_ids)
-            
-            actividad_ids = list(actividades_base.values_list('id', flat=True))
-            
-            # Obtener todos los usuarios del sistema y colaboradores con usuario
-            usuarios_sistema = Usuario.objects.filter(activo=True).select_related('puesto')
-            colaboradores_con_usuario = Colaborador.objects.filter(
-                activo=True,
-                usuario__isnull=False
-            ).select_related('usuario', 'puesto')
-            
-            # Si hay filtro de usuarios, aplicar
-            if usuarios_filtro:
-                usuarios_sistema = usuarios_sistema.filter(id__in=usuarios_filtro)
-                colaboradores_con_usuario = colaboradores_con_usuario.filter(usuario_id__in=usuarios_filtro)
-            
-            # Obtener cambios de usuarios (ActividadCambio)
-            cambios_usuarios = ActividadCambio.objects.filter(
-                actividad_id__in=actividad_ids
-            ).select_related('responsable', 'actividad', 'actividad__tipo', 'actividad__comunidad')
-            
-            if fecha_inicio_dt:
-                cambios_usuarios = cambios_usuarios.filter(fecha_cambio__gte=fecha_inicio_dt)
-            if fecha_fin_dt:
-                cambios_usuarios = cambios_usuarios.filter(fecha_cambio__lte=fecha_fin_dt)
-            
-            if usuarios_filtro:
-                cambios_usuarios = cambios_usuarios.filter(responsable_id__in=usuarios_filtro)
-            
-            # Obtener cambios de colaboradores con usuario (EventoCambioColaborador)
-            colaborador_ids_con_usuario = [c.id for c in colaboradores_con_usuario]
-            cambios_colaboradores = EventoCambioColaborador.objects.filter(
-                actividad_id__in=actividad_ids,
-                colaborador_id__in=colaborador_ids_con_usuario
-            ).select_related('colaborador', 'colaborador__usuario', 'actividad', 'actividad__tipo', 'actividad__comunidad')
-            
-            if fecha_inicio_dt:
-                cambios_colaboradores = cambios_colaboradores.filter(fecha_cambio__gte=fecha_inicio_dt)
-            if fecha_fin_dt:
-                cambios_colaboradores = cambios_colaboradores.filter(fecha_cambio__lte=fecha_fin_dt)
-            
-            # Agrupar cambios por usuario
-            usuarios_dict = {}
-            
-            # Procesar cambios de usuarios
-            for cambio in cambios_usuarios:
-                usuario = cambio.responsable
-                if not usuario:
-                    continue
-                
-                usuario_id = str(usuario.id)
-                if usuario_id not in usuarios_dict:
-                    usuarios_dict[usuario_id] = {
-                        'id': usuario_id,
-                        'username': usuario.username,
-                        'nombre': usuario.nombre or usuario.username,
-                        'rol': usuario.rol,
-                        'rol_display': usuario.get_rol_display() if hasattr(usuario, 'get_rol_display') else usuario.rol,
-                        'puesto': usuario.puesto.nombre if usuario.puesto else None,
-                        'puesto_nombre': usuario.puesto.nombre if usuario.puesto else None,
-                        'cambios': [],
-                        'total_cambios': 0
-                    }
-                
-                # Formatear fecha
-                fecha_display = ''
-                if cambio.fecha_cambio:
-                    import pytz
-                    guatemala_tz = pytz.timezone('America/Guatemala')
-                    if timezone.is_aware(cambio.fecha_cambio):
-                        fecha_local = cambio.fecha_cambio.astimezone(guatemala_tz)
-                    else:
-                        fecha_local = timezone.make_aware(cambio.fecha_cambio, guatemala_tz)
-                    fecha_display = fecha_local.strftime('%d/%m/%Y %H:%M')
-                
-                usuarios_dict[usuario_id]['cambios'].append({
-                    'tipo_cambio': 'Cambio de Actividad',
-                    'descripcion': cambio.descripcion_cambio,
-                    'fecha': cambio.fecha_cambio.isoformat() if cambio.fecha_cambio else None,
-                    'fecha_display': fecha_display,
-                    'evento_id': str(cambio.actividad.id),
-                    'evento_nombre': cambio.actividad.nombre
-                })
-                usuarios_dict[usuario_id]['total_cambios'] += 1
-            
-            # Procesar cambios de colaboradores con usuario
-            # Agrupar por grupo_id para evitar duplicados cuando un cambio tiene múltiples comunidades
-            cambios_por_grupo = {}
-            for cambio in cambios_colaboradores:
-                colaborador = cambio.colaborador
-                if not colaborador or not colaborador.usuario:
-                    continue
-                
-                usuario = colaborador.usuario
-                usuario_id = str(usuario.id)
-                grupo_id = str(cambio.grupo_id) if hasattr(cambio, 'grupo_id') and cambio.grupo_id else str(cambio.id)
-                
-                # Crear clave única por usuario y grupo
-                clave_grupo = f"{usuario_id}_{grupo_id}"
-                
-                # Si ya procesamos este grupo para este usuario, saltarlo
-                if clave_grupo not in cambios_por_grupo:
-                    cambios_por_grupo[clave_grupo] = {
-                        'usuario_id': usuario_id,
-                        'usuario': usuario,
-                        'colaborador': colaborador,
-                        'cambio': cambio
-                    }
-            
-            # Procesar los cambios únicos agrupados
-            for clave_grupo, grupo_data in cambios_por_grupo.items():
-                usuario = grupo_data['usuario']
-                colaborador = grupo_data['colaborador']
-                cambio = grupo_data['cambio']
-                usuario_id = grupo_data['usuario_id']
-                
-                if usuario_id not in usuarios_dict:
-                    usuarios_dict[usuario_id] = {
-                        'id': usuario_id,
-                        'username': usuario.username,
-                        'nombre': usuario.nombre or usuario.username,
-                        'rol': usuario.rol,
-                        'rol_display': usuario.get_rol_display() if hasattr(usuario, 'get_rol_display') else usuario.rol,
-                        'puesto': colaborador.puesto.nombre if colaborador.puesto else (usuario.puesto.nombre if usuario.puesto else None),
-                        'puesto_nombre': colaborador.puesto.nombre if colaborador.puesto else (usuario.puesto.nombre if usuario.puesto else None),
-                        'cambios': [],
-                        'total_cambios': 0
-                    }
-                
-                # Formatear fecha
-                fecha_display = ''
-                if cambio.fecha_cambio:
-                    import pytz
-                    guatemala_tz = pytz.timezone('America/Guatemala')
-                    if timezone.is_aware(cambio.fecha_cambio):
-                        fecha_local = cambio.fecha_cambio.astimezone(guatemala_tz)
-                    else:
-                        fecha_local = timezone.make_aware(cambio.fecha_cambio, guatemala_tz)
-                    fecha_display = fecha_local.strftime('%d/%m/%Y %H:%M')
-                
-                usuarios_dict[usuario_id]['cambios'].append({
-                    'tipo_cambio': 'Cambio por Colaborador',
-                    'descripcion': cambio.descripcion_cambio,
-                    'fecha': cambio.fecha_cambio.isoformat() if cambio.fecha_cambio else None,
-                    'fecha_display': fecha_display,
-                    'evento_id': str(cambio.actividad.id),
-                    'evento_nombre': cambio.actividad.nombre
-                })
-                usuarios_dict[usuario_id]['total_cambios'] += 1
-            
-            # Si hay filtro de usuarios pero no tienen cambios, agregarlos sin actividad
-            if usuarios_filtro:
-                for usuario in usuarios_sistema:
-                    usuario_id = str(usuario.id)
-                    if usuario_id not in usuarios_dict:
-                        usuarios_dict[usuario_id] = {
-                            'id': usuario_id,
-                            'username': usuario.username,
-                            'nombre': usuario.nombre or usuario.username,
-                            'rol': usuario.rol,
-                            'rol_display': usuario.get_rol_display() if hasattr(usuario, 'get_rol_display') else usuario.rol,
-                            'puesto': usuario.puesto.nombre if usuario.puesto else None,
-                            'puesto_nombre': usuario.puesto.nombre if usuario.puesto else None,
-                            'cambios': [],
-                            'total_cambios': 0,
-                            'sin_actividad': True
-                        }
-            
-            # Convertir a lista y ordenar por total de cambios
-            usuarios_lista = list(usuarios_dict.values())
-            usuarios_lista.sort(key=lambda x: x['total_cambios'], reverse=True)
-            
-            return JsonResponse({
-                'data': {
-                    'usuarios': usuarios_lista
-                },
-                'total': len(usuarios_lista)
-            })
-        elif report_type == 'reporte-general':
-            # Obtener filtros
-            periodo = request.GET.get('periodo', 'todo')
-            fecha_inicio = request.GET.get('fecha_inicio')
-            fecha_fin = request.GET.get('fecha_fin')
-            apartados = request.GET.get('apartados', '').split(',') if request.GET.get('apartados') else []
-            apartados = [a.strip() for a in apartados if a.strip()]
-            
-            # Si no hay apartados seleccionados, retornar vacío
-            if not apartados:
-                return JsonResponse({
-                    'data': {},
-                    'total': 0
-                })
-            
-            # Construir query base para actividades
-            actividades_query = Actividad.objects.filter(eliminado_en__isnull=True)
-            
-            # Filtrar por fecha según período
-            from django.utils import timezone
-            from datetime import timedelta
-            
-            if periodo == 'ultimo_mes':
-                fecha_inicio = (timezone.now() - timedelta(days=30)).date()
-                fecha_fin = timezone.now().date()
-            elif periodo == 'ultima_semana':
-                fecha_inicio = (timezone.now() - timedelta(days=7)).date()
-                fecha_fin = timezone.now().date()
-            elif periodo == 'rango' and fecha_inicio and fecha_fin:
-                try:
-                    fecha_inicio = datetime.strptime(fecha_inicio, '%Y-%m-%d').date()
-                    fecha_fin = datetime.strptime(fecha_fin, '%Y-%m-%d').date()
-                except:
-                    fecha_inicio = None
-                    fecha_fin = None
-            
-            if fecha_inicio:
-                actividades_query = actividades_query.filter(fecha__gte=fecha_inicio)
-            if fecha_fin:
-                actividades_query = actividades_query.filter(fecha__lte=fecha_fin)
-            
-            # Construir datos del reporte según apartados seleccionados
-            reporte_data = {}
-            
-            # Total de Eventos
-            if 'total_eventos' in apartados:
-                total_eventos = actividades_query.count()
-                lista_eventos = []
-                # Si se selecciona mostrar lista, obtener eventos
-                if 'total_eventos' in apartados:  # Siempre incluir lista si está seleccionado
-                    eventos_lista = actividades_query.select_related('tipo', 'comunidad', 'comunidad__region')[:100]
-                    for evento in eventos_lista:
-                        ben_count = ActividadBeneficiario.objects.filter(actividad_id=evento.id).count()
-                        lista_eventos.append({
-                            'nombre': evento.nombre,
-                            'tipo': evento.tipo.nombre if evento.tipo else '-',
-                            'estado': evento.get_estado_display() if hasattr(evento, 'get_estado_display') else evento.estado,
-                            'fecha': evento.fecha.strftime('%d/%m/%Y') if evento.fecha else '-',
-                            'comunidad': evento.comunidad.nombre if evento.comunidad else '-',
-                            'beneficiarios': ben_count
-                        })
-                reporte_data['total_eventos'] = {
-                    'total': total_eventos,
-                    'lista_eventos': lista_eventos
-                }
-            
-            # Total de Tipos de Eventos
-            if 'tipos_eventos' in apartados:
-                tipos_query = actividades_query.values('tipo__nombre').annotate(
-                    total=Count('id')
-                )
-                tipos_eventos = {
-                    'capacitacion': 0,
-                    'entrega': 0,
-                    'proyecto_ayuda': 0
-                }
-                for tipo in tipos_query:
-                    nombre = tipo['tipo__nombre'] or ''
-                    if 'capacitación' in nombre.lower() or 'capacitacion' in nombre.lower():
-                        tipos_eventos['capacitacion'] = tipo['total']
-                    elif 'entrega' in nombre.lower():
-                        tipos_eventos['entrega'] = tipo['total']
-                    elif 'proyecto' in nombre.lower() or 'ayuda' in nombre.lower():
-                        tipos_eventos['proyecto_ayuda'] = tipo['total']
-                reporte_data['tipos_eventos'] = tipos_eventos
-            
-            # Total de Beneficiarios Alcanzados
-            if 'total_beneficiarios' in apartados:
-                actividad_ids = actividades_query.values_list('id', flat=True)
-                total_benef = ActividadBeneficiario.objects.filter(
-                    actividad_id__in=actividad_ids
-                ).values('beneficiario_id').distinct().count()
-                reporte_data['total_beneficiarios'] = total_benef
-            
-            # Total de Tipos de Beneficiarios
-            if 'tipos_beneficiarios' in apartados:
-                actividad_ids = actividades_query.values_list('id', flat=True)
-                beneficiarios_query = ActividadBeneficiario.objects.filter(
-                    actividad_id__in=actividad_ids
-                ).select_related('beneficiario__tipo', 'beneficiario__individual', 'beneficiario__familia')
-                
-                tipos_benef = {
-                    'individual': 0,
-                    'familia': 0,
-                    'institucion': 0,
-                    'mujeres': 0,
-                    'hombres': 0
-                }
-                
-                beneficiarios_ids = beneficiarios_query.values_list('beneficiario_id', flat=True).distinct()
-                for benef_id in beneficiarios_ids:
-                    try:
-                        benef = Beneficiario.objects.select_related('tipo', 'individual', 'familia').get(id=benef_id)
-                        tipo_nombre = benef.tipo.nombre.lower() if benef.tipo else ''
-                        if 'individual' in tipo_nombre:
-                            tipos_benef['individual'] += 1
-                            # Contar género si es individual
-                            if hasattr(benef, 'individual') and benef.individual:
-                                genero = benef.individual.genero.lower() if benef.individual.genero else ''
-                                if 'femenino' in genero or 'mujer' in genero:
-                                    tipos_benef['mujeres'] += 1
-                                elif 'masculino' in genero or 'hombre' in genero:
-                                    tipos_benef['hombres'] += 1
-                        elif 'familia' in tipo_nombre:
-                            tipos_benef['familia'] += 1
-                        elif 'institución' in tipo_nombre or 'institucion' in tipo_nombre:
-                            tipos_benef['institucion'] += 1
-                    except Beneficiario.DoesNotExist:
-                        continue
-                
-                reporte_data['tipos_beneficiarios'] = tipos_benef
-            
-            # Total de Comunidades Alcanzadas
-            if 'total_comunidades' in apartados:
-                actividad_ids = actividades_query.values_list('id', flat=True)
-                comunidades_ids_list = list(actividades_query.values_list('comunidad_id', flat=True).distinct())
-                # También incluir comunidades relacionadas
-                comunidades_relacionadas_ids_list = list(ActividadComunidad.objects.filter(
-                    actividad_id__in=actividad_ids
-                ).values_list('comunidad_id', flat=True).distinct())
-                
-                # Combinar y obtener IDs únicos
-                todas_comunidades_ids = list(set([c for c in comunidades_ids_list if c] + [c for c in comunidades_relacionadas_ids_list if c]))
-                total_comunidades = len(todas_comunidades_ids)
-                
-                # Obtener información de las comunidades
-                comunidades_lista = []
-                for com_id in todas_comunidades_ids:
-                    try:
-                        comunidad = Comunidad.objects.select_related('region', 'tipo').get(id=com_id)
-                        # Contar eventos de esta comunidad
-                        eventos_count = actividades_query.filter(
-                            Q(comunidad_id=com_id) | 
-                            Q(comunidades_relacionadas__comunidad_id=com_id)
-                        ).distinct().count()
-                        
-                        # Contar beneficiarios de esta comunidad
-                        beneficiarios_count = Beneficiario.objects.filter(
-                            comunidad_id=com_id
-                        ).count()
-                        
-                        comunidades_lista.append({
-                            'nombre': comunidad.nombre,
-                            'cocode': comunidad.cocode or '-',
-                            'region': comunidad.region.nombre if comunidad.region else '-',
-                            'tipo': comunidad.tipo.nombre if comunidad.tipo else '-',
-                            'total_eventos': eventos_count,
-                            'total_beneficiarios': beneficiarios_count
-                        })
-                    except Comunidad.DoesNotExist:
-                        continue
-                
-                # Ordenar por nombre
-                comunidades_lista.sort(key=lambda x: x['nombre'])
-                
-                reporte_data['total_comunidades'] = {
-                    'total': total_comunidades,
-                    'lista_comunidades': comunidades_lista
-                }
-            
-            # Total de Avances en Proyectos
-            if 'total_avances' in apartados:
-                actividad_ids = actividades_query.values_list('id', flat=True)
-                total_avances = EventoCambioColaborador.objects.filter(
-                    actividad_id__in=actividad_ids
-                ).count()
-                reporte_data['total_avances'] = total_avances
-            
-            # Comunidades con Más Beneficiarios y Eventos
-            if 'comunidades_mas_beneficiarios' in apartados:
-                actividad_ids = actividades_query.values_list('id', flat=True)
-                comunidades_stats = {}
-                
-                # Obtener comunidades principales
-                for actividad in actividades_query.select_related('comunidad', 'comunidad__region'):
-                    if actividad.comunidad:
-                        com_id = str(actividad.comunidad.id)
-                        if com_id not in comunidades_stats:
-                            comunidades_stats[com_id] = {
-                                'nombre': actividad.comunidad.nombre,
-                                'region': actividad.comunidad.region.nombre if actividad.comunidad.region else '-',
-                                'total_eventos': 0,
-                                'total_beneficiarios': set()
-                            }
-                        comunidades_stats[com_id]['total_eventos'] += 1
-                
-                # Obtener comunidades relacionadas
-                actividades_comunidades = ActividadComunidad.objects.filter(
-                    actividad_id__in=actividad_ids
-                ).select_related('comunidad', 'comunidad__region')
-                
-                for ac in actividades_comunidades:
-                    if ac.comunidad:
-                        com_id = str(ac.comunidad.id)
-                        if com_id not in comunidades_stats:
-                            comunidades_stats[com_id] = {
-                                'nombre': ac.comunidad.nombre,
-                                'region': ac.comunidad.region.nombre if ac.comunidad.region else '-',
-                                'total_eventos': 0,
-                                'total_beneficiarios': set()
-                            }
-                        comunidades_stats[com_id]['total_eventos'] += 1
-                
-                # Contar beneficiarios por comunidad
-                for actividad_id in actividad_ids:
-                    ben_ids = ActividadBeneficiario.objects.filter(
-                        actividad_id=actividad_id
-                    ).values_list('beneficiario_id', flat=True)
-                    
-                    # Obtener comunidad de cada beneficiario
-                    for ben_id in ben_ids:
-                        try:
-                            ben = Beneficiario.objects.select_related('comunidad').get(id=ben_id)
-                            if ben.comunidad:
-                                com_id = str(ben.comunidad.id)
-                                if com_id in comunidades_stats:
-                                    comunidades_stats[com_id]['total_beneficiarios'].add(ben_id)
-                        except Beneficiario.DoesNotExist:
-                            continue
-                
-                # Convertir a lista y ordenar
-                comunidades_list = []
-                for com_id, stats in comunidades_stats.items():
-                    comunidades_list.append({
-                        'nombre': stats['nombre'],
-                        'region': stats['region'],
-                        'total_beneficiarios': len(stats['total_beneficiarios']),
-                        'total_eventos': stats['total_eventos']
-                    })
-                
-                comunidades_list.sort(key=lambda x: (x['total_beneficiarios'], x['total_eventos']), reverse=True)
-                reporte_data['comunidades_mas_beneficiarios'] = comunidades_list[:10]  # Top 10
-            
-            # Eventos con Más Beneficiarios
-            if 'eventos_mas_beneficiarios' in apartados:
-                eventos_stats = []
-                for actividad in actividades_query.select_related('tipo', 'comunidad')[:100]:
-                    ben_count = ActividadBeneficiario.objects.filter(actividad_id=actividad.id).count()
-                    eventos_stats.append({
-                        'nombre': actividad.nombre,
-                        'tipo': actividad.tipo.nombre if actividad.tipo else '-',
-                        'estado': actividad.get_estado_display() if hasattr(actividad, 'get_estado_display') else actividad.estado,
-                        'total_beneficiarios': ben_count,
-                        'comunidad': actividad.comunidad.nombre if actividad.comunidad else '-'
-                    })
-                
-                eventos_stats.sort(key=lambda x: x['total_beneficiarios'], reverse=True)
-                reporte_data['eventos_mas_beneficiarios'] = eventos_stats[:10]  # Top 10
-            
-            # Evento con Más Avances y Cambios
-            if 'evento_mas_avances' in apartados:
-                actividad_ids = actividades_query.values_list('id', flat=True)
-                eventos_avances = {}
-                
-                for cambio in EventoCambioColaborador.objects.filter(actividad_id__in=actividad_ids).select_related('actividad', 'actividad__tipo', 'actividad__comunidad'):
-                    act_id = str(cambio.actividad.id)
-                    if act_id not in eventos_avances:
-                        eventos_avances[act_id] = {
-                            'nombre': cambio.actividad.nombre,
-                            'tipo': cambio.actividad.tipo.nombre if cambio.actividad.tipo else '-',
-                            'estado': cambio.actividad.get_estado_display() if hasattr(cambio.actividad, 'get_estado_display') else cambio.actividad.estado,
-                            'comunidad': cambio.actividad.comunidad.nombre if cambio.actividad.comunidad else '-',
-                            'total_avances': 0
-                        }
-                    eventos_avances[act_id]['total_avances'] += 1
-                
-                if eventos_avances:
-                    evento_mas_avances = max(eventos_avances.values(), key=lambda x: x['total_avances'])
-                    reporte_data['evento_mas_avances'] = evento_mas_avances
-                else:
-                    reporte_data['evento_mas_avances'] = {}
-            
-            return JsonResponse({
-                'data': reporte_data,
-                'total': len(apartados)
-            })
-        
-        else:
-            # Reporte genérico: lista de actividades
-            actividades = actividades_query.select_related(
-                'comunidad', 'comunidad__region', 'tipo', 'responsable'
-            )[:100]  # Limitar a 100 resultados
-            
-            data = [
-                {
-                    'nombre': act.nombre,
-                    'fecha': act.fecha.strftime('%Y-%m-%d') if act.fecha else '-',
-                    'estado': act.estado,
-                    'tipo': act.tipo.nombre if act.tipo else '-',
-                    'comunidad': act.comunidad.nombre if act.comunidad else '-',
-                    'region': act.comunidad.region.nombre if act.comunidad and act.comunidad.region else '-',
-                    'responsable': act.responsable.username if act.responsable else '-'
-                }
-                for act in actividades
-            ]
-        
+        import traceback
+        traceback.print_exc()
         return JsonResponse({
-            'data': data,
-            'total': len(data)
-        })
+            'success': False,
+            'error': f'Error al eliminar colaborador: {str(e)}'
+        }, status=500)
+@respuesta_cacheada('dashboard_stats')
+def api_dashboard_stats(request):
+    """API para obtener estadísticas del dashboard ejecutivo"""
+    try:
+        from .dashboard_stats import calcular_estadisticas_dashboard
+
+        return JsonResponse(calcular_estadisticas_dashboard())
         
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({
+            'error': f'Error al obtener estadísticas: {str(e)}'
+        }, status=500)
+@solo_administrador
+def api_generar_reporte(request, report_type):
+    """API para generar reporte según tipo (los datos salen de report_queries)"""
+    try:
+        from .report_queries import ReporteError, filtros_desde_querydict, generar_reporte
+
+        filtros = filtros_desde_querydict(request.GET)
+        try:
+            resultado = generar_reporte(report_type, filtros)
+        except ReporteError as e:
+            return JsonResponse({'error': e.mensaje}, status=e.status)
+        return JsonResponse(resultado)
+
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -14004,6 +10849,24 @@ def api_generar_reporte(request, report_type):
         }, status=500)
 
 
+def _respuesta_reporte_cacheado(entrada):
+    """Respuesta de descarga para un archivo de reporte tomado de la caché en disco"""
+    from django.http import FileResponse
+
+    response = FileResponse(
+        open(entrada['ruta'], 'rb'),
+        as_attachment=True,
+        filename=entrada['archivo_nombre'],
+        content_type=entrada['content_type'],
+    )
+    response['X-Content-Type-Options'] = 'nosniff'
+    response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    response['Pragma'] = 'no-cache'
+    response['Expires'] = '0'
+    response['X-Reporte-Cache'] = 'HIT'
+    return response
+
+
 @permiso_generar_reportes
 def api_exportar_reporte(request, report_type):
     """API para exportar reporte en PDF o Word"""
@@ -14046,156 +10909,76 @@ def api_exportar_reporte(request, report_type):
             return JsonResponse({
                 'error': 'Formato no válido. Use "pdf" o "word"'
             }, status=400)
+
+        # Los datos de reportes son exclusivos de administradores (igual que api_generar_reporte).
+        # Se valida antes de consultar la caché para no entregar a otro rol un archivo ya generado
+        usuario_maga = get_usuario_maga(request.user)
+        if not usuario_maga or usuario_maga.rol != 'admin':
+            logger.warning(
+                "Exportación de reporte denegada: usuario=%s, tipo=%s",
+                user_label,
+                report_type,
+            )
+            return JsonResponse({
+                'error': 'Solo los administradores pueden generar reportes'
+            }, status=403)
+
+        # Si ya se generó este mismo reporte con los mismos datos, servir el archivo guardado
+        from . import report_cache
+        clave_cache = report_cache.clave_reporte('reporte', report_type, formato, query_params)
+        entrada_cache = report_cache.obtener(clave_cache)
+        if entrada_cache:
+            logger.info(
+                "Reporte servido desde caché: usuario=%s, tipo=%s, formato=%s, archivo=%s",
+                user_label,
+                report_type,
+                formato,
+                entrada_cache['archivo_nombre'],
+            )
+            return _respuesta_reporte_cacheado(entrada_cache)
         
-        # Obtener los mismos filtros que usa api_generar_reporte
-        # Reutilizar la lógica de generación de datos
-        fecha_inicio = request.GET.get('fecha_inicio')
-        fecha_fin = request.GET.get('fecha_fin')
-        region_ids = request.GET.get('region', '').split(',') if request.GET.get('region') else []
-        comunidad_ids = request.GET.get('comunidad', '').split(',') if request.GET.get('comunidad') else []
-        estados = request.GET.get('estado', '').split(',') if request.GET.get('estado') else []
-        tipo_actividad_param = request.GET.get('tipo_actividad', None)
-        if tipo_actividad_param is None or tipo_actividad_param == '' or tipo_actividad_param.strip() == '':
-            tipo_actividad = []
-        else:
-            tipo_actividad = [t.strip() for t in tipo_actividad_param.split(',') if t and t.strip() and t.strip() != '']
-        responsable_id = request.GET.get('responsable')
-        tipo_beneficiario_param = request.GET.get('tipo_beneficiario', '')
-        tipo_beneficiario = [t.strip() for t in tipo_beneficiario_param.split(',') if t.strip()] if tipo_beneficiario_param else []
-        
-        # Nuevos filtros para reportes unificados
-        agrupar_por = request.GET.get('agrupar_por', 'region')
-        comunidades_filtro_param = request.GET.get('comunidades', '')
-        comunidades_filtro = [c.strip() for c in comunidades_filtro_param.split(',') if c.strip()] if comunidades_filtro_param else []
-        evento_filtro_param = request.GET.get('evento', '')
-        evento_filtro = [e.strip() for e in evento_filtro_param.split(',') if e.strip()] if evento_filtro_param else []
-        
-        # Construir información de filtros para el reporte
-        filters_info_parts = []
-        if fecha_inicio:
-            filters_info_parts.append(f'Desde: {fecha_inicio}')
-        if fecha_fin:
-            filters_info_parts.append(f'Hasta: {fecha_fin}')
-        if estados:
-            filters_info_parts.append(f'Estados: {", ".join(estados)}')
-        if tipo_actividad:
-            filters_info_parts.append(f'Tipos: {", ".join(tipo_actividad)}')
-        if comunidades_filtro:
-            filters_info_parts.append(f'Comunidades: {len(comunidades_filtro)} seleccionadas')
-        if evento_filtro:
-            filters_info_parts.append(f'Eventos: {len(evento_filtro)} seleccionados')
-        
-        filters_info = ' | '.join(filters_info_parts) if filters_info_parts else 'Sin filtros aplicados'
-        
-        # Generar datos del reporte llamando directamente a api_generar_reporte
+        # Los datos se generan con la misma capa de consultas que usa api_generar_reporte
+        from django.core.serializers.json import DjangoJSONEncoder
+        from .report_queries import ReporteError, descripcion_filtros, filtros_desde_querydict, generar_reporte
+
+        filtros = filtros_desde_querydict(request.GET)
+        filters_info = descripcion_filtros(filtros)
+
         try:
-            # Llamar a api_generar_reporte con la misma request
-            report_response = api_generar_reporte(request, report_type)
-            
-            # Verificar si la respuesta es exitosa
-            if not hasattr(report_response, 'status_code'):
-                logger.error(
-                    "Respuesta inválida al generar datos previos del reporte: usuario=%s, tipo=%s",
-                    user_label,
-                    report_type,
-                )
-                return JsonResponse({
-                    'error': 'Error: respuesta inválida del servidor'
-                }, status=500)
-                
-            if report_response.status_code != 200:
-                # Intentar obtener el mensaje de error del response
-                try:
-                    import json
-                    error_data = json.loads(report_response.content.decode('utf-8'))
-                    error_msg = error_data.get('error', 'Error al generar datos del reporte')
-                except:
-                    error_msg = 'Error al generar datos del reporte'
-                logger.error(
-                    "Error HTTP al generar datos del reporte: usuario=%s, tipo=%s, detalle=%s",
-                    user_label,
-                    report_type,
-                    error_msg,
-                )
-                return JsonResponse({
-                    'error': error_msg
-                }, status=500)
-            
-            # Obtener los datos del JSON response
-            import json
             try:
-                if hasattr(report_response, 'content'):
-                    content = report_response.content
-                    if isinstance(content, bytes):
-                        content = content.decode('utf-8')
-                    report_data_dict = json.loads(content)
-                else:
-                    logger.error(
-                        "No se pudo obtener el contenido de la respuesta del reporte: usuario=%s, tipo=%s",
-                        user_label,
-                        report_type,
-                    )
-                    return JsonResponse({
-                        'error': 'Error: no se pudo obtener el contenido de la respuesta'
-                    }, status=500)
-            except json.JSONDecodeError as e:
-                logger.exception(
-                    "Error al decodificar JSON del reporte: usuario=%s, tipo=%s",
-                    user_label,
-                    report_type,
-                )
-                return JsonResponse({
-                    'error': f'Error al decodificar respuesta JSON: {str(e)}'
-                }, status=500)
-            
-            if 'error' in report_data_dict:
+                resultado = generar_reporte(report_type, filtros)
+            except ReporteError as e:
                 logger.error(
                     "La generación de datos del reporte devolvió un error: usuario=%s, tipo=%s, detalle=%s",
                     user_label,
                     report_type,
-                    report_data_dict['error'],
+                    e.mensaje,
                 )
                 return JsonResponse({
-                    'error': report_data_dict['error']
-                }, status=500)
-            
-            # Extraer los datos según el tipo de reporte
-            if 'data' in report_data_dict:
-                report_data = report_data_dict['data']
-                # Validar que report_data no sea None
-                if report_data is None:
-                    report_data = []
-            else:
-                report_data = report_data_dict
-            
-            # Para evento individual, asegurar que la estructura sea correcta
-            if report_type == 'reporte-evento-individual':
-                print(f'🔵 reporte-evento-individual: report_data keys: {list(report_data.keys()) if isinstance(report_data, dict) else "No es dict"}')
-                # Si report_data es {'evento': {...}}, está bien
-                # Si report_data es directamente el evento, envolverlo
-                if isinstance(report_data, dict) and 'evento' not in report_data and 'nombre' in report_data:
-                    # Es el evento directamente, envolverlo
-                    report_data = {'evento': report_data}
-                    print(f'🔵 Envuelto evento en estructura correcta')
-            
+                    'error': e.mensaje
+                }, status=e.status)
+
+            # Mismos tipos que recibe el frontend (UUID, fechas y decimales como texto)
+            report_data = json.loads(json.dumps(resultado, cls=DjangoJSONEncoder)).get('data')
+
             # Para comunidades, extraer la lista de comunidades del objeto
             if report_type == 'comunidades':
                 if isinstance(report_data, dict) and 'comunidades' in report_data:
                     report_data = report_data['comunidades']
                 elif not isinstance(report_data, list):
                     report_data = []
-            
+
             # Para actividad-usuarios, extraer la lista de usuarios del objeto
             if report_type == 'actividad-usuarios':
                 if isinstance(report_data, dict) and 'usuarios' in report_data:
                     report_data = report_data['usuarios']
                 elif not isinstance(report_data, list):
                     report_data = []
-                
+
             # Validar que tenemos datos válidos
             if report_data is None:
                 report_data = []
-                
+
         except Exception as e:
             import traceback
             logger.exception(
@@ -14261,6 +11044,8 @@ def api_exportar_reporte(request, report_type):
             except Exception:
                 records_count = None
 
+            report_cache.guardar(clave_cache, response_content, filename, content_type, records_count)
+
             logger.info(
                 "Reporte exportado exitosamente: usuario=%s, tipo=%s, formato=%s, registros=%s, tamaño=%s bytes, archivo=%s",
                 user_label,
@@ -14298,6 +11083,207 @@ def api_exportar_reporte(request, report_type):
             'error': f'Error al exportar reporte: {str(e)}'
         }, status=500)
 
+
+# =====================================================
+# EXPORTACIÓN DE REPORTES EN SEGUNDO PLANO
+# =====================================================
+
+# Máximo de exportaciones pendientes/en proceso por usuario
+MAX_EXPORTACIONES_ACTIVAS_POR_USUARIO = 5
+
+
+def _validar_nueva_exportacion(usuario_maga, formato):
+    """Valida formato y límite de trabajos activos. Retorna un JsonResponse de error o None."""
+    if formato not in ['pdf', 'word']:
+        return JsonResponse({
+            'success': False,
+            'error': 'Formato no válido. Use "pdf" o "word"'
+        }, status=400)
+
+    activas = ExportacionReporte.objects.filter(
+        usuario=usuario_maga,
+        estado__in=['pendiente', 'procesando']
+    ).count()
+    if activas >= MAX_EXPORTACIONES_ACTIVAS_POR_USUARIO:
+        return JsonResponse({
+            'success': False,
+            'error': 'Ya tienes varias exportaciones en proceso. Espera a que finalicen e intenta de nuevo.'
+        }, status=429)
+
+    return None
+
+
+def _completar_exportacion_desde_cache(trabajo, tipo_exportacion, report_type, formato, parametros):
+    """Si el archivo ya está en la caché de reportes, completa el trabajo sin esperar al worker"""
+    from . import report_cache
+    from .report_jobs import completar_desde_cache
+
+    try:
+        entrada = report_cache.obtener(
+            report_cache.clave_reporte(tipo_exportacion, report_type, formato, parametros)
+        )
+        if entrada:
+            completar_desde_cache(trabajo, entrada)
+    except Exception as e:
+        # El worker generará el archivo normalmente
+        logger.warning("No se pudo usar la caché de reportes para la exportación %s: %s", trabajo.id, e)
+
+
+@login_required
+@require_http_methods(["POST"])
+def api_encolar_exportacion_reporte(request, report_type):
+    """Registra la exportación de un reporte (PDF/Word) para procesarla en segundo plano"""
+    from .report_jobs import encolar_exportacion, parametros_desde_querydict, serializar_exportacion
+
+    usuario_maga = get_usuario_maga(request.user)
+    if not usuario_maga:
+        return JsonResponse({'success': False, 'error': 'Usuario no encontrado'}, status=401)
+
+    # La generación de datos de reportes (api_generar_reporte) está restringida a administradores
+    if usuario_maga.rol != 'admin':
+        return JsonResponse({
+            'success': False,
+            'error': 'Solo los administradores pueden exportar este reporte'
+        }, status=403)
+
+    formato = request.GET.get('formato', 'pdf').lower()
+    error_response = _validar_nueva_exportacion(usuario_maga, formato)
+    if error_response:
+        return error_response
+
+    parametros = parametros_desde_querydict(request.GET)
+    trabajo = encolar_exportacion(
+        usuario_maga,
+        'reporte',
+        formato,
+        parametros,
+        report_type=report_type,
+    )
+    _completar_exportacion_desde_cache(trabajo, 'reporte', report_type, formato, parametros)
+
+    logger.info(
+        "Exportación de reporte encolada: usuario=%s, tipo=%s, formato=%s, id=%s",
+        usuario_maga.username,
+        report_type,
+        formato,
+        trabajo.id,
+    )
+
+    return JsonResponse({
+        'success': True,
+        'exportacion': serializar_exportacion(trabajo),
+    }, status=202)
+
+
+@login_required
+@require_http_methods(["POST"])
+def api_encolar_exportacion_beneficiarios(request):
+    """Registra la exportación del reporte de beneficiarios para procesarla en segundo plano"""
+    from .report_jobs import encolar_exportacion, parametros_desde_querydict, serializar_exportacion
+
+    usuario_maga = get_usuario_maga(request.user)
+    if not usuario_maga:
+        return JsonResponse({'success': False, 'error': 'Usuario no encontrado'}, status=401)
+
+    formato = request.GET.get('formato', 'pdf').lower()
+    error_response = _validar_nueva_exportacion(usuario_maga, formato)
+    if error_response:
+        return error_response
+
+    include_estadisticas = request.GET.get('include_estadisticas', '1') == '1'
+    include_listado = request.GET.get('include_listado', '1') == '1'
+    if not include_estadisticas and not include_listado:
+        return JsonResponse({
+            'success': False,
+            'error': 'Debe seleccionar al menos una sección para exportar'
+        }, status=400)
+
+    parametros = parametros_desde_querydict(request.GET)
+    trabajo = encolar_exportacion(
+        usuario_maga,
+        'beneficiarios',
+        formato,
+        parametros,
+    )
+    _completar_exportacion_desde_cache(trabajo, 'beneficiarios', None, formato, parametros)
+
+    logger.info(
+        "Exportación de beneficiarios encolada: usuario=%s, formato=%s, id=%s",
+        usuario_maga.username,
+        formato,
+        trabajo.id,
+    )
+
+    return JsonResponse({
+        'success': True,
+        'exportacion': serializar_exportacion(trabajo),
+    }, status=202)
+
+
+def _obtener_exportacion_usuario(request, exportacion_id):
+    """Obtiene la exportación si pertenece al usuario (o si es administrador)"""
+    usuario_maga = get_usuario_maga(request.user)
+    if not usuario_maga:
+        return None
+    trabajo = ExportacionReporte.objects.filter(id=exportacion_id).select_related('usuario').first()
+    if trabajo is None:
+        return None
+    if trabajo.usuario_id != usuario_maga.id and usuario_maga.rol != 'admin':
+        return None
+    return trabajo
+
+
+@login_required
+@require_http_methods(["GET"])
+def api_estado_exportacion(request, exportacion_id):
+    """Consulta el estado de una exportación en segundo plano"""
+    from .report_jobs import serializar_exportacion
+
+    trabajo = _obtener_exportacion_usuario(request, exportacion_id)
+    if trabajo is None:
+        return JsonResponse({'success': False, 'error': 'Exportación no encontrada'}, status=404)
+
+    return JsonResponse({
+        'success': True,
+        'exportacion': serializar_exportacion(trabajo),
+    })
+
+
+@login_required
+@require_http_methods(["GET"])
+def api_descargar_exportacion(request, exportacion_id):
+    """Descarga el archivo generado por una exportación completada"""
+    from django.http import FileResponse
+    from .report_jobs import ruta_absoluta_exportacion
+
+    trabajo = _obtener_exportacion_usuario(request, exportacion_id)
+    if trabajo is None:
+        return JsonResponse({'success': False, 'error': 'Exportación no encontrada'}, status=404)
+
+    if trabajo.estado != 'completado':
+        return JsonResponse({
+            'success': False,
+            'error': 'La exportación aún no está lista',
+            'estado': trabajo.estado,
+        }, status=409)
+
+    ruta = ruta_absoluta_exportacion(trabajo)
+    if not ruta:
+        return JsonResponse({
+            'success': False,
+            'error': 'El archivo de la exportación ya no está disponible'
+        }, status=410)
+
+    response = FileResponse(
+        open(ruta, 'rb'),
+        as_attachment=True,
+        filename=trabajo.archivo_nombre or os.path.basename(ruta),
+        content_type=trabajo.archivo_tipo or 'application/octet-stream',
+    )
+    response['X-Content-Type-Options'] = 'nosniff'
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
 def api_actualizar_comunidad_datos(request, comunidad_id):
     """API: Actualizar datos generales y tarjetas personalizadas de una comunidad."""
     try:
@@ -14588,40 +11574,22 @@ def api_agregar_imagen_comunidad(request, comunidad_id):
     if not imagen.content_type or not imagen.content_type.startswith('image/'):
         return JsonResponse({'success': False, 'error': 'El archivo debe ser una imagen válida'}, status=400)
 
-    # COMPRIMIR IMAGEN automáticamente
-    if getattr(settings, 'COMPRESS_IMAGES', True):
-        from .image_compression import compress_if_needed, get_compression_settings
-        compression_settings = get_compression_settings('gallery')
-        imagen = compress_if_needed(imagen, **compression_settings)
-
     descripcion = (request.POST.get('descripcion') or '').strip()
 
-    galeria_dir = os.path.join(str(settings.MEDIA_ROOT), 'comunidades_galeria')
-    os.makedirs(galeria_dir, exist_ok=True)
-    
     print(f"📤 Subiendo imagen a comunidad {comunidad_id}")
-    print(f"📁 Directorio: {galeria_dir}")
     print(f"✅ Archivo recibido: {imagen.name}, tamaño: {imagen.size}, tipo: {imagen.content_type}")
     
-    # Verificar permisos de escritura
-    if not os.access(galeria_dir, os.W_OK):
-        print(f"❌ No hay permisos de escritura en {galeria_dir}")
-        return JsonResponse({'success': False, 'error': f'No se tienen permisos de escritura en {galeria_dir}'}, status=500)
-
-    fs = FileSystemStorage(location=galeria_dir)
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S%f')
     extension = os.path.splitext(imagen.name)[1]
-    filename = f"{timestamp}_{comunidad_id}{extension}"
-    print(f"💾 Intentando guardar archivo: {filename}")
+    print(f"💾 Intentando guardar archivo: {imagen.name}")
     try:
-        saved_name = fs.save(filename, imagen)
+        saved_name = almacen_archivos.guardar(imagen, extension)
         print(f"✅ Archivo guardado exitosamente: {saved_name}")
     except Exception as e:
         import traceback
         print(f"❌ Error al guardar archivo: {str(e)}")
         print(f"📋 Traceback:\n{traceback.format_exc()}")
         raise
-    file_url = f"/media/comunidades_galeria/{saved_name}"
+    file_url = f"/media/{saved_name}"
 
     foto = ComunidadGaleria.objects.create(
         comunidad=comunidad,
@@ -14631,6 +11599,9 @@ def api_agregar_imagen_comunidad(request, comunidad_id):
         creado_por=usuario_maga,
     )
 
+    # Comprimir y generar miniaturas en segundo plano (procesar_imagenes)
+    imagenes_diferidas.programar_procesamiento(ComunidadGaleria, foto.id, file_url, imagen, 'gallery')
+
     comunidad.actualizado_en = timezone.now()
     comunidad.save(update_fields=['actualizado_en'])
 
@@ -14674,27 +11645,7 @@ def api_eliminar_imagen_comunidad(request, comunidad_id, imagen_id):
     except ComunidadGaleria.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'Imagen no encontrada'}, status=404)
 
-    ruta = foto.url_almacenamiento or ''
-    ruta_media = (settings.MEDIA_URL or '/media/').rstrip('/')
-    if ruta.startswith(ruta_media):
-        relative_path = ruta[len(ruta_media):].lstrip('/')
-    elif ruta.startswith('/'):
-        ruta_sin_slash = ruta.lstrip('/')
-        media_prefix = ruta_media.lstrip('/')
-        if ruta_sin_slash.startswith(media_prefix):
-            relative_path = ruta_sin_slash[len(media_prefix):].lstrip('/')
-        else:
-            relative_path = ruta_sin_slash
-    else:
-        relative_path = ruta
-
-    if relative_path:
-        file_path = os.path.join(str(settings.MEDIA_ROOT), relative_path.replace('/', os.sep))
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except OSError:
-                pass
+    _eliminar_archivo_media(foto.url_almacenamiento)
 
     foto.delete()
 
@@ -14795,25 +11746,26 @@ def api_agregar_archivo_comunidad(request, comunidad_id):
     descripcion = (request.POST.get('descripcion') or '').strip()
 
     extension = os.path.splitext(archivo.name)[1].lower()
-    if not nombre:
-        nombre = os.path.splitext(archivo.name)[0]
-    archivo_tipo = extension.replace('.', '') if extension else (archivo.content_type or 'archivo')
+    relative_path = almacen_archivos.guardar(archivo, extension)
+    _comunidad_archivo, respuesta = _crear_archivo_comunidad(
+        request, comunidad, usuario_maga, relative_path, archivo.name, archivo.content_type, nombre, descripcion
+    )
+    return JsonResponse(respuesta)
 
-    archivos_dir = os.path.join(str(settings.MEDIA_ROOT), 'comunidades_archivos')
-    os.makedirs(archivos_dir, exist_ok=True)
 
-    fs = FileSystemStorage(location=archivos_dir)
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S%f')
-    filename = f"{timestamp}_{comunidad_id}{extension}"
-    saved_name = fs.save(filename, archivo)
+def _crear_archivo_comunidad(request, comunidad, usuario_maga, relative_path, archivo_nombre, content_type, nombre, descripcion):
+    """Crea el ComunidadArchivo de un archivo ya guardado en el almacén; retorna (registro, respuesta)"""
+    extension = os.path.splitext(archivo_nombre)[1].lower()
+    if not nombre:
+        nombre = os.path.splitext(archivo_nombre)[0]
+    archivo_tipo = extension.replace('.', '') if extension else (content_type or 'archivo')
 
-    relative_path = f"comunidades_archivos/{saved_name}"
     media_url = (settings.MEDIA_URL or '/media/').rstrip('/')
     file_url = f"{media_url}/{relative_path}"
     if not file_url.startswith('/'):
         file_url = f"/{file_url}"
 
-    ComunidadArchivo.objects.create(
+    comunidad_archivo = ComunidadArchivo.objects.create(
         comunidad=comunidad,
         nombre_archivo=nombre,
         archivo_tipo=archivo_tipo,
@@ -14832,18 +11784,151 @@ def api_agregar_archivo_comunidad(request, comunidad_id):
             Prefetch('archivos', queryset=ComunidadArchivo.objects.order_by('-creado_en'), to_attr='archivos_api'),
             Prefetch('autoridades', queryset=ComunidadAutoridad.objects.filter(activo=True).order_by('nombre'), to_attr='autoridades_api'),
         )
-        .get(id=comunidad_id, activo=True)
+        .get(id=comunidad.id, activo=True)
     )
 
     payload_actualizado = _serialize_comunidad_detalle(comunidad_actualizada, request)
 
-    return JsonResponse(
-        {
-            'success': True,
-            'message': 'Archivo agregado exitosamente',
-            'comunidad': payload_actualizado,
-        }
-    )
+    return comunidad_archivo, {
+        'success': True,
+        'message': 'Archivo agregado exitosamente',
+        'comunidad': payload_actualizado,
+    }
+
+
+def _objeto_destino_subida(destino, objeto_id):
+    """Evento, región o comunidad al que se adjunta una subida por partes (None si no existe)"""
+    if destino == 'evento':
+        return Actividad.objects.filter(id=objeto_id, eliminado_en__isnull=True).first()
+    if destino == 'region':
+        return Region.objects.filter(id=objeto_id).first()
+    if destino == 'comunidad':
+        return Comunidad.objects.filter(id=objeto_id, activo=True).first()
+    return None
+
+
+def _crear_archivo_desde_subida(request, usuario_maga, subida, relative_path):
+    """Crea el registro de archivo de una subida por partes completa; retorna (id, respuesta)"""
+    objeto = _objeto_destino_subida(subida.destino, subida.objeto_id)
+    if objeto is None:
+        raise subidas_por_partes.SubidaInvalida('El destino de la subida ya no existe', status=404)
+
+    if subida.destino == 'evento':
+        registro, respuesta = _crear_archivo_evento(
+            objeto, usuario_maga, relative_path, subida.archivo_nombre, subida.archivo_tipo,
+            subida.tamanio_total, subida.descripcion or ''
+        )
+    elif subida.destino == 'region':
+        registro, respuesta = _crear_archivo_region(
+            objeto, usuario_maga, relative_path, subida.archivo_nombre, subida.archivo_tipo,
+            subida.nombre or '', subida.descripcion or ''
+        )
+    else:
+        registro, respuesta = _crear_archivo_comunidad(
+            request, objeto, usuario_maga, relative_path, subida.archivo_nombre, subida.archivo_tipo,
+            subida.nombre or '', subida.descripcion or ''
+        )
+    return registro.id, respuesta
+
+
+@require_http_methods(["POST"])
+@permiso_admin_o_personal_api
+def api_subida_iniciar(request):
+    """
+    API: Inicia (o retoma) la subida por partes de un archivo de evento, región o comunidad.
+    Ver el protocolo en webmaga/subidas_por_partes.py.
+    """
+    usuario_maga = get_usuario_maga(request.user)
+    data = _parse_request_data(request)
+
+    destino = (data.get('destino') or '').strip()
+    if destino not in dict(SubidaArchivo.DESTINO_CHOICES):
+        return JsonResponse({'success': False, 'error': 'Destino no válido'}, status=400)
+    try:
+        objeto_id = uuid.UUID(str(data.get('objeto_id')))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'objeto_id debe ser un UUID'}, status=400)
+
+    if _objeto_destino_subida(destino, objeto_id) is None:
+        return JsonResponse({'success': False, 'error': 'Destino no encontrado'}, status=404)
+    if destino == 'evento' and usuario_maga.rol == 'personal' and not usuario_puede_gestionar_evento(usuario_maga, objeto_id):
+        return JsonResponse({
+            'success': False,
+            'error': 'No tienes permisos para gestionar este evento'
+        }, status=403)
+
+    try:
+        subida = subidas_por_partes.iniciar(
+            usuario_maga,
+            destino,
+            objeto_id,
+            data.get('archivo_nombre'),
+            data.get('tamanio'),
+            archivo_tipo=data.get('archivo_tipo'),
+            ultima_modificacion=data.get('ultima_modificacion'),
+            sha256=(data.get('sha256') or '').strip() or None,
+            nombre=(data.get('nombre') or '').strip(),
+            descripcion=(data.get('descripcion') or '').strip(),
+        )
+    except subidas_por_partes.SubidaInvalida as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=e.status)
+
+    return JsonResponse({'success': True, **subidas_por_partes.serializar_subida(subida)})
+
+
+@require_http_methods(["GET", "PUT", "DELETE"])
+@permiso_admin_o_personal_api
+def api_subida_parte(request, subida_id):
+    """
+    API: Estado (GET), envío de una parte (PUT) o cancelación (DELETE) de una subida por partes.
+    Al recibir el último byte se crea el registro del archivo y se responde como la subida en un POST.
+    """
+    usuario_maga = get_usuario_maga(request.user)
+    subida = SubidaArchivo.objects.filter(id=subida_id, usuario=usuario_maga).first()
+    if subida is None:
+        return JsonResponse({'success': False, 'error': 'Subida no encontrada'}, status=404)
+
+    try:
+        if request.method == 'GET':
+            return JsonResponse({'success': True, **subidas_por_partes.serializar_subida(subida)})
+
+        if request.method == 'DELETE':
+            subida = subidas_por_partes.cancelar(subida_id, usuario_maga)
+            return JsonResponse({'success': True, **subidas_por_partes.serializar_subida(subida)})
+
+        try:
+            longitud = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            longitud = 0
+        subida = subidas_por_partes.recibir_parte(
+            subida_id,
+            usuario_maga,
+            request,
+            request.headers.get('Content-Range'),
+            longitud,
+            checksum=request.headers.get('X-Checksum-Sha256'),
+        )
+        respuesta = None
+        if subida.estado == 'en_curso' and subida.recibido >= subida.tamanio_total:
+            subida, respuesta = subidas_por_partes.completar(
+                subida_id,
+                usuario_maga,
+                lambda subida_lista, relative_path: _crear_archivo_desde_subida(
+                    request, usuario_maga, subida_lista, relative_path
+                ),
+            )
+    except subidas_por_partes.SubidaInvalida as e:
+        if e.status == 404 and subida.estado == 'en_curso':
+            # El evento, la región o la comunidad se eliminó durante la subida
+            subidas_por_partes.cancelar(subida_id, usuario_maga)
+        subida.refresh_from_db()
+        return JsonResponse({
+            'success': False,
+            'error': str(e),
+            **subidas_por_partes.serializar_subida(subida),
+        }, status=e.status)
+
+    return JsonResponse({**(respuesta or {'success': True}), **subidas_por_partes.serializar_subida(subida)})
 
 
 @require_http_methods(["DELETE"])
@@ -14856,29 +11941,7 @@ def api_eliminar_archivo_comunidad(request, comunidad_id, archivo_id):
 
     comunidad = archivo.comunidad
 
-    ruta_url = archivo.url_almacenamiento or ''
-    media_url = (settings.MEDIA_URL or '/media/').rstrip('/')
-    relative_path = ''
-
-    if ruta_url.startswith(media_url):
-        relative_path = ruta_url[len(media_url):].lstrip('/')
-    elif ruta_url.startswith('/'):
-        ruta_sin_slash = ruta_url.lstrip('/')
-        media_prefix = media_url.lstrip('/')
-        if ruta_sin_slash.startswith(media_prefix):
-            relative_path = ruta_sin_slash[len(media_prefix):].lstrip('/')
-        else:
-            relative_path = ruta_sin_slash
-    else:
-        relative_path = ruta_url
-
-    if relative_path:
-        file_path = os.path.join(str(settings.MEDIA_ROOT), relative_path.replace('/', os.sep))
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except OSError:
-                pass
+    _eliminar_archivo_media(archivo.url_almacenamiento)
 
     archivo.delete()
 
@@ -14988,17 +12051,9 @@ def api_login(request):
                 'error': 'Usuario y contraseña son requeridos'
             }, status=400)
         
-        # Intentar autenticar
+        # Intentar autenticar (el backend busca por username o email en la misma consulta)
         user = authenticate(request, username=username_or_email, password=password)
         
-        # Si falla con username, intentar con email
-        if not user:
-            try:
-                usuario_maga = Usuario.objects.get(email=username_or_email)
-                user = authenticate(request, username=usuario_maga.username, password=password)
-            except Usuario.DoesNotExist:
-                pass
-        
         if not user:
             return JsonResponse({
                 'success': False,
@@ -15011,15 +12066,13 @@ def api_login(request):
                 'error': 'Esta cuenta está desactivada'
             }, status=403)
         
-        # Iniciar sesión
+        # Iniciar sesión (SessionMiddleware guarda la sesión al responder)
         auth_login(request, user)
         request.session.set_expiry(604800)  # 7 días
-        request.session.save()
         
-        # Obtener información del usuario
-        try:
-            usuario_maga = Usuario.objects.select_related('puesto').get(username=user.username)
-        except Usuario.DoesNotExist:
+        # Obtener información del usuario (ya resuelto por el backend de autenticación)
+        usuario_maga = get_usuario_maga(user)
+        if not usuario_maga:
             return JsonResponse({
                 'success': False,
                 'error': 'Usuario no encontrado en el sistema'
@@ -15122,6 +12175,16 @@ def api_exportar_reporte_beneficiarios(request):
                 'error': 'Debe seleccionar al menos una sección para exportar'
             }, status=400)
         
+        # Si ya se generó este mismo reporte con los mismos datos, servir el archivo guardado
+        from . import report_cache
+        from .report_jobs import parametros_desde_querydict
+        clave_cache = report_cache.clave_reporte(
+            'beneficiarios', None, formato, parametros_desde_querydict(request.GET)
+        )
+        entrada_cache = report_cache.obtener(clave_cache)
+        if entrada_cache:
+            return _respuesta_reporte_cacheado(entrada_cache)
+        
         # Obtener filtros
         comunidades_ids = request.GET.get('comunidades', '').split(',') if request.GET.get('comunidades') else []
         comunidades_ids = [c.strip() for c in comunidades_ids if c.strip()]
@@ -15226,6 +12289,11 @@ def api_exportar_reporte_beneficiarios(request):
         response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
         response['Pragma'] = 'no-cache'
         response['Expires'] = '0'
+
+        report_cache.guardar(
+            clave_cache, response_content, filename, content_type,
+            len(beneficiarios_data) if beneficiarios_data else 0,
+        )
         
         logger.info(
             "Reporte de beneficiarios exportado exitosamente: usuario=%s, formato=%s, incluye_estadisticas=%s, incluye_listado=%s, beneficiarios=%s, tamaño=%s bytes",
@@ -13,6 +13,7 @@ from .decorators import (
     solo_administrador,
 )
 from .forms import LoginForm
+from .imagenes_diferidas import url_variante
 from .models import (
     Actividad,
     Comunidad,
@@ -72,18 +73,19 @@ def comunidades(request):
         '?ixlib=rb-4.0.3&auto=format&fit=crop&w=400&q=80'
     )
 
-    def asignar_imagen(comunidad, fallback_url):
+    def asignar_imagen(comunidad, fallback_url, tamano):
         galeria = getattr(comunidad, 'galeria_prefetch', None)
         if galeria:
-            comunidad.imagen_url = galeria[0].url_almacenamiento
+            comunidad.imagen_url = url_variante(galeria[0], tamano)
+            comunidad.imagen_url_webp = url_variante(galeria[0], f'{tamano}_webp')
         else:
             comunidad.imagen_url = fallback_url
 
     for comunidad in comunidades_list:
-        asignar_imagen(comunidad, default_image_small)
+        asignar_imagen(comunidad, default_image_small, 'thumbnail')
 
     for comunidad in ultimas_comunidades:
-        asignar_imagen(comunidad, default_image_large)
+        asignar_imagen(comunidad, default_image_large, 'medium')
 
     ultimas_ids = {str(comunidad.id) for comunidad in ultimas_comunidades}
     comunidades_secundarias = [
@@ -119,18 +121,20 @@ def regiones(request):
     for region in regiones_list:
         galeria = RegionGaleria.objects.filter(region=region).first()
         region.imagen_url = (
-            galeria.url_almacenamiento
+            url_variante(galeria, 'thumbnail')
             if galeria
             else 'https://images.unsplash.com/photo-1506905925346-21bda4d32df4?ixlib=rb-4.0.3&auto=format&fit=crop&w=400&q=80'
         )
+        region.imagen_url_webp = url_variante(galeria, 'thumbnail_webp') if galeria else None
 
     for region in ultimas_regiones:
         galeria = RegionGaleria.objects.filter(region=region).first()
         region.imagen_url = (
-            galeria.url_almacenamiento
+            url_variante(galeria, 'medium')
             if galeria
             else 'https://images.unsplash.com/photo-1506905925346-21bda4d32df4?ixlib=rb-4.0.3&auto=format&fit=crop&w=800&q=80'
         )
+        region.imagen_url_webp = url_variante(galeria, 'medium_webp') if galeria else None
 
     context = {
         'regiones': regiones_list,
@@ -236,9 +240,7 @@ def login_view(request):
             # La configuración SESSION_EXPIRE_AT_BROWSER_CLOSE = False en settings.py
             # asegura que la sesión no se cierre al cerrar el navegador
             request.session.set_expiry(604800)  # Una semana en segundos
-            
-            # Forzar que la sesión se guarde inmediatamente para asegurar que la cookie se establezca
-            request.session.save()
+            # auth_login ya creó la sesión (session_key existe); SessionMiddleware la guarda al responder
             
             # Asegurar que la cookie de sesión tenga una fecha de expiración explícita
             # Esto es crítico para Android donde las cookies de sesión pueden eliminarse
@@ -1,13 +1,10 @@
-from datetime import datetime
 import os
 import re
 
 from django.conf import settings
-from django.core.files.storage import FileSystemStorage
-from django.db.models import F, Value
-from django.db.models.functions import Coalesce, Replace
 from django.utils import timezone
 
+from . import almacen_archivos
 from .models import (
     Actividad,
     ActividadBeneficiario,
@@ -32,12 +29,13 @@ def normalizar_dpi(valor):
     return re.sub(r'\D', '', str(valor))
 
 
-def _expresion_dpi_normalizado(field_name):
-    """Construye una expresión que elimina caracteres comunes en el DPI."""
-    expr = Coalesce(F(field_name), Value(''))
-    for caracter in (' ', '-', '_', '/', '.', '\t', '\u00a0'):
-        expr = Replace(expr, Value(caracter), Value(''))
-    return expr
+# Máximo de DPIs que acepta la verificación masiva en una petición
+MAX_DPIS_POR_CONSULTA = 5000
+
+
+def _campo_dpi_normalizado(field_name):
+    """Columna indexada con los dígitos del DPI (dpi -> dpi_normalizado, mantenida por trigger)."""
+    return f'{field_name}_normalizado'
 
 
 def buscar_conflicto_dpi(queryset, field_name, valor, beneficiario_excluir=None):
@@ -49,14 +47,32 @@ def buscar_conflicto_dpi(queryset, field_name, valor, beneficiario_excluir=None)
     if not valor_normalizado:
         return None
 
-    expr = _expresion_dpi_normalizado(field_name)
-    qs = queryset.filter(beneficiario__activo=True).annotate(
-        _dpi_normalizado=expr
+    qs = queryset.filter(
+        beneficiario__activo=True,
+        **{_campo_dpi_normalizado(field_name): valor_normalizado},
     )
     if beneficiario_excluir is not None:
         qs = qs.exclude(beneficiario=beneficiario_excluir)
 
-    return qs.filter(_dpi_normalizado=valor_normalizado).first()
+    return qs.first()
+
+
+def buscar_dpis_existentes(queryset, field_name, valores):
+    """
+    Versión masiva de buscar_conflicto_dpi: una sola consulta indexada para toda la lista.
+    Retorna un diccionario {dpi normalizado: instancia} con los DPIs que ya existen.
+    """
+    normalizados = {normalizar_dpi(valor) for valor in valores}
+    normalizados.discard('')
+    if not normalizados:
+        return {}
+
+    campo = _campo_dpi_normalizado(field_name)
+    qs = queryset.filter(beneficiario__activo=True, **{f'{campo}__in': normalizados})
+    existentes = {}
+    for registro in qs:
+        existentes.setdefault(getattr(registro, campo), registro)
+    return existentes
 
 
 def obtener_detalle_beneficiario(beneficiario):
@@ -354,28 +370,15 @@ def obtener_cambios_evento(evento):
     print(f'🔍 Buscando cambios (colaboradores) para evento {evento.id} - {evento.nombre}')
 
     # Verificar si las columnas comunidad_id y region_id existen en la tabla
-    from django.db import connection
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = 'eventos_cambios_colaboradores' 
-                AND column_name IN ('comunidad_id', 'region_id');
-            """)
-            existing_columns = {row[0] for row in cursor.fetchall()}
-            has_comunidad = 'comunidad_id' in existing_columns
-            has_region = 'region_id' in existing_columns
-    except Exception as e:
-        # Si hay un error al verificar, asumir que las columnas no existen
-        print(f'⚠️ Error al verificar columnas: {e}')
-        has_comunidad = False
-        has_region = False
+    from .schema_registry import tiene_columna
+    has_comunidad = tiene_columna('eventos_cambios_colaboradores', 'comunidad_id')
+    has_region = tiene_columna('eventos_cambios_colaboradores', 'region_id')
 
     # Construir select_related dinámicamente según las columnas disponibles
-    select_related_fields = ['colaborador']
+    select_related_fields = ['colaborador', 'colaborador__puesto']
     if has_comunidad:
-        select_related_fields.append('comunidad')
+        # comunidad__tipo: el __str__ de Comunidad (usado en los logs) muestra el tipo
+        select_related_fields.extend(['comunidad', 'comunidad__tipo'])
     if has_region:
         select_related_fields.append('region')
 
@@ -383,7 +386,7 @@ def obtener_cambios_evento(evento):
     # Los cambios adicionales se cargan bajo demanda si es necesario
     MAX_CAMBIOS_VISTA = 50
     # NO usar prefetch_related('evidencias') aquí porque puede cachear evidencias eliminadas
-    # En su lugar, haremos consultas directas por cada cambio
+    # En su lugar, las evidencias se consultan directamente más abajo
     cambios_queryset = (
         EventoCambioColaborador.objects.filter(actividad=evento)
         .select_related(*select_related_fields)
@@ -417,49 +420,53 @@ def obtener_cambios_evento(evento):
         grupo_uuid = getattr(cambio, 'grupo_id', None) or cambio.id
         grupos_unicos.add(grupo_uuid)
     
-    # Pre-cargar evidencias por grupo una sola vez
+    # Pre-cargar en dos consultas los cambios de todos los grupos y sus evidencias
+    # (no por cada grupo, para que el número de consultas no crezca con los cambios)
+    cambio_a_grupo = {}
+    if grupos_unicos:
+        for cambio_id, grupo_id in EventoCambioColaborador.objects.filter(
+            actividad=evento,
+            grupo_id__in=grupos_unicos
+        ).values_list('id', 'grupo_id'):
+            cambio_a_grupo[cambio_id] = str(grupo_id)
+
+    evidencias_encontradas = {}
+    if cambio_a_grupo:
+        evidencias_qs = EventosEvidenciasCambios.objects.filter(
+            actividad=evento,
+            cambio_id__in=list(cambio_a_grupo)
+        ).order_by('creado_en')
+        for evidencia in evidencias_qs:
+            evidencias_encontradas.setdefault(cambio_a_grupo[evidencia.cambio_id], []).append(evidencia)
+
     for grupo_uuid in grupos_unicos:
         grupo_clave = str(grupo_uuid)
-        # Obtener todos los cambios del mismo grupo
-        cambios_del_grupo = list(EventoCambioColaborador.objects.filter(
-            actividad=evento,
-            grupo_id=grupo_uuid
-        ).values_list('id', flat=True))
-        print(f'🔍 Grupo {grupo_clave}: Cambios del grupo: {cambios_del_grupo}')
-        
-        # Obtener todas las evidencias de todos los cambios del grupo
         # Usar un diccionario para evitar duplicados por ID (más compatible con todas las bases de datos)
         # También verificar duplicados por URL de almacenamiento para evitar el mismo archivo múltiples veces
         evidencias_temp = {}
         evidencias_por_url = {}  # Diccionario adicional para verificar duplicados por URL
-        if cambios_del_grupo:
-            # Usar una consulta directa con distinct para evitar duplicados a nivel de base de datos
-            evidencias_qs = EventosEvidenciasCambios.objects.filter(
-                actividad=evento,
-                cambio_id__in=cambios_del_grupo
-            ).order_by('creado_en')
-            
-            print(f'📎 Grupo {grupo_clave}: Evidencias encontradas en BD: {evidencias_qs.count()}')
-            
-            # Agregar al diccionario usando ID como clave para asegurar unicidad
-            # También verificar si ya existe una evidencia con la misma URL (mismo archivo físico)
-            for evidencia in evidencias_qs:
-                evidencia_key = str(evidencia.id)
-                evidencia_url = evidencia.url_almacenamiento or ''
-                
-                # Verificar si ya existe una evidencia con la misma URL (mismo archivo físico)
-                if evidencia_url in evidencias_por_url:
-                    print(f'  ⚠️ Evidencia {evidencia.id} ({evidencia.archivo_nombre}) con URL duplicada - omitida (ya existe evidencia {evidencias_por_url[evidencia_url].id})')
-                    continue
-                
-                # Solo agregar si no existe ya por ID (evita duplicados por seguridad)
-                if evidencia_key not in evidencias_temp:
-                    evidencias_temp[evidencia_key] = evidencia
-                    evidencias_por_url[evidencia_url] = evidencia
-                    print(f'  ✅ Evidencia {evidencia.id} ({evidencia.archivo_nombre}) agregada al grupo {grupo_clave}')
-                else:
-                    print(f'  ⚠️ Evidencia {evidencia.id} ({evidencia.archivo_nombre}) ya existe en el grupo {grupo_clave} por ID - omitida')
-        
+        evidencias_grupo = evidencias_encontradas.get(grupo_clave, [])
+        print(f'📎 Grupo {grupo_clave}: Evidencias encontradas en BD: {len(evidencias_grupo)}')
+
+        # Agregar al diccionario usando ID como clave para asegurar unicidad
+        # También verificar si ya existe una evidencia con la misma URL (mismo archivo físico)
+        for evidencia in evidencias_grupo:
+            evidencia_key = str(evidencia.id)
+            evidencia_url = evidencia.url_almacenamiento or ''
+
+            # Verificar si ya existe una evidencia con la misma URL (mismo archivo físico)
+            if evidencia_url in evidencias_por_url:
+                print(f'  ⚠️ Evidencia {evidencia.id} ({evidencia.archivo_nombre}) con URL duplicada - omitida (ya existe evidencia {evidencias_por_url[evidencia_url].id})')
+                continue
+
+            # Solo agregar si no existe ya por ID (evita duplicados por seguridad)
+            if evidencia_key not in evidencias_temp:
+                evidencias_temp[evidencia_key] = evidencia
+                evidencias_por_url[evidencia_url] = evidencia
+                print(f'  ✅ Evidencia {evidencia.id} ({evidencia.archivo_nombre}) agregada al grupo {grupo_clave}')
+            else:
+                print(f'  ⚠️ Evidencia {evidencia.id} ({evidencia.archivo_nombre}) ya existe en el grupo {grupo_clave} por ID - omitida')
+
         evidencias_por_grupo[grupo_clave] = list(evidencias_temp.values())
         print(f'📦 Grupo {grupo_clave}: Total de evidencias únicas (por ID y URL): {len(evidencias_por_grupo[grupo_clave])}')
 
@@ -610,6 +617,11 @@ def eliminar_portada_evento(portada_inst):
         return False
 
     relative_path = (portada_inst.url_almacenamiento or '').strip()
+    if almacen_archivos.es_archivo_del_almacen(relative_path):
+        # El archivo puede estar compartido: la recolección lo elimina al quedar sin referencias
+        portada_inst.delete()
+        return True
+
     media_url = getattr(settings, 'MEDIA_URL', '') or ''
     posibles_prefijos = [media_url, '/media/', 'media/']
     for prefijo in posibles_prefijos:
@@ -650,14 +662,9 @@ def guardar_portada_evento(actividad, archivo):
     if not content_type.startswith('image/'):
         raise ValueError('El archivo de portada debe ser una imagen')
 
-    portada_dir = os.path.join(settings.MEDIA_ROOT, 'eventos_portada_img')
-    os.makedirs(portada_dir, exist_ok=True)
-    fs = FileSystemStorage(location=portada_dir)
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S%f')
     extension = os.path.splitext(archivo.name)[1]
-    filename = f"{timestamp}{extension}"
-    saved_name = fs.save(filename, archivo)
-    url = f"/media/eventos_portada_img/{saved_name}"
+    saved_name = almacen_archivos.guardar(archivo, extension)
+    url = f"/media/{saved_name}"
 
     portada, _ = ActividadPortada.objects.update_or_create(
         actividad=actividad,
@@ -683,6 +690,7 @@ __all__ = [
     '_calcular_tiempo_relativo',
     'normalizar_dpi',
     'buscar_conflicto_dpi',
+    'buscar_dpis_existentes',
 ]
 
 